@@ -1,25 +1,85 @@
-from typing import List, Any
+import asyncio
+import time
+from typing import List, Any, AsyncIterator, Generator, Iterator, Optional, Dict, Tuple
+from core.config import PIPELINE_MODE, ASYNC_MAX_CONCURRENCY, SESSION_TTL_SECONDS
+from core.telemetry import annotate, traced
+from utils.answer_cache import get_answer_cache
 from utils.file_handler import read_files_to_string
-from handlers.instruction_0 import handle_instruction_0
-from handlers.instruction_1 import handle_instruction_1_interactive
+from utils.memory_cache import LRUCache
+from utils.prefetch import KnowledgePrefetcher
+from utils.knowledge_base import (
+    NOT_FOUND_MESSAGE,
+    get_knowledge_base_fingerprint,
+    query_knowledge_base,
+    query_knowledge_base_async,
+    search_knowledge_base,
+)
+from handlers.instruction_0 import handle_instruction_0, handle_instruction_0_async
+from handlers.instruction_1 import (
+    handle_instruction_1_interactive,
+    handle_instruction_1_interactive_async,
+    clarify_once,
+    clarify_once_async,
+    is_found,
+    write_result,
+    ClarificationSession,
+)
+from handlers.combined import handle_combined_analysis, handle_combined_analysis_async, stream_combined_analysis
 
-def run_analysis_agent(instruction: int, prompt: str, file_paths: List[str] = None, output_path: str = None) -> Any:
+def _answer_code(knowledge_text: Optional[str], result: Optional[Dict[str, Any]]) -> int:
+    """把知识问答得到的文本记入 result（提供时），返回结果代码：找到结果为 0，否则为 -1"""
+    if result is not None:
+        result["answer"] = knowledge_text
+    return 0 if is_found(knowledge_text) else -1
+
+def _cached_answer(prompt: str, file_paths: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    """在查询级答案缓存中查找；上传了文件的查询答案依赖文件内容，不使用缓存"""
+    cache = None if file_paths else get_answer_cache()
+    if cache is None:
+        return None
+    entry = cache.lookup(prompt, get_knowledge_base_fingerprint())
+    annotate(answer_cache="hit" if entry else "miss")
+    if entry:
+        print(f"[Agent] 命中答案缓存（相似度 {entry['similarity']:.2f}，原查询: '{entry['query']}'），术语: '{entry['term']}'")
+    return entry
+
+def _remember_answer(prompt: str, file_paths: Optional[List[str]], term: Optional[str], answer: Optional[str], clarified_by_user: bool = False) -> None:
+    """保存找到结果的知识问答；需要用户从建议中选择的查询不保存（同一问法下次可能选择不同的术语）"""
+    cache = None if file_paths or clarified_by_user or not term or not is_found(answer) else get_answer_cache()
+    if cache is not None:
+        cache.put(prompt, get_knowledge_base_fingerprint(), answer, term=term)
+
+def _use_cached_answer(entry: Dict[str, Any], output_path: Optional[str], result: Optional[Dict[str, Any]]) -> int:
+    if output_path:
+        write_result(output_path, entry["answer"])
+    if result is not None:
+        result["term"] = entry["term"]
+    return _answer_code(entry["answer"], result)
+
+def run_analysis_agent(
+    instruction: int,
+    prompt: str,
+    file_paths: List[str] = None,
+    output_path: str = None,
+    file_content: Optional[str] = None,
+    result: Optional[Dict[str, Any]] = None,
+) -> Any:
     """
     RS Agent's main entry point, dispatching tasks to appropriate handlers.
+    file_content: 已读取的文件内容；为 None 时读取 file_paths。
+    output_path: 提供时把知识问答结果另外写入该文件。
+    result: 提供时把知识问答结果写入 result["answer"]（在内存中返回，不经过文件）。
     """
-    file_content = read_files_to_string(file_paths)
+    if file_content is None:
+        file_content = read_files_to_string(file_paths, query=prompt)
 
     if instruction == 0:
         # Call the handler for instruction 0
         return handle_instruction_0(prompt, file_content)
     
     elif instruction == 1:
-        if not output_path:
-            print("[错误] instruction 1 需要提供 output_path。")
-            return -1
         # Call the handler for instruction 1
-        success = handle_instruction_1_interactive(prompt, file_content, output_path)
-        return 0 if success else -1
+        return _answer_code(handle_instruction_1_interactive(prompt, file_content, output_path, result=result), result)
         
     elif instruction in [2, 3]:
         print(f"[Agent] instruction {instruction} 尚未实现。")
@@ -29,24 +89,509 @@ def run_analysis_agent(instruction: int, prompt: str, file_paths: List[str] = No
         print(f"[错误] 未知的 instruction: {instruction}")
         return -1
 
-def process_user_query(prompt: str, file_paths: List[str] = None, output_path: str = None) -> Any:
+@traced("request")
+def process_user_query(
+    prompt: str,
+    file_paths: List[str] = None,
+    output_path: str = None,
+    mode: Optional[str] = None,
+    result: Optional[Dict[str, Any]] = None,
+) -> Any:
     """
     处理用户查询的主函数。
     首先进行意图分类，然后根据分类结果进行相应处理。
+
+    mode: "combined"（默认，见 PIPELINE_MODE）一次LLM调用完成意图识别与术语澄清；
+          "two_step" 使用原有的两步流程，便于对比。
+    result: 提供时把知识问答结果写入 result["answer"]（以及 result["term"]）；output_path 可省略。
+    知识问答的结果保存在查询级答案缓存中，同一问题的其他问法直接返回缓存的答案（见 utils/answer_cache.py）。
     """
-    # 第一步：意图分类
-    task_id = handle_instruction_0(prompt, read_files_to_string(file_paths))
+    mode = mode or PIPELINE_MODE
+    if mode not in ("combined", "two_step"):
+        print(f"[错误] 未知的处理模式: {mode}")
+        return -1
+    cached = _cached_answer(prompt, file_paths)
+    if cached is not None:
+        return _use_cached_answer(cached, output_path, result)
+
+    result = {} if result is None else result
+    if mode == "combined":
+        code = _process_user_query_combined(prompt, file_paths, output_path, result)
+    else:
+        code = _process_user_query_two_step(prompt, file_paths, output_path, result)
+    if code == 0:
+        _remember_answer(prompt, file_paths, result.get("term"), result.get("answer"), result.get("clarified_by_user", False))
+    return code
+
+def _process_user_query_two_step(
+    prompt: str,
+    file_paths: List[str] = None,
+    output_path: str = None,
+    result: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """两步模式：先意图分类，再按任务分派"""
+    # 第一步：意图分类（文件只读取一次，后续步骤复用）
+    file_content = read_files_to_string(file_paths, query=prompt)
+    task_id = handle_instruction_0(prompt, file_content)
     
     if task_id == -2:
         # 如果是可纠正的模糊查询，直接进入交互式问答
-        if not output_path:
-            print("[错误] 需要提供 output_path 用于保存结果。")
-            return -1
-        success = handle_instruction_1_interactive(prompt, read_files_to_string(file_paths), output_path)
-        return 0 if success else -1
+        return _answer_code(handle_instruction_1_interactive(prompt, file_content, output_path, result=result), result)
     elif task_id < 0:
         # 如果是完全无关的查询，直接返回
         return task_id
     else:
         # 如果是标准任务，调用相应的处理器
-        return run_analysis_agent(task_id, prompt, file_paths, output_path) 
\ No newline at end of file
+        return run_analysis_agent(task_id, prompt, file_paths, output_path, file_content, result)
+
+def _initial_clarification(analysis: dict) -> Optional[dict]:
+    """取出合并分析中的术语澄清部分；模型未给出可用的术语时返回 None，交由澄清流程重新识别。"""
+    usable = analysis["suggestions"] if analysis["is_ambiguous"] else analysis["corrected_term"]
+    if not usable:
+        return None
+    return {key: analysis[key] for key in ("is_ambiguous", "original_term", "corrected_term", "suggestions")}
+
+def _process_user_query_combined(
+    prompt: str,
+    file_paths: List[str] = None,
+    output_path: str = None,
+    result: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """合并模式：意图与术语在同一次分析中得到，知识问答直接进入知识库查询或建议选择。"""
+    file_content = read_files_to_string(file_paths, query=prompt)
+    analysis = handle_combined_analysis(prompt, file_content)
+    task_id = analysis["task_id"]
+
+    if task_id < 0:
+        return task_id
+    if task_id != 1:
+        return run_analysis_agent(task_id, prompt, file_paths, output_path, file_content, result)
+
+    knowledge_text = handle_instruction_1_interactive(prompt, file_content, output_path, _initial_clarification(analysis), result)
+    return _answer_code(knowledge_text, result)
+
+async def run_analysis_agent_async(
+    instruction: int,
+    prompt: str,
+    file_paths: List[str] = None,
+    output_path: str = None,
+    file_content: Optional[str] = None,
+    result: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """Async variant of run_analysis_agent."""
+    if file_content is None:
+        file_content = await asyncio.to_thread(read_files_to_string, file_paths, query=prompt)
+
+    if instruction == 0:
+        return await handle_instruction_0_async(prompt, file_content)
+
+    elif instruction == 1:
+        return _answer_code(await handle_instruction_1_interactive_async(prompt, file_content, output_path, result=result), result)
+
+    elif instruction in [2, 3]:
+        print(f"[Agent] instruction {instruction} 尚未实现。")
+        return -1
+
+    else:
+        print(f"[错误] 未知的 instruction: {instruction}")
+        return -1
+
+@traced("request")
+async def process_user_query_async(
+    prompt: str,
+    file_paths: List[str] = None,
+    output_path: str = None,
+    mode: Optional[str] = None,
+    result: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """
+    process_user_query 的异步版本：LLM 调用使用 ainvoke，文件读写与知识库查询不阻塞事件循环。
+    """
+    mode = mode or PIPELINE_MODE
+    if mode not in ("combined", "two_step"):
+        print(f"[错误] 未知的处理模式: {mode}")
+        return -1
+    cached = await asyncio.to_thread(_cached_answer, prompt, file_paths)
+    if cached is not None:
+        return await asyncio.to_thread(_use_cached_answer, cached, output_path, result)
+
+    result = {} if result is None else result
+    code = await _process_user_query_async(prompt, file_paths, output_path, mode, result)
+    if code == 0:
+        await asyncio.to_thread(_remember_answer, prompt, file_paths, result.get("term"), result.get("answer"),
+                                result.get("clarified_by_user", False))
+    return code
+
+async def _process_user_query_async(
+    prompt: str,
+    file_paths: Optional[List[str]],
+    output_path: Optional[str],
+    mode: str,
+    result: Dict[str, Any],
+) -> Any:
+    file_content = await asyncio.to_thread(read_files_to_string, file_paths, query=prompt)
+    initial_clarification = None
+    if mode == "combined":
+        analysis = await handle_combined_analysis_async(prompt, file_content)
+        task_id = analysis["task_id"]
+        initial_clarification = _initial_clarification(analysis) if task_id == 1 else None
+    else:
+        task_id = await handle_instruction_0_async(prompt, file_content)
+
+    if task_id == -2 or (mode == "combined" and task_id == 1):
+        knowledge_text = await handle_instruction_1_interactive_async(prompt, file_content, output_path, initial_clarification, result)
+        return _answer_code(knowledge_text, result)
+    elif task_id < 0:
+        return task_id
+    else:
+        return await run_analysis_agent_async(task_id, prompt, file_paths, output_path, file_content, result)
+
+async def process_user_queries_async(
+    prompts: List[str],
+    output_paths: Optional[List[Optional[str]]] = None,
+    max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+    mode: Optional[str] = None,
+    results: Optional[List[Dict[str, Any]]] = None,
+) -> List[Any]:
+    """
+    在同一个事件循环中并发处理多个查询，同时进行中的查询数不超过 max_concurrency。结果顺序与输入一致。
+    output_paths 省略时不写文件；results 为与 prompts 等长的字典列表时，各查询的知识问答结果写入对应的 ["answer"]。
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    output_paths = output_paths or [None] * len(prompts)
+    results = results or [None] * len(prompts)
+
+    async def _run(prompt: str, output_path: Optional[str], result: Optional[Dict[str, Any]]) -> Any:
+        async with semaphore:
+            return await process_user_query_async(prompt, output_path=output_path, mode=mode, result=result)
+
+    return await asyncio.gather(*(_run(p, o, r) for p, o, r in zip(prompts, output_paths, results)))
+
+def _new_answer(task_id: Optional[int] = None) -> Dict[str, Any]:
+    return {"task_id": task_id, "status": None, "term": None, "answer": None, "suggestions": None, "timings": {}}
+
+def _classification_status(result: Dict[str, Any]) -> bool:
+    """根据分类结果设置状态；返回 True 表示需要继续进行术语澄清与知识库查询。"""
+    task_id = result["task_id"]
+    if task_id in (1, -2):
+        return True
+    result["status"] = "rejected" if task_id < 0 else "unsupported"
+    return False
+
+def _pick_term(result: Dict[str, Any], clarification: dict, on_ambiguous: str) -> Optional[str]:
+    """非交互的模糊处理：'top' 自动采用第一个建议，'suggest' 只输出建议列表。"""
+    if not clarification['is_ambiguous']:
+        return clarification['corrected_term']
+    suggestions = clarification.get('suggestions') or []
+    result["suggestions"] = suggestions
+    if on_ambiguous == "top" and suggestions:
+        return suggestions[0]
+    result["status"] = "ambiguous"
+    return None
+
+def _set_answer(result: Dict[str, Any], knowledge_text: str) -> None:
+    result["answer"] = knowledge_text
+    result["status"] = "ok" if "抱歉" not in knowledge_text else "not_found"
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+def _cached_result(entry: Dict[str, Any], total_start: float) -> Dict[str, Any]:
+    """把答案缓存中的条目转为 answer_query 格式的结果（timings 只有 total）"""
+    result = _new_answer(task_id=entry["task_id"])
+    result["term"] = entry["term"]
+    _set_answer(result, entry["answer"])
+    result["timings"]["total"] = _elapsed_ms(total_start)
+    return result
+
+@traced("request")
+def answer_query(prompt: str, file_paths: List[str] = None, mode: Optional[str] = None, on_ambiguous: str = "top") -> Dict[str, Any]:
+    """
+    非交互地处理一个查询，结果保留在内存中（供批处理使用）。
+
+    返回 task_id、status（ok / not_found / ambiguous / rejected / unsupported）、
+    term、answer、suggestions 以及各阶段耗时 timings（毫秒）。
+    on_ambiguous: "top" 自动采用第一个建议，"suggest" 只返回建议。
+    """
+    mode = mode or PIPELINE_MODE
+    total_start = time.perf_counter()
+    cached = _cached_answer(prompt, file_paths)
+    if cached is not None:
+        return _cached_result(cached, total_start)
+    result = _new_answer()
+    timings = result["timings"]
+
+    start = time.perf_counter()
+    file_content = read_files_to_string(file_paths, query=prompt)
+    timings["read_files"] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    initial_clarification = None
+    if mode == "combined":
+        analysis = handle_combined_analysis(prompt, file_content)
+        result["task_id"] = analysis["task_id"]
+        if analysis["task_id"] == 1:
+            initial_clarification = _initial_clarification(analysis)
+    else:
+        result["task_id"] = handle_instruction_0(prompt, file_content)
+    timings["classify"] = _elapsed_ms(start)
+
+    if _classification_status(result):
+        start = time.perf_counter()
+        clarification = clarify_once(prompt, initial_clarification=initial_clarification)
+        timings["clarify"] = _elapsed_ms(start)
+
+        term = _pick_term(result, clarification, on_ambiguous)
+        if term:
+            result["term"] = term
+            start = time.perf_counter()
+            _set_answer(result, query_knowledge_base([(term, 1.0)]))
+            timings["knowledge_base"] = _elapsed_ms(start)
+            _remember_answer(prompt, file_paths, term, result["answer"], clarification['is_ambiguous'])
+
+    timings["total"] = _elapsed_ms(total_start)
+    return result
+
+async def _read_and_classify_async(prompt: str, file_paths: Optional[List[str]], mode: str, result: Dict[str, Any]) -> Optional[dict]:
+    """读取文件并完成意图识别（写入 result 的 task_id 与耗时），返回合并分析得到的初始澄清结果"""
+    timings = result["timings"]
+    start = time.perf_counter()
+    file_content = await asyncio.to_thread(read_files_to_string, file_paths, query=prompt)
+    timings["read_files"] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    initial_clarification = None
+    if mode == "combined":
+        analysis = await handle_combined_analysis_async(prompt, file_content)
+        result["task_id"] = analysis["task_id"]
+        if analysis["task_id"] == 1:
+            initial_clarification = _initial_clarification(analysis)
+    else:
+        result["task_id"] = await handle_instruction_0_async(prompt, file_content)
+    timings["classify"] = _elapsed_ms(start)
+    return initial_clarification
+
+@traced("request")
+async def answer_query_async(prompt: str, file_paths: List[str] = None, mode: Optional[str] = None, on_ambiguous: str = "top") -> Dict[str, Any]:
+    """Async variant of answer_query."""
+    mode = mode or PIPELINE_MODE
+    total_start = time.perf_counter()
+    cached = await asyncio.to_thread(_cached_answer, prompt, file_paths)
+    if cached is not None:
+        return _cached_result(cached, total_start)
+    result = _new_answer()
+    timings = result["timings"]
+    initial_clarification = await _read_and_classify_async(prompt, file_paths, mode, result)
+
+    if _classification_status(result):
+        start = time.perf_counter()
+        clarification = await clarify_once_async(prompt, initial_clarification=initial_clarification)
+        timings["clarify"] = _elapsed_ms(start)
+
+        term = _pick_term(result, clarification, on_ambiguous)
+        if term:
+            result["term"] = term
+            start = time.perf_counter()
+            _set_answer(result, await query_knowledge_base_async([(term, 1.0)]))
+            timings["knowledge_base"] = _elapsed_ms(start)
+            await asyncio.to_thread(_remember_answer, prompt, file_paths, term, result["answer"], clarification['is_ambiguous'])
+
+    timings["total"] = _elapsed_ms(total_start)
+    return result
+
+# 等待选择的会话对应的知识库预取（只保留最近的会话；被淘汰时选择后照常查询知识库）
+_session_prefetchers = LRUCache(max_entries=1024, ttl_seconds=SESSION_TTL_SECONDS)
+
+async def _finish_session_async(result: Dict[str, Any], session: ClarificationSession) -> None:
+    """
+    根据会话状态填写结果：已澄清时查询知识库（优先使用预取结果），
+    等待选择时给出建议并在后台预取各建议术语，用户中止时标记 aborted
+    """
+    prefetcher = _session_prefetchers.get(session.session_id)
+    if session.state == ClarificationSession.AWAITING_CHOICE:
+        result["status"] = "ambiguous"
+        result["suggestions"] = session.suggestions
+        prefetcher = prefetcher or KnowledgePrefetcher()
+        prefetcher.aprefetch(session.suggestions)
+        _session_prefetchers.set(session.session_id, prefetcher)
+        return
+
+    _session_prefetchers.delete(session.session_id)
+    if session.state == ClarificationSession.RESOLVED:
+        result["term"] = session.term
+        start = time.perf_counter()
+        knowledge_text = await prefetcher.atake(session.term) if prefetcher else None
+        if knowledge_text is None:
+            knowledge_text = await query_knowledge_base_async([(session.term, 1.0)])
+        _set_answer(result, knowledge_text)
+        result["timings"]["knowledge_base"] = _elapsed_ms(start)
+    else:
+        result["status"] = "aborted"
+    if prefetcher:
+        prefetcher.cancel()
+
+@traced("request", session=True)
+async def start_session_async(
+    prompt: str,
+    file_paths: List[str] = None,
+    mode: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Optional[ClarificationSession]]:
+    """
+    与 answer_query_async 相同的处理流程，但模糊查询不会自动选择建议：返回 (结果, 澄清会话)。
+    结果 status 为 ambiguous 时会话处于 awaiting_choice 状态，可以序列化保存，
+    之后用 resume_session_async 传入用户的选择继续。不需要澄清的查询返回的会话为 None。
+    """
+    mode = mode or PIPELINE_MODE
+    total_start = time.perf_counter()
+    cached = await asyncio.to_thread(_cached_answer, prompt, file_paths)
+    if cached is not None:
+        return _cached_result(cached, total_start), None
+    result = _new_answer()
+    initial_clarification = await _read_and_classify_async(prompt, file_paths, mode, result)
+
+    session = None
+    if _classification_status(result):
+        start = time.perf_counter()
+        session = await ClarificationSession(prompt).astep(initial_clarification)
+        result["timings"]["clarify"] = _elapsed_ms(start)
+        await _finish_session_async(result, session)
+        if session.state == ClarificationSession.RESOLVED:
+            await asyncio.to_thread(_remember_answer, prompt, file_paths, session.term, result["answer"])
+
+    result["timings"]["total"] = _elapsed_ms(total_start)
+    return result, session
+
+@traced("request", session=True)
+async def resume_session_async(session: ClarificationSession, user_choice: str) -> Dict[str, Any]:
+    """把用户的选择（序号、术语或退出词）应用到等待选择的会话上并继续处理，返回与 answer_query 相同格式的结果"""
+    total_start = time.perf_counter()
+    result = _new_answer(task_id=1)
+    start = time.perf_counter()
+    await session.achoose(user_choice)
+    result["timings"]["clarify"] = _elapsed_ms(start)
+    await _finish_session_async(result, session)
+    result["timings"]["total"] = _elapsed_ms(total_start)
+    return result
+
+def _token_events(tokens: Generator[str, None, Any], timings: Dict[str, float], total_start: float) -> Generator[Dict[str, Any], None, Any]:
+    """把LLM token 流包装为事件并记录首个 token 的耗时，返回 token 流的返回值"""
+    while True:
+        try:
+            text = next(tokens)
+        except StopIteration as stop:
+            return stop.value
+        timings.setdefault("first_token", _elapsed_ms(total_start))
+        yield {"event": "token", "text": text}
+
+def _search_passages(term: str) -> tuple:
+    """返回 (命中段落, 无段落时的提示文本)；检索接口出错时回退到 query_knowledge_base"""
+    try:
+        hits = search_knowledge_base([(term, 1.0)])
+    except Exception as e:
+        print(f"[错误] 知识库检索失败，改用普通查询: {e}")
+        text = query_knowledge_base([(term, 1.0)])
+        return [], text
+    return hits, NOT_FOUND_MESSAGE
+
+@traced("request", stream=True)
+def stream_answer(
+    prompt: str,
+    file_paths: List[str] = None,
+    output_path: Optional[str] = None,
+    mode: Optional[str] = None,
+    on_ambiguous: str = "top",
+) -> Iterator[Dict[str, Any]]:
+    """
+    流式处理一个查询，按产生顺序逐个返回事件：
+      {"event": "token", "text": ...}        合并分析阶段LLM输出的 token（本地快速路径命中时没有）
+      {"event": "analysis", "task_id": ...}  意图与术语分析完成
+      {"event": "passage", "key": ..., "text": ..., "score": ...}
+                                             知识库段落，同时追加写入 output_path 并立即刷新
+      {"event": "done", "result": {...}}     与 answer_query 相同的结果；timings 额外包含
+                                             first_token（首个 token 或段落）与 first_passage 的耗时
+    two_step 模式下意图识别不逐 token 输出。
+    """
+    mode = mode or PIPELINE_MODE
+    total_start = time.perf_counter()
+    result = _new_answer()
+    timings = result["timings"]
+
+    start = time.perf_counter()
+    file_content = read_files_to_string(file_paths, query=prompt)
+    timings["read_files"] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    initial_clarification = None
+    if mode == "combined":
+        analysis = yield from _token_events(stream_combined_analysis(prompt, file_content), timings, total_start)
+        result["task_id"] = analysis["task_id"]
+        if analysis["task_id"] == 1:
+            initial_clarification = _initial_clarification(analysis)
+    else:
+        result["task_id"] = handle_instruction_0(prompt, file_content)
+    timings["classify"] = _elapsed_ms(start)
+    yield {"event": "analysis", "task_id": result["task_id"]}
+
+    if _classification_status(result):
+        start = time.perf_counter()
+        clarification = clarify_once(prompt, initial_clarification=initial_clarification)
+        timings["clarify"] = _elapsed_ms(start)
+
+        term = _pick_term(result, clarification, on_ambiguous)
+        if term:
+            result["term"] = term
+            start = time.perf_counter()
+            hits, empty_text = _search_passages(term)
+            texts = []
+            out = open(output_path, 'w', encoding='utf-8') if output_path else None
+            try:
+                for hit in hits:
+                    if "first_passage" not in timings:
+                        timings["first_passage"] = _elapsed_ms(total_start)
+                        timings.setdefault("first_token", timings["first_passage"])
+                    if out is not None:
+                        out.write(("\n\n" if texts else "") + hit.text)
+                        out.flush()
+                    texts.append(hit.text)
+                    yield {"event": "passage", "key": hit.key, "text": hit.text, "score": hit.score}
+                if not texts and out is not None:
+                    out.write(empty_text)
+            finally:
+                if out is not None:
+                    out.close()
+            _set_answer(result, "\n\n".join(texts) if texts else empty_text)
+            timings["knowledge_base"] = _elapsed_ms(start)
+
+    timings["total"] = _elapsed_ms(total_start)
+    yield {"event": "done", "result": result}
+
+async def astream_answer(
+    prompt: str,
+    file_paths: List[str] = None,
+    output_path: Optional[str] = None,
+    mode: Optional[str] = None,
+    on_ambiguous: str = "top",
+) -> AsyncIterator[Dict[str, Any]]:
+    """stream_answer 的异步迭代器版本：流水线在工作线程中执行，事件经队列交给事件循环，不阻塞其他协程。"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    def produce() -> None:
+        try:
+            for event in stream_answer(prompt, file_paths, output_path, mode, on_ambiguous):
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    while True:
+        item = await queue.get()
+        if item is finished:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    await producer
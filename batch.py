@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Set, TextIO, Tuple
+
+AnswerFn = Callable[..., Dict[str, Any]]
+AsyncAnswerFn = Callable[..., Awaitable[Dict[str, Any]]]
+
+def read_queries(input_path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    逐行读取查询文件（JSONL），返回 (序号, 查询) 。
+
+    每行可以是 {"id": ..., "query": ..., "file_paths": [...]}，也可以是纯文本问题；
+    未提供 id 时使用行号。空行会被跳过。
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        seq = 0
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = line
+            if not isinstance(item, dict):
+                item = {"query": str(item)}
+            item["id"] = str(item.get("id", line_no))
+            yield seq, item
+            seq += 1
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """读取已有的结果文件，返回已成功处理（status 不为 error）的查询 id。"""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 进程中断时最后一行可能不完整
+                continue
+            if record.get("status") != "error":
+                done.add(str(record.get("id")))
+    return done
+
+def _ends_without_newline(path: str) -> bool:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+class _ResultWriter:
+    """把结果逐行写入 JSONL 并立即刷新；ordered=True 时按输入顺序输出。"""
+
+    def __init__(self, stream: TextIO, ordered: bool):
+        self.stream = stream
+        self.ordered = ordered
+        self.written = 0
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._next_seq = 0
+
+    def skip(self, seq: int) -> None:
+        """记录被跳过的序号（断点续跑），使有序输出不会在此等待。"""
+        self._emit(seq, None)
+
+    def add(self, seq: int, record: Dict[str, Any]) -> None:
+        self._emit(seq, record)
+
+    def _emit(self, seq: int, record: Optional[Dict[str, Any]]) -> None:
+        if not self.ordered:
+            if record is not None:
+                self._write(record)
+            return
+        self._pending[seq] = record
+        while self._next_seq in self._pending:
+            ready = self._pending.pop(self._next_seq)
+            if ready is not None:
+                self._write(ready)
+            self._next_seq += 1
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+        self.written += 1
+
+def _record(item: Dict[str, Any], answer: Optional[Dict[str, Any]] = None, error: Optional[Exception] = None) -> Dict[str, Any]:
+    record = {"id": item["id"], "query": item.get("query", "")}
+    if error is not None:
+        record.update({"status": "error", "error": f"{type(error).__name__}: {error}"})
+    else:
+        record.update(answer)
+    return record
+
+def _process_threaded(queries, writer: _ResultWriter, answer_fn: AnswerFn, workers: int, options: Dict[str, Any]) -> None:
+    """线程池处理；同时在途的查询不超过 workers * 2，避免一次性读入整个输入文件。"""
+    def run(item: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return _record(item, answer_fn(item.get("query", ""), item.get("file_paths"), **options))
+        except Exception as e:
+            return _record(item, error=e)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        for seq, item in queries:
+            if item is None:
+                writer.skip(seq)
+                continue
+            in_flight[pool.submit(run, item)] = seq
+            if len(in_flight) >= workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    writer.add(in_flight.pop(future), future.result())
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                writer.add(in_flight.pop(future), future.result())
+
+async def _process_async(queries, writer: _ResultWriter, answer_fn: AsyncAnswerFn, workers: int, options: Dict[str, Any]) -> None:
+    """异步处理：固定数量的 worker 协程从队列中取查询。"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+
+    async def worker() -> None:
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            seq, item = entry
+            try:
+                record = _record(item, await answer_fn(item.get("query", ""), item.get("file_paths"), **options))
+            except Exception as e:
+                record = _record(item, error=e)
+            writer.add(seq, record)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    for seq, item in queries:
+        if item is None:
+            writer.skip(seq)
+        else:
+            await queue.put((seq, item))
+    for _ in tasks:
+        await queue.put(None)
+    await asyncio.gather(*tasks)
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    workers: int = 4,
+    executor: str = "thread",
+    ordered: bool = False,
+    resume: bool = False,
+    on_ambiguous: str = "top",
+    mode: Optional[str] = None,
+    answer_fn: Optional[Callable] = None,
+) -> Dict[str, int]:
+    """
+    批量处理查询文件，每完成一个查询就向 output_path 追加一行 JSONL 结果。
+
+    executor: "thread" 使用线程池，"async" 使用事件循环 + worker 协程
+    ordered: 按输入顺序输出（默认按完成顺序）
+    resume: 跳过 output_path 中已成功处理的 id，并在文件末尾继续追加
+    on_ambiguous: 模糊查询的处理方式，"top" 自动采用第一个建议，"suggest" 只输出建议
+    answer_fn: 处理单个查询的函数，默认为 agent.answer_query / agent.answer_query_async
+    output_path 为 "-" 时输出到标准输出。
+    """
+    if answer_fn is None:
+        from agent import answer_query, answer_query_async
+        answer_fn = answer_query_async if executor == "async" else answer_query
+
+    done = load_checkpoint(output_path) if resume and output_path != "-" else set()
+    skipped = 0
+
+    def pending_queries():
+        nonlocal skipped
+        for seq, item in read_queries(input_path):
+            if item["id"] in done:
+                skipped += 1
+                yield seq, None
+            else:
+                yield seq, item
+
+    if output_path == "-":
+        stream = sys.stdout
+    else:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        if resume and _ends_without_newline(output_path):
+            # 中断时写了一半的行单独成行，避免与新结果粘连
+            with open(output_path, 'a', encoding='utf-8') as f:
+                f.write("\n")
+        stream = open(output_path, 'a' if resume else 'w', encoding='utf-8')
+
+    options = {"mode": mode, "on_ambiguous": on_ambiguous}
+    writer = _ResultWriter(stream, ordered)
+    try:
+        if executor == "async":
+            asyncio.run(_process_async(pending_queries(), writer, answer_fn, workers, options))
+        elif executor == "thread":
+            _process_threaded(pending_queries(), writer, answer_fn, workers, options)
+        else:
+            raise ValueError(f"未知的执行方式: {executor}")
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    return {"written": writer.written, "skipped": skipped}
@@ -0,0 +1,5 @@
+"""
+Benchmarks package for RS Agent.
+Contains offline performance measurements (pipeline stages, knowledge bases,
+memory, startup time) driven by a deterministic fake chat model.
+"""
@@ -0,0 +1,66 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.1,
+    min_delta: float = 0.0,
+) -> List[Dict[str, Any]]:
+    """
+    逐项比较两次基准结果中都存在的指标。
+
+    变差（better 为 lower 时变大、为 higher 时变小）的相对幅度超过 threshold，
+    且绝对变化超过 min_delta 时标记为 regression。
+    """
+    rows = []
+    base_metrics = baseline.get("metrics", {})
+    for name, metric in sorted(current.get("metrics", {}).items()):
+        if name not in base_metrics:
+            continue
+        old, new = base_metrics[name]["value"], metric["value"]
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+        worse = change if metric.get("better", "lower") == "lower" else -change
+        rows.append({
+            "metric": name,
+            "unit": metric.get("unit", ""),
+            "baseline": old,
+            "current": new,
+            "change": change,
+            "regression": worse > threshold and abs(new - old) > min_delta,
+            "improvement": -worse > threshold and abs(new - old) > min_delta,
+        })
+    return rows
+
+def print_comparison(rows: List[Dict[str, Any]]) -> None:
+    for row in rows:
+        flag = "回退" if row["regression"] else "提升" if row["improvement"] else ""
+        print(
+            f"{row['metric']:<52} {row['baseline']:>12.3f} -> {row['current']:>12.3f} {row['unit']:<6}"
+            f" {row['change'] * 100:>+8.1f}%  {flag}"
+        )
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n共比较 {len(rows)} 项指标，{len(regressions)} 项回退。")
+
+def main():
+    parser = argparse.ArgumentParser(description="比较两次基准结果，标记性能回退")
+    parser.add_argument("baseline", help="基线结果 JSON")
+    parser.add_argument("current", help="当前结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定为回退的相对变化（默认 0.1，即 10%%）")
+    parser.add_argument("--min-delta", type=float, default=0.0, help="忽略绝对变化不超过该值的指标（过滤噪声）")
+    args = parser.parse_args()
+
+    rows = compare_results(load_results(args.baseline), load_results(args.current), args.threshold, args.min_delta)
+    print_comparison(rows)
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import asyncio
+import difflib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from core.config import KNOWN_TECHNICAL_TERMS
+from utils.file_handler import estimate_tokens
+
+# responder(system_prompt, user_message) -> 模型输出文本
+Responder = Callable[[str, str], str]
+
+_BUILD_WORDS = ("模拟", "构建", "搭建")
+_INVERT_WORDS = ("推断", "反演", "对应的")
+
+
+def _match_terms(text: str, terms: List[str]) -> Dict[str, Any]:
+    """确定性的术语判断：包含标准术语时直接采用，否则按字符相似度给出建议，没有相近术语时视为无关"""
+    for term in terms:
+        if term.lower() in text.lower():
+            return {"task_id": 1, "is_ambiguous": False, "original_term": term, "corrected_term": term, "suggestions": None}
+    if any(word in text for word in _BUILD_WORDS):
+        return {"task_id": 2, "is_ambiguous": False, "original_term": None, "corrected_term": None, "suggestions": None}
+    if any(word in text for word in _INVERT_WORDS):
+        return {"task_id": 3, "is_ambiguous": False, "original_term": None, "corrected_term": None, "suggestions": None}
+    scored = sorted(
+        ((difflib.SequenceMatcher(None, term, text).find_longest_match(0, len(term), 0, len(text)).size / len(term), term) for term in terms),
+        key=lambda item: (-item[0], item[1]),
+    )
+    suggestions = [term for score, term in scored if score >= 0.5][:3]
+    if not suggestions:
+        return {"task_id": -1, "is_ambiguous": False, "original_term": None, "corrected_term": None, "suggestions": None}
+    return {"task_id": 1, "is_ambiguous": True, "original_term": text.strip("'？?。 "), "corrected_term": None, "suggestions": suggestions}
+
+
+def _truncate(text: str, max_tokens: Optional[int]) -> str:
+    """与真实模型一样，输出超过 max_tokens（按 estimate_tokens 估算）时截断"""
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def _user_request(message: str) -> str:
+    """取出各处理器拼接的用户消息中用户真正输入的部分"""
+    if message.startswith("用户请求：\n"):
+        return message[len("用户请求：\n"):].split("\n\n", 1)[0]
+    if message.startswith("用户当前输入: '"):
+        return message[len("用户当前输入: '"):].split("'\n", 1)[0]
+    return message
+
+
+def default_responder(system_prompt: str, user_message: str, terms: Optional[List[str]] = None) -> str:
+    """按系统提示词识别调用方（意图分类 / 合并分析 / 术语澄清），返回对应格式的固定输出"""
+    analysis = _match_terms(_user_request(user_message), list(terms or KNOWN_TECHNICAL_TERMS))
+    if "任务分类助手" in system_prompt:
+        task_id = -2 if analysis["is_ambiguous"] else analysis["task_id"]
+        return str(task_id)
+    if "两项分析" in system_prompt:
+        return json.dumps(analysis, ensure_ascii=False)
+    clarification = {key: analysis[key] for key in ("is_ambiguous", "original_term", "corrected_term", "suggestions")}
+    clarification["original_term"] = clarification["original_term"] or _user_request(user_message)
+    return json.dumps(clarification, ensure_ascii=False)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    用于基准测试的本地确定性聊天模型，可以替换 core.config 中的 LLM（见 fake_llm_provider）。
+
+    latency 为每次调用返回首个 token 前的固定延迟（秒），token_delay 为流式输出时每个 token 之间的延迟，
+    token_chars 为每个流式 token 包含的字符数。输出由 responder 根据系统提示词与用户消息确定，
+    调用时传入 max_tokens（例如经 bind）则按估算的 token 数截断。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    latency: float = 0.05
+    token_delay: float = 0.0
+    token_chars: int = 2
+    responder: Responder = Field(default=default_responder, exclude=True)
+
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"latency": self.latency, "token_delay": self.token_delay}
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _respond(self, messages: List[BaseMessage], max_tokens: Optional[int] = None) -> str:
+        with self._lock:
+            self._calls += 1
+        system = "\n".join(str(m.content) for m in messages if m.type == "system")
+        user = str(messages[-1].content) if messages else ""
+        return _truncate(self.responder(system, user), max_tokens)
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], text: str) -> Dict[str, int]:
+        """按 estimate_tokens 估算的 token 用量，格式与真实模型的 usage_metadata 相同"""
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = estimate_tokens(text)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._respond(messages, kwargs.get("max_tokens"))
+        time.sleep(self._total_delay(text))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # 异步调用直接在事件循环中等待，不占用线程池（便于测试高并发服务）
+        text = self._respond(messages, kwargs.get("max_tokens"))
+        await asyncio.sleep(self._total_delay(text))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _total_delay(self, text: str) -> float:
+        return self.latency + self.token_delay * max(0, -(-len(text) // self.token_chars) - 1)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        text = self._respond(messages, kwargs.get("max_tokens"))
+        time.sleep(self.latency)
+        last = max(0, len(text) - 1) // self.token_chars * self.token_chars
+        for i in range(0, len(text), self.token_chars):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            # 用量随最后一个块返回（与 OpenAI 兼容接口的 stream_usage 一致）
+            usage = self._usage(messages, text) if i == last else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + self.token_chars], usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def fake_llm_provider(**kwargs: Any) -> Callable[[], FakeChatModel]:
+    """返回供 core.config.set_llm_provider 使用的提供者，例如 set_llm_provider(fake_llm_provider(latency=0.2))"""
+    return lambda: FakeChatModel(**kwargs)
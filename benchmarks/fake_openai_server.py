@@ -0,0 +1,146 @@
+"""
+本地 OpenAI 兼容的假聊天接口（POST /v1/chat/completions），带服务端配额：
+同时处理的请求数超过 max_concurrency，或最近 1 秒内的请求数超过 requests_per_second 时返回 429（带 Retry-After）。
+用于在不访问真实服务的情况下测试客户端限流与自适应并发（ChatOpenAI 的 base_url 指向本服务即可）。
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, Optional
+
+# content(请求 JSON) -> 回复文本
+Replier = Callable[[dict], str]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server: QuotaServer = self.server.quota
+        if not server.admit():
+            self._send(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error", "code": "rate_limit"}},
+                       {"Retry-After": str(server.retry_after)})
+            return
+        try:
+            time.sleep(server.latency)
+            content = server.replier(body)
+        finally:
+            server.finish()
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 2
+        completion_tokens = max(1, len(content) // 2)
+        self._send(200, {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    def _send(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class QuotaServer:
+    """
+    带配额的假 OpenAI 服务。start() 后 base_url 可直接用于 ChatOpenAI(base_url=...)；
+    stats() 返回成功数、429 数以及观察到的最大并发。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        requests_per_second: Optional[int] = None,
+        latency: float = 0.05,
+        retry_after: float = 0.05,
+        replier: Optional[Replier] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.latency = latency
+        self.retry_after = retry_after
+        self.replier = replier or (lambda body: "-2")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._recent: Deque[float] = deque()
+        self._stats = {"ok": 0, "rejected": 0, "max_in_flight": 0}
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.quota = self
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def admit(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            over_rate = self.requests_per_second is not None and len(self._recent) >= self.requests_per_second
+            if over_rate or self._in_flight >= self.max_concurrency:
+                self._stats["rejected"] += 1
+                return False
+            self._recent.append(now)
+            self._in_flight += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._in_flight)
+            return True
+
+    def finish(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._stats["ok"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def start(self) -> "QuotaServer":
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="带配额（返回 429）的本地假 OpenAI 聊天接口")
+    parser.add_argument("--port", type=int, default=8399)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--rps", type=int, default=None, help="每秒请求数上限")
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    server = QuotaServer(args.max_concurrency, args.rps, args.latency, port=args.port)
+    print(f"[服务] 假 OpenAI 接口: {server.base_url}（并发上限 {args.max_concurrency}，每秒 {args.rps or '不限'}）")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
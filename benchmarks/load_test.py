@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# 允许以 `python benchmarks/load_test.py` 方式运行
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import DEFAULT_QUERIES, _latency_metrics, _metric, _quiet, fake_llm, percentile
+
+
+class AsyncHTTPClient:
+    """最小的 HTTP/1.1 keep-alive 客户端（每个实例一个连接，断开后自动重连）"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self.connections = 0
+
+    async def request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Tuple[int, Any]:
+        """发送请求，返回 (状态码, 解析后的 JSON 或文本)"""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self.connections += 1
+        head = (
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        )
+        self._writer.write(head.encode("latin-1") + body)
+        await self._writer.drain()
+
+        lines = (await self._reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        data = await self._reader.readexactly(int(headers.get("content-length") or 0))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        if headers.get("content-type", "").startswith("application/json"):
+            return status, json.loads(data)
+        return status, data.decode("utf-8")
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._reader = self._writer = None
+
+
+async def _client_loop(
+    client: AsyncHTTPClient,
+    queries: List[str],
+    remaining: List[int],
+    latencies: Dict[str, List[float]],
+    stats: Dict[str, int],
+    choice: str,
+) -> None:
+    """不断从共享计数中领取查询；模糊查询立即用 choice 继续会话（继续请求单独计时）"""
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        query = queries[remaining[0] % len(queries)]
+        start = time.perf_counter()
+        try:
+            status, result = await client.request("POST", "/v1/query", {"query": query})
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            stats["errors"] += 1
+            print(f"[警告] 请求失败: {e}")
+            await client.close()
+            continue
+        latencies["query"].append((time.perf_counter() - start) * 1000)
+        if status != 200:
+            stats["errors"] += 1
+            continue
+        stats["queries"] += 1
+        session_id = result.get("session_id")
+        if session_id:
+            stats["sessions"] += 1
+            start = time.perf_counter()
+            status, _ = await client.request("POST", f"/v1/sessions/{session_id}", {"choice": choice})
+            latencies["resume"].append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                stats["errors"] += 1
+
+
+async def run_load(
+    host: str,
+    port: int,
+    requests: int = 500,
+    concurrency: int = 50,
+    queries: Optional[List[str]] = None,
+    choice: str = "1",
+) -> Dict[str, Dict[str, Any]]:
+    """concurrency 个 keep-alive 连接并发发送共 requests 个查询，返回吞吐量、延迟分位数与错误数"""
+    queries = queries or DEFAULT_QUERIES
+    latencies: Dict[str, List[float]] = {"query": [], "resume": []}
+    stats = {"queries": 0, "sessions": 0, "errors": 0}
+    remaining = [requests]
+    clients = [AsyncHTTPClient(host, port) for _ in range(concurrency)]
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(_client_loop(c, queries, remaining, latencies, stats, choice) for c in clients))
+    finally:
+        await asyncio.gather(*(c.close() for c in clients))
+    elapsed = time.perf_counter() - start
+
+    metrics: Dict[str, Dict[str, Any]] = {}
+    total = len(latencies["query"]) + len(latencies["resume"])
+    _metric(metrics, "load.throughput_rps", total / elapsed if elapsed else 0.0, "req/s", "higher")
+    _latency_metrics(metrics, "load.query", latencies["query"])
+    _metric(metrics, "load.query.p99_ms", percentile(latencies["query"], 0.99))
+    if latencies["resume"]:
+        _latency_metrics(metrics, "load.resume", latencies["resume"])
+        _metric(metrics, "load.resume.p99_ms", percentile(latencies["resume"], 0.99))
+    _metric(metrics, "load.sessions", stats["sessions"], "count", "higher")
+    _metric(metrics, "load.errors", stats["errors"], "count")
+    _metric(metrics, "load.connections", sum(c.connections for c in clients), "count")
+    return metrics
+
+
+async def measure_pending_sessions(server: Any, count: int, query: str = "说说土壤含水那些事") -> Dict[str, Dict[str, Any]]:
+    """
+    在进程内服务上创建 count 个不继续的模糊会话，测量每个等待中会话占用的内存与线程数变化。
+    等待选择的会话只以序列化状态保存在 SessionStore 中，线程数不应随会话数增长。
+    """
+    client = AsyncHTTPClient(server.host, server.port)
+    threads_before = threading.active_count()
+    sessions_before = len(server.sessions)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        for _ in range(count):
+            await client.request("POST", "/v1/query", {"query": query})
+        used = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+        await client.close()
+    pending = len(server.sessions) - sessions_before
+
+    metrics: Dict[str, Dict[str, Any]] = {}
+    _metric(metrics, "sessions.pending", pending, "count", "higher")
+    _metric(metrics, "sessions.bytes_per_session", used / pending if pending else 0.0, "B")
+    _metric(metrics, "sessions.thread_delta", threading.active_count() - threads_before, "count")
+    return metrics
+
+
+async def run_in_process(
+    requests: int,
+    concurrency: int,
+    pending_sessions: int,
+    llm_latency: float,
+    mode: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """使用确定性假模型在本进程启动服务并压测（无需 API Key）"""
+    from server import AgentServer
+
+    with fake_llm(latency=llm_latency), _quiet():
+        server = AgentServer("127.0.0.1", 0, mode=mode, max_concurrency=max(concurrency, 1))
+        await server.start()
+        try:
+            metrics = await run_load(server.host, server.port, requests, concurrency)
+            if pending_sessions:
+                metrics.update(await measure_pending_sessions(server, pending_sessions))
+        finally:
+            await server.close()
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RS Agent HTTP 服务压测（默认在本进程以假模型启动服务）")
+    parser.add_argument("--url", type=str, default=None, help="压测已运行的服务，例如 http://127.0.0.1:8080")
+    parser.add_argument("--requests", type=int, default=500, help="发送的查询总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发的 keep-alive 连接数")
+    parser.add_argument("--pending-sessions", type=int, default=1000, help="额外创建的等待中会话数（仅本进程模式）")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="假模型每次调用的固定延迟（秒）")
+    parser.add_argument("--mode", type=str, choices=["combined", "two_step"], default=None, help="服务的处理模式")
+    parser.add_argument("--output", type=str, default=None, help="将结果保存为 JSON 文件（可用 benchmarks/compare.py 比较）")
+    args = parser.parse_args()
+
+    if args.url:
+        target = urlsplit(args.url)
+        metrics = asyncio.run(run_load(target.hostname, target.port or 80, args.requests, args.concurrency))
+    else:
+        metrics = asyncio.run(run_in_process(args.requests, args.concurrency, args.pending_sessions, args.llm_latency, args.mode))
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.url or "in-process",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency": None if args.url else args.llm_latency,
+        },
+        "metrics": metrics,
+    }
+    for name, metric in sorted(metrics.items()):
+        print(f"{name:<40} {metric['value']:>12.3f} {metric['unit']}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[基准] 结果已保存到: {args.output}")
+
+if __name__ == "__main__":
+    main()
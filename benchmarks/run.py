@@ -0,0 +1,411 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from unittest import mock
+
+# 允许以 `python benchmarks/run.py` 方式运行
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.compare import compare_results, load_results, print_comparison
+from benchmarks.fake_llm import fake_llm_provider
+
+SECTIONS = ("pipeline", "knowledge_base", "memory", "startup")
+
+# 覆盖本地快速路径、LLM 分类、模糊术语、未实现任务与无关查询
+DEFAULT_QUERIES = [
+    "土壤湿度是什么？",
+    "RSHub怎么用？",
+    "说说土壤含水那些事",
+    "土地湿度是什么？",
+    "帮我用这些参数模拟一下场景",
+    "今天星期几？",
+]
+
+_PREFIXES = ["土壤", "植被", "地表", "微波", "雷达", "积雪", "海冰", "冻土", "湿地", "森林", "农田", "城市"]
+_SUFFIXES = ["湿度", "指数", "粗糙度", "散射", "辐射亮温", "反演", "穿透深度", "介电常数", "覆盖度", "含水量"]
+_VOCAB = ["后向散射", "极化", "入射角", "频率", "L波段", "C波段", "亮温", "发射率", "反演算法", "观测",
+          "卫星", "分辨率", "时间序列", "地面验证", "模型", "参数", "误差", "敏感性", "植被层", "土壤层"]
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+def _metric(metrics: Dict[str, Dict[str, Any]], name: str, value: float, unit: str = "ms", better: str = "lower") -> None:
+    metrics[name] = {"value": round(value, 4), "unit": unit, "better": better}
+
+
+def _latency_metrics(metrics: Dict[str, Dict[str, Any]], prefix: str, values_ms: List[float]) -> None:
+    _metric(metrics, f"{prefix}.p50_ms", percentile(values_ms, 0.5))
+    _metric(metrics, f"{prefix}.p95_ms", percentile(values_ms, 0.95))
+
+
+@contextlib.contextmanager
+def _quiet():
+    """屏蔽被测代码的过程输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def fake_llm(**kwargs: Any):
+    """在上下文中使用确定性的本地假模型代替远程LLM"""
+    from core.config import get_llm, set_llm_provider
+    set_llm_provider(fake_llm_provider(**kwargs))
+    try:
+        yield get_llm()
+    finally:
+        set_llm_provider(None)
+
+
+def _write_upload(directory: str, lines: int = 5000) -> str:
+    """生成一个用于测量文件读取阶段的上传文件"""
+    path = os.path.join(directory, "upload.txt")
+    rng = random.Random(1)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(f"{i},{'、'.join(rng.sample(_VOCAB, 5))}\n")
+    return path
+
+
+# --- 处理流程 ---
+
+def bench_pipeline(
+    queries: List[str],
+    modes: List[str],
+    repeat: int,
+    llm_latency: float,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    测量 process_user_query 各阶段耗时（answer_query 的 timings：read_files / classify / clarify /
+    knowledge_base / total）、process_user_query 端到端耗时、每个查询的平均LLM调用次数，
+    以及每次LLM调用放入提示词的术语 token 数与相对放入整个术语表节省的比例。
+    每个查询前清空文件读取缓存，read_files 反映冷读取耗时。
+    """
+    from agent import answer_query, process_user_query
+    from handlers.instruction_1 import get_prompt_term_stats, reset_prompt_term_stats
+    from utils.file_handler import clear_file_cache
+    from utils.knowledge_base import set_knowledge_base
+
+    metrics: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp, fake_llm(latency=llm_latency) as llm, _quiet():
+        set_knowledge_base("mock")
+        upload = _write_upload(tmp)
+        cases = [(query, None) for query in queries] + [(queries[-1 if len(queries) < 3 else 2], [upload])]
+        for mode in modes:
+            for query, files in cases:  # 预热：导入、索引构建等一次性开销不计入
+                answer_query(query, files, mode=mode)
+
+            stages: Dict[str, List[float]] = {}
+            calls_before = llm.calls
+            reset_prompt_term_stats()
+            for _ in range(repeat):
+                for query, files in cases:
+                    clear_file_cache()  # 测量冷读取，而不是读取缓存
+                    for stage, elapsed in answer_query(query, files, mode=mode)["timings"].items():
+                        stages.setdefault(stage, []).append(elapsed)
+            for stage, values in stages.items():
+                _latency_metrics(metrics, f"pipeline.{mode}.{stage}", values)
+            _metric(metrics, f"pipeline.{mode}.llm_calls_per_query", (llm.calls - calls_before) / (repeat * len(cases)), "calls")
+            term_stats = get_prompt_term_stats()
+            if term_stats["prompts"]:
+                _metric(metrics, f"pipeline.{mode}.prompt_term_tokens", term_stats["injected_tokens"] / term_stats["prompts"], "tokens")
+                _metric(metrics, f"pipeline.{mode}.prompt_term_savings", term_stats["savings_rate"], "ratio", better="higher")
+
+            end_to_end = []
+            with mock.patch("builtins.input", return_value="1"):
+                for _ in range(repeat):
+                    for i, (query, files) in enumerate(cases):
+                        start = time.perf_counter()
+                        process_user_query(query, files, os.path.join(tmp, f"{mode}_{i}.txt"), mode=mode)
+                        end_to_end.append((time.perf_counter() - start) * 1000)
+            _latency_metrics(metrics, f"pipeline.{mode}.process_user_query", end_to_end)
+    return metrics
+
+
+# --- 知识库 ---
+
+def synthetic_knowledge(entries: int, seed: int = 0) -> Dict[str, str]:
+    """生成确定性的合成知识库条目"""
+    rng = random.Random(seed)
+    data = {}
+    for i in range(entries):
+        key = f"{_PREFIXES[i % len(_PREFIXES)]}{_SUFFIXES[(i // len(_PREFIXES)) % len(_SUFFIXES)]}{i}"
+        data[key] = f"{key}：" + "，".join(rng.choice(_VOCAB) for _ in range(20)) + "。"
+    return data
+
+
+def synthetic_queries(data: Dict[str, str], count: int, seed: int = 0) -> List[List[tuple]]:
+    """精确命中、部分命中与未命中的查询各占一部分"""
+    rng = random.Random(seed)
+    keys = sorted(data)
+    queries = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            queries.append([(rng.choice(keys), 1.0)])
+        elif kind == 1:
+            queries.append([(rng.choice(_PREFIXES) + rng.choice(_SUFFIXES), 1.0), (rng.choice(_VOCAB), 0.5)])
+        else:
+            queries.append([(f"不存在的术语{i}", 1.0)])
+    return queries
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """本地知识库API：按服务器上的 MockKnowledgeBase 检索"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        results = []
+        for item in body["queries"]:
+            keywords = [(k["keyword"], k["weight"]) for k in item["keywords"]]
+            results.append([hit._asdict() for hit in self.server.kb.search(keywords, item["top_k"])])
+        data = json.dumps({"results": results}, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _start_stub_server(data: Dict[str, str]) -> ThreadingHTTPServer:
+    from utils.knowledge_base import MockKnowledgeBase
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    server.kb = MockKnowledgeBase(data)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def knowledge_base_builders(data: Dict[str, str], directory: str) -> Dict[str, Callable[[], Any]]:
+    """各知识库实现的构造函数（同一份合成数据）"""
+    from utils import knowledge_base as kb
+
+    json_path = os.path.join(directory, "kb.json")
+    jsonl_path = os.path.join(directory, "kb.jsonl")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for key, text in data.items():
+            f.write(json.dumps({"key": key, "text": text}, ensure_ascii=False) + "\n")
+
+    builders: Dict[str, Callable[[], Any]] = {
+        "mock": lambda: kb.MockKnowledgeBase(data),
+        "file": lambda: kb.FileKnowledgeBase(json_path),
+        "store": lambda: kb.StoreKnowledgeBase(jsonl_path, db_path=os.path.join(directory, "kb.sqlite3")),
+        "cache": lambda: kb.CachingKnowledgeBase(kb.FileKnowledgeBase(json_path)),
+        "federated": lambda: kb.FederatedKnowledgeBase([
+            kb.FederatedBackend(kb.MockKnowledgeBase(data), name="mock"),
+            kb.FederatedBackend(kb.FileKnowledgeBase(json_path), weight=0.8, name="file"),
+        ]),
+    }
+    try:
+        import numpy  # noqa: F401
+        builders["vector"] = lambda: kb.VectorKnowledgeBase(os.path.join(directory, "vector_index"), knowledge_data=data)
+    except ImportError:
+        print("[警告] 未安装 numpy，跳过向量知识库基准。")
+    return builders
+
+
+def bench_knowledge_bases(entries: int, query_count: int, names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """测量每种知识库的构建耗时、构建时的 Python 内存峰值与顺序查询吞吐量/延迟"""
+    metrics: Dict[str, Dict[str, Any]] = {}
+    data = synthetic_knowledge(entries)
+    queries = synthetic_queries(data, query_count)
+    server = _start_stub_server(data)
+    try:
+        with tempfile.TemporaryDirectory() as tmp, _quiet():
+            from utils.knowledge_base import APIKnowledgeBase
+            builders = knowledge_base_builders(data, tmp)
+            builders["api"] = lambda: APIKnowledgeBase(f"http://127.0.0.1:{server.server_address[1]}/v1/search", api_key="bench")
+            for name, build in builders.items():
+                if names and name not in names:
+                    continue
+                tracemalloc.start()
+                probe = build()
+                _metric(metrics, f"kb.{name}.build_peak_kb", tracemalloc.get_traced_memory()[1] / 1024, "KB")
+                tracemalloc.stop()
+                _close(probe)
+
+                start = time.perf_counter()
+                knowledge_base = build()
+                _metric(metrics, f"kb.{name}.build_ms", (time.perf_counter() - start) * 1000)
+
+                latencies = []
+                start = time.perf_counter()
+                for keywords in queries:
+                    query_start = time.perf_counter()
+                    knowledge_base.query(keywords)
+                    latencies.append((time.perf_counter() - query_start) * 1000)
+                total = time.perf_counter() - start
+                _metric(metrics, f"kb.{name}.qps", len(queries) / total, "qps", better="higher")
+                _latency_metrics(metrics, f"kb.{name}.query", latencies)
+                _close(knowledge_base)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return metrics
+
+
+def bench_term_index(entries: int, query_count: int) -> Dict[str, Dict[str, Any]]:
+    """测量本地术语索引（术语澄清与意图预分类使用）的构建耗时与 suggest 延迟，术语为合成知识库的条目名称"""
+    from core.config import KNOWN_TECHNICAL_TERMS
+    from utils.term_index import TermIndex
+
+    metrics: Dict[str, Dict[str, Any]] = {}
+    data = synthetic_knowledge(entries)
+    start = time.perf_counter()
+    index = TermIndex(KNOWN_TECHNICAL_TERMS + list(data))
+    _metric(metrics, "term_index.build_ms", (time.perf_counter() - start) * 1000)
+
+    latencies = []
+    for keywords in synthetic_queries(data, query_count):
+        query_start = time.perf_counter()
+        index.suggest(f"{keywords[0][0]}是什么？")
+        latencies.append((time.perf_counter() - query_start) * 1000)
+    _latency_metrics(metrics, "term_index.suggest", latencies)
+    return metrics
+
+
+def _close(knowledge_base: Any) -> None:
+    close = getattr(knowledge_base, "close", None)
+    if callable(close):
+        close()
+
+
+# --- 内存与启动 ---
+
+def bench_memory(queries: List[str], llm_latency: float) -> Dict[str, Dict[str, Any]]:
+    """处理一轮查询时的 Python 内存峰值，以及进程的最大常驻内存"""
+    from agent import answer_query
+
+    metrics: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp, fake_llm(latency=llm_latency), _quiet():
+        upload = _write_upload(tmp)
+        answer_query(queries[0])  # 预热导入
+        tracemalloc.start()
+        for query in queries:
+            answer_query(query, [upload])
+        _metric(metrics, "memory.pipeline_peak_kb", tracemalloc.get_traced_memory()[1] / 1024, "KB")
+        tracemalloc.stop()
+    try:
+        import resource
+        # Linux 上 ru_maxrss 的单位为 KB，macOS 上为字节
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        _metric(metrics, "memory.max_rss_kb", max_rss / 1024 if sys.platform == "darwin" else max_rss, "KB")
+    except ImportError:
+        pass
+    return metrics
+
+
+def bench_startup(repeat: int) -> Dict[str, Dict[str, Any]]:
+    from benchmarks.startup import DEFAULT_TARGETS, run as run_startup
+
+    metrics: Dict[str, Dict[str, Any]] = {}
+    for result in run_startup(DEFAULT_TARGETS, repeat):
+        if "error" in result:
+            print(f"[警告] 无法测量 {result['module']} 的启动耗时: {result['error']}")
+            continue
+        _metric(metrics, f"startup.{result['module']}.import_ms", result["import_ms_median"])
+        _metric(metrics, f"startup.{result['module']}.process_ms", result["process_ms_median"])
+    return metrics
+
+
+def run_benchmarks(
+    sections: List[str] = SECTIONS,
+    repeat: int = 5,
+    llm_latency: float = 0.05,
+    kb_entries: int = 2000,
+    kb_queries: int = 300,
+    modes: Optional[List[str]] = None,
+    queries: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """运行选定的基准部分，返回 {"meta": ..., "metrics": {名称: {value, unit, better}}}"""
+    queries = queries or DEFAULT_QUERIES
+    metrics: Dict[str, Dict[str, Any]] = {}
+    for section in sections:
+        start = time.perf_counter()
+        print(f"[基准] 运行 {section} ...")
+        if section == "pipeline":
+            metrics.update(bench_pipeline(queries, modes or ["combined", "two_step"], repeat, llm_latency))
+        elif section == "knowledge_base":
+            metrics.update(bench_knowledge_bases(kb_entries, kb_queries))
+            metrics.update(bench_term_index(kb_entries, kb_queries))
+        elif section == "memory":
+            metrics.update(bench_memory(queries, llm_latency))
+        elif section == "startup":
+            metrics.update(bench_startup(repeat))
+        else:
+            raise ValueError(f"未知的基准部分: {section}")
+        print(f"[基准] {section} 完成，用时 {time.perf_counter() - start:.1f}s")
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sections": list(sections),
+            "repeat": repeat,
+            "llm_latency": llm_latency,
+            "kb_entries": kb_entries,
+            "kb_queries": kb_queries,
+        },
+        "metrics": metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RS Agent 离线基准（使用本地确定性假模型，无需 API Key）")
+    parser.add_argument("--section", action="append", choices=SECTIONS, help="要运行的部分（可重复，默认全部）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个查询 / 启动测量的重复次数")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="假模型每次调用的固定延迟（秒）")
+    parser.add_argument("--kb-entries", type=int, default=2000, help="合成知识库的条目数")
+    parser.add_argument("--kb-queries", type=int, default=300, help="每种知识库执行的查询数")
+    parser.add_argument("--output", type=str, default=None, help="将结果保存为 JSON 文件")
+    parser.add_argument("--baseline", type=str, default=None, help="与该基线结果比较，出现回退时返回码为 1")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定为回退的相对变化（默认 0.1）")
+    parser.add_argument("--min-delta", type=float, default=0.0, help="忽略绝对变化不超过该值的指标")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.section or list(SECTIONS),
+        repeat=args.repeat,
+        llm_latency=args.llm_latency,
+        kb_entries=args.kb_entries,
+        kb_queries=args.kb_queries,
+    )
+    for name, metric in sorted(results["metrics"].items()):
+        print(f"{name:<52} {metric['value']:>12.3f} {metric['unit']}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[基准] 结果已保存到: {args.output}")
+    if args.baseline:
+        print(f"\n--- 与基线 {args.baseline} 比较 ---")
+        rows = compare_results(load_results(args.baseline), results, args.threshold, args.min_delta)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+# 依次测量的模块：从只用知识库到完整的命令行入口
+DEFAULT_TARGETS = [
+    "utils.knowledge_base",
+    "core.config",
+    "handlers.instruction_0",
+    "agent",
+    "main",
+]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "langchain_loaded": any(m.startswith("langchain") for m in sys.modules),
+    "modules": len(sys.modules),
+}}))
+"""
+
+def measure_module(module: str, repeat: int = 5, python: str = sys.executable) -> Dict:
+    """在全新的解释器中导入模块，返回导入耗时与进程总耗时（毫秒）"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = root + os.pathsep + env.get("PYTHONPATH", "")
+    import_ms: List[float] = []
+    process_ms: List[float] = []
+    probe = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [python, "-c", _PROBE.format(module=module)],
+            cwd=root, env=env, capture_output=True, text=True,
+        )
+        process_ms.append((time.perf_counter() - start) * 1000)
+        if completed.returncode != 0:
+            return {"module": module, "error": completed.stderr.strip().splitlines()[-1:]}
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        import_ms.append(probe["import_ms"])
+    return {
+        "module": module,
+        "import_ms_min": round(min(import_ms), 2),
+        "import_ms_median": round(statistics.median(import_ms), 2),
+        "process_ms_median": round(statistics.median(process_ms), 2),
+        "langchain_loaded": probe.get("langchain_loaded"),
+        "modules_loaded": probe.get("modules"),
+    }
+
+def run(targets: List[str], repeat: int) -> List[Dict]:
+    return [measure_module(module, repeat) for module in targets]
+
+def main():
+    parser = argparse.ArgumentParser(description="RS Agent 冷启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块重复测量的次数")
+    parser.add_argument("--module", action="append", help="要测量的模块（可重复，默认测量常用入口）")
+    parser.add_argument("--json", type=str, default=None, help="将结果保存为 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.module or DEFAULT_TARGETS, args.repeat)
+    for result in results:
+        if "error" in result:
+            print(f"{result['module']:<28} 导入失败: {result['error']}")
+            continue
+        print(
+            f"{result['module']:<28} import {result['import_ms_median']:>8.1f} ms (min {result['import_ms_min']:.1f})"
+            f"  process {result['process_ms_median']:>8.1f} ms  langchain={result['langchain_loaded']}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import sys
+
+from core.config import (
+    KB_BUILD_CACHE_DIR,
+    KB_BUILD_WORKERS,
+    KB_CHUNK_MAX_CHARS,
+    KNOWLEDGE_BASE_INDEX_PATH,
+    KNOWLEDGE_BASE_PATH,
+)
+
+def main():
+    parser = argparse.ArgumentParser(description='RS Agent - 由源文档离线（增量）构建向量知识库索引')
+    parser.add_argument('--source', type=str, default=KNOWLEDGE_BASE_PATH,
+                        help='源文档目录（txt / md / json / jsonl，默认读取 KNOWLEDGE_BASE_PATH）')
+    parser.add_argument('--index', type=str, default=KNOWLEDGE_BASE_INDEX_PATH,
+                        help='索引目录（默认读取 KNOWLEDGE_BASE_INDEX_PATH）')
+    parser.add_argument('--cache-dir', type=str, default=KB_BUILD_CACHE_DIR, help='各文件处理结果的缓存目录')
+    parser.add_argument('--workers', type=int, default=KB_BUILD_WORKERS, help='并行处理的进程数（0 表示 CPU 核数）')
+    parser.add_argument('--max-chars', type=int, default=KB_CHUNK_MAX_CHARS, help='每个片段的最大字符数')
+    parser.add_argument('--rebuild', action='store_true', help='忽略缓存，全部重新处理')
+    parser.add_argument('--no-prune', action='store_true', help='保留缓存中不再使用的结果')
+    args = parser.parse_args()
+
+    try:
+        from utils.kb_builder import build_knowledge_base
+    except ImportError as e:
+        print(f"[错误] 构建向量知识库需要 numpy: {e}")
+        sys.exit(1)
+
+    print(f"[知识库] 正在由 {args.source} 构建索引 {args.index}")
+    try:
+        stats = build_knowledge_base(
+            args.source,
+            args.index,
+            cache_dir=args.cache_dir,
+            workers=args.workers,
+            max_chars=args.max_chars,
+            rebuild=args.rebuild,
+            prune=not args.no_prune,
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[错误] {e}")
+        sys.exit(1)
+    state = "已更新" if stats["updated"] else "已是最新"
+    print(f"[知识库] 索引{state}：源文件 {stats['files']} 个（重新处理 {stats['processed']}，复用 {stats['reused']}，"
+          f"删除 {stats['removed']}，失败 {stats['failed']}），片段 {stats['chunks']} 个，用时 {stats['seconds']:.2f}s")
+    if stats["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import os
-import sys
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
+import threading
+from typing import Any, Callable, Optional
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # python-dotenv 未安装时仅使用进程环境变量
+    load_dotenv = None
 
 # Load environment variables from .env file at the project root
-load_dotenv()
+if load_dotenv is not None:
+    load_dotenv()
 
 # --- Central Configuration ---
 VOLCANO_API_KEY_ENV_VAR = "ARK_API_KEY"
@@ -14,23 +19,188 @@ VOLCANO_MODEL_NAME = os.getenv("VOLCANO_MODEL_NAME", "deepseek-v3-250324")
 # --- Shared Constants ---
 KNOWN_TECHNICAL_TERMS = ["土壤湿度", "RSHub", "微波遥感", "地表粗糙度", "植被指数", "后向散射系数"]
 
+# --- Knowledge Base Paths ---
+KNOWLEDGE_BASE_PATH = os.getenv("KNOWLEDGE_BASE_PATH", "./knowledge_base")
+# 向量知识库（'vector'）的索引目录，向量矩阵以内存映射方式加载，可被多个进程共享
+KNOWLEDGE_BASE_INDEX_PATH = os.getenv("KNOWLEDGE_BASE_INDEX_PATH", os.path.join(KNOWLEDGE_BASE_PATH, "index"))
+# 离线构建（build_kb.py）：KNOWLEDGE_BASE_PATH 下的源文档（txt / md / json / jsonl）切分后写入上面的索引目录。
+# 每个源文件的切分与向量化结果按内容哈希缓存在 KB_BUILD_CACHE_DIR，重新构建时只处理内容变化的文件；
+# KB_BUILD_WORKERS 为并行处理的进程数（0 表示 CPU 核数），KB_CHUNK_MAX_CHARS 为每个片段的最大字符数
+KB_BUILD_CACHE_DIR = os.getenv("KB_BUILD_CACHE_DIR", os.path.join(".cache", "kb_build"))
+KB_BUILD_WORKERS = int(os.getenv("KB_BUILD_WORKERS", "0"))
+KB_CHUNK_MAX_CHARS = int(os.getenv("KB_CHUNK_MAX_CHARS", "800"))
+
+# --- Pipeline Mode ---
+# "combined": 一次LLM调用同时完成意图识别与术语澄清；"two_step": 原有的 instruction 0 -> instruction 1 两步流程
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "combined")
+# 异步管道中同时处理的查询数上限
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "32"))
+# 批处理模式（main.py --batch）默认的并发 worker 数
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+
+# --- Local Fast-Path Intent Classification ---
+# 置信度达到阈值的查询直接在本地给出任务ID，不再调用LLM
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1").lower() not in ("0", "false", "no")
+FAST_PATH_ACCEPT_THRESHOLD = float(os.getenv("FAST_PATH_ACCEPT_THRESHOLD", "0.9"))
+FAST_PATH_REJECT_THRESHOLD = float(os.getenv("FAST_PATH_REJECT_THRESHOLD", "0.95"))
+# 查询与已知术语的编辑相似度达到该值（例如"土地湿度"与"土壤湿度"为 0.75）时视为近似命中，判定为任务1
+FAST_PATH_SIMILARITY_THRESHOLD = float(os.getenv("FAST_PATH_SIMILARITY_THRESHOLD", "0.75"))
+
+# --- Local Term Index (clarification) ---
+# 相似度达到自动纠正阈值且明显领先时直接采用；达到建议阈值时给出候选；否则回退到LLM
+TERM_INDEX_AUTO_CORRECT_THRESHOLD = float(os.getenv("TERM_INDEX_AUTO_CORRECT_THRESHOLD", "0.85"))
+TERM_INDEX_SUGGEST_THRESHOLD = float(os.getenv("TERM_INDEX_SUGGEST_THRESHOLD", "0.5"))
+# 需要调用LLM时，只把本地术语索引选出的前 K 个候选术语（不足时用 KNOWN_TECHNICAL_TERMS 补足）放入提示词，
+# 提示词长度不随知识库术语表增长；0 表示放入全部术语
+PROMPT_TERMS_TOP_K = int(os.getenv("PROMPT_TERMS_TOP_K", "8"))
+
+# --- Per-Stage Token Budgets ---
+# 各阶段LLM调用的最大输出 token（以 max_tokens 传给模型，0 表示不限制）：意图分类只需输出一个编号，
+# 合并分析与术语澄清输出紧凑的 JSON
+LLM_MAX_TOKENS_CLASSIFY = int(os.getenv("LLM_MAX_TOKENS_CLASSIFY", "16"))
+LLM_MAX_TOKENS_COMBINED = int(os.getenv("LLM_MAX_TOKENS_COMBINED", "256"))
+LLM_MAX_TOKENS_CLARIFY = int(os.getenv("LLM_MAX_TOKENS_CLARIFY", "192"))
+# 每次LLM调用的用户消息输入 token 上限，超出时按与查询的相关度截取上传文件内容（0 表示不限制）
+LLM_MAX_INPUT_TOKENS = int(os.getenv("LLM_MAX_INPUT_TOKENS", "3000"))
+
+# --- LLM Rate Limiting ---
+# 所有LLM调用共享的客户端限流：每分钟请求数 / token 数的令牌桶（0 表示不限制），以及按 AIMD 自适应的并发上限
+# （遇到 429 或超时时减半，成功时逐步增加）。LLM_RATE_LIMIT_STATE_PATH 不为空时令牌桶状态保存在该路径的文件中，
+# 同一台机器上的多个进程共享配额。只在使用默认LLM时启用
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_RATE_LIMIT_STATE_PATH = os.getenv("LLM_RATE_LIMIT_STATE_PATH", "")
+# 遇到 429 / 超时后的最大重试次数（启用限流时由限流器重试，ChatOpenAI 自身不再重试）
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+# --- Persistent LLM Response Cache ---
+# temperature=0 时相同的模型与消息得到相同结果，命中缓存即可跳过网络请求
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+# --- Answer Cache ---
+# 查询级答案缓存：归一化查询相同，或字符 n-gram 相似度（MinHash 预筛选）不低于阈值时，直接返回已保存的答案与术语，
+# 跳过意图识别、术语澄清与知识库查询；知识库内容变化后旧答案失效。只在使用默认LLM时启用
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", os.path.join(".cache", "answer_cache.sqlite3"))
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.8"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+
+# --- Uploaded File Ingestion ---
+# 上传文件放入提示词的总 token 预算，以及单个文件最多读取的字节数（超出部分只取首尾）
+FILE_CONTEXT_MAX_TOKENS = int(os.getenv("FILE_CONTEXT_MAX_TOKENS", "2000"))
+FILE_READ_MAX_BYTES = int(os.getenv("FILE_READ_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# --- Result Store ---
+# 查询结果写入只追加的分段日志（按编号或查询查找）；压缩方式为 gzip（默认）、zstd（需安装 zstandard）或 none
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", os.path.join("output", "results"))
+RESULT_STORE_COMPRESSION = os.getenv("RESULT_STORE_COMPRESSION", "gzip")
+RESULT_STORE_SEGMENT_MAX_BYTES = int(os.getenv("RESULT_STORE_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# --- Speculative Knowledge Prefetch ---
+# 给出澄清建议后在后台预取前 N 个建议术语的知识库结果（0 表示关闭），以及全进程同时进行的预取查询数上限
+PREFETCH_WIDTH = int(os.getenv("PREFETCH_WIDTH", "3"))
+PREFETCH_MAX_INFLIGHT = int(os.getenv("PREFETCH_MAX_INFLIGHT", "8"))
+
+# --- HTTP Service Mode (server.py) ---
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+# 客户端在 file_paths 中只能引用该目录下的文件（相对路径按该目录解析）；为空时服务模式不接受 file_paths，
+# 避免远程调用者读取服务进程可以访问的任意文件
+SERVER_UPLOAD_DIR = os.getenv("SERVER_UPLOAD_DIR", "")
+# 等待用户选择的澄清会话只保存序列化后的状态；超过存活时间或数量上限时淘汰最久未访问的会话
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+
+# --- Telemetry ---
+# 开启后各阶段（意图识别、术语澄清、知识库查询、文件读写、LLM调用）记录耗时与 token 用量；
+# TELEMETRY_LOG_PATH 为结构化 JSON 日志（每个阶段一行）的输出文件，"-" 表示标准错误
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "0").lower() in ("1", "true", "yes")
+TELEMETRY_LOG_PATH = os.getenv("TELEMETRY_LOG_PATH", "")
+
 # --- Global LLM Instance ---
-print("--- Initializing LLM instance ---")
-if VOLCANO_API_KEY_ENV_VAR not in os.environ:
-    raise ValueError(
-        f"环境变量 {VOLCANO_API_KEY_ENV_VAR} 未设置。"
-        "请在项目根目录的 .env 文件中设置。"
-    )
+# LLM 在首次使用时才创建（get_llm），导入本模块不会加载 LangChain，也不要求设置 API Key。
+# 可以通过 set_llm_provider 替换创建方式（例如测试或基准中使用本地假模型）。
+LLMProvider = Callable[[], Any]
 
-try:
-    LLM = ChatOpenAI(
-        model=VOLCANO_MODEL_NAME,
-        temperature=0,
-        openai_api_key=os.environ[VOLCANO_API_KEY_ENV_VAR],
-        base_url=VOLCANO_BASE_URL,
-        request_timeout=60.0,
-    )
+_llm: Optional[Any] = None
+_llm_cache: Optional[Any] = None
+_llm_provider: Optional[LLMProvider] = None
+_llm_lock = threading.Lock()
+
+def _get_llm_cache() -> Optional[Any]:
+    """创建（一次）并返回持久化LLM响应缓存"""
+    global _llm_cache
+    if _llm_cache is None and LLM_CACHE_ENABLED:
+        from core.llm_cache import create_llm_cache
+        _llm_cache = create_llm_cache(
+            LLM_CACHE_PATH,
+            ttl_seconds=LLM_CACHE_TTL_SECONDS,
+            max_entries=LLM_CACHE_MAX_ENTRIES,
+        )
+    return _llm_cache
+
+def create_default_llm() -> Any:
+    """默认的LLM提供者：火山引擎 OpenAI 兼容接口上的 ChatOpenAI"""
+    print("--- Initializing LLM instance ---")
+    if VOLCANO_API_KEY_ENV_VAR not in os.environ:
+        raise ValueError(
+            f"环境变量 {VOLCANO_API_KEY_ENV_VAR} 未设置。"
+            "请在项目根目录的 .env 文件中设置。"
+        )
+
+    try:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(
+            model=VOLCANO_MODEL_NAME,
+            temperature=0,
+            openai_api_key=os.environ[VOLCANO_API_KEY_ENV_VAR],
+            base_url=VOLCANO_BASE_URL,
+            request_timeout=60.0,
+            # 启用限流时由 core.llm_calls 重试，429 与超时才能反馈给自适应并发控制
+            max_retries=0 if LLM_RATE_LIMIT_ENABLED else 2,
+            cache=_get_llm_cache(),
+        )
+    except Exception as e:
+        print(f"--- LLM initialization FAILED: {e} ---")
+        raise
     print(f"--- LLM ({VOLCANO_MODEL_NAME}) initialized successfully ---")
-except Exception as e:
-    print(f"--- LLM initialization FAILED: {e} ---")
-    sys.exit(1) 
\ No newline at end of file
+    return llm
+
+def get_llm() -> Any:
+    """返回共享的LLM实例，首次调用时通过当前的提供者创建"""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = (_llm_provider or create_default_llm)()
+    return _llm
+
+def set_llm_provider(provider: Optional[LLMProvider]) -> None:
+    """替换LLM的创建方式（None 恢复默认），已创建的实例会在下次使用时重新创建"""
+    global _llm, _llm_provider
+    with _llm_lock:
+        _llm_provider = provider
+        _llm = None
+
+def get_llm_provider() -> Optional[LLMProvider]:
+    """返回通过 set_llm_provider 设置的提供者；使用默认LLM时为 None"""
+    return _llm_provider
+
+def get_llm_cache_stats() -> dict:
+    """返回LLM响应缓存的命中/未命中统计"""
+    return _llm_cache.stats() if _llm_cache is not None else {}
+
+def __getattr__(name: str) -> Any:
+    # 兼容旧代码中的 `from core.config import LLM`：访问时才创建实例
+    if name == "LLM":
+        return get_llm()
+    if name == "LLM_CACHE":
+        return _get_llm_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,55 @@
+import hashlib
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+from utils.disk_cache import SQLiteCache
+
+
+class PersistentLLMCache(BaseCache):
+    """
+    LangChain 缓存实现：以模型参数与完整渲染后的消息为内容地址，结果持久化到本地 SQLite。
+
+    LangChain 传入的 llm_string 包含模型名称与调用参数（temperature 等），
+    prompt 为序列化后的完整消息列表，二者共同决定缓存键。
+    """
+
+    def __init__(self, store: SQLiteCache):
+        self.store = store
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self.store.get(self.make_key(prompt, llm_string))
+        if value is None:
+            return None
+        try:
+            return loads(value)
+        except Exception:
+            # 旧版本或损坏的条目视为未命中
+            return None
+
+    def contains(self, prompt: str, llm_string: str) -> bool:
+        """是否已缓存（调用前判断是否需要经过限流），不计入命中统计"""
+        return self.store.contains(self.make_key(prompt, llm_string))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.store.set(self.make_key(prompt, llm_string), dumps(list(return_val)))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return self.store.stats()
+
+
+def create_llm_cache(
+    path: str,
+    ttl_seconds: Optional[float] = None,
+    max_entries: Optional[int] = None,
+) -> PersistentLLMCache:
+    """创建基于 SQLite 的持久化LLM缓存"""
+    return PersistentLLMCache(SQLiteCache(path, ttl_seconds=ttl_seconds, max_entries=max_entries))
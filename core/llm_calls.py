@@ -0,0 +1,161 @@
+"""
+统一的LLM链调用入口：开启追踪时每次调用记为一个 "llm" 阶段，并通过回调统计 token 用量、
+与阶段输出预算的比较（见 core.token_budget）以及失败次数；关闭时直接调用链本身。
+启用限流时（见 utils.rate_limiter）调用在共享的并发与速率限制下进行，遇到 429 / 超时会重试；
+LLM 响应缓存（见 core.llm_cache）中已有结果的调用不经过限流，不占用配额与并发名额。
+"""
+
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from core import telemetry, token_budget
+from utils.file_handler import estimate_tokens
+from utils.rate_limiter import get_rate_limiter
+
+_usage_handler_class = None
+
+
+def _usage_handler(stage: str, current: Any) -> Any:
+    """创建记录 token 用量的 LangChain 回调（类在首次使用时定义，避免导入本模块时加载 LangChain）"""
+    global _usage_handler_class
+    if _usage_handler_class is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class UsageCallbackHandler(BaseCallbackHandler):
+            # 在调用线程中直接执行，异步调用时也不切换到线程池
+            run_inline = True
+
+            def __init__(self, stage: str, current: Any):
+                self.stage = stage
+                self.current = current
+
+            def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+                prompt_tokens, completion_tokens = _token_usage(response)
+                telemetry.increment("llm_calls_total", stage=self.stage)
+                if prompt_tokens or completion_tokens:
+                    telemetry.increment("llm_tokens_total", prompt_tokens, stage=self.stage, kind="prompt")
+                    telemetry.increment("llm_tokens_total", completion_tokens, stage=self.stage, kind="completion")
+                budget = token_budget.record_usage(self.stage, prompt_tokens, completion_tokens)
+                self.current.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, **budget)
+
+            def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+                telemetry.increment("llm_errors_total", stage=self.stage)
+
+        _usage_handler_class = UsageCallbackHandler
+    return _usage_handler_class(stage, current)
+
+
+def _token_usage(response: Any) -> tuple:
+    """从 LLMResult 中取出 (prompt_tokens, completion_tokens)：优先消息的 usage_metadata，其次 llm_output"""
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    if not (prompt_tokens or completion_tokens):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+def _config(stage: str, current: Any) -> Dict[str, Any]:
+    return {"callbacks": [_usage_handler(stage, current)], "run_name": stage}
+
+
+def _estimate_tokens(stage: str, chain: Any, inputs: Dict[str, Any]) -> int:
+    """调用前估计的 token 数（用于 token 限流）：渲染后的提示词 + 阶段的输出预算"""
+    try:
+        text = chain.first.format_prompt(**inputs).to_string()
+    except Exception:
+        text = " ".join(str(value) for value in inputs.values())
+    return estimate_tokens(text) + token_budget.get_budget(stage).max_output_tokens
+
+
+def _chat_model(chain: Any) -> tuple:
+    """取出链中的聊天模型及其绑定参数（例如 max_tokens），没有时返回 (None, {})"""
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    for step in getattr(chain, "steps", [chain]):
+        if isinstance(step, BaseChatModel):
+            return step, {}
+        bound = getattr(step, "bound", None)
+        if isinstance(bound, BaseChatModel):
+            return bound, dict(getattr(step, "kwargs", {}) or {})
+    return None, {}
+
+
+def _is_cached(chain: Any, inputs: Dict[str, Any]) -> bool:
+    """LLM 响应缓存中是否已有该调用的结果（键的计算方式与 LangChain 查询缓存时相同）"""
+    try:
+        model, kwargs = _chat_model(chain)
+        contains = getattr(getattr(model, "cache", None), "contains", None)
+        if contains is None:
+            return False
+        from langchain_core.load import dumps
+        messages = chain.first.format_messages(**inputs)
+        return contains(dumps(messages), model._get_llm_string(stop=None, **kwargs))
+    except Exception:
+        return False
+
+
+def invoke_chain(stage: str, chain: Any, inputs: Dict[str, Any]) -> Any:
+    """chain.invoke(inputs)，stage 为阶段名称（classify / combined / clarify ...）"""
+    limiter = get_rate_limiter()
+    if limiter is None or _is_cached(chain, inputs):
+        return _invoke(stage, chain, inputs)
+    return limiter.call(lambda: _invoke(stage, chain, inputs), _estimate_tokens(stage, chain, inputs))
+
+
+def _invoke(stage: str, chain: Any, inputs: Dict[str, Any]) -> Any:
+    if not telemetry.is_enabled():
+        return chain.invoke(inputs)
+    with telemetry.span("llm", stage=stage) as current:
+        return chain.invoke(inputs, config=_config(stage, current))
+
+
+async def ainvoke_chain(stage: str, chain: Any, inputs: Dict[str, Any]) -> Any:
+    """Async variant of invoke_chain."""
+    limiter = get_rate_limiter()
+    if limiter is None or _is_cached(chain, inputs):
+        return await _ainvoke(stage, chain, inputs)
+    return await limiter.acall(lambda: _ainvoke(stage, chain, inputs), _estimate_tokens(stage, chain, inputs))
+
+
+async def _ainvoke(stage: str, chain: Any, inputs: Dict[str, Any]) -> Any:
+    if not telemetry.is_enabled():
+        return await chain.ainvoke(inputs)
+    with telemetry.span("llm", stage=stage) as current:
+        return await chain.ainvoke(inputs, config=_config(stage, current))
+
+
+def stream_chain(stage: str, chain: Any, inputs: Dict[str, Any]) -> Iterator[Any]:
+    """
+    chain.stream(inputs)；阶段耗时包含整个流，属性 first_chunk_ms 为首个输出块的耗时。流式调用只限流，不重试。
+    LangChain 的流式调用不查询缓存：已缓存的结果改为 invoke 一次性取出，作为唯一的输出块，不经过限流
+    """
+    if _is_cached(chain, inputs):
+        yield _invoke(stage, chain, inputs)
+        return
+    limiter = get_rate_limiter()
+    if limiter is None:
+        yield from _stream(stage, chain, inputs)
+        return
+    with limiter.limit(_estimate_tokens(stage, chain, inputs)):
+        yield from _stream(stage, chain, inputs)
+
+
+def _stream(stage: str, chain: Any, inputs: Dict[str, Any]) -> Iterator[Any]:
+    if not telemetry.is_enabled():
+        yield from chain.stream(inputs)
+        return
+    with telemetry.span("llm", stage=stage, stream=True) as current:
+        start = time.perf_counter()
+        first: Optional[float] = None
+        for chunk in chain.stream(inputs, config=_config(stage, current)):
+            if first is None:
+                first = (time.perf_counter() - start) * 1000
+                current.set(first_chunk_ms=round(first, 3))
+            yield chunk
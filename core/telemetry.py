@@ -0,0 +1,360 @@
+"""
+轻量的阶段追踪与指标：
+
+- span(name, **attrs) / @traced(name) 记录一个阶段的耗时与状态，嵌套的阶段属于同一条 trace；
+- 阶段结束时可写出一行结构化 JSON 日志，耗时同时计入直方图；
+- increment / observe 记录其他计数（例如LLM token 用量）；
+- render_prometheus() 以 Prometheus 文本格式导出全部指标以及已注册缓存的命中率。
+
+关闭时（默认，见 TELEMETRY_ENABLED）span 返回共享的空对象，@traced 只多一次标志判断。
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
+
+from core.config import TELEMETRY_ENABLED, TELEMETRY_LOG_PATH
+
+METRIC_PREFIX = "rs_agent_"
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_HELP = {
+    "span_duration_seconds": ("histogram", "各阶段耗时（秒）"),
+    "spans_total": ("counter", "各阶段执行次数（按状态）"),
+    "llm_calls_total": ("counter", "LLM调用次数"),
+    "llm_errors_total": ("counter", "LLM调用失败次数"),
+    "llm_tokens_total": ("counter", "LLM token 用量（prompt / completion）"),
+}
+
+
+class MetricsRegistry:
+    """线程安全的计数器与直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+
+    def increment(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            # [各桶计数..., 总和, 次数]
+            data = self._histograms.setdefault(name, {}).setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """{"counters": {name: [{labels, value}]}, "histograms": {name: [{labels, count, sum, buckets}]}}"""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {"labels": dict(key), "count": data[-1], "sum": data[-2],
+                     "buckets": dict(zip(map(str, self.buckets), data[:-2]))}
+                    for key, data in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+_registry = MetricsRegistry()
+_enabled = TELEMETRY_ENABLED
+_log_stream: Optional[TextIO] = None
+_log_lock = threading.Lock()
+_current: contextvars.ContextVar = contextvars.ContextVar("rs_agent_span", default=None)
+_cache_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+class Span:
+    """一个计时阶段；作为上下文管理器使用，异常会记为 status=error 并继续抛出"""
+
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "status", "_start", "_wall", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.status = "ok"
+
+    def set(self, **attrs: Any) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def fail(self, error: Any) -> "Span":
+        """标记为失败（用于被捕获、不会继续抛出的错误）"""
+        self.status = "error"
+        self.attrs["error"] = str(error)
+        return self
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current.set(self)
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        duration = time.perf_counter() - self._start
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # 生成器在其他上下文中结束时无法还原，直接恢复父阶段
+            _current.set(None)
+        if exc is not None:
+            self.fail(f"{exc_type.__name__}: {exc}")
+        _registry.observe("span_duration_seconds", duration, span=self.name)
+        _registry.increment("spans_total", span=self.name, status=self.status)
+        if _log_stream is not None:
+            _write_log({
+                "ts": round(self._wall, 6),
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "name": self.name,
+                "duration_ms": round(duration * 1000, 3),
+                "status": self.status,
+                "attrs": self.attrs,
+            })
+        return False
+
+
+class _NoopSpan:
+    """关闭追踪时使用的空阶段"""
+
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> "_NoopSpan":
+        return self
+
+    def fail(self, error: Any) -> "_NoopSpan":
+        return self
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def _write_log(record: Dict[str, Any]) -> None:
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _log_lock:
+        if _log_stream is not None:
+            _log_stream.write(line + "\n")
+            _log_stream.flush()
+
+
+def configure(enabled: Optional[bool] = None, log_path: Optional[str] = None) -> None:
+    """
+    开启/关闭追踪，并设置 JSON 日志输出（文件路径，"-" 为标准错误，"" 为不输出）。
+    参数为 None 时保持原设置。
+    """
+    global _enabled, _log_stream
+    if enabled is not None:
+        _enabled = enabled
+    if log_path is not None:
+        with _log_lock:
+            if _log_stream is not None and _log_stream is not sys.stderr:
+                _log_stream.close()
+            if not log_path:
+                _log_stream = None
+            elif log_path == "-":
+                _log_stream = sys.stderr
+            else:
+                os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+                _log_stream = open(log_path, "a", encoding="utf-8")
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **attrs: Any) -> Any:
+    """返回一个计时阶段（上下文管理器）；关闭追踪时返回空对象"""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def current_span() -> Any:
+    """当前所在的阶段；不在任何阶段中或关闭追踪时返回空对象"""
+    current = _current.get() if _enabled else None
+    return current if current is not None else _NOOP
+
+
+def annotate(**attrs: Any) -> None:
+    """为当前阶段添加属性（例如 path="local" 表示本地快速路径）"""
+    if _enabled:
+        current_span().set(**attrs)
+
+
+def traced(name: str, **attrs: Any) -> Callable:
+    """把函数（同步、async 或生成器）的每次调用记为一个阶段"""
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await func(*args, **kwargs)
+                with Span(name, dict(attrs)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return (yield from func(*args, **kwargs))
+                with Span(name, dict(attrs)):
+                    return (yield from func(*args, **kwargs))
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name, dict(attrs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def increment(name: str, value: float = 1.0, **labels: Any) -> None:
+    if _enabled:
+        _registry.increment(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    if _enabled:
+        _registry.observe(name, value, **labels)
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    """注册一个缓存的统计函数（返回含 hits / misses 的字典），导出时计算命中率"""
+    _cache_sources[name] = stats
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """各已注册缓存的命中、未命中次数与命中率（没有访问记录的缓存不列出）"""
+    result = {}
+    for name, source in _cache_sources.items():
+        try:
+            stats = source() or {}
+        except Exception:
+            continue
+        hits = stats.get("hits", 0) + stats.get("negative_hits", 0)
+        misses = stats.get("misses", 0)
+        if hits + misses:
+            result[name] = {"hits": hits, "misses": misses, "hit_ratio": hits / (hits + misses)}
+    return result
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    snapshot = _registry.snapshot()
+    snapshot["caches"] = cache_stats()
+    return snapshot
+
+
+def reset_metrics() -> None:
+    _registry.reset()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, Any], **extra: Any) -> str:
+    merged = dict(labels, **extra)
+    if not merged:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in merged.items()) + "}"
+
+
+def _header(lines: List[str], name: str, metric_type: str, help_text: str) -> None:
+    lines.append(f"# HELP {METRIC_PREFIX}{name} {help_text}")
+    lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式导出全部指标"""
+    snapshot = metrics_snapshot()
+    lines: List[str] = []
+    for name, series in sorted(snapshot["counters"].items()):
+        _header(lines, name, "counter", _HELP.get(name, ("counter", name))[1])
+        for item in series:
+            lines.append(f"{METRIC_PREFIX}{name}{_labels(item['labels'])} {item['value']:g}")
+    for name, series in sorted(snapshot["histograms"].items()):
+        _header(lines, name, "histogram", _HELP.get(name, ("histogram", name))[1])
+        for item in series:
+            for bound, count in item["buckets"].items():
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(item['labels'], le=bound)} {count:g}")
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(item['labels'], le='+Inf')} {item['count']:g}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_labels(item['labels'])} {item['sum']:.6f}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_labels(item['labels'])} {item['count']:g}")
+    caches = snapshot["caches"]
+    if caches:
+        for field, metric_type, help_text in (
+            ("hits", "counter", "缓存命中次数"),
+            ("misses", "counter", "缓存未命中次数"),
+            ("hit_ratio", "gauge", "缓存命中率"),
+        ):
+            name = f"cache_{field}_total" if metric_type == "counter" else f"cache_{field}"
+            _header(lines, name, metric_type, help_text)
+            for cache, stats in sorted(caches.items()):
+                lines.append(f"{METRIC_PREFIX}{name}{_labels({'cache': cache})} {stats[field]:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str) -> None:
+    """把 Prometheus 文本写入文件（先写临时文件再替换，便于 node_exporter textfile 收集）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def _llm_cache_stats() -> Dict[str, Any]:
+    from core.config import get_llm_cache_stats
+    return get_llm_cache_stats()
+
+
+register_cache("llm", _llm_cache_stats)
+if TELEMETRY_LOG_PATH:
+    configure(log_path=TELEMETRY_LOG_PATH)
@@ -0,0 +1,112 @@
+"""
+LLM 调用的分阶段 token 预算：每个阶段的最大输出 token 通过 bind(max_tokens=...) 传给模型，
+用户消息超过输入预算时按与查询的相关度截取上传文件内容（用户请求本身保持完整）。
+开启追踪时每次调用记录实际 token 用量与预算（见 core.llm_calls）。
+"""
+
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+
+from core.config import (
+    LLM_MAX_INPUT_TOKENS,
+    LLM_MAX_TOKENS_CLARIFY,
+    LLM_MAX_TOKENS_CLASSIFY,
+    LLM_MAX_TOKENS_COMBINED,
+    get_llm,
+)
+from core import telemetry
+from utils.file_handler import estimate_tokens, fit_text
+
+
+class StageBudget(NamedTuple):
+    """单个阶段的预算：最大输出 token 与用户消息的最大输入 token（0 表示不限制）"""
+    max_output_tokens: int
+    max_input_tokens: int
+
+
+_budgets: Dict[str, StageBudget] = {
+    "classify": StageBudget(LLM_MAX_TOKENS_CLASSIFY, LLM_MAX_INPUT_TOKENS),
+    "combined": StageBudget(LLM_MAX_TOKENS_COMBINED, LLM_MAX_INPUT_TOKENS),
+    "clarify": StageBudget(LLM_MAX_TOKENS_CLARIFY, LLM_MAX_INPUT_TOKENS),
+}
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def get_budget(stage: str) -> StageBudget:
+    """返回阶段的预算；未配置的阶段不限制输出，只限制输入"""
+    return _budgets.get(stage, StageBudget(0, LLM_MAX_INPUT_TOKENS))
+
+
+def set_budget(stage: str, max_output_tokens: Optional[int] = None, max_input_tokens: Optional[int] = None) -> None:
+    """修改阶段的预算（None 表示保持原值），之后构建的LLM链生效"""
+    current = get_budget(stage)
+    with _lock:
+        _budgets[stage] = StageBudget(
+            current.max_output_tokens if max_output_tokens is None else max_output_tokens,
+            current.max_input_tokens if max_input_tokens is None else max_input_tokens,
+        )
+
+
+def budgeted_llm(stage: str) -> Any:
+    """共享的LLM实例，按阶段预算绑定 max_tokens"""
+    llm = get_llm()
+    max_tokens = get_budget(stage).max_output_tokens
+    return llm.bind(max_tokens=max_tokens) if max_tokens > 0 else llm
+
+
+def fit_file_content(stage: str, user_prompt: str, file_content: str) -> str:
+    """用户请求与上传文件内容合计超过输入预算时，按与请求的相关度截取文件内容"""
+    max_input_tokens = get_budget(stage).max_input_tokens
+    if max_input_tokens <= 0 or not file_content:
+        return file_content
+    available = max_input_tokens - estimate_tokens(user_prompt)
+    text, truncated = fit_text(file_content, available, user_prompt)
+    if truncated:
+        print(f"[Agent] 上传文件内容超出 {stage} 阶段的输入预算（{max_input_tokens} tokens），已截取相关片段")
+        _count(stage, truncated_inputs=1)
+        telemetry.increment("llm_inputs_truncated_total", stage=stage)
+    return text
+
+
+def record_usage(stage: str, prompt_tokens: int, completion_tokens: int) -> Dict[str, Any]:
+    """记录一次调用的实际用量，返回与预算比较的属性（写入追踪阶段）"""
+    max_tokens = get_budget(stage).max_output_tokens
+    at_limit = bool(max_tokens) and completion_tokens >= max_tokens
+    _count(stage, calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+           budget_tokens=max_tokens, at_limit=int(at_limit))
+    if max_tokens:
+        telemetry.increment("llm_budget_tokens_total", max_tokens, stage=stage)
+    if at_limit:
+        print(f"[警告] {stage} 阶段的输出达到 max_tokens 上限（{max_tokens}），结果可能不完整")
+        telemetry.increment("llm_output_at_limit_total", stage=stage)
+    return {"max_tokens": max_tokens, "budget_used": round(completion_tokens / max_tokens, 4) if max_tokens else None}
+
+
+def _count(stage: str, **values: int) -> None:
+    with _lock:
+        counters = _stats.setdefault(stage, {
+            "calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "budget_tokens": 0, "at_limit": 0, "truncated_inputs": 0,
+        })
+        for key, value in values.items():
+            counters[key] += value
+
+
+def get_budget_stats() -> Dict[str, Dict[str, float]]:
+    """
+    各阶段的调用次数、实际输入/输出 token、输出预算合计、达到上限的次数、截取输入的次数，
+    以及输出预算的使用率（completion_tokens / budget_tokens）
+    """
+    with _lock:
+        snapshot = {stage: dict(counters) for stage, counters in _stats.items()}
+    for stage, counters in snapshot.items():
+        budget = counters["budget_tokens"]
+        counters["budget_used"] = counters["completion_tokens"] / budget if budget else 0.0
+        counters.update(get_budget(stage)._asdict())
+    return snapshot
+
+
+def reset_budget_stats() -> None:
+    with _lock:
+        _stats.clear()
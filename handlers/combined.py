@@ -0,0 +1,152 @@
+from typing import Generator, Optional, List
+from pydantic import BaseModel, Field
+
+from core.llm_calls import invoke_chain, ainvoke_chain, stream_chain
+from core.telemetry import annotate, traced
+from core.token_budget import budgeted_llm, fit_file_content
+from handlers.instruction_0 import classify_locally
+from handlers.instruction_1 import clarify_term_locally, prompt_terms
+
+class QueryAnalysis(BaseModel):
+    task_id: int = Field(description="任务类型：1 遥感知识问答（包括术语模糊或有错别字的知识问答），2 根据参数构建环境，3 根据环境数据推断参数，-1 与遥感领域完全无关。")
+    is_ambiguous: bool = Field(description="仅当task_id为1时有意义：如果核心术语是模糊的、有错别字或不在已知列表中，则为True；否则为False。")
+    original_term: Optional[str] = Field(description="从用户提问中识别出的原始核心术语。")
+    corrected_term: Optional[str] = Field(description="如果is_ambiguous为False，这里是对应的标准术语。")
+    suggestions: Optional[List[str]] = Field(description="如果is_ambiguous为True，这里是推荐给用户的2-3个标准术语。")
+
+def _analysis(task_id: int, clarification: Optional[dict] = None) -> dict:
+    result = {"task_id": task_id, "is_ambiguous": False, "original_term": None, "corrected_term": None, "suggestions": None}
+    if clarification:
+        result.update(clarification)
+    return result
+
+SYSTEM_PROMPT_TEMPLATE = """
+    你是一个微波遥感领域的智能助手。请一次性完成以下两项分析：
+
+    一、任务意图识别（task_id）：
+       1: 用户询问遥感领域知识（例如"什么是土壤湿度？"或"RSHub怎么用？"），
+          即使用户使用了与标准术语相近但不完全匹配的词语（例如"土地湿度"），也归为1
+       2: 用户希望根据参数构建环境（例如"帮我用这些参数模拟一下场景"）
+       3: 用户希望根据环境数据推断参数（例如"看看这个数据对应的土壤参数是什么"）
+       -1: 与遥感领域完全无关的问题（例如"今天星期几？"、"帮我写个作文"）
+
+    二、核心术语澄清（仅当task_id为1时需要）：
+    已知的标准技术术语列表为: {known_terms}
+    1. 识别用户提问中的核心技术术语，填入original_term。
+    2. 如果该术语是标准术语之一，或者是非常明确的同义词（例如"RSHub使用" -> "RSHub"），
+       is_ambiguous为False，并在corrected_term中给出标准术语。
+    3. 如果该术语是模糊的、有错别字或不在列表中（例如"土地湿度"），
+       is_ambiguous为True，并在suggestions中从标准列表提供最相关的2-3个建议。
+
+    你必须严格按照指定的JSON格式进行输出，不要添加任何额外的解释。
+    {format_instructions}
+    """
+
+def _local_analysis(user_prompt: str, file_content: str) -> Optional[dict]:
+    """本地优先：分类与术语澄清都能在本地确定时完全跳过LLM"""
+    print("\n[Agent] 执行合并分析: 意图识别 + 术语澄清...")
+
+    fast_task_id = classify_locally(user_prompt, file_content)
+    if fast_task_id is not None and fast_task_id < 0:
+        print("[Agent] 本地快速分类：无关查询，拒绝处理（跳过LLM）")
+        annotate(path="local", task_id=fast_task_id)
+        return _analysis(fast_task_id)
+    if fast_task_id == 1:
+        clarification = clarify_term_locally(user_prompt)
+        if clarification is not None:
+            print("[Agent] 本地快速分类与术语索引已完成分析（跳过LLM）")
+            annotate(path="local", task_id=1)
+            return _analysis(1, clarification)
+    return None
+
+def _build_parser():
+    from langchain_core.output_parsers import JsonOutputParser
+    return JsonOutputParser(pydantic_object=QueryAnalysis)
+
+def _build_chain(with_parser: bool = True):
+    """Builds the prompt | LLM | JSON parser combined-analysis chain (without the parser when streaming raw tokens)."""
+    # LangChain 在首次需要调用LLM时才导入
+    from langchain_core.prompts import ChatPromptTemplate
+
+    parser = _build_parser()
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT_TEMPLATE),
+        ("user", "{input}")
+    ]).partial(format_instructions=parser.get_format_instructions())
+    chain = prompt | budgeted_llm("combined")
+    return chain | parser if with_parser else chain
+
+def _build_input(user_prompt: str, file_content: str) -> str:
+    full_prompt = f"用户请求：\n{user_prompt}\n\n"
+    file_content = fit_file_content("combined", user_prompt, file_content)
+    if file_content:
+        full_prompt += f"用户上传的文件内容：\n{file_content}"
+    return full_prompt
+
+def _chain_inputs(user_prompt: str, file_content: str) -> dict:
+    """Prompt variables: the user message and the top-k glossary terms relevant to it."""
+    return {"input": _build_input(user_prompt, file_content), "known_terms": str(prompt_terms(user_prompt))}
+
+def _parse_result(result: dict) -> dict:
+    analysis = _analysis(int(result.get("task_id", -1)), {
+        key: result.get(key) for key in ("is_ambiguous", "original_term", "corrected_term", "suggestions")
+    })
+    analysis["is_ambiguous"] = bool(analysis["is_ambiguous"])
+    print(f"[Agent] 合并分析结果: {analysis}")
+    return analysis
+
+@traced("classify", mode="combined")
+def handle_combined_analysis(user_prompt: str, file_content: str) -> dict:
+    """
+    Classifies the intent and clarifies the core term in a single LLM round trip.
+
+    Returns a QueryAnalysis-shaped dict; its term fields can be passed to
+    handle_instruction_1_interactive as initial_clarification.
+    """
+    local = _local_analysis(user_prompt, file_content)
+    if local is not None:
+        return local
+
+    try:
+        result = invoke_chain("combined", _build_chain(), _chain_inputs(user_prompt, file_content))
+        return _parse_result(result)
+    except Exception as e:
+        print(f"[错误] 调用LLM时发生错误: {e}")
+        return _analysis(-1)
+
+@traced("classify", mode="combined")
+async def handle_combined_analysis_async(user_prompt: str, file_content: str) -> dict:
+    """Async variant of handle_combined_analysis (uses ainvoke)."""
+    local = _local_analysis(user_prompt, file_content)
+    if local is not None:
+        return local
+
+    try:
+        result = await ainvoke_chain("combined", _build_chain(), _chain_inputs(user_prompt, file_content))
+        return _parse_result(result)
+    except Exception as e:
+        print(f"[错误] 调用LLM时发生错误: {e}")
+        return _analysis(-1)
+
+@traced("classify", mode="combined", stream=True)
+def stream_combined_analysis(user_prompt: str, file_content: str) -> Generator[str, None, dict]:
+    """
+    Streaming variant of handle_combined_analysis: yields the raw LLM output tokens as they
+    arrive (nothing when the local fast path answers) and returns the analysis dict as the
+    generator's return value.
+    """
+    local = _local_analysis(user_prompt, file_content)
+    if local is not None:
+        return local
+
+    try:
+        chunks = []
+        for chunk in stream_chain("combined", _build_chain(with_parser=False), _chain_inputs(user_prompt, file_content)):
+            text = getattr(chunk, "content", chunk)
+            if text:
+                chunks.append(text)
+                yield text
+        return _parse_result(_build_parser().parse("".join(chunks)))
+    except Exception as e:
+        print(f"[错误] 调用LLM时发生错误: {e}")
+        return _analysis(-1)
@@ -1,13 +1,38 @@
-from langchain_core.prompts import ChatPromptTemplate
-from core.config import LLM, KNOWN_TECHNICAL_TERMS  # 导入已知术语列表
+from typing import Optional
+from core.config import (
+    KNOWN_TECHNICAL_TERMS,  # 导入已知术语列表
+    FAST_PATH_ENABLED,
+    FAST_PATH_ACCEPT_THRESHOLD,
+    FAST_PATH_REJECT_THRESHOLD,
+    FAST_PATH_SIMILARITY_THRESHOLD,
+)
+from core.llm_calls import invoke_chain, ainvoke_chain
+from core.telemetry import annotate, traced
+from core.token_budget import budgeted_llm, fit_file_content
+from handlers.instruction_1 import prompt_terms
 from utils.parsers import parse_last_line_as_int
+from utils.intent_classifier import LocalIntentClassifier
 
-def handle_instruction_0(user_prompt: str, file_content: str) -> int:
-    """Handles instruction 0: Classifies the user's intent."""
-    print("\n[Agent] 执行 instruction 0: 任务意图识别...")
-    
-    # 构建系统提示词，增加对模糊查询和无关查询的区分
-    system_prompt = """
+# 本地快速分类器：明显的查询不再经过LLM
+_fast_path = LocalIntentClassifier(
+    KNOWN_TECHNICAL_TERMS,
+    accept_threshold=FAST_PATH_ACCEPT_THRESHOLD,
+    reject_threshold=FAST_PATH_REJECT_THRESHOLD,
+    similarity_threshold=FAST_PATH_SIMILARITY_THRESHOLD,
+) if FAST_PATH_ENABLED else None
+
+def get_fast_path_stats() -> dict:
+    """Returns the fast-path counters (total / bypassed / bypass_rate ...)."""
+    return _fast_path.stats() if _fast_path is not None else {}
+
+def classify_locally(user_prompt: str, file_content: str) -> Optional[int]:
+    """Returns the task ID when the local classifier is confident, otherwise None."""
+    if _fast_path is None:
+        return None
+    return _fast_path.classify(user_prompt, file_content)
+
+# 构建系统提示词，增加对模糊查询和无关查询的区分
+SYSTEM_PROMPT = """
     你是一个智能任务分类助手。你的任务是分析用户的请求，并将其归类为以下几种情况：
 
     1. 标准任务类型（返回对应编号）：
@@ -33,42 +58,80 @@ def handle_instruction_0(user_prompt: str, file_content: str) -> int:
     2. 如果用户的请求使用了模糊或相近的术语，但明显是在询问遥感领域的问题，返回-2
     3. 如果用户的请求与遥感领域完全无关，返回-1
 
-    请在你的回答最后一行单独输出判断结果（1、2、3、-1或-2）。
+    只输出判断结果（1、2、3、-1或-2）这一个数字，不要输出分析过程或任何其他内容。
     """
-    
-    # 构建完整提示词
-    full_prompt = f"用户请求：\n{user_prompt}\n\n"
-    if file_content:
-        full_prompt += f"用户上传的文件内容：\n{file_content}"
-    
-    # 创建提示模板
+
+def _build_chain():
+    """Builds the prompt | LLM classification chain."""
+    # LangChain 在首次需要调用LLM时才导入
+    from langchain_core.prompts import ChatPromptTemplate
+
     prompt_template = ChatPromptTemplate.from_messages([
-        ("system", system_prompt.format(known_terms=str(KNOWN_TECHNICAL_TERMS))),
+        ("system", SYSTEM_PROMPT),
         ("user", "{input}")
     ])
-    
-    # 构建处理链
-    chain = prompt_template | LLM
-    
+    return prompt_template | budgeted_llm("classify")
+
+def _build_input(user_prompt: str, file_content: str) -> str:
+    """Builds the full user message for the classification prompt."""
+    full_prompt = f"用户请求：\n{user_prompt}\n\n"
+    file_content = fit_file_content("classify", user_prompt, file_content)
+    if file_content:
+        full_prompt += f"用户上传的文件内容：\n{file_content}"
+    return full_prompt
+
+def _chain_inputs(user_prompt: str, file_content: str) -> dict:
+    """Prompt variables: the user message and the top-k glossary terms relevant to it."""
+    return {"input": _build_input(user_prompt, file_content), "known_terms": str(prompt_terms(user_prompt))}
+
+def _interpret_output(llm_output: str) -> int:
+    """Parses the LLM output into a task ID and reports it."""
+    print(f"[LLM Output for Inst 0]\n{llm_output}")
+    task_id = parse_last_line_as_int(llm_output)
+
+    # 根据结果类型输出不同的提示信息
+    if task_id > 0:
+        print(f"[Agent] 识别到标准任务，任务ID: {task_id}")
+    elif task_id == -2:
+        print("[Agent] 识别到可纠正的模糊查询")
+    else:
+        print("[Agent] 识别到无关查询，拒绝处理")
+    return task_id
+
+def _try_fast_path(user_prompt: str, file_content: str) -> Optional[int]:
+    print("\n[Agent] 执行 instruction 0: 任务意图识别...")
+
+    # 本地预分类：命中已知术语或明显无关时直接返回
+    fast_task_id = classify_locally(user_prompt, file_content)
+    if fast_task_id is not None:
+        print(f"[Agent] 本地快速分类命中，任务ID: {fast_task_id}（跳过LLM）")
+        annotate(path="local", task_id=fast_task_id)
+    return fast_task_id
+
+@traced("classify", mode="two_step")
+def handle_instruction_0(user_prompt: str, file_content: str) -> int:
+    """Handles instruction 0: Classifies the user's intent."""
+    fast_task_id = _try_fast_path(user_prompt, file_content)
+    if fast_task_id is not None:
+        return fast_task_id
+
+    try:
+        response = invoke_chain("classify", _build_chain(), _chain_inputs(user_prompt, file_content))
+        return _interpret_output(response.content)
+    except Exception as e:
+        print(f"[错误] 调用LLM时发生错误: {e}")
+        return -1
+
+@traced("classify", mode="two_step")
+async def handle_instruction_0_async(user_prompt: str, file_content: str) -> int:
+    """Async variant of handle_instruction_0 (uses ainvoke)."""
+    fast_task_id = _try_fast_path(user_prompt, file_content)
+    if fast_task_id is not None:
+        return fast_task_id
+
     try:
-        # 调用LLM
-        response = chain.invoke({"input": full_prompt})
-        llm_output = response.content
-        print(f"[LLM Output for Inst 0]\n{llm_output}")
-        
-        # 解析结果
-        task_id = parse_last_line_as_int(llm_output)
-        
-        # 根据结果类型输出不同的提示信息
-        if task_id > 0:
-            print(f"[Agent] 识别到标准任务，任务ID: {task_id}")
-        elif task_id == -2:
-            print("[Agent] 识别到可纠正的模糊查询")
-        else:
-            print("[Agent] 识别到无关查询，拒绝处理")
-            
-        return task_id
-        
+        response = await ainvoke_chain("classify", _build_chain(), _chain_inputs(user_prompt, file_content))
+        return _interpret_output(response.content)
     except Exception as e:
         print(f"[错误] 调用LLM时发生错误: {e}")
-        return -1 
\ No newline at end of file
+        return -1
@@ -1,12 +1,31 @@
 import os
+import asyncio
+import threading
+import time
 import traceback
-from typing import Optional, List
+import uuid
+from typing import Dict, Optional, List
 from pydantic import BaseModel, Field
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 
-from core.config import LLM, KNOWN_TECHNICAL_TERMS
-from utils.knowledge_base import query_knowledge_base
+from core.config import (
+    KNOWN_TECHNICAL_TERMS,
+    PROMPT_TERMS_TOP_K,
+    TERM_INDEX_AUTO_CORRECT_THRESHOLD,
+    TERM_INDEX_SUGGEST_THRESHOLD,
+)
+from utils.knowledge_base import (
+    query_knowledge_base,
+    query_knowledge_base_async,
+    get_knowledge_base_terms,
+    get_knowledge_base_generation,
+)
+from core.llm_calls import invoke_chain, ainvoke_chain
+from core import telemetry
+from core.telemetry import annotate, traced
+from core.token_budget import budgeted_llm
+from utils.file_handler import estimate_tokens
+from utils.prefetch import KnowledgePrefetcher
+from utils.term_index import TermIndex
 
 class TermClarification(BaseModel):
     is_ambiguous: bool = Field(description="如果用户提问中的核心术语是模糊的或不在已知列表中，则为True；否则为False。")
@@ -14,12 +33,79 @@ class TermClarification(BaseModel):
     corrected_term: Optional[str] = Field(description="如果is_ambiguous为False，这里是对应的标准术语。")
     suggestions: Optional[List[str]] = Field(description="如果is_ambiguous为True，这里是推荐给用户的标准术语列表。")
 
-def handle_instruction_1_interactive(user_prompt: str, file_content: str, output_path: str) -> bool:
-    """Handles instruction 1: Interactive knowledge Q&A with clarification."""
-    print("\n[Agent] 执行 instruction 1: 知识库问答 (交互式澄清模式)...")
-    
-    clarification_parser = JsonOutputParser(pydantic_object=TermClarification)
-    system_prompt_template = """
+_term_index: Optional[TermIndex] = None
+_term_index_generation: Optional[int] = None
+_term_index_lock = threading.Lock()
+# 把整个术语表放入提示词时的 token 数（随术语索引一起重建），用于统计节省的提示词 token
+_glossary_tokens = 0
+_prompt_term_stats = {"prompts": 0, "injected_tokens": 0, "glossary_tokens": 0}
+
+def get_term_index() -> TermIndex:
+    """Returns the local term index over known terms and knowledge-base keys, rebuilt when the knowledge base changes."""
+    global _term_index, _term_index_generation, _glossary_tokens
+    generation = get_knowledge_base_generation()
+    with _term_index_lock:
+        if _term_index is None or _term_index_generation != generation:
+            _term_index = TermIndex(list(KNOWN_TECHNICAL_TERMS) + get_knowledge_base_terms())
+            _term_index_generation = generation
+            _glossary_tokens = estimate_tokens(str(_term_index.terms))
+        return _term_index
+
+def prompt_terms(user_text: str, k: int = PROMPT_TERMS_TOP_K) -> List[str]:
+    """
+    Picks the glossary terms to put into an LLM prompt: the top-k candidates of the local
+    term index, padded with KNOWN_TECHNICAL_TERMS, so the prompt size does not grow with
+    the knowledge base. k <= 0 returns the whole glossary.
+    """
+    index = get_term_index()
+    if k <= 0:
+        terms = index.terms
+    else:
+        terms = [match.term for match in index.suggest(user_text, k=k)]
+        for term in KNOWN_TECHNICAL_TERMS:
+            if len(terms) >= k:
+                break
+            if term not in terms:
+                terms.append(term)
+    _record_prompt_terms(terms)
+    return terms
+
+def _record_prompt_terms(terms: List[str]) -> None:
+    injected = estimate_tokens(str(terms))
+    with _term_index_lock:
+        glossary = _glossary_tokens
+        _prompt_term_stats["prompts"] += 1
+        _prompt_term_stats["injected_tokens"] += injected
+        _prompt_term_stats["glossary_tokens"] += glossary
+    telemetry.increment("prompt_term_tokens_total", injected, kind="injected")
+    telemetry.increment("prompt_term_tokens_total", glossary, kind="glossary")
+    annotate(prompt_terms=len(terms), prompt_term_tokens=injected)
+
+def get_prompt_term_stats() -> Dict[str, float]:
+    """
+    Returns the prompt term-injection counters: LLM prompts built, term tokens injected,
+    tokens the whole glossary would have cost, and the saved tokens / savings rate.
+    """
+    with _term_index_lock:
+        stats: Dict[str, float] = dict(_prompt_term_stats)
+    stats["saved_tokens"] = stats["glossary_tokens"] - stats["injected_tokens"]
+    stats["savings_rate"] = stats["saved_tokens"] / stats["glossary_tokens"] if stats["glossary_tokens"] else 0.0
+    return stats
+
+def reset_prompt_term_stats() -> None:
+    with _term_index_lock:
+        for key in _prompt_term_stats:
+            _prompt_term_stats[key] = 0
+
+def clarify_term_locally(user_text: str) -> Optional[dict]:
+    """Resolves the core term with the local index; returns None when the LLM is needed."""
+    return get_term_index().clarify(
+        user_text,
+        auto_correct_threshold=TERM_INDEX_AUTO_CORRECT_THRESHOLD,
+        suggest_threshold=TERM_INDEX_SUGGEST_THRESHOLD,
+    )
+
+SYSTEM_PROMPT_TEMPLATE = """
     你是一个微波遥感领域的专家助手。你的任务是帮助用户澄清他们模糊的提问。
     已知的标准技术术语列表为: {known_terms}
     请分析用户的提问，并遵循以下规则：
@@ -31,81 +117,301 @@ def handle_instruction_1_interactive(user_prompt: str, file_content: str, output
     你必须严格按照指定的JSON格式进行输出，不要添加任何额外的解释。
     {format_instructions}
     """
-    
+
+EXIT_WORDS = ['退出', 'exit', 'quit']
+
+def _build_clarification_chain():
+    """Builds the prompt | LLM | JSON parser clarification chain."""
+    # LangChain 在首次需要调用LLM时才导入
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
+
+    clarification_parser = JsonOutputParser(pydantic_object=TermClarification)
     prompt_base = ChatPromptTemplate.from_messages([
-        ("system", system_prompt_template),
+        ("system", SYSTEM_PROMPT_TEMPLATE),
         ("user", "{input}")
     ])
-    
-    prompt = prompt_base.partial(
-        format_instructions=clarification_parser.get_format_instructions(),
-        known_terms=str(KNOWN_TECHNICAL_TERMS)
+    prompt = prompt_base.partial(format_instructions=clarification_parser.get_format_instructions())
+    return prompt | budgeted_llm("clarify") | clarification_parser
+
+def _clarification_input(current_prompt: str, clarification_context: str) -> str:
+    print("-" * 20)
+    print(f"[Agent] 正在分析用户输入: '{current_prompt}'")
+    return (
+        f"用户当前输入: '{current_prompt}'\n\n"
+        f"历史澄清上下文:\n{clarification_context if clarification_context else '无'}"
     )
 
-    clarification_chain = prompt | LLM | clarification_parser
-    current_prompt = user_prompt
-    clarification_context = ""
+def _clarification_chain_inputs(current_prompt: str, full_clarification_prompt: str) -> dict:
+    """Prompt variables: the clarification message and the top-k glossary terms relevant to it."""
+    return {"input": full_clarification_prompt, "known_terms": str(prompt_terms(current_prompt))}
 
-    # Clarification Loop
-    while True:
-        print("-" * 20)
-        print(f"[Agent] 正在分析用户输入: '{current_prompt}'")
-        full_clarification_prompt = (
-            f"用户当前输入: '{current_prompt}'\n\n"
-            f"历史澄清上下文:\n{clarification_context if clarification_context else '无'}"
-        )
-
-        try:
-            clarification_result = clarification_chain.invoke({"input": full_clarification_prompt})
-            
-            if not clarification_result['is_ambiguous']:
-                final_term = clarification_result['corrected_term']
-                print(f"[Agent] 意图已澄清。识别出的标准术语为: '{final_term}'")
-                break  # Exit loop
-            else:
-                suggestions = clarification_result['suggestions']
-                original_term = clarification_result['original_term']
-                print(f"\n[Agent] 您的提问 '{original_term}' 似乎有些模糊。")
-                print("您是不是想询问以下某个概念？")
-                for i, term in enumerate(suggestions):
-                    print(f"  {i+1}. {term}")
-                print("请直接输入您想查询的词语，或者输入序号，或输入'退出'来中止查询。")
-                
-                user_choice = input("您的选择: ").strip()
-
-                if user_choice.lower() in ['退出', 'exit', 'quit']:
-                    print("[Agent] 用户中止查询。")
-                    return False
-                
-                if user_choice.isdigit() and 1 <= int(user_choice) <= len(suggestions):
-                    current_prompt = suggestions[int(user_choice) - 1]
-                else:
-                    current_prompt = user_choice
-                
-                clarification_context = f"上一轮识别到模糊词 '{original_term}', 提供了选项 {suggestions}, 用户选择了 '{current_prompt}'."
-
-        except Exception as e:
-            print(f"[错误] 在澄清步骤中调用LLM失败: {e}")
-            traceback.print_exc()
+def _local_clarification(current_prompt: str, initial_clarification: Optional[dict]) -> Optional[dict]:
+    """优先使用已有的澄清结果和本地术语索引，只有本地无法给出可靠结果时才需要调用LLM"""
+    if initial_clarification is not None:
+        annotate(path="initial")
+        return initial_clarification
+    clarification_result = clarify_term_locally(current_prompt)
+    if clarification_result is not None:
+        print("[Agent] 本地术语索引已完成澄清（跳过LLM）")
+        annotate(path="local")
+    return clarification_result
+
+def _show_suggestions(original_term: str, suggestions: List[str]) -> None:
+    print(f"\n[Agent] 您的提问 '{original_term}' 似乎有些模糊。")
+    print("您是不是想询问以下某个概念？")
+    for i, term in enumerate(suggestions):
+        print(f"  {i+1}. {term}")
+    print("请直接输入您想查询的词语，或者输入序号，或输入'退出'来中止查询。")
+
+def _apply_user_choice(user_choice: str, original_term: str, suggestions: List[str]) -> Optional[tuple]:
+    """Returns (next prompt, clarification context), or None when the user aborts."""
+    if user_choice.lower() in EXIT_WORDS:
+        print("[Agent] 用户中止查询。")
+        return None
+
+    if user_choice.isdigit() and 1 <= int(user_choice) <= len(suggestions):
+        current_prompt = suggestions[int(user_choice) - 1]
+    else:
+        current_prompt = user_choice
+
+    clarification_context = f"上一轮识别到模糊词 '{original_term}', 提供了选项 {suggestions}, 用户选择了 '{current_prompt}'."
+    return current_prompt, clarification_context
+
+@traced("file.write")
+def write_result(output_path: str, knowledge_text: str) -> None:
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(knowledge_text)
+
+def _record_term(result: Optional[dict], session: "ClarificationSession") -> None:
+    if result is not None:
+        result["term"] = session.term
+        result["clarified_by_user"] = session.turns > 1
+
+def _record_aborted(result: Optional[dict]) -> None:
+    if result is not None:
+        result["status"] = "aborted"
+
+def is_found(knowledge_text: Optional[str]) -> bool:
+    """知识库是否给出了有效结果（未找到时返回的是以“抱歉”开头的提示）"""
+    return knowledge_text is not None and "抱歉" not in knowledge_text
+
+def _report_result(output_path: Optional[str], knowledge_text: str) -> str:
+    if is_found(knowledge_text):
+        print(f"[Agent] 成功！结果已写入: {output_path}" if output_path else "[Agent] 成功！已取得查询结果。")
+    else:
+        print("[Agent] 知识库中无此信息，已将提示写入文件。" if output_path else "[Agent] 知识库中无此信息。")
+    return knowledge_text
+
+@traced("clarify")
+def clarify_once(current_prompt: str, clarification_context: str = "", initial_clarification: Optional[dict] = None) -> dict:
+    """Runs a single clarification step without user interaction; returns a TermClarification-shaped dict."""
+    full_clarification_prompt = _clarification_input(current_prompt, clarification_context)
+    clarification_result = _local_clarification(current_prompt, initial_clarification)
+    if clarification_result is None:
+        clarification_result = invoke_chain("clarify", _build_clarification_chain(), _clarification_chain_inputs(current_prompt, full_clarification_prompt))
+    return clarification_result
+
+@traced("clarify")
+async def clarify_once_async(current_prompt: str, clarification_context: str = "", initial_clarification: Optional[dict] = None) -> dict:
+    """Async variant of clarify_once."""
+    full_clarification_prompt = _clarification_input(current_prompt, clarification_context)
+    clarification_result = _local_clarification(current_prompt, initial_clarification)
+    if clarification_result is None:
+        clarification_result = await ainvoke_chain("clarify", _build_clarification_chain(), _clarification_chain_inputs(current_prompt, full_clarification_prompt))
+    return clarification_result
+
+class ClarificationSession:
+    """
+    可恢复、可序列化的术语澄清状态机（交互式问答与服务模式共用）。
+
+    状态：clarifying（等待执行澄清）-> awaiting_choice（已给出建议，等待用户选择）-> resolved（得到标准术语）
+    或 aborted（用户中止）。每一步只依赖 to_dict() 中的字段，等待用户输入时不占用线程或协程，
+    可以保存后在其他进程中用 from_dict() 恢复。
+    """
+
+    CLARIFYING = "clarifying"
+    AWAITING_CHOICE = "awaiting_choice"
+    RESOLVED = "resolved"
+    ABORTED = "aborted"
+
+    FIELDS = ("session_id", "user_prompt", "current_prompt", "context", "state",
+              "original_term", "suggestions", "term", "turns", "created_at", "updated_at")
+
+    def __init__(self, user_prompt: str, session_id: Optional[str] = None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.user_prompt = user_prompt
+        self.current_prompt = user_prompt
+        self.context = ""
+        self.state = self.CLARIFYING
+        self.original_term: Optional[str] = None
+        self.suggestions: Optional[List[str]] = None
+        self.term: Optional[str] = None
+        self.turns = 0
+        self.created_at = self.updated_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ClarificationSession":
+        session = cls(data["user_prompt"], data["session_id"])
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(session, field, data[field])
+        return session
+
+    @property
+    def done(self) -> bool:
+        return self.state in (self.RESOLVED, self.ABORTED)
+
+    def _apply(self, clarification_result: dict) -> None:
+        self.turns += 1
+        self.updated_at = time.time()
+        if not clarification_result['is_ambiguous']:
+            self.term = clarification_result['corrected_term']
+            self.state = self.RESOLVED
+            print(f"[Agent] 意图已澄清。识别出的标准术语为: '{self.term}'")
+        else:
+            self.original_term = clarification_result['original_term']
+            self.suggestions = clarification_result['suggestions'] or []
+            self.state = self.AWAITING_CHOICE
+
+    def _choose(self, user_choice: str) -> bool:
+        """应用用户选择；返回 False 表示用户中止"""
+        if self.state != self.AWAITING_CHOICE:
+            raise ValueError(f"会话当前状态为 {self.state}，不接受选择")
+        next_step = _apply_user_choice(user_choice.strip(), self.original_term, self.suggestions)
+        self.updated_at = time.time()
+        if next_step is None:
+            self.state = self.ABORTED
             return False
+        self.current_prompt, self.context = next_step
+        self.state = self.CLARIFYING
+        return True
+
+    def step(self, initial_clarification: Optional[dict] = None) -> "ClarificationSession":
+        """执行一次澄清（state 为 clarifying 时）"""
+        self._apply(clarify_once(self.current_prompt, self.context, initial_clarification))
+        return self
+
+    async def astep(self, initial_clarification: Optional[dict] = None) -> "ClarificationSession":
+        """Async variant of step."""
+        self._apply(await clarify_once_async(self.current_prompt, self.context, initial_clarification))
+        return self
+
+    def choose(self, user_choice: str) -> "ClarificationSession":
+        """用户输入序号、术语或退出词，并据此继续澄清"""
+        if self._choose(user_choice):
+            self.step()
+        return self
+
+    async def achoose(self, user_choice: str) -> "ClarificationSession":
+        """Async variant of choose."""
+        if self._choose(user_choice):
+            await self.astep()
+        return self
+
+def handle_instruction_1_interactive(
+    user_prompt: str,
+    file_content: str,
+    output_path: Optional[str] = None,
+    initial_clarification: Optional[dict] = None,
+    result: Optional[dict] = None,
+) -> Optional[str]:
+    """
+    Handles instruction 1: Interactive knowledge Q&A with clarification.
+
+    Returns the knowledge-base text (the "not found" message included), or None when
+    the user aborts or a step fails. The text is also written to output_path when given.
+
+    initial_clarification: a TermClarification-shaped dict that is already known
+    (e.g. from the combined analysis), used instead of the first clarification call.
+    result: when given, receives the resolved "term" and "clarified_by_user" (whether
+    the user had to pick among suggestions), or status "aborted" when the user aborts.
+    """
+    print("\n[Agent] 执行 instruction 1: 知识库问答 (交互式澄清模式)...")
+
+    # Clarification Loop
+    # 等待用户选择期间在后台预取各建议术语的知识库结果
+    prefetcher = KnowledgePrefetcher()
+    try:
+        session = ClarificationSession(user_prompt).step(initial_clarification)
+        while session.state == ClarificationSession.AWAITING_CHOICE:
+            prefetcher.prefetch(session.suggestions)
+            _show_suggestions(session.original_term, session.suggestions)
+            session.choose(input("您的选择: "))
+    except Exception as e:
+        print(f"[错误] 在澄清步骤中调用LLM失败: {e}")
+        traceback.print_exc()
+        prefetcher.cancel()
+        return None
+    if session.state == ClarificationSession.ABORTED:
+        prefetcher.cancel()
+        _record_aborted(result)
+        return None
+    final_term = session.term
+    _record_term(result, session)
 
     # After loop, query knowledge base
     try:
         print("[Agent] 步骤 2/3: 查询知识库...")
-        knowledge_text = query_knowledge_base([(final_term, 1.0)])
+        knowledge_text = prefetcher.take(final_term)
+        prefetcher.cancel()
+        if knowledge_text is None:
+            knowledge_text = query_knowledge_base([(final_term, 1.0)])
         
-        print("[Agent] 步骤 3/3: 写入文件...")
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(knowledge_text)
-
-        if "抱歉" not in knowledge_text:
-            print(f"[Agent] 成功！结果已写入: {output_path}")
-            return True
-        else:
-            print(f"[Agent] 知识库中无此信息，已将提示写入文件。")
-            return False # Or True, depending on desired behavior for "not found"
+        if output_path:
+            print("[Agent] 步骤 3/3: 写入文件...")
+            write_result(output_path, knowledge_text)
+        return _report_result(output_path, knowledge_text)
             
     except Exception as e:
         print(f"[错误] 在查询知识库或写入文件时发生错误: {e}")
-        return False 
\ No newline at end of file
+        return None
+
+async def handle_instruction_1_interactive_async(
+    user_prompt: str,
+    file_content: str,
+    output_path: Optional[str] = None,
+    initial_clarification: Optional[dict] = None,
+    result: Optional[dict] = None,
+) -> Optional[str]:
+    """Async variant of handle_instruction_1_interactive (ainvoke, non-blocking input and file I/O)."""
+    print("\n[Agent] 执行 instruction 1: 知识库问答 (交互式澄清模式)...")
+
+    prefetcher = KnowledgePrefetcher()
+    try:
+        session = await ClarificationSession(user_prompt).astep(initial_clarification)
+        while session.state == ClarificationSession.AWAITING_CHOICE:
+            prefetcher.aprefetch(session.suggestions)
+            _show_suggestions(session.original_term, session.suggestions)
+            await session.achoose(await asyncio.to_thread(input, "您的选择: "))
+    except Exception as e:
+        print(f"[错误] 在澄清步骤中调用LLM失败: {e}")
+        traceback.print_exc()
+        prefetcher.cancel()
+        return None
+    if session.state == ClarificationSession.ABORTED:
+        prefetcher.cancel()
+        _record_aborted(result)
+        return None
+    final_term = session.term
+    _record_term(result, session)
+
+    try:
+        print("[Agent] 步骤 2/3: 查询知识库...")
+        knowledge_text = await prefetcher.atake(final_term)
+        prefetcher.cancel()
+        if knowledge_text is None:
+            knowledge_text = await query_knowledge_base_async([(final_term, 1.0)])
+
+        if output_path:
+            print("[Agent] 步骤 3/3: 写入文件...")
+            await asyncio.to_thread(write_result, output_path, knowledge_text)
+        return _report_result(output_path, knowledge_text)
+
+    except Exception as e:
+        print(f"[错误] 在查询知识库或写入文件时发生错误: {e}")
+        return None
@@ -1,60 +1,175 @@
 import os
+import time
 import argparse
-from agent import process_user_query
+from agent import process_user_query, stream_answer
+from batch import run_batch
+from core import telemetry
+from core.config import BATCH_WORKERS, RESULT_STORE_DIR
+from utils.result_store import ResultStore
 
-def process_query(query: str, output_dir: str = "output") -> None:
-    """处理单个查询"""
-    # 创建输出目录
-    os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, "query_result.txt")
-    
+def process_query(query: str, store: ResultStore, mode: str = None) -> None:
+    """处理单个查询，结果保存到结果存储中"""
     print(f"\n[系统] 正在处理查询: {query}")
     
-    # 运行代理
+    # 运行代理（知识问答结果直接在内存中返回）
+    answer = {}
     result = process_user_query(
         prompt=query,
-        output_path=output_file
+        mode=mode,
+        result=answer,
     )
+    knowledge_text = answer.get("answer")
+    aborted = answer.get("status") == "aborted"
+    if aborted:
+        result_id = store.put(query, None, code=result, status="aborted")
+    else:
+        result_id = store.put(query, knowledge_text, code=result) if knowledge_text is not None else None
     
     # 处理结果
-    if result == 0:
+    if aborted:
+        print("\n[系统] 已取消查询。")
+    elif result in (0, -2) and knowledge_text is not None:
         print("\n[成功] 查询处理完成！")
-        try:
-            with open(output_file, 'r', encoding='utf-8') as f:
-                print("\n--- 查询结果 ---")
-                print(f.read())
-                print("--- 结果结束 ---")
-        except FileNotFoundError:
-            print(f"[错误] 未找到输出文件: {output_file}")
-    elif result == -2:
-        print("\n[成功] 模糊查询已通过交互式澄清完成！")
-        try:
-            with open(output_file, 'r', encoding='utf-8') as f:
-                print("\n--- 查询结果 ---")
-                print(f.read())
-                print("--- 结果结束 ---")
-        except FileNotFoundError:
-            print(f"[错误] 未找到输出文件: {output_file}")
+        print("\n--- 查询结果 ---")
+        print(knowledge_text)
+        print("--- 结果结束 ---")
+        print(f"[系统] 结果编号: {result_id}")
+    elif knowledge_text is not None:
+        print(f"\n[Agent] {knowledge_text}")
     elif result == -1:
         print("\n[失败] 查询与系统功能无关，无法处理。")
     else:
         print(f"\n[失败] 查询处理失败，错误代码: {result}")
 
+def process_query_stream(query: str, store: ResultStore, mode: str = None, on_ambiguous: str = "top") -> None:
+    """流式处理单个查询：LLM token 与知识库段落一产生就输出到控制台，完成后保存到结果存储"""
+    print(f"\n[系统] 正在处理查询（流式）: {query}")
+    in_tokens = False
+    passages = 0
+    for event in stream_answer(query, mode=mode, on_ambiguous=on_ambiguous):
+        kind = event["event"]
+        if kind == "token":
+            if not in_tokens:
+                print("[LLM] ", end="", flush=True)
+                in_tokens = True
+            print(event["text"], end="", flush=True)
+            continue
+        if in_tokens:
+            print(flush=True)
+            in_tokens = False
+        if kind == "passage":
+            if passages == 0:
+                print("\n--- 查询结果 ---")
+            passages += 1
+            print(event["text"] + "\n", flush=True)
+        elif kind == "done":
+            result = event["result"]
+            timings = result["timings"]
+            status = result["status"]
+            if result["answer"] is not None:
+                result_id = store.put(query, result["answer"], status=status, term=result["term"])
+            if status == "ok":
+                print("--- 结果结束 ---")
+                print(f"\n[成功] 查询处理完成！结果编号: {result_id}")
+            elif status == "not_found":
+                print(f"\n[Agent] {result['answer']}")
+            elif status == "ambiguous":
+                print(f"\n[Agent] 提问较模糊，建议的术语: {result['suggestions']}")
+            elif status == "rejected":
+                print("\n[失败] 查询与系统功能无关，无法处理。")
+            else:
+                print(f"\n[失败] 暂不支持该类任务（task_id={result['task_id']}）")
+            first_token = timings.get("first_token")
+            first_token_text = f"{first_token:.1f}ms" if first_token is not None else "无"
+            print(f"[系统] 首个输出耗时: {first_token_text}，总耗时: {timings['total']:.1f}ms")
+
+def show_result(store: ResultStore, id_or_query: str) -> None:
+    """按结果编号或查询（忽略大小写、空白与标点）显示已保存的结果"""
+    record = store.lookup(id_or_query)
+    if record is None:
+        print(f"[错误] 未找到结果: {id_or_query}")
+        return
+    created_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["created_at"]))
+    print(f"\n[系统] 结果 {record['id']}（{created_at}）: {record['query']}")
+    print("\n--- 查询结果 ---")
+    print(record["answer"])
+    print("--- 结果结束 ---")
+
+def process_batch(args) -> None:
+    """批处理：从 JSONL 文件流式读取查询，每完成一个查询输出一行 JSONL 结果"""
+    output_file = args.batch_output or os.path.join(args.output_dir, "batch_results.jsonl")
+    workers = args.workers or BATCH_WORKERS
+    print(f"\n[系统] 批处理: {args.batch} -> {output_file}（{args.executor}，{workers} 个 worker）")
+
+    start = time.perf_counter()
+    summary = run_batch(
+        args.batch,
+        output_file,
+        workers=workers,
+        executor=args.executor,
+        ordered=args.ordered,
+        resume=args.resume,
+        on_ambiguous=args.on_ambiguous,
+        mode=args.mode,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"\n[系统] 批处理完成：写入 {summary['written']} 条结果，跳过 {summary['skipped']} 条已完成查询，耗时 {elapsed:.2f}s")
+
 def main():
     """主函数：处理用户查询"""
     parser = argparse.ArgumentParser(description='RS Agent - 遥感知识问答系统')
     parser.add_argument('--query', type=str, help='要查询的问题')
     parser.add_argument('--output-dir', type=str, default='output', help='输出目录路径')
+    parser.add_argument('--results-dir', type=str, default=None,
+                        help='查询结果存储目录（分段日志 + 偏移索引，默认读取 RESULT_STORE_DIR）')
+    parser.add_argument('--lookup', type=str, default=None, help='按结果编号或查询显示已保存的结果')
+    parser.add_argument('--mode', type=str, choices=['combined', 'two_step'], default=None,
+                        help='处理模式：combined 合并意图识别与术语澄清，two_step 原有两步流程（默认读取 PIPELINE_MODE）')
+    parser.add_argument('--batch', type=str, help='批处理输入文件（JSONL，每行 {"id": ..., "query": ...} 或纯文本问题）')
+    parser.add_argument('--batch-output', type=str, default=None,
+                        help='批处理结果文件（JSONL，默认 <output-dir>/batch_results.jsonl，"-" 表示标准输出）')
+    parser.add_argument('--workers', type=int, default=None, help='批处理并发 worker 数（默认读取 BATCH_WORKERS）')
+    parser.add_argument('--executor', type=str, choices=['thread', 'async'], default='thread', help='批处理执行方式')
+    parser.add_argument('--ordered', action='store_true', help='批处理结果按输入顺序输出（默认按完成顺序）')
+    parser.add_argument('--resume', action='store_true', help='从已有结果文件断点续跑，跳过已完成的查询')
+    parser.add_argument('--on-ambiguous', type=str, choices=['top', 'suggest'], default='top',
+                        help='批处理与流式模式中模糊查询的处理方式：top 自动采用第一个建议，suggest 只输出建议')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式输出：LLM token 与知识库段落一产生就显示，完成后保存到结果存储，并报告首个输出耗时')
+    parser.add_argument('--trace-log', type=str, default=None,
+                        help='开启阶段追踪，并把每个阶段的耗时、token 用量写为 JSON 日志（"-" 表示标准错误）')
+    parser.add_argument('--metrics-file', type=str, default=None,
+                        help='开启阶段追踪，退出时把指标以 Prometheus 文本格式写入该文件')
     
     args = parser.parse_args()
-    
+    if args.trace_log or args.metrics_file:
+        telemetry.configure(enabled=True, log_path=args.trace_log)
+    try:
+        _run(args)
+    finally:
+        if args.metrics_file:
+            telemetry.write_prometheus(args.metrics_file)
+            print(f"[系统] 指标已写入: {args.metrics_file}")
+
+def _run(args) -> None:
+    """按参数执行批处理、单次查询或交互模式"""
     print("="*50)
     print("RS Agent - 遥感知识问答系统")
     print("="*50)
     
-    if args.query:
+    if args.batch:
+        process_batch(args)
+        return
+
+    store = ResultStore(args.results_dir or RESULT_STORE_DIR)
+    if args.lookup:
+        show_result(store, args.lookup)
+    elif args.query:
         # 如果提供了命令行参数，直接处理查询
-        process_query(args.query, args.output_dir)
+        if args.stream:
+            process_query_stream(args.query, store, args.mode, args.on_ambiguous)
+        else:
+            process_query(args.query, store, args.mode)
     else:
         # 交互模式
         while True:
@@ -62,7 +177,10 @@ def main():
             if query.lower() in ['退出', 'exit', 'quit']:
                 print("\n[系统] 感谢使用，再见！")
                 break
-            process_query(query)
+            if args.stream:
+                process_query_stream(query, store, args.mode, args.on_ambiguous)
+            else:
+                process_query(query, store, args.mode)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
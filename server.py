@@ -0,0 +1,410 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from agent import answer_query_async, start_session_async, resume_session_async
+from core import telemetry
+from core.config import (
+    ASYNC_MAX_CONCURRENCY,
+    PIPELINE_MODE,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_UPLOAD_DIR,
+    SESSION_MAX_ENTRIES,
+    SESSION_TTL_SECONDS,
+)
+from handlers.instruction_1 import ClarificationSession
+from utils.memory_cache import LRUCache
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """请求无法处理，status 为返回给客户端的 HTTP 状态码"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SessionStore:
+    """
+    澄清会话存储：只保存序列化后的会话状态（JSON 字符串），不为等待中的会话保留线程或协程。
+    超过 ttl_seconds 未访问或超过 max_entries 时淘汰最久未访问的会话；可以导出到文件并在重启后加载。
+    """
+
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, ttl_seconds: Optional[float] = SESSION_TTL_SECONDS):
+        self._sessions = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def save(self, session: ClarificationSession) -> None:
+        self._sessions.set(session.session_id, json.dumps(session.to_dict(), ensure_ascii=False))
+
+    def load(self, session_id: str) -> Optional[ClarificationSession]:
+        data = self._sessions.get(session_id)
+        return ClarificationSession.from_dict(json.loads(data)) if data is not None else None
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.delete(session_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def dump(self, path: str) -> int:
+        """把全部未过期的会话写入 JSONL 文件，返回写入的数量"""
+        items = self._sessions.items()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for _, data in items:
+                f.write(data + "\n")
+        os.replace(tmp_path, path)
+        return len(items)
+
+    def restore(self, path: str) -> int:
+        """从 dump 写出的文件恢复会话，返回恢复的数量"""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    session = ClarificationSession.from_dict(json.loads(line))
+                    self._sessions.set(session.session_id, line)
+                    count += 1
+        return count
+
+
+class AgentServer:
+    """
+    基于 asyncio 的常驻 HTTP 服务（HTTP/1.1，支持 keep-alive），LLM 客户端与知识库在进程内保持预热。
+
+    接口：
+      POST   /v1/query              {"query": ..., "file_paths": [...], "mode": ..., "on_ambiguous": "session"|"top"|"suggest"}
+                                    结果格式同 answer_query；on_ambiguous 为 session（默认）时，
+                                    模糊查询返回 status=ambiguous、suggestions 与 session_id；
+                                    file_paths 只能是 upload_dir 下的文件（未配置 upload_dir 时不接受）
+      POST   /v1/sessions/<id>      {"choice": "1" | "土壤湿度" | "退出"}  继续澄清会话
+      GET    /v1/sessions/<id>      查看会话状态
+      DELETE /v1/sessions/<id>      删除会话
+      GET    /health                服务状态
+      GET    /metrics               Prometheus 文本格式的指标
+    """
+
+    def __init__(
+        self,
+        host: str = SERVER_HOST,
+        port: int = SERVER_PORT,
+        mode: Optional[str] = None,
+        max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+        sessions: Optional[SessionStore] = None,
+        upload_dir: Optional[str] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.mode = mode or PIPELINE_MODE
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.upload_dir = upload_dir if upload_dir is not None else SERVER_UPLOAD_DIR
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._started_at = time.time()
+        self._stats = {"requests": 0, "errors": 0, "connections": 0}
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self, warmup: bool = True) -> None:
+        if warmup:
+            await asyncio.to_thread(self.warmup)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"[服务] 已启动: http://{self.host}:{self.port}（{self.mode} 模式）")
+
+    @staticmethod
+    def warmup() -> None:
+        """提前创建LLM客户端、导入 LangChain 并构建本地术语索引，避免首个请求承担启动开销"""
+        from core.config import get_llm
+        from handlers.combined import _build_chain as build_combined_chain
+        from handlers.instruction_0 import _build_chain as build_classification_chain
+        from handlers.instruction_1 import _build_clarification_chain, get_term_index
+
+        start = time.perf_counter()
+        get_llm()
+        build_combined_chain()
+        build_classification_chain()
+        _build_clarification_chain()
+        get_term_index()
+        print(f"[服务] 预热完成，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    async def serve_forever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """停止接受新连接，关闭已有连接并等待各连接的处理协程结束"""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections.values()):
+                writer.close()
+            if self._connections:
+                await asyncio.wait(list(self._connections))
+            await self._server.wait_closed()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, sessions=len(self.sessions), uptime_seconds=round(time.time() - self._started_at, 3))
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._stats["connections"] += 1
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except RequestError as e:
+                    await _write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self._dispatch(method, path, body)
+                await _write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        self._stats["requests"] += 1
+        try:
+            route = urlsplit(path).path.rstrip("/")
+            if route == "/health" and method == "GET":
+                return 200, dict(self.stats(), status="ok")
+            if route == "/metrics" and method == "GET":
+                return 200, telemetry.render_prometheus()
+            if route == "/v1/query":
+                _require_method(method, "POST")
+                return 200, await self.handle_query(_parse_json(body))
+            if route.startswith("/v1/sessions/"):
+                session_id = route[len("/v1/sessions/"):]
+                if method == "GET":
+                    return 200, self._get_session(session_id).to_dict()
+                if method == "DELETE":
+                    self._get_session(session_id)
+                    self.sessions.delete(session_id)
+                    return 200, {"deleted": session_id}
+                _require_method(method, "POST")
+                return 200, await self.handle_choice(session_id, _parse_json(body))
+            raise RequestError(404, f"未知的路径: {route}")
+        except RequestError as e:
+            self._stats["errors"] += 1
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"[错误] 处理请求 {method} {path} 时发生错误: {e}")
+            return 500, {"error": str(e)}
+
+    # --- 业务接口 ---
+
+    async def handle_query(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        query = request.get("query")
+        if not isinstance(query, str) or not query.strip():
+            raise RequestError(400, "缺少 query")
+        mode = request.get("mode") or self.mode
+        if mode not in ("combined", "two_step"):
+            raise RequestError(400, f"未知的处理模式: {mode}")
+        on_ambiguous = request.get("on_ambiguous", "session")
+        file_paths = self._resolve_file_paths(request.get("file_paths"))
+
+        async with self._semaphore:
+            if on_ambiguous in ("top", "suggest"):
+                return await answer_query_async(query, file_paths, mode=mode, on_ambiguous=on_ambiguous)
+            if on_ambiguous != "session":
+                raise RequestError(400, f"未知的 on_ambiguous: {on_ambiguous}")
+            result, session = await start_session_async(query, file_paths, mode=mode)
+        return self._with_session(result, session)
+
+    async def handle_choice(self, session_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        choice = request.get("choice")
+        if not isinstance(choice, str) or not choice.strip():
+            raise RequestError(400, "缺少 choice")
+        session = self._get_session(session_id)
+        if session.state != ClarificationSession.AWAITING_CHOICE:
+            raise RequestError(409, f"会话当前状态为 {session.state}，不接受选择")
+        async with self._semaphore:
+            result = await resume_session_async(session, choice)
+        return self._with_session(result, session)
+
+    def _resolve_file_paths(self, file_paths: Any) -> Optional[list]:
+        """把客户端提供的文件路径解析到上传目录下；目录外的路径（含 .. 与符号链接）或未配置上传目录时返回 400"""
+        if not file_paths:
+            return None
+        if not isinstance(file_paths, list) or not all(isinstance(path, str) and path for path in file_paths):
+            raise RequestError(400, "file_paths 必须是文件路径列表")
+        if not self.upload_dir:
+            raise RequestError(400, "服务未配置上传目录（SERVER_UPLOAD_DIR），不接受 file_paths")
+        root = os.path.realpath(self.upload_dir)
+        resolved = []
+        for path in file_paths:
+            full_path = os.path.realpath(os.path.join(root, path))
+            if os.path.commonpath([root, full_path]) != root or full_path == root:
+                raise RequestError(400, f"文件不在上传目录中: {path}")
+            resolved.append(full_path)
+        return resolved
+
+    def _with_session(self, result: Dict[str, Any], session: Optional[ClarificationSession]) -> Dict[str, Any]:
+        """等待选择的会话保存下来并返回 session_id；结束的会话从存储中删除"""
+        if session is None:
+            return result
+        if session.state == ClarificationSession.AWAITING_CHOICE:
+            self.sessions.save(session)
+            result["session_id"] = session.session_id
+        else:
+            self.sessions.delete(session.session_id)
+        return result
+
+    def _get_session(self, session_id: str) -> ClarificationSession:
+        session = self.sessions.load(session_id)
+        if session is None:
+            raise RequestError(404, f"会话不存在或已过期: {session_id}")
+        return session
+
+
+def _require_method(method: str, expected: str) -> None:
+    if method != expected:
+        raise RequestError(405, f"不支持的请求方法: {method}")
+
+
+def _parse_json(body: bytes) -> Dict[str, Any]:
+    try:
+        data = json.loads(body or b"{}")
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise RequestError(400, f"请求体不是有效的 JSON: {e}")
+    if not isinstance(data, dict):
+        raise RequestError(400, "请求体必须是 JSON 对象")
+    return data
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """读取一个 HTTP/1.1 请求，连接已关闭时返回 None"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise RequestError(400, "请求不完整")
+        return None
+    except asyncio.LimitOverrunError:
+        raise RequestError(413, "请求头过大")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise RequestError(400, f"无效的请求行: {lines[0]!r}")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = _content_length(headers.get("content-length"))
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def _content_length(value: Optional[str]) -> int:
+    """解析 Content-Length：只接受非负整数，超过 MAX_BODY_BYTES 时返回 413"""
+    if not value:
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        raise RequestError(400, f"无效的 Content-Length: {value!r}")
+    length = int(value)
+    if length > MAX_BODY_BYTES:
+        raise RequestError(413, "请求体过大")
+    return length
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+    if isinstance(payload, str):
+        data = payload.encode("utf-8")
+        content_type = "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        content_type = "application/json; charset=utf-8"
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + data)
+    await writer.drain()
+
+
+async def run_server(
+    host: str = SERVER_HOST,
+    port: int = SERVER_PORT,
+    mode: Optional[str] = None,
+    session_file: Optional[str] = None,
+    warmup: bool = True,
+    gc_freeze: bool = False,
+) -> None:
+    """
+    启动服务直到被中断；指定 session_file 时启动时恢复、退出时保存等待中的澄清会话。
+    gc_freeze=True 时在预热后把已加载的对象（知识库索引等）移入永久代，之后的完整垃圾回收不再扫描它们。
+    """
+    sessions = SessionStore()
+    if session_file:
+        print(f"[服务] 恢复了 {sessions.restore(session_file)} 个澄清会话")
+    server = AgentServer(host, port, mode=mode, sessions=sessions)
+    await server.start(warmup=warmup)
+    if gc_freeze:
+        gc.collect()
+        gc.freeze()
+        print(f"[服务] 已冻结 {gc.get_freeze_count()} 个启动时创建的对象，垃圾回收不再扫描")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+        if session_file:
+            print(f"[服务] 已保存 {sessions.dump(session_file)} 个澄清会话到: {session_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RS Agent - HTTP 服务模式')
+    parser.add_argument('--host', type=str, default=SERVER_HOST, help='监听地址（默认读取 SERVER_HOST）')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='监听端口（默认读取 SERVER_PORT）')
+    parser.add_argument('--mode', type=str, choices=['combined', 'two_step'], default=None,
+                        help='处理模式（默认读取 PIPELINE_MODE）')
+    parser.add_argument('--session-file', type=str, default=None, help='启动时恢复、退出时保存澄清会话的文件（JSONL）')
+    parser.add_argument('--no-warmup', action='store_true', help='启动时不预热LLM客户端与术语索引')
+    parser.add_argument('--gc-freeze', action='store_true',
+                        help='预热后冻结启动时创建的对象（gc.freeze），减少大型知识库索引造成的垃圾回收停顿')
+    parser.add_argument('--quiet', action='store_true', help='不输出各请求的处理过程')
+    args = parser.parse_args()
+
+    if args.quiet:
+        sys.stdout = open(os.devnull, "w")
+    try:
+        asyncio.run(run_server(args.host, args.port, args.mode, args.session_file, warmup=not args.no_warmup,
+                               gc_freeze=args.gc_freeze))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
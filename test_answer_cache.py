@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import tempfile
+from unittest import mock
+from core.config import set_llm_provider
+from benchmarks.fake_llm import fake_llm_provider
+import agent
+from agent import answer_query_async, process_user_query, process_user_query_async
+from utils.answer_cache import AnswerCache, get_answer_cache, reset_answer_cache, set_answer_cache
+from utils.knowledge_base import get_knowledge_base_fingerprint, set_knowledge_base
+
+def test_paraphrase_and_similar_hits():
+    """测试场景1：同一问题的不同问法命中；相似问法经 MinHash 预筛选后命中，不相关的问题不命中"""
+    print("\n" + "="*50)
+    print("测试场景1：问法归一化与相似度命中")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnswerCache(os.path.join(tmp, "answers.sqlite3"), namespace="test")
+        cache.put("土壤湿度是什么？", "kb-1", "土壤湿度的答案", term="土壤湿度")
+        cache.put("土壤湿度对雷达后向散射系数的影响", "kb-1", "影响的答案", term="后向散射系数")
+
+        for query in ("什么是土壤湿度", "土壤湿度的定义", "请介绍一下土壤湿度"):
+            entry = cache.lookup(query, "kb-1")
+            print(f"[测试] {query} -> {entry['term']}（相似度 {entry['similarity']}）")
+            assert entry["answer"] == "土壤湿度的答案" and entry["similarity"] == 1.0
+
+        entry = cache.lookup("土壤湿度对雷达后向散射系数有什么影响", "kb-1")
+        print(f"[测试] 相似问法 -> {entry['term']}（相似度 {entry['similarity']}）")
+        assert entry["answer"] == "影响的答案" and 0.8 <= entry["similarity"] < 1.0
+
+        assert cache.lookup("植被指数对光学反射率的影响", "kb-1") is None
+        assert cache.lookup("什么是土壤湿度", "kb-1")["query"] == "土壤湿度是什么？"
+        stats = cache.stats()
+        print(f"[测试] 统计: {stats}")
+        assert stats["hits"] == 5 and stats["similar_hits"] == 1 and stats["misses"] == 1
+
+def test_persistence_and_invalidation():
+    """测试场景2：重启后仍然命中；知识库内容变化后旧答案失效并被删除"""
+    print("\n" + "="*50)
+    print("测试场景2：持久化与知识库失效")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "answers.sqlite3")
+        old = get_knowledge_base_fingerprint()
+        AnswerCache(path).put("RSHub 怎么用", old, "RSHub 的答案", term="RSHub")
+        AnswerCache(path, namespace="另一个模型").put("RSHub 怎么用", old, "其他模型的答案", term="RSHub")
+
+        reopened = AnswerCache(path)
+        assert reopened.lookup("rshub怎么用？", old)["answer"] == "RSHub 的答案"
+
+        try:
+            set_knowledge_base('mock', knowledge_data={"RSHub": "更新后的 RSHub 说明"})
+            new = get_knowledge_base_fingerprint()
+            assert new != old
+            assert reopened.lookup("RSHub 怎么用", new) is None
+            assert len(reopened.store) == 1, "旧知识库的条目应被删除，其他模型的条目保留"
+        finally:
+            set_knowledge_base('mock')
+        assert get_knowledge_base_fingerprint() == old
+
+def test_fingerprint_tracks_content():
+    """测试场景3：条目名称不变而正文变化时指纹也变化（向量索引、磁盘知识库修改后的首次查询）"""
+    print("\n" + "="*50)
+    print("测试场景3：知识库指纹包含正文")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            try:
+                import numpy  # noqa: F401  向量知识库的可选依赖
+                index_path = os.path.join(tmp, "index")
+                set_knowledge_base('vector', index_path=index_path, knowledge_data={"RSHub": "旧的说明"})
+                set_knowledge_base('vector', index_path=index_path)
+                old = get_knowledge_base_fingerprint()
+                set_knowledge_base('vector', index_path=index_path, knowledge_data={"RSHub": "新的说明"})
+                set_knowledge_base('vector', index_path=index_path)
+                assert get_knowledge_base_fingerprint() != old
+            except ImportError:
+                print("[跳过] 未安装 numpy，不测试向量知识库")
+
+            source = os.path.join(tmp, "kb.jsonl")
+            with open(source, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"key": "RSHub", "text": "旧的说明"}, ensure_ascii=False) + "\n")
+            set_knowledge_base('store', file_path=source, check_interval=0)
+            old = get_knowledge_base_fingerprint()
+            with open(source, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"key": "RSHub", "text": "新的说明，内容更长一些"}, ensure_ascii=False) + "\n")
+            # 修改后尚未有任何知识库查询，读取指纹时即同步
+            new = get_knowledge_base_fingerprint()
+            print(f"[测试] 磁盘知识库指纹: {old} -> {new}")
+            assert new != old
+        finally:
+            set_knowledge_base('mock')
+
+def test_pipeline_bypass():
+    """测试场景4：命中答案缓存时跳过整个处理流程；需要用户选择的查询不保存"""
+    print("\n" + "="*50)
+    print("测试场景4：跳过处理流程")
+    print("="*50)
+
+    set_llm_provider(fake_llm_provider(latency=0.01))
+    assert get_answer_cache() is None, "使用假模型时默认不启用答案缓存"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = AnswerCache(os.path.join(tmp, "answers.sqlite3"))
+            set_answer_cache(cache)
+            with mock.patch.object(agent, "handle_combined_analysis", wraps=agent.handle_combined_analysis) as analysis:
+                first = {}
+                assert process_user_query("土壤湿度是什么？", result=first) == 0
+                assert analysis.call_count == 1 and first["term"] == "土壤湿度"
+
+                second = {}
+                output_path = os.path.join(tmp, "out", "result.txt")
+                assert process_user_query("什么是土壤湿度", output_path=output_path, result=second) == 0
+                print(f"[测试] 第二次查询结果: {second['answer'][:20]}...")
+                assert analysis.call_count == 1, "命中答案缓存时不应再进行意图识别"
+                assert second == {"term": "土壤湿度", "answer": first["answer"]}
+                with open(output_path, encoding="utf-8") as f:
+                    assert f.read() == first["answer"]
+
+                with mock.patch("builtins.input", return_value="1"):
+                    assert process_user_query("说说土壤含水那些事", result={}) == 0
+                assert cache.lookup("说说土壤含水那些事", get_knowledge_base_fingerprint()) is None
+
+            answer = {}
+            assert asyncio.run(process_user_query_async("土壤湿度的定义", result=answer)) == 0
+            assert answer["answer"] == first["answer"]
+            result = asyncio.run(answer_query_async("土壤湿度是啥"))
+            print(f"[测试] answer_query_async: status={result['status']} timings={result['timings']}")
+            assert result["status"] == "ok" and result["term"] == "土壤湿度" and "classify" not in result["timings"]
+            assert process_user_query("今天星期几？") == -1
+    finally:
+        reset_answer_cache()
+        set_llm_provider(None)
+
+def main():
+    """运行所有测试"""
+    print("开始答案缓存测试...")
+
+    test_paraphrase_and_similar_hits()
+    test_persistence_and_invalidation()
+    test_fingerprint_tracks_content()
+    test_pipeline_bypass()
+
+    print("\n答案缓存测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.knowledge_base import APIKnowledgeBase, API_UNAVAILABLE_MESSAGE, NOT_FOUND_MESSAGE, MockKnowledgeBase
+
+class StubKnowledgeServer(ThreadingHTTPServer):
+    """本地模拟的知识库API：按 MockKnowledgeBase 检索，可注入延迟与失败"""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, fail_first: int = 0):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.kb = MockKnowledgeBase()
+        self.latency = latency
+        self.fail_first = fail_first
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.queries = 0
+        self.clients = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/search"
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体分两次写出，关闭 Nagle 算法避免与延迟确认叠加产生 40ms 的停顿
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            server.queries += len(body["queries"])
+            server.clients.add(self.client_address)
+            failing = server.requests <= server.fail_first
+        time.sleep(server.latency)
+        if failing:
+            self._send(503, {"error": "unavailable"})
+            return
+        results = []
+        for item in body["queries"]:
+            keywords = [(k["keyword"], k["weight"]) for k in item["keywords"]]
+            hits = server.kb.search(keywords, item["top_k"])
+            results.append([hit._asdict() for hit in hits])
+        self._send(200, {"results": results})
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def _start(**kwargs) -> StubKnowledgeServer:
+    server = StubKnowledgeServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_query_and_retries():
+    """测试场景1：查询、失败重试与不可用提示"""
+    print("\n" + "="*50)
+    print("测试场景1：查询与重试")
+    print("="*50)
+
+    server = _start(fail_first=2)
+    try:
+        kb = APIKnowledgeBase(server.url, api_key="test", retry_base_delay=0.01)
+        result = kb.query([("土壤湿度", 1.0)])
+        print(f"[测试] 查询结果: {result}")
+        assert result.startswith("土壤湿度是")
+        assert kb.stats()["retries"] == 2
+        assert kb.query([("今天星期几", 1.0)]) == NOT_FOUND_MESSAGE
+
+        # 重试次数用尽后返回不可用提示而不是抛出异常
+        server.fail_first = server.requests + 10
+        assert kb.query([("RSHub", 1.0)]) == API_UNAVAILABLE_MESSAGE
+        print(f"[测试] 统计: {kb.stats()}")
+        kb.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_bulk_and_singleflight():
+    """测试场景2：批量请求与并发相同查询合并"""
+    print("\n" + "="*50)
+    print("测试场景2：批量与请求合并")
+    print("="*50)
+
+    server = _start(latency=0.05)
+    try:
+        kb = APIKnowledgeBase(server.url, max_batch_size=2)
+        results = kb.search_many([[("土壤湿度", 1.0)], [("RSHub", 1.0)], [("土壤湿度", 1.0)], [("微波遥感", 1.0)]])
+        assert [hits[0].key for hits in results] == ["土壤湿度", "RSHub", "土壤湿度", "微波遥感"]
+        print(f"[测试] 4 个查询（3 个不同）使用 {server.requests} 个请求")
+        assert server.requests == 2 and server.queries == 3
+
+        before = server.requests
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda _: kb.search([("地表粗糙度", 1.0)]), range(16)))
+        print(f"[测试] 16 个并发相同查询使用 {server.requests - before} 个请求")
+        assert all(hits[0].key == "地表粗糙度" for hits in results)
+        assert server.requests - before < 16
+        kb.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_pooled_throughput():
+    """测试场景3：连接复用下的并发吞吐与延迟"""
+    print("\n" + "="*50)
+    print("测试场景3：并发吞吐")
+    print("="*50)
+
+    server = _start(latency=0.005)
+    try:
+        kb = APIKnowledgeBase(server.url, max_connections=8)
+        queries = [[(f"术语{i}", 1.0)] for i in range(400)]
+        latencies = []
+
+        def run(keywords):
+            start = time.perf_counter()
+            kb.search(keywords)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(run, queries))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        stats = kb.stats()
+        print(f"[测试] {len(queries)} 个查询耗时 {elapsed:.2f}s，吞吐 {len(queries) / elapsed:.0f} qps，"
+              f"p50 {latencies[len(latencies) // 2] * 1000:.1f}ms，p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+        print(f"[测试] 统计: {stats}，服务端看到的客户端连接数: {len(server.clients)}")
+        assert stats["connections_opened"] <= 16
+        assert len(server.clients) == stats["connections_opened"]
+        kb.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def main():
+    """运行所有测试"""
+    print("开始API知识库测试...")
+
+    test_query_and_retries()
+    test_bulk_and_singleflight()
+    test_pooled_throughput()
+
+    print("\nAPI知识库测试完成！")
+
+if __name__ == "__main__":
+    main()
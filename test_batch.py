@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import random
+import tempfile
+import asyncio
+from batch import run_batch, load_checkpoint
+
+def fake_answer(prompt, file_paths=None, mode=None, on_ambiguous="top"):
+    """模拟 agent.answer_query：随机延迟，返回固定结构"""
+    time.sleep(random.uniform(0, 0.01))
+    if "失败" in prompt:
+        raise RuntimeError("模拟失败")
+    return {"task_id": 1, "status": "ok", "term": prompt, "answer": f"答案:{prompt}", "suggestions": None, "timings": {"total": 1.0}}
+
+async def fake_answer_async(prompt, file_paths=None, mode=None, on_ambiguous="top"):
+    await asyncio.sleep(random.uniform(0, 0.01))
+    return fake_answer(prompt, file_paths, mode, on_ambiguous)
+
+def _write_queries(path, queries):
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in queries:
+            f.write(line + "\n")
+
+def _read_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def test_thread_and_async_batch():
+    """测试场景1：线程池与异步批处理，按输入顺序输出"""
+    print("\n" + "="*50)
+    print("测试场景1：批处理")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "queries.jsonl")
+        queries = [json.dumps({"id": f"q{i}", "query": f"问题{i}"}, ensure_ascii=False) for i in range(30)]
+        queries.append("纯文本问题")
+        _write_queries(input_file, queries)
+
+        for executor, answer_fn in [("thread", fake_answer), ("async", fake_answer_async)]:
+            output_file = os.path.join(tmp, f"{executor}.jsonl")
+            summary = run_batch(input_file, output_file, workers=4, executor=executor, ordered=True, answer_fn=answer_fn)
+            results = _read_results(output_file)
+            print(f"[测试] {executor}: {summary}")
+            assert summary["written"] == 31
+            assert [r["id"] for r in results] == [f"q{i}" for i in range(30)] + ["31"]
+            assert results[-1]["query"] == "纯文本问题"
+
+def test_resume_from_checkpoint():
+    """测试场景2：断点续跑只处理未完成和失败的查询"""
+    print("\n" + "="*50)
+    print("测试场景2：断点续跑")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "queries.jsonl")
+        _write_queries(input_file, [json.dumps({"id": i, "query": q}, ensure_ascii=False)
+                                    for i, q in enumerate(["甲", "乙", "失败", "丁"])])
+        output_file = os.path.join(tmp, "results.jsonl")
+        # 模拟上次运行完成了前两个查询，且最后一行写了一半
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"id": "0", "status": "ok"}) + "\n")
+            f.write(json.dumps({"id": "1", "status": "ok"}) + "\n")
+            f.write('{"id": "3", "sta')
+
+        assert load_checkpoint(output_file) == {"0", "1"}
+        summary = run_batch(input_file, output_file, workers=2, resume=True, answer_fn=fake_answer)
+        print(f"[测试] {summary}")
+        assert summary == {"written": 2, "skipped": 2}
+
+        records = {}
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["id"]] = record
+        assert records["2"]["status"] == "error"
+        assert records["3"]["answer"] == "答案:丁"
+
+def main():
+    """运行所有测试"""
+    print("开始批处理测试...")
+
+    test_thread_and_async_batch()
+    test_resume_from_checkpoint()
+
+    print("\n批处理测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import json
+from benchmarks.compare import compare_results
+from benchmarks.fake_llm import FakeChatModel, default_responder
+from benchmarks.run import fake_llm, run_benchmarks
+from handlers.combined import handle_combined_analysis
+from handlers.instruction_0 import handle_instruction_0
+
+def test_fake_llm_is_deterministic():
+    """测试场景1：假模型按调用方返回固定格式的输出"""
+    print("\n" + "="*50)
+    print("测试场景1：确定性假模型")
+    print("="*50)
+
+    with fake_llm(latency=0.0) as llm:
+        assert isinstance(llm, FakeChatModel)
+        analysis = handle_combined_analysis("说说土壤含水那些事", "")
+        print(f"[测试] 合并分析: {analysis}")
+        assert analysis["task_id"] == 1 and analysis["is_ambiguous"] and "土壤湿度" in analysis["suggestions"]
+        assert handle_combined_analysis("说说土壤含水那些事", "") == analysis
+        assert llm.calls == 2
+        assert handle_instruction_0("帮我写个作文", "") == -1
+
+    output = default_responder("你是一个智能任务分类助手。", "用户请求：\n帮我用这些参数模拟一下场景\n\n")
+    assert output.splitlines()[-1] == "2"
+    clarification = json.loads(default_responder("澄清", "用户当前输入: 'RSHub使用'\n\n历史澄清上下文:\n无"))
+    assert clarification["corrected_term"] == "RSHub" and not clarification["is_ambiguous"]
+
+def test_compare_flags_regressions():
+    """测试场景2：比较模式按阈值标记回退与提升"""
+    print("\n" + "="*50)
+    print("测试场景2：结果比较")
+    print("="*50)
+
+    baseline = {"metrics": {
+        "a.p50_ms": {"value": 10.0, "unit": "ms", "better": "lower"},
+        "b.qps": {"value": 1000.0, "unit": "qps", "better": "higher"},
+        "c.p50_ms": {"value": 0.01, "unit": "ms", "better": "lower"},
+        "d.p50_ms": {"value": 5.0, "unit": "ms", "better": "lower"},
+    }}
+    current = {"metrics": {
+        "a.p50_ms": {"value": 12.0, "unit": "ms", "better": "lower"},
+        "b.qps": {"value": 850.0, "unit": "qps", "better": "higher"},
+        "c.p50_ms": {"value": 0.02, "unit": "ms", "better": "lower"},
+        "d.p50_ms": {"value": 4.0, "unit": "ms", "better": "lower"},
+        "e.new_metric": {"value": 1.0, "unit": "ms", "better": "lower"},
+    }}
+    rows = {row["metric"]: row for row in compare_results(baseline, current, threshold=0.1, min_delta=0.05)}
+    print(f"[测试] 比较结果: {rows}")
+    assert rows["a.p50_ms"]["regression"] and rows["b.qps"]["regression"]
+    assert not rows["c.p50_ms"]["regression"]
+    assert rows["d.p50_ms"]["improvement"] and not rows["d.p50_ms"]["regression"]
+    assert "e.new_metric" not in rows
+
+def test_quick_run():
+    """测试场景3：小规模运行处理流程与知识库基准"""
+    print("\n" + "="*50)
+    print("测试场景3：小规模基准")
+    print("="*50)
+
+    results = run_benchmarks(["pipeline", "knowledge_base"], repeat=1, llm_latency=0.0, kb_entries=60, kb_queries=9, modes=["combined"])
+    metrics = results["metrics"]
+    print(f"[测试] 共 {len(metrics)} 项指标")
+    for name in ("pipeline.combined.classify.p50_ms", "pipeline.combined.read_files.p95_ms",
+                 "pipeline.combined.process_user_query.p50_ms", "kb.store.qps", "kb.api.query.p95_ms", "kb.file.build_peak_kb",
+                 "term_index.suggest.p95_ms"):
+        assert name in metrics, name
+    assert 0 < metrics["pipeline.combined.llm_calls_per_query"]["value"] < 1
+    assert json.loads(json.dumps(results)) == results
+
+def main():
+    """运行所有测试"""
+    print("开始基准工具测试...")
+
+    test_fake_llm_is_deterministic()
+    test_compare_flags_regressions()
+    test_quick_run()
+
+    print("\n基准工具测试完成！")
+
+if __name__ == "__main__":
+    main()
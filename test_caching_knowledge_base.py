@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from utils.knowledge_base import (
+    CachingKnowledgeBase,
+    FileKnowledgeBase,
+    KnowledgeBase,
+    MockKnowledgeBase,
+    NOT_FOUND_MESSAGE,
+    API_UNAVAILABLE_MESSAGE,
+    get_knowledge_base_generation,
+    query_knowledge_base,
+    set_knowledge_base,
+)
+
+class CountingKnowledgeBase(KnowledgeBase):
+    """记录后端被访问次数的知识库"""
+
+    def __init__(self, inner: KnowledgeBase, fail: bool = False):
+        self.inner = inner
+        self.fail = fail
+        self.calls = 0
+
+    def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        self.calls += 1
+        if self.fail:
+            return API_UNAVAILABLE_MESSAGE
+        return self.inner.query(keywords_with_weights)
+
+def test_positive_and_negative_tiers():
+    """测试场景1：命中缓存与负缓存"""
+    print("\n" + "="*50)
+    print("测试场景1：两级缓存")
+    print("="*50)
+
+    backend = CountingKnowledgeBase(MockKnowledgeBase())
+    kb = CachingKnowledgeBase(backend, max_entries=2, negative_ttl_seconds=0.05)
+    for _ in range(5):
+        assert kb.query([("土壤湿度", 1.0)]).startswith("土壤湿度是")
+        assert kb.query([("今天星期几", 1.0)]) == NOT_FOUND_MESSAGE
+    print(f"[测试] 后端访问 {backend.calls} 次，统计: {kb.stats()}")
+    assert backend.calls == 2
+    assert kb.stats()["hits"] == 4 and kb.stats()["negative_hits"] == 4
+
+    # 负缓存过期后重新访问后端
+    time.sleep(0.06)
+    kb.query([("今天星期几", 1.0)])
+    assert backend.calls == 3
+
+    # 超过容量时淘汰最久未访问的条目
+    kb.query([("RSHub", 1.0)])
+    kb.query([("微波遥感", 1.0)])
+    assert kb.stats()["evictions"] == 1 and kb.stats()["size"] == 2
+
+    # 服务不可用的结果不缓存
+    failing = CountingKnowledgeBase(MockKnowledgeBase(), fail=True)
+    kb = CachingKnowledgeBase(failing)
+    kb.query([("RSHub", 1.0)])
+    kb.query([("RSHub", 1.0)])
+    assert failing.calls == 2
+
+def test_reload_invalidation():
+    """测试场景2：底层知识库重新加载时缓存失效"""
+    print("\n" + "="*50)
+    print("测试场景2：重新加载失效")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "kb.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"植被指数": "旧内容"}, f, ensure_ascii=False)
+        set_knowledge_base('file', file_path=path, cache={'negative_ttl_seconds': 60})
+        assert query_knowledge_base([("植被指数", 1.0)]) == "旧内容"
+        assert query_knowledge_base([("土壤湿度", 1.0)]) == NOT_FOUND_MESSAGE
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"植被指数": "新内容", "土壤湿度": "新增条目"}, f, ensure_ascii=False)
+        generation = get_knowledge_base_generation()
+        from utils import knowledge_base as kb_module
+        cache = kb_module._knowledge_base
+        assert isinstance(cache, CachingKnowledgeBase) and isinstance(cache.inner, FileKnowledgeBase)
+        cache.inner.reload()
+        print(f"[测试] 重新加载后统计: {cache.stats()}")
+        assert query_knowledge_base([("植被指数", 1.0)]) == "新内容"
+        assert query_knowledge_base([("土壤湿度", 1.0)]) == "新增条目"
+        assert get_knowledge_base_generation() == generation + 1
+        set_knowledge_base('mock')
+
+def test_thread_safety():
+    """测试场景3：多线程并发读写"""
+    print("\n" + "="*50)
+    print("测试场景3：并发访问")
+    print("="*50)
+
+    backend = CountingKnowledgeBase(MockKnowledgeBase())
+    kb = CachingKnowledgeBase(backend, max_entries=8)
+    terms = ["土壤湿度", "RSHub", "微波遥感", "地表粗糙度", "未知术语"]
+
+    def run(i: int) -> str:
+        return kb.query([(terms[i % len(terms)], 1.0)])
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(run, range(2000)))
+    stats = kb.stats()
+    print(f"[测试] 后端访问 {backend.calls} 次，统计: {stats}")
+    assert results[4] == NOT_FOUND_MESSAGE
+    assert stats["hits"] + stats["negative_hits"] + stats["misses"] == 2000
+    assert backend.calls < 100
+
+def main():
+    """运行所有测试"""
+    print("开始知识库缓存测试...")
+
+    test_positive_and_negative_tiers()
+    test_reload_invalidation()
+    test_thread_safety()
+
+    print("\n知识库缓存测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import json
+import os
+import tempfile
+from unittest import mock
+from core.config import set_llm_provider
+from benchmarks.fake_llm import FakeChatModel
+import agent
+from agent import process_user_query
+from handlers.combined import handle_combined_analysis
+
+AMBIGUOUS_PROMPT = "说说土壤含水那些事"  # 本地无法确定，需要调用LLM
+
+class ScriptedLLM:
+    """按调用方返回固定输出的假模型，记录每次调用的是哪一种分析"""
+
+    def __init__(self, combined=None, classify="1", clarify=None):
+        self.combined = combined
+        self.classify = classify
+        self.clarify = clarify
+        self.calls = []
+
+    def __call__(self, system_prompt, user_message):
+        if "两项分析" in system_prompt:
+            self.calls.append("combined")
+            return self.combined if isinstance(self.combined, str) else json.dumps(self.combined, ensure_ascii=False)
+        if "任务分类助手" in system_prompt:
+            self.calls.append("classify")
+            return self.classify
+        self.calls.append("clarify")
+        return json.dumps(self.clarify, ensure_ascii=False)
+
+    def install(self):
+        set_llm_provider(lambda: FakeChatModel(latency=0, responder=self))
+
+def _analysis(task_id, is_ambiguous=False, original_term=None, corrected_term=None, suggestions=None):
+    return {"task_id": task_id, "is_ambiguous": is_ambiguous, "original_term": original_term,
+            "corrected_term": corrected_term, "suggestions": suggestions}
+
+def _run_combined(llm, choice="1"):
+    """运行合并流程，返回 (结果代码, result, 写入的文件内容, 提示用户选择的次数)"""
+    inputs = []
+    llm.install()
+    try:
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("builtins.input", lambda prompt: inputs.append(prompt) or choice):
+            output_path = os.path.join(tmp, "out.txt")
+            result = {}
+            code = agent._process_user_query_combined(AMBIGUOUS_PROMPT, None, output_path, result)
+            text = None
+            if os.path.exists(output_path):
+                with open(output_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+    finally:
+        set_llm_provider(None)
+    print(f"[测试] 代码 {code}，LLM 调用 {llm.calls}，选择 {len(inputs)} 次，结果 {result}")
+    return code, result, text, len(inputs)
+
+def test_resolved():
+    """测试场景1：合并分析直接给出标准术语，不再调用澄清，直接查询知识库"""
+    print("\n" + "="*50)
+    print("测试场景1：术语明确")
+    print("="*50)
+
+    llm = ScriptedLLM(combined=_analysis(1, original_term="土壤含水", corrected_term="土壤湿度"))
+    llm.install()
+    try:
+        analysis = handle_combined_analysis(AMBIGUOUS_PROMPT, "")
+    finally:
+        set_llm_provider(None)
+    assert analysis == _analysis(1, original_term="土壤含水", corrected_term="土壤湿度")
+
+    llm = ScriptedLLM(combined=_analysis(1, original_term="土壤含水", corrected_term="土壤湿度"))
+    code, result, text, asked = _run_combined(llm)
+    assert code == 0 and asked == 0 and llm.calls == ["combined"]
+    assert result["term"] == "土壤湿度" and not result["clarified_by_user"]
+    assert text == result["answer"] and "土壤湿度" in text
+
+def test_ambiguous():
+    """测试场景2：合并分析给出建议，用户选择后查询所选术语"""
+    print("\n" + "="*50)
+    print("测试场景2：术语模糊，请用户选择")
+    print("="*50)
+
+    llm = ScriptedLLM(combined=_analysis(1, True, "土壤含水", suggestions=["土壤湿度", "RSHub"]))
+    code, result, text, asked = _run_combined(llm, choice="2")
+    assert code == 0 and asked == 1 and llm.calls == ["combined"]
+    assert result["term"] == "RSHub" and result["clarified_by_user"]
+    assert text == result["answer"]
+
+    # 用户放弃选择：没有结果，也不写文件
+    llm = ScriptedLLM(combined=_analysis(1, True, "土壤含水", suggestions=["土壤湿度", "RSHub"]))
+    code, result, text, asked = _run_combined(llm, choice="退出")
+    assert code == -1 and asked == 1 and text is None and result.get("answer") is None
+
+def test_off_domain():
+    """测试场景3：合并分析判定为无关查询时直接拒绝"""
+    print("\n" + "="*50)
+    print("测试场景3：无关查询")
+    print("="*50)
+
+    llm = ScriptedLLM(combined=_analysis(-1))
+    code, result, text, asked = _run_combined(llm)
+    assert code == -1 and asked == 0 and text is None and result == {}
+    assert llm.calls == ["combined"]
+
+def test_malformed_output():
+    """测试场景4：模型输出不是合法JSON时按无关查询处理；缺少可用术语时回到澄清流程"""
+    print("\n" + "="*50)
+    print("测试场景4：模型输出异常")
+    print("="*50)
+
+    llm = ScriptedLLM(combined="好的，这个问题是关于土壤湿度的。")
+    llm.install()
+    try:
+        analysis = handle_combined_analysis(AMBIGUOUS_PROMPT, "")
+    finally:
+        set_llm_provider(None)
+    assert analysis == _analysis(-1)
+
+    llm = ScriptedLLM(combined="好的，这个问题是关于土壤湿度的。")
+    code, result, text, asked = _run_combined(llm)
+    assert code == -1 and asked == 0 and text is None and llm.calls == ["combined"]
+
+    # 输出被截断（只解析出 task_id）或没有给出术语：由澄清流程重新识别
+    llm = ScriptedLLM(combined="{\"task_id\": 1, \"is_ambiguous\": ",
+                      clarify={"is_ambiguous": False, "original_term": "土壤含水", "corrected_term": "土壤湿度", "suggestions": None})
+    code, result, text, asked = _run_combined(llm)
+    assert code == 0 and result["term"] == "土壤湿度" and llm.calls[0] == "combined"
+
+    llm = ScriptedLLM(combined=_analysis(1, True, "土壤含水"),
+                      clarify={"is_ambiguous": False, "original_term": "土壤含水", "corrected_term": "土壤湿度", "suggestions": None})
+    code, result, text, asked = _run_combined(llm)
+    assert code == 0 and result["term"] == "土壤湿度" and llm.calls[0] == "combined"
+
+def test_two_step_mode():
+    """测试场景5：two_step 模式仍然经由意图分类与澄清处理器，不调用合并分析"""
+    print("\n" + "="*50)
+    print("测试场景5：两步模式")
+    print("="*50)
+
+    llm = ScriptedLLM(combined=_analysis(-1), classify="-2",
+                      clarify={"is_ambiguous": False, "original_term": "土壤含水", "corrected_term": "土壤湿度", "suggestions": None})
+    llm.install()
+    try:
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(agent, "handle_combined_analysis", side_effect=AssertionError("不应调用合并分析")), \
+                mock.patch("builtins.input", lambda prompt: "1"):
+            output_path = os.path.join(tmp, "out.txt")
+            result = {}
+            code = process_user_query(AMBIGUOUS_PROMPT, output_path=output_path, mode="two_step", result=result)
+            assert os.path.exists(output_path)
+    finally:
+        set_llm_provider(None)
+    print(f"[测试] 代码 {code}，LLM 调用 {llm.calls}，结果 {result}")
+    assert code == 0 and result["term"] == "土壤湿度"
+    assert llm.calls[0] == "classify" and "combined" not in llm.calls
+
+    # 意图分类判定为无关查询时不进入知识问答
+    llm = ScriptedLLM(classify="-1")
+    llm.install()
+    try:
+        with mock.patch.object(agent, "handle_instruction_1_interactive", side_effect=AssertionError("不应进入知识问答")):
+            assert process_user_query(AMBIGUOUS_PROMPT, mode="two_step") == -1
+    finally:
+        set_llm_provider(None)
+    assert llm.calls == ["classify"]
+
+def main():
+    """运行所有测试"""
+    print("开始合并分析流程测试...")
+
+    test_resolved()
+    test_ambiguous()
+    test_off_domain()
+    test_malformed_output()
+    test_two_step_mode()
+
+    print("\n合并分析流程测试完成！")
+
+if __name__ == "__main__":
+    main()
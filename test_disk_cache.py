@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from utils.disk_cache import SQLiteCache
+
+def _write_entries(path: str, worker: int, count: int) -> int:
+    """子进程：并发写入并回读缓存"""
+    cache = SQLiteCache(path)
+    for i in range(count):
+        cache.set(f"w{worker}-{i}", f"value-{worker}-{i}")
+        assert cache.get(f"w{worker}-{i}") == f"value-{worker}-{i}"
+    return count
+
+def test_hit_miss_and_stats():
+    """测试场景1：命中、未命中与统计"""
+    print("\n" + "="*50)
+    print("测试场景1：命中与统计")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SQLiteCache(os.path.join(tmp, "cache.sqlite3"))
+        assert cache.get("prompt-a") is None
+        cache.set("prompt-a", "答案A")
+        assert cache.get("prompt-a") == "答案A"
+
+        # 新实例（模拟新的CLI进程）可以读到之前写入的数据
+        reopened = SQLiteCache(os.path.join(tmp, "cache.sqlite3"))
+        assert reopened.get("prompt-a") == "答案A"
+
+        stats = cache.stats()
+        print(f"[测试] 统计: {stats}")
+        assert stats["hits"] == 1 and stats["misses"] == 1 and stats["writes"] == 1
+        cache.close()
+        reopened.close()
+
+def test_ttl_and_lru_eviction():
+    """测试场景2：TTL过期与LRU淘汰"""
+    print("\n" + "="*50)
+    print("测试场景2：TTL与LRU")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SQLiteCache(os.path.join(tmp, "ttl.sqlite3"), ttl_seconds=0.05)
+        cache.set("k", "v")
+        time.sleep(0.1)
+        assert cache.get("k") is None
+        assert cache.stats()["expired"] == 1
+        cache.close()
+
+        cache = SQLiteCache(os.path.join(tmp, "lru.sqlite3"), max_entries=3)
+        for key in ["a", "b", "c"]:
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get("a")  # a 成为最近访问
+        cache.set("d", "d")
+        print(f"[测试] 条目数: {len(cache)}，统计: {cache.stats()}")
+        assert len(cache) == 3
+        assert cache.get("b") is None
+        assert cache.get("a") == "a"
+        assert cache.stats()["evictions"] == 1
+        cache.close()
+
+        cache = SQLiteCache(os.path.join(tmp, "bytes.sqlite3"), max_bytes=10)
+        cache.set("x", "12345")
+        time.sleep(0.01)
+        cache.set("y", "1234567")
+        assert cache.get("x") is None
+        assert cache.get("y") == "1234567"
+        cache.close()
+
+        # 同时限制条目数与字节数：按条目数淘汰后已不超过字节上限时，不再多淘汰
+        cache = SQLiteCache(os.path.join(tmp, "both.sqlite3"), max_entries=2, max_bytes=10)
+        for key, value in [("a", "12345678"), ("b", "1"), ("c", "12")]:
+            cache.set(key, value)
+            time.sleep(0.01)
+        print(f"[测试] 条目数: {len(cache)}，统计: {cache.stats()}")
+        assert cache.get("a") is None
+        assert cache.get("b") == "1" and cache.get("c") == "12"
+        assert cache.stats()["evictions"] == 1
+        cache.close()
+
+def test_concurrent_processes():
+    """测试场景3：多进程并发读写同一缓存文件"""
+    print("\n" + "="*50)
+    print("测试场景3：多进程并发")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared.sqlite3")
+        SQLiteCache(path).close()
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            written = sum(pool.map(_write_entries, [path] * 4, range(4), [50] * 4))
+        cache = SQLiteCache(path)
+        print(f"[测试] 写入 {written} 条，缓存中 {len(cache)} 条")
+        assert len(cache) == written
+        cache.close()
+
+def main():
+    """运行所有测试"""
+    print("开始持久化缓存测试...")
+
+    test_hit_miss_and_stats()
+    test_ttl_and_lru_eviction()
+    test_concurrent_processes()
+
+    print("\n持久化缓存测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import itertools
+import threading
+import time
+from typing import List, Tuple
+from utils.knowledge_base import (
+    FederatedBackend,
+    FederatedKnowledgeBase,
+    KnowledgeBase,
+    MockKnowledgeBase,
+    NOT_FOUND_MESSAGE,
+    query_knowledge_base,
+    set_knowledge_base,
+)
+
+class SlowKnowledgeBase(KnowledgeBase):
+    """包装一个知识库，按调用次序注入延迟或异常"""
+
+    def __init__(self, inner: KnowledgeBase, delays: List[float], fail: bool = False):
+        self.inner = inner
+        self.delays = itertools.cycle(delays)
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: int = 3):
+        with self.lock:
+            self.calls += 1
+            delay = next(self.delays)
+        time.sleep(delay)
+        if self.fail:
+            raise ConnectionError("后端不可用")
+        return self.inner.search(keywords_with_weights, top_k)
+
+    def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        hits = self.search(keywords_with_weights)
+        return hits[0].text if hits else NOT_FOUND_MESSAGE
+
+SOIL = MockKnowledgeBase({"土壤湿度": "本地：土壤湿度影响后向散射。"})
+REMOTE = MockKnowledgeBase({"土壤湿度": "远程：土壤湿度越高回波越强。", "植被指数": "远程：植被指数反映植被覆盖。"})
+
+def test_merge_by_weighted_score():
+    """测试场景1：并行查询并按加权得分合并"""
+    print("\n" + "="*50)
+    print("测试场景1：加权合并")
+    print("="*50)
+
+    kb = FederatedKnowledgeBase([
+        FederatedBackend(SOIL, weight=1.0, name="local"),
+        FederatedBackend(REMOTE, weight=0.8, name="remote"),
+    ], confident_score=1.1, hedge_after=None)
+    hits = kb.search([("植被指数", 0.5), ("土壤湿度", 1.0)], top_k=3)
+    print(f"[测试] 合并结果: {[(h.key, round(h.score, 3)) for h in hits]}")
+    # 同名条目保留加权得分更高的后端结果
+    assert [h.text for h in hits] == ["本地：土壤湿度影响后向散射。"]
+    assert set(kb.keys()) == {"土壤湿度", "植被指数"}
+
+def test_early_return_and_deadline():
+    """测试场景2：高置信命中立即返回，慢后端受全局超时限制"""
+    print("\n" + "="*50)
+    print("测试场景2：提前返回与超时")
+    print("="*50)
+
+    kb = FederatedKnowledgeBase([
+        FederatedBackend(SlowKnowledgeBase(SOIL, [0.01]), name="fast"),
+        FederatedBackend(SlowKnowledgeBase(REMOTE, [1.0]), hedge=False, name="slow"),
+    ], deadline=0.5)
+    start = time.perf_counter()
+    hits = kb.search([("土壤湿度", 1.0)])
+    elapsed = time.perf_counter() - start
+    print(f"[测试] 高置信命中耗时 {elapsed * 1000:.0f}ms: {[h.key for h in hits]}")
+    assert elapsed < 0.3 and hits[0].text.startswith("本地")
+
+    start = time.perf_counter()
+    hits = kb.search([("植被指数", 1.0)])
+    elapsed = time.perf_counter() - start
+    print(f"[测试] 只有慢后端能命中时耗时 {elapsed * 1000:.0f}ms: {hits}")
+    assert 0.45 < elapsed < 0.8 and hits == []
+    print(f"[测试] 统计: {kb.stats()}")
+    assert kb.stats()["early_returns"] == 1 and kb.stats()["deadline_exceeded"] == 1
+
+def test_hedging_and_errors():
+    """测试场景3：对冲请求与后端异常"""
+    print("\n" + "="*50)
+    print("测试场景3：对冲请求")
+    print("="*50)
+
+    # 第一次请求很慢，对冲请求很快返回
+    tail = SlowKnowledgeBase(REMOTE, [1.0, 0.01])
+    kb = FederatedKnowledgeBase([
+        FederatedBackend(tail, name="tail"),
+        FederatedBackend(SlowKnowledgeBase(SOIL, [0.0], fail=True), name="broken"),
+    ], deadline=2.0, hedge_after=0.1)
+    start = time.perf_counter()
+    hits = kb.search([("植被指数", 1.0)])
+    elapsed = time.perf_counter() - start
+    print(f"[测试] 对冲后耗时 {elapsed * 1000:.0f}ms: {[h.key for h in hits]}，统计: {kb.stats()}")
+    assert hits[0].key == "植被指数" and elapsed < 0.5
+    assert tail.calls == 2 and kb.stats()["hedge_wins"] == 1 and kb.stats()["errors"] == 1
+
+    # 通过工厂与全局查询函数使用
+    set_knowledge_base('federated', backends=[
+        {'type': 'mock', 'knowledge_data': {"RSHub": "RSHub平台"}},
+        {'type': 'mock', 'weight': 0.5},
+    ])
+    assert query_knowledge_base([("RSHub", 1.0)]) == "RSHub平台"
+    set_knowledge_base('mock')
+
+def main():
+    """运行所有测试"""
+    print("开始联合知识库测试...")
+
+    test_merge_by_weighted_score()
+    test_early_return_and_deadline()
+    test_hedging_and_errors()
+
+    print("\n联合知识库测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+from unittest import mock
+from utils import file_handler
+from utils.file_handler import estimate_tokens, read_file_digests, read_files_to_string
+
+def _write(path: str, data) -> str:
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    with open(path, mode, **({} if isinstance(data, bytes) else {'encoding': 'utf-8'})) as f:
+        f.write(data)
+    return path
+
+def test_small_binary_and_missing():
+    """测试场景1：小文件原样读取，二进制文件与不存在的文件快速跳过"""
+    print("\n" + "="*50)
+    print("测试场景1：小文件与非文本文件")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text = _write(os.path.join(tmp, "notes.txt"), "土壤湿度观测记录\n第二行")
+        gbk = _write(os.path.join(tmp, "gbk.csv"), "站点,植被指数\n".encode("gb18030"))
+        blob = _write(os.path.join(tmp, "data.dat"), b"\x00\x01\x02" * 100)
+        image = _write(os.path.join(tmp, "scene.png"), b"not really a png")
+        missing = os.path.join(tmp, "missing.txt")
+
+        content = read_files_to_string([text, gbk, blob, image, missing])
+        print(content)
+        assert "--- 文件: notes.txt ---\n土壤湿度观测记录\n第二行" in content
+        assert "站点,植被指数" in content
+        assert "已跳过非文本文件: data.dat" in content and "已跳过非文本文件: scene.png" in content
+        assert "无法读取文件: missing.txt" in content
+        assert [d.kind for d in read_file_digests([text, blob, missing])] == ["text", "binary", "error"]
+        assert read_files_to_string(None) == ""
+
+def test_budget_and_relevant_chunks():
+    """测试场景2：大文件按 token 预算截取，有查询时保留最相关的片段"""
+    print("\n" + "="*50)
+    print("测试场景2：token 预算与相关片段")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lines = [f"第{i}行 常规观测数据，风速与气温正常。" for i in range(5000)]
+        lines[3000] = "第3000行 雷达回波强度在降雨期间明显增强，后向散射系数升高。"
+        path = _write(os.path.join(tmp, "log.txt"), "\n".join(lines))
+
+        content = read_files_to_string([path], max_tokens=500)
+        print(f"[测试] 无查询：{estimate_tokens(content)} tokens，原文 {estimate_tokens(chr(10).join(lines))} tokens")
+        assert estimate_tokens(content) <= 600
+        assert "第0行" in content and "第4999行" in content and "省略" in content
+
+        content = read_files_to_string([path], max_tokens=500, query="雷达回波强度为什么增强")
+        assert "第0行" in content and "雷达回波强度在降雨期间明显增强" in content
+        assert content.index("第0行") < content.index("第3000行")
+
+        # 预算按文件平均分配
+        other = _write(os.path.join(tmp, "other.txt"), "\n".join(lines))
+        digests = read_file_digests([path, other], max_tokens=500)
+        assert all(d.truncated for d in digests)
+        assert sum(estimate_tokens(d.excerpt) for d in digests) <= 650
+
+def test_byte_cap_with_mmap():
+    """测试场景3：超过读取上限的文件只读取首尾（mmap）"""
+    print("\n" + "="*50)
+    print("测试场景3：读取上限")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("开头：微波遥感数据\n")
+            f.write("中间数据行，填充内容。\n" * 200000)
+            f.write("结尾：数据结束\n")
+        size = os.path.getsize(path)
+        digest = read_file_digests([path], max_tokens=10 ** 6, max_bytes=64 * 1024)[0]
+        print(f"[测试] 文件 {size} 字节，摘录 {len(digest.excerpt)} 字符")
+        assert digest.truncated and digest.excerpt.count("省略") == 1
+        assert "开头：微波遥感数据" in digest.excerpt and "结尾：数据结束" in digest.excerpt
+        assert len(digest.excerpt.encode("utf-8")) < 70 * 1024
+        assert "�" not in digest.excerpt
+
+def test_memoized():
+    """测试场景4：同一文件未修改时复用读取结果，修改后重新读取"""
+    print("\n" + "="*50)
+    print("测试场景4：读取结果缓存")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write(os.path.join(tmp, "notes.txt"), "旧内容")
+        assert "旧内容" in read_files_to_string([path])
+        with mock.patch.object(file_handler, "_read_sample", side_effect=AssertionError("重复读取")):
+            assert "旧内容" in read_files_to_string([path])
+
+        time.sleep(0.01)
+        _write(path, "新内容，长度不同")
+        assert "新内容" in read_files_to_string([path])
+
+def main():
+    """运行所有测试"""
+    print("开始文件读取测试...")
+
+    test_small_binary_and_missing()
+    test_budget_and_relevant_chunks()
+    test_byte_cap_with_mmap()
+    test_memoized()
+
+    print("\n文件读取测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from utils.intent_classifier import LocalIntentClassifier
+
+KNOWN_TERMS = ["土壤湿度", "RSHub", "微波遥感", "地表粗糙度", "植被指数", "后向散射系数"]
+
+def test_known_term_bypasses_llm():
+    """测试场景1：包含已知术语的查询直接识别为任务1"""
+    print("\n" + "="*50)
+    print("测试场景1：已知术语命中")
+    print("="*50)
+
+    classifier = LocalIntentClassifier(KNOWN_TERMS)
+    for query in ["什么是土壤湿度？", "rshub 怎么用", "RS Hub是什么"]:
+        result = classifier.classify(query)
+        print(f"[测试] {query} -> {result}")
+        assert result == 1
+
+    # 近似命中（错别字、漏字）同样识别为任务1
+    for query in ["土地湿度是什么？", "后向散射系是什么", "植被指标怎么算"]:
+        result = classifier.predict(query)
+        print(f"[测试] {query} -> {result}")
+        assert classifier.classify(query) == 1 and result.reason.startswith("term_near:")
+    assert classifier.predict("土地湿度是什么？").reason == "term_near:土壤湿度"
+    assert LocalIntentClassifier(KNOWN_TERMS, similarity_threshold=0.8).classify("土地湿度是什么？") is None
+
+def test_off_domain_rejected():
+    """测试场景2：明显无关的查询直接拒绝"""
+    print("\n" + "="*50)
+    print("测试场景2：无关查询")
+    print("="*50)
+
+    classifier = LocalIntentClassifier(KNOWN_TERMS)
+    for query in ["今天星期几？", "帮我写个作文"]:
+        result = classifier.classify(query)
+        print(f"[测试] {query} -> {result}")
+        assert result == -1
+
+def test_low_confidence_deferred():
+    """测试场景3：模糊或涉及任务2/3的查询交给LLM"""
+    print("\n" + "="*50)
+    print("测试场景3：低置信度查询")
+    print("="*50)
+
+    classifier = LocalIntentClassifier(KNOWN_TERMS)
+    queries = [
+        ("说说土壤含水那些事", ""),
+        ("帮我用这些参数模拟一下土壤湿度", ""),
+        ("帮我用这些参数模拟一下土地湿度", ""),
+        ("看看这个数据对应的土壤湿度", ""),
+        ("土壤湿度", "--- 文件: data.csv ---\n0.1,0.2"),
+        ("NDVI怎么计算", ""),
+    ]
+    for query, file_content in queries:
+        result = classifier.classify(query, file_content)
+        print(f"[测试] {query} -> {result}")
+        assert result is None
+
+    # 没有使用领域提示词的领域问题不能在本地拒绝，必须交给LLM
+    for query in ["什么是亮温", "什么是合成孔径", "蒸散发怎么计算", "什么是Sentinel-1", "土地利用分类",
+                  "讲讲地面的起伏程度", "天气预报对雷达有影响吗"]:
+        result = classifier.predict(query)
+        print(f"[测试] {query} -> {result}")
+        assert result.task_id == 0 and classifier.classify(query) is None
+
+def test_thresholds_and_stats():
+    """测试场景4：阈值配置与统计计数"""
+    print("\n" + "="*50)
+    print("测试场景4：阈值与统计")
+    print("="*50)
+
+    strict = LocalIntentClassifier(KNOWN_TERMS, accept_threshold=1.1, reject_threshold=1.1)
+    assert strict.classify("什么是土壤湿度？") is None
+    assert strict.classify("今天星期几？") is None
+    exact_only = LocalIntentClassifier(KNOWN_TERMS, accept_threshold=0.95)
+    assert exact_only.classify("什么是土壤湿度？") == 1 and exact_only.classify("土地湿度是什么？") is None
+
+    classifier = LocalIntentClassifier(KNOWN_TERMS)
+    classifier.classify("什么是土壤湿度？")
+    classifier.classify("今天星期几？")
+    classifier.classify("说说土壤含水那些事")
+    stats = classifier.stats()
+    print(f"[测试] 统计: {stats}")
+    assert stats["total"] == 3
+    assert stats["bypassed"] == 2
+    assert abs(stats["bypass_rate"] - 2 / 3) < 1e-9
+
+def main():
+    """运行所有测试"""
+    print("开始本地意图预分类测试...")
+
+    test_known_term_bypasses_llm()
+    test_off_domain_rejected()
+    test_low_confidence_deferred()
+    test_thresholds_and_stats()
+
+    print("\n本地意图预分类测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是向量知识库的可选依赖
+    np = None
+
+from utils.knowledge_base import NOT_FOUND_MESSAGE, query_knowledge_base, set_knowledge_base
+
+def _write(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def _make_corpus(source: str) -> None:
+    _write(os.path.join(source, "土壤.md"),
+           "# 土壤湿度\n土壤湿度是影响微波后向散射系数的关键地表参数之一。\n\n"
+           "## 时域反射法\n时域反射仪（ＴＤＲ）通过电磁波传播时间测量土壤含水量。\n")
+    _write(os.path.join(source, "平台.json"),
+           json.dumps({"RSHub": "RSHub是一个集成了多种微波遥感模型的平台。"}, ensure_ascii=False))
+    _write(os.path.join(source, "sub", "粗糙度.jsonl"),
+           json.dumps({"key": "地表粗糙度", "text": "地表粗糙度描述了地表面的起伏状况。"}, ensure_ascii=False) + "\n")
+    _write(os.path.join(source, "微波遥感.txt"), "微波遥感利用微波波段的电磁波探测地表信息，能够穿透云雾。")
+
+def test_chunking():
+    """测试场景1：源文档的切分与规范化"""
+    print("\n" + "="*50)
+    print("测试场景1：切分与规范化")
+    print("="*50)
+    if np is None:
+        print("[跳过] 未安装 numpy")
+        return
+
+    from utils.kb_builder import chunk_entries, chunk_text, normalize_passage
+
+    assert normalize_passage("  ＴＤＲ   测量\r\n\r\n\r\n 含水量  ") == "TDR 测量\n\n含水量"
+    paragraph = "。".join(f"第{i}句关于后向散射系数的说明" for i in range(60)) + "。"
+    chunks = chunk_text(paragraph + "\n\n短段落。", max_chars=200)
+    print(f"[测试] {len(paragraph)} 字符切分为 {len(chunks)} 个片段: {[len(c) for c in chunks]}")
+    assert len(chunks) > 1 and all(len(chunk) <= 200 for chunk in chunks)
+    assert chunks[0].startswith("第0句") and chunks[-1].endswith("短段落。")
+    assert chunk_text("   ") == [] and chunk_text("短文本", max_chars=200) == ["短文本"]
+    assert chunk_entries([(" 术语 ", "正文"), ("", "无名称"), ("空", "")]) == [("术语", "正文")]
+
+def test_build_and_query():
+    """测试场景2：用进程池由源文档目录构建索引，向量知识库直接加载"""
+    print("\n" + "="*50)
+    print("测试场景2：构建与查询")
+    print("="*50)
+    if np is None:
+        print("[跳过] 未安装 numpy")
+        return
+
+    from utils.kb_builder import build_knowledge_base
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "knowledge_base")
+        index_path = os.path.join(source, "index")
+        _make_corpus(source)
+        _write(os.path.join(source, ".hidden.txt"), "不应被收录")
+        _write(os.path.join(source, "坏文件.json"), "{不是 JSON")
+
+        stats = build_knowledge_base(source, index_path, cache_dir=os.path.join(tmp, "cache"), workers=2)
+        print(f"[测试] 构建统计: {stats}")
+        assert stats["files"] == 5 and stats["processed"] == 4 and stats["failed"] == 1
+        assert stats["chunks"] == 5 and stats["updated"]
+
+        try:
+            set_knowledge_base('vector', index_path=index_path)
+            result = query_knowledge_base([("时域反射法", 1.0)])
+            assert "TDR" in result
+            assert "平台" in query_knowledge_base([("RSHub", 1.0)])
+            assert query_knowledge_base([("今天星期几", 1.0)]) == NOT_FOUND_MESSAGE
+        finally:
+            set_knowledge_base('mock')
+
+def test_incremental_rebuild():
+    """测试场景3：只重新处理内容变化的文件"""
+    print("\n" + "="*50)
+    print("测试场景3：增量构建")
+    print("="*50)
+    if np is None:
+        print("[跳过] 未安装 numpy")
+        return
+
+    from utils.kb_builder import build_knowledge_base
+    from utils.vector_index import VectorIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "src")
+        index_path = os.path.join(tmp, "index")
+        cache_dir = os.path.join(tmp, "cache")
+        _make_corpus(source)
+        filler = "".join(f"第{i}条观测记录：后向散射系数与入射角、极化方式及地表参数有关。\n\n" for i in range(400))
+        for i in range(12):
+            _write(os.path.join(source, "docs", f"doc{i:02d}.txt"), f"文档{i}。\n\n" + filler)
+        build = lambda **kwargs: build_knowledge_base(source, index_path, cache_dir=cache_dir, workers=4, **kwargs)
+
+        full = build()
+        embeddings_mtime = os.stat(os.path.join(index_path, "embeddings.npy")).st_mtime_ns
+        assert full["processed"] == 16
+
+        # 没有变化：不读取源文件，也不重写索引
+        unchanged = build()
+        print(f"[测试] 全量: {full['seconds']:.3f}s，无变化: {unchanged['seconds']:.3f}s")
+        assert unchanged["processed"] == 0 and unchanged["reused"] == 16 and not unchanged["updated"]
+        assert os.stat(os.path.join(index_path, "embeddings.npy")).st_mtime_ns == embeddings_mtime
+
+        # 只修改了时间：按内容哈希复用，清单记录新的修改时间
+        os.utime(os.path.join(source, "平台.json"), ns=(0, 10**18))
+        touched = build()
+        assert touched["processed"] == 0 and not touched["updated"]
+        assert VectorIndex.read_meta(index_path)["build"]["files"]["平台.json"]["mtime_ns"] == 10**18
+
+        # 修改一个、新增一个、删除一个
+        _write(os.path.join(source, "docs", "doc03.txt"), "文档3。\n\n植被指数反映植被覆盖状况。")
+        _write(os.path.join(source, "新术语.txt"), "极化分解把散射过程分解为面散射、二次散射与体散射。")
+        os.remove(os.path.join(source, "微波遥感.txt"))
+        incremental = build()
+        print(f"[测试] 增量: {incremental}")
+        assert incremental["processed"] == 2 and incremental["reused"] == 14 and incremental["removed"] == 1
+        assert incremental["updated"] and incremental["seconds"] < full["seconds"]
+        assert len(os.listdir(cache_dir)) == 2 * 16  # 不再使用的结果已清理
+
+        try:
+            set_knowledge_base('vector', index_path=index_path)
+            assert "体散射" in query_knowledge_base([("新术语", 1.0)])
+            assert "植被指数" in query_knowledge_base([("doc03", 1.0)])
+            assert "穿透云雾" not in query_knowledge_base([("微波遥感", 1.0)])
+        finally:
+            set_knowledge_base('mock')
+
+        # 切分参数变化时全部重新处理
+        assert build(max_chars=300)["processed"] == 16
+        assert build(rebuild=True, max_chars=300)["processed"] == 16
+
+def test_missing_source_keeps_index():
+    """测试场景4：源目录不存在或为空时报错，已有的索引与缓存保持不变"""
+    print("\n" + "="*50)
+    print("测试场景4：源目录错误")
+    print("="*50)
+    if np is None:
+        print("[跳过] 未安装 numpy")
+        return
+
+    from utils.kb_builder import build_knowledge_base
+    from utils.vector_index import VectorIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "src")
+        index_path = os.path.join(tmp, "index")
+        cache_dir = os.path.join(tmp, "cache")
+        _make_corpus(source)
+        assert build_knowledge_base(source, index_path, cache_dir=cache_dir, workers=1)["chunks"] == 5
+        cached = sorted(os.listdir(cache_dir))
+
+        try:
+            build_knowledge_base(os.path.join(tmp, "srcc_typo"), index_path, cache_dir=cache_dir, workers=1)
+            assert False, "源目录不存在时应报错"
+        except FileNotFoundError as e:
+            print(f"[测试] 源目录不存在: {e}")
+
+        empty = os.path.join(tmp, "empty")
+        os.makedirs(empty)
+        try:
+            build_knowledge_base(empty, index_path, cache_dir=cache_dir, workers=1)
+            assert False, "不应用空索引替换已有索引"
+        except ValueError as e:
+            print(f"[测试] 空源目录: {e}")
+        assert VectorIndex.read_meta(index_path)["count"] == 5 and sorted(os.listdir(cache_dir)) == cached
+
+        result = subprocess.run(
+            [sys.executable, "build_kb.py", "--source", os.path.join(tmp, "srcc_typo"),
+             "--index", index_path, "--cache-dir", cache_dir],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+        )
+        assert result.returncode == 1 and "源文档目录不存在" in result.stdout
+        assert sorted(os.listdir(cache_dir)) == cached
+
+        # 明确要求重建时允许清空
+        stats = build_knowledge_base(empty, index_path, cache_dir=cache_dir, workers=1, rebuild=True)
+        assert stats["chunks"] == 0 and VectorIndex.read_meta(index_path)["count"] == 0
+
+def main():
+    """运行所有测试"""
+    print("开始知识库离线构建测试...")
+
+    test_chunking()
+    test_build_and_query()
+    test_incremental_rebuild()
+    test_missing_source_keeps_index()
+
+    print("\n知识库离线构建测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import os
 import json
+import asyncio
 from utils.knowledge_base import (
     query_knowledge_base,
+    query_knowledge_base_async,
     set_knowledge_base,
     MockKnowledgeBase,
     FileKnowledgeBase
@@ -73,6 +75,23 @@ def test_error_handling():
     result = query_knowledge_base([])
     print(f"查询结果: {result}")
 
+def test_async_query():
+    """测试异步查询"""
+    print("\n" + "="*50)
+    print("测试场景4：异步查询")
+    print("="*50)
+
+    set_knowledge_base('mock')
+
+    async def run_queries():
+        keywords = [[("土壤湿度", 1.0)], [("RSHub", 1.0)], [("不存在的术语", 1.0)]] * 100
+        return await asyncio.gather(*(query_knowledge_base_async(k) for k in keywords))
+
+    results = asyncio.run(run_queries())
+    print(f"并发查询 {len(results)} 次，前三个结果: {results[:3]}")
+    assert results[0] == query_knowledge_base([("土壤湿度", 1.0)])
+    assert "抱歉" in results[2]
+
 def main():
     """运行所有测试"""
     print("开始知识库测试...")
@@ -81,6 +100,7 @@ def main():
     test_mock_knowledge_base()
     test_file_knowledge_base()
     test_error_handling()
+    test_async_query()
     
     print("\n知识库测试完成！")
 
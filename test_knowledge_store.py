@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from utils.knowledge_base import StoreKnowledgeBase, NOT_FOUND_MESSAGE
+from utils.knowledge_store import SQLiteKnowledgeStore, iter_source_entries
+
+ENTRIES = {
+    "土壤湿度": "土壤湿度是影响微波后向散射系数的关键地表参数之一。",
+    "地表粗糙度": "地表粗糙度描述了地表面的起伏状况，是影响雷达信号散射方向和强度的另一个重要因素。",
+    "RSHub": "RSHub是一个集成了多种微波遥感模型的平台。",
+}
+
+def _write_jsonl(path: str, entries: dict) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for key, text in entries.items():
+            f.write(json.dumps({"key": key, "text": text}, ensure_ascii=False) + "\n")
+
+def test_lazy_store_queries():
+    """测试场景1：磁盘知识库查询与常驻集合上限"""
+    print("\n" + "="*50)
+    print("测试场景1：磁盘知识库查询")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "kb.jsonl")
+        _write_jsonl(source, ENTRIES)
+        kb = StoreKnowledgeBase(source, hot_entries=2)
+        assert kb.query([("土壤湿度", 1.0)]) == ENTRIES["土壤湿度"]
+        assert kb.query([("rshub", 1.0)]) == ENTRIES["RSHub"]
+        hits = kb.search([("雷达信号的散射方向", 1.0)])
+        print(f"[测试] 检索结果: {[(h.key, round(h.score, 3)) for h in hits]}")
+        assert hits[0].key == "地表粗糙度"
+        assert kb.query([("今天星期几", 1.0)]) == NOT_FOUND_MESSAGE
+
+        for key in ENTRIES:
+            kb.store.get(key)
+        stats = kb.store.stats()
+        print(f"[测试] 统计: {stats}")
+        assert stats["hot_size"] <= 2
+        kb.store.close()
+
+def test_incremental_reload():
+    """测试场景2：知识源变化后只同步变化的条目"""
+    print("\n" + "="*50)
+    print("测试场景2：增量热加载")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "kb.jsonl")
+        _write_jsonl(source, ENTRIES)
+        kb = StoreKnowledgeBase(source, check_interval=0)
+        assert kb.query([("RSHub", 1.0)]) == ENTRIES["RSHub"]
+
+        # 重启后不重新导入未变化的知识源
+        reopened = StoreKnowledgeBase(source, check_interval=0)
+        assert reopened.store.stats()["syncs"] == 0
+        assert reopened.query([("RSHub", 1.0)]) == ENTRIES["RSHub"]
+
+        updated = dict(ENTRIES)
+        updated["RSHub"] = "RSHub 平台已升级到新版本。"
+        updated["植被指数"] = "植被指数反映植被覆盖与长势。"
+        del updated["地表粗糙度"]
+        time.sleep(0.01)
+        _write_jsonl(source, updated)
+        counts = kb.store.sync(iter_source_entries(source))
+        print(f"[测试] 同步结果: {counts}")
+        assert counts == {"added": 1, "updated": 1, "removed": 1, "unchanged": 1}
+        # 另一个实例的常驻集合不会返回旧内容
+        assert reopened.query([("RSHub", 1.0)]) == updated["RSHub"]
+
+        _write_jsonl(source, ENTRIES)
+        assert kb.query([("RSHub", 1.0)]) == ENTRIES["RSHub"]
+        assert reopened.query([("地表粗糙度", 1.0)]) == ENTRIES["地表粗糙度"]
+        kb.store.close()
+        reopened.store.close()
+
+def test_atomic_snapshot():
+    """测试场景3：同步期间的并发查询只会看到完整快照"""
+    print("\n" + "="*50)
+    print("测试场景3：原子切换")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteKnowledgeStore(os.path.join(tmp, "kb.sqlite3"))
+        versions = [{f"条目{i}": f"版本{v}内容{i}" for i in range(300)} for v in range(2)]
+        store.sync(versions[0].items())
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                texts = [hit.text[:3] for hit in store.search([("条目1", 1.0), ("条目2", 1.0)], top_k=2)]
+                if len(set(texts)) > 1:
+                    errors.append(texts)
+
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for i in range(6):
+            store.sync(versions[(i + 1) % 2].items())
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(f"[测试] 混合版本的查询结果: {len(errors)}")
+        assert not errors
+        store.close()
+
+def main():
+    """运行所有测试"""
+    print("开始磁盘知识库测试...")
+
+    test_lazy_store_queries()
+    test_incremental_reload()
+    test_atomic_snapshot()
+
+    print("\n磁盘知识库测试完成！")
+
+if __name__ == "__main__":
+    main()
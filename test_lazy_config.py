@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import subprocess
+import core.config as config
+
+def test_import_without_langchain_or_api_key():
+    """测试场景1：导入入口模块不会加载 LangChain，也不要求 API Key"""
+    print("\n" + "="*50)
+    print("测试场景1：无副作用导入")
+    print("="*50)
+
+    env = {k: v for k, v in os.environ.items() if k != config.VOLCANO_API_KEY_ENV_VAR}
+    probe = (
+        "import json, sys, agent, main; "
+        "print(json.dumps(sorted(m for m in sys.modules if m.startswith('langchain'))))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True,
+    )
+    print(f"[测试] 返回码: {completed.returncode}，输出: {completed.stdout.strip()}")
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads(completed.stdout.strip().splitlines()[-1]) == []
+
+def test_llm_provider():
+    """测试场景2：LLM 在首次使用时通过提供者创建，可以替换"""
+    print("\n" + "="*50)
+    print("测试场景2：可替换的LLM提供者")
+    print("="*50)
+
+    created = []
+
+    def provider():
+        created.append(object())
+        return created[-1]
+
+    try:
+        config.set_llm_provider(provider)
+        assert created == []
+        first = config.get_llm()
+        assert config.get_llm() is first
+        assert config.LLM is first
+        assert len(created) == 1
+
+        config.set_llm_provider(provider)
+        assert config.get_llm() is not first
+        assert len(created) == 2
+    finally:
+        config.set_llm_provider(None)
+
+def main():
+    """运行所有测试"""
+    print("开始配置模块测试...")
+
+    test_import_without_langchain_or_api_key()
+    test_llm_provider()
+
+    print("\n配置模块测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+import utils.knowledge_base as kb_module
+from core.config import set_llm_provider
+from benchmarks.fake_llm import fake_llm_provider
+from agent import start_session_async, resume_session_async
+from handlers.instruction_1 import handle_instruction_1_interactive
+from utils.knowledge_base import KnowledgeBase
+from utils.prefetch import KnowledgePrefetcher
+
+class SlowKnowledgeBase(KnowledgeBase):
+    """每次查询固定延迟的知识库，记录查询过的术语"""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.queried = []
+        self._lock = threading.Lock()
+
+    def query(self, keywords_with_weights):
+        with self._lock:
+            self.queried.append(keywords_with_weights[0][0])
+        time.sleep(self.delay)
+        return f"{keywords_with_weights[0][0]}的内容"
+
+def test_prefetch_and_take():
+    """测试场景1：预取结果可以直接取用，超出宽度的建议与未使用的结果不会被使用"""
+    print("\n" + "="*50)
+    print("测试场景1：预取与取用")
+    print("="*50)
+
+    knowledge_base = SlowKnowledgeBase()
+    with mock.patch.object(kb_module, "_knowledge_base", knowledge_base):
+        prefetcher = KnowledgePrefetcher(width=2)
+        assert prefetcher.prefetch(["土壤湿度", "植被指数", "RSHub"]) == 2
+        assert prefetcher.prefetch(["土壤湿度"]) == 0
+        text = prefetcher.take("植被指数")
+        print(f"[测试] 取用预取结果: {text}")
+        assert text == "植被指数的内容"
+        assert prefetcher.take("RSHub") is None
+        prefetcher.cancel(wait=True)
+        assert prefetcher.take("土壤湿度") is None
+        assert sorted(knowledge_base.queried) == ["土壤湿度", "植被指数"]
+
+        # 知识库切换后，旧的预取结果不再使用
+        prefetcher = KnowledgePrefetcher()
+        prefetcher.prefetch(["土壤湿度"])
+        kb_module._bump_knowledge_base_generation()
+        assert prefetcher.take("土壤湿度") is None
+        prefetcher.cancel(wait=True)
+
+    # 预取查询使用提交时的知识库实例，即使执行时全局知识库已经切换
+    first, second = SlowKnowledgeBase(), SlowKnowledgeBase()
+    with mock.patch.object(kb_module, "_knowledge_base", first):
+        prefetcher = KnowledgePrefetcher(width=1)
+        prefetcher.prefetch(["RSHub"])
+    with mock.patch.object(kb_module, "_knowledge_base", second):
+        assert prefetcher.take("RSHub") == "RSHub的内容"
+    assert first.queried == ["RSHub"] and second.queried == []
+
+def test_interactive_uses_prefetch():
+    """测试场景2：交互式问答中用户思考期间完成预取，选择后不再查询知识库"""
+    print("\n" + "="*50)
+    print("测试场景2：交互式问答使用预取结果")
+    print("="*50)
+
+    def slow_input(prompt):
+        time.sleep(0.3)  # 模拟用户阅读建议的时间
+        return "1"
+
+    knowledge_base = SlowKnowledgeBase()
+    set_llm_provider(fake_llm_provider(latency=0.01))
+    try:
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(kb_module, "_knowledge_base", knowledge_base), \
+                mock.patch("builtins.input", slow_input):
+            output_path = os.path.join(tmp, "out.txt")
+            assert handle_instruction_1_interactive("说说土壤含水那些事", "", output_path)
+            with open(output_path, "r", encoding="utf-8") as f:
+                text = f.read()
+    finally:
+        set_llm_provider(None)
+    print(f"[测试] 查询过的术语: {knowledge_base.queried}")
+    assert text.endswith("的内容")
+    assert knowledge_base.queried.count(text[:-len("的内容")]) == 1
+
+def test_session_uses_prefetch():
+    """测试场景3：服务模式的会话在等待选择时预取，继续会话时直接使用"""
+    print("\n" + "="*50)
+    print("测试场景3：会话继续使用预取结果")
+    print("="*50)
+
+    async def run(knowledge_base):
+        result, session = await start_session_async("说说土壤含水那些事", mode="combined")
+        assert result["status"] == "ambiguous"
+        await asyncio.sleep(0.3)
+        queried = len(knowledge_base.queried)
+        resumed = await resume_session_async(session, "1")
+        print(f"[测试] 继续会话: {resumed['status']} {resumed['term']} {resumed['timings']}")
+        assert resumed["status"] == "ok" and resumed["answer"] == f"{resumed['term']}的内容"
+        assert len(knowledge_base.queried) == queried
+        assert resumed["timings"]["knowledge_base"] < 100
+
+    knowledge_base = SlowKnowledgeBase()
+    set_llm_provider(fake_llm_provider(latency=0.01))
+    try:
+        with mock.patch.object(kb_module, "_knowledge_base", knowledge_base):
+            asyncio.run(run(knowledge_base))
+    finally:
+        set_llm_provider(None)
+
+def main():
+    """运行所有测试"""
+    print("开始知识库预取测试...")
+
+    test_prefetch_and_take()
+    test_interactive_uses_prefetch()
+    test_session_uses_prefetch()
+
+    print("\n知识库预取测试完成！")
+
+if __name__ == "__main__":
+    main()
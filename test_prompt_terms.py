@@ -0,0 +1,79 @@
+from core.config import KNOWN_TECHNICAL_TERMS, set_llm_provider
+from benchmarks.fake_llm import default_responder, fake_llm_provider
+from handlers.instruction_0 import handle_instruction_0
+from handlers.instruction_1 import get_prompt_term_stats, get_term_index, prompt_terms, reset_prompt_term_stats
+from utils.file_handler import estimate_tokens
+from utils.knowledge_base import set_knowledge_base
+
+def _glossary(size: int) -> dict:
+    """合成术语表：土壤湿度、植被相关的少量真实术语 + 大量无关术语"""
+    data = {f"合成术语{i:05d}号": f"条目{i}的内容" for i in range(size)}
+    data.update({"土壤湿度反演": "……", "土壤含水量": "……", "植被含水量": "……"})
+    return data
+
+def test_top_k_from_knowledge_base():
+    """测试场景1：候选术语来自当前知识库，数量固定为 K，不随术语表增长"""
+    print("\n" + "="*50)
+    print("测试场景1：按查询选出前 K 个术语")
+    print("="*50)
+
+    try:
+        sizes = {}
+        for size in (100, 5000):
+            set_knowledge_base('mock', knowledge_data=_glossary(size))
+            terms = prompt_terms("土壤含水那些事", k=8)
+            sizes[size] = estimate_tokens(str(terms))
+            print(f"[测试] 术语表 {size} 条: {terms}")
+            assert len(terms) == 8
+            assert terms[0] == "土壤含水量" and "土壤湿度反演" in terms
+            assert not any(term.startswith("合成术语") for term in terms)
+
+        assert sizes[100] == sizes[5000], "提示词中的术语 token 数不应随术语表增长"
+        assert len(prompt_terms("土壤含水那些事", k=0)) == len(get_term_index()) == 5003 + len(KNOWN_TECHNICAL_TERMS)
+        # 与查询无关时用已知术语补足
+        assert prompt_terms("今天星期几", k=4) == KNOWN_TECHNICAL_TERMS[:4]
+    finally:
+        set_knowledge_base('mock')
+
+def test_prompt_size_and_savings():
+    """测试场景2：发给LLM的系统提示词只包含候选术语，并统计节省的 token"""
+    print("\n" + "="*50)
+    print("测试场景2：提示词长度与节省统计")
+    print("="*50)
+
+    prompts = []
+
+    def capture(system_prompt: str, user_message: str) -> str:
+        prompts.append(system_prompt)
+        return default_responder(system_prompt, user_message)
+
+    set_llm_provider(fake_llm_provider(latency=0.0, responder=capture))
+    try:
+        reset_prompt_term_stats()
+        for size in (100, 5000):
+            set_knowledge_base('mock', knowledge_data=_glossary(size))
+            assert handle_instruction_0("说说土壤含水那些事", "") == -2
+        print(f"[测试] 系统提示词长度: {[len(p) for p in prompts]}")
+        assert len(prompts) == 2 and len(prompts[0]) == len(prompts[1])
+        assert "土壤含水量" in prompts[1] and "合成术语00001号" not in prompts[1]
+
+        stats = get_prompt_term_stats()
+        print(f"[测试] 术语注入统计: {stats}")
+        assert stats["prompts"] == 2
+        assert stats["saved_tokens"] == stats["glossary_tokens"] - stats["injected_tokens"]
+        assert stats["savings_rate"] > 0.95
+    finally:
+        set_llm_provider(None)
+        set_knowledge_base('mock')
+
+def main():
+    """运行所有测试"""
+    print("开始提示词术语注入测试...")
+
+    test_top_k_from_knowledge_base()
+    test_prompt_size_and_savings()
+
+    print("\n提示词术语注入测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.fake_openai_server import QuotaServer
+from core.llm_cache import create_llm_cache
+from core.config import set_llm_provider
+from handlers.instruction_0 import handle_instruction_0, handle_instruction_0_async
+from utils.rate_limiter import (
+    AdaptiveConcurrency,
+    FileTokenBucket,
+    RateLimiter,
+    TokenBucket,
+    reset_rate_limiter,
+    set_rate_limiter,
+)
+
+AMBIGUOUS_QUERY = "说说土壤含水那些事"
+
+
+def _reserve_from_process(path: str) -> float:
+    """子进程：从共享文件桶预约 5 个令牌"""
+    return FileTokenBucket(path, 60, capacity=1).reserve(5)
+
+
+def _openai_provider(server: QuotaServer):
+    """指向假服务的 ChatOpenAI，关闭客户端自带的重试，429 交给限流器处理"""
+    def provider():
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model="fake", api_key="test", base_url=server.base_url, max_retries=0, timeout=5)
+    return provider
+
+
+def test_token_bucket_and_aimd():
+    """测试场景1：令牌桶按速率排队，AIMD 过载时减半、成功时缓慢增加"""
+    print("\n" + "="*50)
+    print("测试场景1：令牌桶与 AIMD 并发")
+    print("="*50)
+
+    bucket = TokenBucket(600, capacity=1)  # 每 0.1 秒一个
+    waits = [bucket.reserve() for _ in range(4)]
+    print(f"[测试] 预约等待: {[round(w, 3) for w in waits]}")
+    assert waits[0] == 0.0
+    assert all(0.09 < later - earlier < 0.11 for earlier, later in zip(waits, waits[1:]))
+
+    concurrency = AdaptiveConcurrency(maximum=32, minimum=2, cooldown=60)
+    assert concurrency.limit == 32
+    assert concurrency.on_overload() and concurrency.limit == 16
+    assert not concurrency.on_overload() and concurrency.limit == 16  # 冷却时间内不再减少
+    for _ in range(17):
+        concurrency.on_success()
+    assert concurrency.limit == 17
+
+    concurrency = AdaptiveConcurrency(maximum=4, minimum=1, initial=2, cooldown=0)
+    assert concurrency.try_acquire() and concurrency.try_acquire() and not concurrency.try_acquire()
+    concurrency.release()
+    assert concurrency.try_acquire() and concurrency.in_flight == 2
+    for _ in range(3):
+        concurrency.on_overload()
+    assert concurrency.limit == 1
+
+
+def test_shared_quota_across_processes():
+    """测试场景2：多个进程通过状态文件共享同一份请求配额"""
+    print("\n" + "="*50)
+    print("测试场景2：跨进程共享配额")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm.requests")
+        with ProcessPoolExecutor(max_workers=3) as pool:
+            waits = list(pool.map(_reserve_from_process, [path] * 3))
+        # 容量 1、每秒补充 1 个：三个进程共预约 15 个，主进程再预约 1 个需要等约 15 秒
+        wait = FileTokenBucket(path, 60, capacity=1).reserve(1)
+        print(f"[测试] 子进程等待: {[round(w, 2) for w in waits]}，主进程等待: {wait:.2f}s")
+        assert sorted(round(w) for w in waits) == [4, 9, 14]
+        assert 14 < wait <= 15.5
+
+        other = FileTokenBucket(path, 60, capacity=1)
+        assert other.reserve(1) > wait
+
+
+def test_adaptive_concurrency_against_429():
+    """测试场景3：服务端并发配额很小时，限流器降低并发并重试，所有请求最终成功"""
+    print("\n" + "="*50)
+    print("测试场景3：429 下的自适应并发")
+    print("="*50)
+
+    server = QuotaServer(max_concurrency=4, latency=0.05).start()
+    set_llm_provider(_openai_provider(server))
+    try:
+        # 不限流：同时发出的请求大多被拒绝
+        set_rate_limiter(None)
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(lambda _: handle_instruction_0(AMBIGUOUS_QUERY, ""), range(32)))
+        print(f"[测试] 不限流: 成功 {results.count(-2)}/32，服务端 {server.stats()}")
+        assert results.count(-1) > 0
+
+        async def burst(count: int):
+            return await asyncio.gather(*(handle_instruction_0_async(AMBIGUOUS_QUERY, "") for _ in range(count)))
+
+        # 协程
+        limiter = RateLimiter(max_concurrency=32, base_delay=0.05, max_retries=10)
+        set_rate_limiter(limiter)
+        before = server.stats()
+        start = time.perf_counter()
+        results = asyncio.run(burst(80))
+        elapsed = time.perf_counter() - start
+        after = server.stats()
+        stats = limiter.stats()
+        print(f"[测试] 协程: {elapsed:.2f}s，429 {after['rejected'] - before['rejected']} 次，限流器 {stats}")
+        assert results == [-2] * 80
+        assert stats["overloads"] > 0 and stats["retries"] == stats["overloads"] and stats["errors"] == 0
+        assert stats["concurrency_limit"] < 32 and stats["in_flight"] == 0
+        assert after["ok"] - before["ok"] == 80
+
+        # 线程
+        limiter = RateLimiter(max_concurrency=32, base_delay=0.05, max_retries=10)
+        set_rate_limiter(limiter)
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(lambda _: handle_instruction_0(AMBIGUOUS_QUERY, ""), range(80)))
+        stats = limiter.stats()
+        print(f"[测试] 线程: 限流器 {stats}")
+        assert results == [-2] * 80
+        assert stats["overloads"] > 0 and stats["concurrency_limit"] < 32 and stats["in_flight"] == 0
+    finally:
+        reset_rate_limiter()
+        set_llm_provider(None)
+        server.close()
+
+
+def test_requests_per_minute():
+    """测试场景4：客户端按每分钟请求数排队，不触发服务端的速率配额"""
+    print("\n" + "="*50)
+    print("测试场景4：每分钟请求数限制")
+    print("="*50)
+
+    server = QuotaServer(max_concurrency=64, requests_per_second=25, latency=0.01).start()
+    set_llm_provider(_openai_provider(server))
+    limiter = RateLimiter(requests_per_minute=1200, max_concurrency=16, burst_seconds=0.05)
+    set_rate_limiter(limiter)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda _: handle_instruction_0(AMBIGUOUS_QUERY, ""), range(40)))
+        elapsed = time.perf_counter() - start
+        stats = limiter.stats()
+        print(f"[测试] 40 个请求用时 {elapsed:.2f}s，服务端 {server.stats()}，限流器 {stats}")
+        assert results == [-2] * 40
+        assert server.stats()["rejected"] == 0 and stats["overloads"] == 0
+        assert elapsed >= 1.8 and stats["waited_seconds"] > 0
+    finally:
+        reset_rate_limiter()
+        set_llm_provider(None)
+        server.close()
+
+
+def test_cached_calls_bypass_limiter():
+    """测试场景5：LLM 缓存命中的调用不经过限流，不预约 token，也不占用并发名额"""
+    print("\n" + "="*50)
+    print("测试场景5：缓存命中不限流")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = create_llm_cache(os.path.join(tmp, "llm.sqlite3"))
+        model = FakeChatModel(latency=0, cache=cache)
+        set_llm_provider(lambda: model)
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=100000, max_concurrency=1)
+        set_rate_limiter(limiter)
+        try:
+            assert handle_instruction_0(AMBIGUOUS_QUERY, "") == -2
+            with mock.patch.object(limiter.tokens, "reserve", wraps=limiter.tokens.reserve) as tokens, \
+                    mock.patch.object(limiter.requests, "reserve", wraps=limiter.requests.reserve) as requests:
+                start = time.perf_counter()
+                assert handle_instruction_0(AMBIGUOUS_QUERY, "") == -2
+                assert asyncio.run(handle_instruction_0_async(AMBIGUOUS_QUERY, "")) == -2
+                elapsed = time.perf_counter() - start
+            stats = limiter.stats()
+            print(f"[测试] 缓存命中 2 次用时 {elapsed * 1000:.1f}ms，限流器 {stats}，缓存 {cache.stats()}")
+            assert tokens.call_count == 0 and requests.call_count == 0
+            assert stats["requests"] == 1 and stats["in_flight"] == 0
+            assert model.calls == 1 and cache.stats()["hits"] == 2
+        finally:
+            reset_rate_limiter()
+            set_llm_provider(None)
+
+
+def main():
+    """运行所有测试"""
+    print("开始限流测试...")
+
+    test_token_bucket_and_aimd()
+    test_shared_quota_across_processes()
+    test_adaptive_concurrency_against_429()
+    test_requests_per_minute()
+    test_cached_calls_bypass_limiter()
+
+    print("\n限流测试完成！")
+
+if __name__ == "__main__":
+    main()
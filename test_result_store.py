@@ -0,0 +1,143 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+from core.config import set_llm_provider
+from benchmarks.fake_llm import fake_llm_provider
+from agent import process_user_query
+from main import process_query
+from utils.result_store import ResultStore
+
+def _write_many(args):
+    directory, worker, count = args
+    store = ResultStore(directory, segment_max_bytes=2048)
+    return [store.put(f"进程{worker}的查询{i}", f"进程{worker}的结果{i}" * 5) for i in range(count)]
+
+def test_put_get_find():
+    """测试场景1：按编号与归一化查询查找，分段滚动与压缩"""
+    print("\n" + "="*50)
+    print("测试场景1：写入与查找")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for compression in ("none", "gzip"):
+            directory = os.path.join(tmp, compression)
+            store = ResultStore(directory, compression=compression, segment_max_bytes=256)
+            first = store.put("土壤湿度是什么？", "土壤湿度是指……" * 20, status="ok")
+            second = store.put("RSHub 怎么用", "RSHub 是……" * 20)
+            third = store.put("土壤湿度 是什么", "更新后的结果")
+
+            record = store.get(first)
+            print(f"[测试] {compression}: {record['id']} {record['query']} status={record['status']}")
+            assert record["answer"] == "土壤湿度是指……" * 20 and record["status"] == "ok"
+            assert store.find("rshub怎么用？")["id"] == second
+            assert store.find("土壤湿度是什么")["id"] == third
+            assert store.lookup(second)["query"] == "RSHub 怎么用"
+            assert store.get("missing") is None and store.find("没有的查询") is None
+            assert len(store) == 3 and [r["id"] for r in store] == [first, second, third]
+            segments = [name for name in os.listdir(directory) if name.startswith("segment-")]
+            print(f"[测试] 分段文件: {sorted(segments)}")
+            assert len(segments) >= 2
+
+        try:
+            ResultStore(os.path.join(tmp, "bad"), compression="lz4")
+            assert False, "未知的压缩方式应报错"
+        except ValueError:
+            pass
+
+def test_concurrent_writers_and_recovery():
+    """测试场景2：多线程、多进程同时写入；其他进程的写入可见；索引丢失后重建"""
+    print("\n" + "="*50)
+    print("测试场景2：并发写入与索引重建")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultStore(tmp, segment_max_bytes=2048)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            thread_ids = list(pool.map(lambda i: store.put(f"线程查询{i}", f"线程结果{i}"), range(40)))
+        with ProcessPoolExecutor(max_workers=3) as pool:
+            process_ids = [i for ids in pool.map(_write_many, [(tmp, w, 20) for w in range(3)]) for i in ids]
+
+        # 其他进程写入的结果在查找时读入
+        assert store.get(process_ids[-1])["answer"] == "进程2的结果19" * 5
+        assert store.find("进程1的查询7")["answer"] == "进程1的结果7" * 5
+        assert len(store) == 100
+        assert all(store.get(i) is not None for i in thread_ids + process_ids)
+
+        os.remove(os.path.join(tmp, "index.jsonl"))
+        reopened = ResultStore(tmp)
+        print(f"[测试] 重建索引后共有 {len(reopened)} 条结果")
+        assert len(reopened) == 100 and reopened.get(thread_ids[0])["answer"] == "线程结果0"
+
+        # 索引末尾不完整的行（写入中途崩溃）会被忽略
+        with open(os.path.join(tmp, "index.jsonl"), "ab") as f:
+            f.write(b'{"id": "partial"')
+        assert len(ResultStore(tmp)) == 100
+
+def test_answer_returned_in_memory():
+    """测试场景3：交互式问答的结果在内存中返回，不需要输出文件"""
+    print("\n" + "="*50)
+    print("测试场景3：结果在内存中返回")
+    print("="*50)
+
+    set_llm_provider(fake_llm_provider(latency=0.01))
+    try:
+        for mode in ("combined", "two_step"):
+            answer = {}
+            with mock.patch("builtins.input", return_value="1"):
+                code = process_user_query("说说土壤含水那些事", mode=mode, result=answer)
+            print(f"[测试] {mode}: 结果代码 {code}，结果: {answer['answer'][:30]}")
+            assert code == 0 and answer["answer"]
+    finally:
+        set_llm_provider(None)
+
+def test_aborted_query():
+    """测试场景4：用户中止澄清时提示已取消，并以 aborted 状态保存"""
+    print("\n" + "="*50)
+    print("测试场景4：用户中止澄清")
+    print("="*50)
+
+    set_llm_provider(fake_llm_provider(latency=0.01))
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ResultStore(tmp)
+            for mode in ("combined", "two_step"):
+                output = io.StringIO()
+                with mock.patch("builtins.input", return_value="退出"), redirect_stdout(output):
+                    process_query("说说土壤含水那些事", store, mode)
+                printed = output.getvalue()
+                print(f"[测试] {mode}: {printed.strip().splitlines()[-1]}")
+                assert "已取消" in printed and "无关" not in printed
+                record = store.find("说说土壤含水那些事")
+                assert record["status"] == "aborted" and record["answer"] is None
+
+            output = io.StringIO()
+            with redirect_stdout(output):
+                process_query("今天星期几？", store)
+            assert "无关" in output.getvalue() and "已取消" not in output.getvalue()
+
+            # 结果代码为 0 但没有得到答案时不报告成功，也不保存记录
+            output = io.StringIO()
+            with mock.patch("main.process_user_query", return_value=0), redirect_stdout(output):
+                process_query("没有答案的查询", store)
+            print(f"[测试] 没有答案: {output.getvalue().strip().splitlines()[-1]}")
+            assert "查询处理完成" not in output.getvalue() and "None" not in output.getvalue()
+            assert "[失败]" in output.getvalue() and store.find("没有答案的查询") is None
+    finally:
+        set_llm_provider(None)
+
+def main():
+    """运行所有测试"""
+    print("开始结果存储测试...")
+
+    test_put_get_find()
+    test_concurrent_writers_and_recovery()
+    test_answer_returned_in_memory()
+    test_aborted_query()
+
+    print("\n结果存储测试完成！")
+
+if __name__ == "__main__":
+    main()
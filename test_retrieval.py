@@ -0,0 +1,97 @@
+import random
+import time
+from utils.retrieval import InvertedIndex, tokenize
+from utils.knowledge_base import MockKnowledgeBase
+
+ENTRIES = {
+    "土壤湿度": "土壤湿度是影响微波后向散射系数的关键地表参数之一。通常，湿度越高，介电常数越大，导致更强的雷达回波信号。",
+    "地表粗糙度": "地表粗糙度描述了地表面的起伏状况，是影响雷达信号散射方向和强度的另一个重要因素。",
+    "介电常数": "介电常数决定了地物对微波的反射与吸收能力，与土壤含水量密切相关。",
+    "RSHub": "RSHub是一个集成了多种微波遥感模型的平台。",
+}
+
+def test_tokenize():
+    """测试场景1：中文二元组与英文整词分词"""
+    print("\n" + "="*50)
+    print("测试场景1：分词")
+    print("="*50)
+
+    tokens = tokenize("RSHub的土壤湿度")
+    print(f"[测试] {tokens}")
+    assert tokens == ["rshub", "的土", "土壤", "壤湿", "湿度"]
+
+def test_weighted_multi_keyword_search():
+    """测试场景2：多关键词加权检索"""
+    print("\n" + "="*50)
+    print("测试场景2：多关键词加权检索")
+    print("="*50)
+
+    index = InvertedIndex(ENTRIES)
+    hits = index.search([("土壤湿度", 1.0)])
+    print(f"[测试] 土壤湿度 -> {[(h.key, round(h.score, 3)) for h in hits]}")
+    assert hits[0].key == "土壤湿度" and hits[0].score == 1.0
+
+    # 第二个关键词不再被忽略，权重决定排序
+    hits = index.search([("土壤湿度", 0.2), ("地表粗糙度", 1.0)], top_k=2)
+    print(f"[测试] 加权查询 -> {[(h.key, round(h.score, 3)) for h in hits]}")
+    assert [h.key for h in hits] == ["地表粗糙度", "土壤湿度"]
+
+    hits = index.search([("雷达回波信号", 1.0)])
+    assert hits and hits[0].key == "土壤湿度"
+    assert index.search([("星期几", 1.0)]) == []
+
+def test_knowledge_base_top_k_passages():
+    """测试场景3：知识库返回前 k 个相关段落"""
+    print("\n" + "="*50)
+    print("测试场景3：知识库检索")
+    print("="*50)
+
+    kb = MockKnowledgeBase(ENTRIES, top_k=3)
+    assert kb.query([("土壤湿度", 1.0)]) == ENTRIES["土壤湿度"]
+    hits = kb.search([("介电常数", 1.0), ("土壤", 1.0)])
+    print(f"[测试] {[(h.key, round(h.score, 3)) for h in hits]}")
+    assert {h.key for h in hits} >= {"介电常数", "土壤湿度"}
+    assert "抱歉" in kb.query([("完全无关的词", 1.0)])
+
+def test_large_knowledge_base_latency():
+    """测试场景4：大规模知识库的构建与查询（输出耗时）"""
+    print("\n" + "="*50)
+    print("测试场景4：大规模检索延迟")
+    print("="*50)
+
+    rng = random.Random(0)
+    alphabet = [chr(c) for c in range(0x4e00, 0x4e00 + 1500)]
+    weights = [1 / (i + 1) for i in range(len(alphabet))]
+    entries = dict(ENTRIES)
+    for i in range(20000):
+        entries[f"条目{i}"] = "".join(rng.choices(alphabet, weights, k=80))
+
+    start = time.perf_counter()
+    index = InvertedIndex(entries)
+    build_s = time.perf_counter() - start
+
+    queries = [[("土壤湿度", 1.0)], [("雷达回波强度影响因素", 1.0), ("土壤", 0.5)], [("一丁七", 1.0)]]
+    rounds = 300
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for q in queries:
+            index.search(q)
+    per_query_ms = (time.perf_counter() - start) * 1000 / (rounds * len(queries))
+    print(f"[测试] {len(index)} 条目，构建 {build_s:.2f} s，单次查询 {per_query_ms:.3f} ms")
+    # 耗时只输出不断言；延迟回退由 benchmarks（python -m benchmarks.run --section knowledge_base）跟踪
+    assert len(index) == len(entries)
+    assert index.search([("土壤湿度", 1.0)])[0].key == "土壤湿度"
+
+def main():
+    """运行所有测试"""
+    print("开始检索引擎测试...")
+
+    test_tokenize()
+    test_weighted_multi_keyword_search()
+    test_knowledge_base_top_k_passages()
+    test_large_knowledge_base_latency()
+
+    print("\n检索引擎测试完成！")
+
+if __name__ == "__main__":
+    main()
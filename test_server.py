@@ -0,0 +1,164 @@
+import asyncio
+import json
+import os
+import tempfile
+from core.config import set_llm_provider
+from benchmarks.fake_llm import fake_llm_provider
+from benchmarks.load_test import AsyncHTTPClient
+from handlers.instruction_1 import ClarificationSession
+from server import MAX_BODY_BYTES, AgentServer, SessionStore
+
+def test_session_round_trip():
+    """测试场景1：澄清会话可以序列化，恢复后继续选择"""
+    print("\n" + "="*50)
+    print("测试场景1：会话序列化与恢复")
+    print("="*50)
+
+    session = ClarificationSession("说说土壤含水那些事")
+    session.step({"is_ambiguous": True, "original_term": "土壤含水", "corrected_term": None,
+                  "suggestions": ["土壤湿度", "地表粗糙度"]})
+    assert session.state == ClarificationSession.AWAITING_CHOICE
+
+    restored = ClarificationSession.from_dict(json.loads(json.dumps(session.to_dict())))
+    assert restored.to_dict() == session.to_dict()
+    restored.choose("2")
+    print(f"[测试] 选择后状态: {restored.state}, 术语: {restored.term}")
+    assert restored.state == ClarificationSession.RESOLVED and restored.term == "地表粗糙度"
+
+    try:
+        restored.choose("1")
+        assert False, "已结束的会话不应接受选择"
+    except ValueError:
+        pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(max_entries=10)
+        store.save(session)
+        path = os.path.join(tmp, "sessions.jsonl")
+        assert store.dump(path) == 1
+        reloaded = SessionStore()
+        assert reloaded.restore(path) == 1
+        assert reloaded.load(session.session_id).suggestions == ["土壤湿度", "地表粗糙度"]
+
+async def _exercise_server(server: AgentServer):
+    client = AsyncHTTPClient(server.host, server.port)
+    try:
+        status, health = await client.request("GET", "/health")
+        assert status == 200 and health["status"] == "ok"
+
+        status, result = await client.request("POST", "/v1/query", {"query": "土壤湿度是什么？"})
+        print(f"[测试] 明确查询: {status} {result['status']} {result['term']}")
+        assert status == 200 and result["status"] == "ok" and "session_id" not in result
+
+        status, result = await client.request("POST", "/v1/query", {"query": "说说土壤含水那些事"})
+        print(f"[测试] 模糊查询: {status} {result['status']} {result['suggestions']}")
+        assert result["status"] == "ambiguous" and result["session_id"]
+        session_id = result["session_id"]
+        assert len(server.sessions) == 1
+
+        status, session = await client.request("GET", f"/v1/sessions/{session_id}")
+        assert status == 200 and session["state"] == ClarificationSession.AWAITING_CHOICE
+
+        status, resumed = await client.request("POST", f"/v1/sessions/{session_id}", {"choice": "1"})
+        print(f"[测试] 继续会话: {status} {resumed['status']} {resumed['term']}")
+        assert status == 200 and resumed["status"] == "ok" and resumed["term"] == result["suggestions"][0]
+        assert len(server.sessions) == 0
+
+        status, result = await client.request("POST", "/v1/query", {"query": "说说土壤含水那些事"})
+        status, aborted = await client.request("POST", f"/v1/sessions/{result['session_id']}", {"choice": "退出"})
+        assert status == 200 and aborted["status"] == "aborted"
+
+        status, result = await client.request("POST", "/v1/query", {"query": "说说土壤含水那些事", "on_ambiguous": "top"})
+        assert result["status"] == "ok" and "session_id" not in result
+
+        assert (await client.request("GET", f"/v1/sessions/{session_id}"))[0] == 404
+        assert (await client.request("POST", "/v1/query", {"mode": "combined"}))[0] == 400
+        assert (await client.request("GET", "/v1/query"))[0] == 405
+        assert (await client.request("GET", "/nowhere"))[0] == 404
+
+        # file_paths 只能引用上传目录中的文件
+        status, error = await client.request("POST", "/v1/query", {"query": "看看这个文件", "file_paths": ["/etc/passwd"]})
+        print(f"[测试] 读取服务器文件: {status} {error}")
+        assert status == 400
+        assert (await client.request("POST", "/v1/query", {"query": "看看", "file_paths": ["../secret.txt"]}))[0] == 400
+        assert (await client.request("POST", "/v1/query", {"query": "看看", "file_paths": "data.txt"}))[0] == 400
+        status, result = await client.request("POST", "/v1/query", {"query": "土壤湿度是什么？", "file_paths": ["data.txt"]})
+        assert status == 200 and result["status"] == "ok"
+
+        status, text = await client.request("GET", "/metrics")
+        assert status == 200 and isinstance(text, str)
+        print(f"[测试] 共使用 {client.connections} 个连接")
+        assert client.connections == 1
+    finally:
+        await client.close()
+
+async def _raw_status(server: AgentServer, head: str, body: bytes = b"") -> int:
+    """发送原始请求，返回响应的状态码"""
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    try:
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        return int((await reader.readline()).split()[1])
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+def test_server_endpoints():
+    """测试场景2：HTTP 接口（查询、会话继续 / 中止、错误码与 keep-alive）"""
+    print("\n" + "="*50)
+    print("测试场景2：HTTP 服务接口")
+    print("="*50)
+
+    async def run(upload_dir: str):
+        server = AgentServer("127.0.0.1", 0, mode="combined", upload_dir=upload_dir)
+        await server.start()
+        try:
+            await _exercise_server(server)
+        finally:
+            await server.close()
+
+    async def run_without_upload_dir():
+        server = AgentServer("127.0.0.1", 0, mode="combined", upload_dir="")
+        await server.start(warmup=False)
+        client = AsyncHTTPClient(server.host, server.port)
+        try:
+            status, _ = await client.request("POST", "/v1/query", {"query": "看看", "file_paths": ["/etc/passwd"]})
+            assert status == 400
+
+            # Content-Length 必须是非负整数，且不超过请求体大小上限
+            request = "POST /v1/query HTTP/1.1\r\nContent-Length: {}\r\n\r\n"
+            assert await _raw_status(server, request.format("abc")) == 400
+            assert await _raw_status(server, request.format("-5")) == 400
+            assert await _raw_status(server, request.format("²")) == 400
+            assert await _raw_status(server, request.format(MAX_BODY_BYTES + 1)) == 413
+            body = json.dumps({"query": "土壤湿度是什么？"}).encode("utf-8")
+            assert await _raw_status(server, request.format(len(body)), body) == 200
+        finally:
+            await client.close()
+            await server.close()
+
+    set_llm_provider(fake_llm_provider(latency=0.01))
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            upload_dir = os.path.join(tmp, "uploads")
+            os.makedirs(upload_dir)
+            with open(os.path.join(upload_dir, "data.txt"), "w", encoding="utf-8") as f:
+                f.write("土壤湿度观测数据")
+            with open(os.path.join(tmp, "secret.txt"), "w", encoding="utf-8") as f:
+                f.write("不应被读取")
+            asyncio.run(run(upload_dir))
+        asyncio.run(run_without_upload_dir())
+    finally:
+        set_llm_provider(None)
+
+def main():
+    """运行所有测试"""
+    print("开始HTTP服务测试...")
+
+    test_session_round_trip()
+    test_server_endpoints()
+
+    print("\nHTTP服务测试完成！")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import tempfile
+from core.config import set_llm_provider
+from agent import stream_answer, astream_answer
+
+ANALYSIS = {"task_id": 1, "is_ambiguous": False, "original_term": "土壤含水", "corrected_term": "土壤湿度", "suggestions": None}
+
+def _fake_llm():
+    """逐字符流式输出固定JSON的本地假模型"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    return FakeListChatModel(responses=[json.dumps(ANALYSIS, ensure_ascii=False)], sleep=0.001)
+
+def test_stream_tokens_and_passages():
+    """测试场景1：LLM token 与知识库段落按到达顺序输出"""
+    print("\n" + "="*50)
+    print("测试场景1：流式输出")
+    print("="*50)
+
+    set_llm_provider(_fake_llm)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "result.txt")
+            events = list(stream_answer("说说土壤含水那些事", output_path=output_file))
+            kinds = [event["event"] for event in events]
+            tokens = "".join(event["text"] for event in events if event["event"] == "token")
+            result = events[-1]["result"]
+            print(f"[测试] 事件: {kinds.count('token')} 个 token，{kinds.count('passage')} 个段落，耗时 {result['timings']}")
+            assert json.loads(tokens) == ANALYSIS
+            assert kinds.index("analysis") > kinds.index("token") and kinds[-1] == "done"
+            assert result["status"] == "ok" and result["term"] == "土壤湿度"
+            assert result["timings"]["first_token"] < result["timings"]["first_passage"] <= result["timings"]["total"]
+            with open(output_file, 'r', encoding='utf-8') as f:
+                assert f.read() == result["answer"]
+    finally:
+        set_llm_provider(None)
+
+def test_fast_path_and_rejection():
+    """测试场景2：本地快速路径没有LLM token，无关查询不写文件"""
+    print("\n" + "="*50)
+    print("测试场景2：快速路径")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = os.path.join(tmp, "result.txt")
+        events = list(stream_answer("土壤湿度是什么？", output_path=output_file))
+        assert [event["event"] for event in events] == ["analysis", "passage", "done"]
+        assert events[-1]["result"]["timings"]["first_token"] == events[-1]["result"]["timings"]["first_passage"]
+
+        events = list(stream_answer("今天星期几？", output_path=os.path.join(tmp, "rejected.txt")))
+        assert events[-1]["result"]["status"] == "rejected"
+        assert "first_token" not in events[-1]["result"]["timings"]
+        assert not os.path.exists(os.path.join(tmp, "rejected.txt"))
+
+def test_async_iterator():
+    """测试场景3：异步迭代器版本"""
+    print("\n" + "="*50)
+    print("测试场景3：异步流式输出")
+    print("="*50)
+
+    async def collect():
+        return [event async for event in astream_answer("RSHub怎么用？")]
+
+    events = asyncio.run(collect())
+    print(f"[测试] 事件: {[event['event'] for event in events]}")
+    assert events[-1]["event"] == "done" and events[-1]["result"]["term"] == "RSHub"
+
+def main():
+    """运行所有测试"""
+    print("开始流式输出测试...")
+
+    test_stream_tokens_and_passages()
+    test_fast_path_and_rejection()
+    test_async_iterator()
+
+    print("\n流式输出测试完成！")
+
+if __name__ == "__main__":
+    main()
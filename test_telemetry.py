@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from core import telemetry
+from core.config import set_llm_provider
+from benchmarks.fake_llm import fake_llm_provider
+from agent import answer_query, answer_query_async, process_user_query
+from utils.answer_cache import reset_answer_cache, set_answer_cache
+from utils.knowledge_base import query_knowledge_base
+
+def _read_spans(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def test_spans_and_token_usage():
+    """测试场景1：各阶段记为同一条 trace 中的嵌套阶段，并记录LLM token 用量"""
+    print("\n" + "="*50)
+    print("测试场景1：阶段追踪与 token 统计")
+    print("="*50)
+
+    set_llm_provider(fake_llm_provider(latency=0.01))
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "trace.jsonl")
+        telemetry.reset_metrics()
+        telemetry.configure(enabled=True, log_path=log_path)
+        try:
+            assert process_user_query("RSHub怎么用？", output_path=os.path.join(tmp, "out.txt"), mode="two_step") == 0
+            result = answer_query("说说土壤含水那些事", mode="combined")
+        finally:
+            telemetry.configure(enabled=False, log_path="")
+            set_llm_provider(None)
+
+        spans = _read_spans(log_path)
+        for span in spans:
+            print(f"[测试] {span['name']:<22} {span['duration_ms']:>8.2f}ms {span['status']} {span['attrs']}")
+        roots = [s for s in spans if s["name"] == "request"]
+        assert len(roots) == 2 and all(s["parent_id"] is None for s in roots)
+        last_trace = [s for s in spans if s["trace_id"] == roots[-1]["trace_id"]]
+        names = {s["name"] for s in last_trace}
+        assert {"request", "file.read", "classify", "llm", "clarify", "knowledge_base.query"} <= names
+        llm = next(s for s in last_trace if s["name"] == "llm")
+        classify = next(s for s in last_trace if s["name"] == "classify")
+        assert llm["parent_id"] == classify["span_id"] and llm["attrs"]["stage"] == "combined"
+        assert llm["attrs"]["prompt_tokens"] > 0 and llm["attrs"]["completion_tokens"] > 0
+        assert result["status"] == "ok"
+        assert any(s["name"] == "file.write" for s in spans)
+
+        snapshot = telemetry.metrics_snapshot()
+        tokens = {(c["labels"]["stage"], c["labels"]["kind"]): c["value"] for c in snapshot["counters"]["llm_tokens_total"]}
+        assert tokens[("combined", "prompt")] > tokens[("combined", "completion")] > 0
+
+def test_prometheus_export():
+    """测试场景2：Prometheus 文本格式导出（直方图、计数与缓存命中率）"""
+    print("\n" + "="*50)
+    print("测试场景2：Prometheus 导出")
+    print("="*50)
+
+    telemetry.reset_metrics()
+    telemetry.configure(enabled=True)
+    # 使用默认LLM时答案缓存默认开启并写入工作目录；关闭它，使每次运行都走完整的处理流程
+    set_answer_cache(None)
+    try:
+        with telemetry.span("custom", note="x") as current:
+            current.set(value=1)
+        try:
+            with telemetry.span("custom"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        query_knowledge_base([("土壤湿度", 1.0)])
+        asyncio.run(answer_query_async("土壤湿度是什么？"))
+    finally:
+        telemetry.configure(enabled=False)
+        reset_answer_cache()
+
+    telemetry.register_cache("test", lambda: {"hits": 3, "misses": 1})
+    text = telemetry.render_prometheus()
+    print(text[:600])
+    assert 'rs_agent_spans_total{span="custom",status="ok"} 1' in text
+    assert 'rs_agent_spans_total{span="custom",status="error"} 1' in text
+    assert 'rs_agent_span_duration_seconds_count{span="custom"} 2' in text
+    assert 'rs_agent_span_duration_seconds_bucket{span="custom",le="+Inf"} 2' in text
+    assert 'rs_agent_spans_total{span="request",status="ok"} 1' in text
+    assert 'rs_agent_cache_hit_ratio{cache="test"} 0.75' in text
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "metrics.prom")
+        telemetry.write_prometheus(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            assert f.read() == telemetry.render_prometheus()
+
+def test_disabled_overhead():
+    """测试场景3：关闭时不记录任何数据，开销接近零"""
+    print("\n" + "="*50)
+    print("测试场景3：关闭时的开销")
+    print("="*50)
+
+    telemetry.reset_metrics()
+    assert not telemetry.is_enabled()
+
+    @telemetry.traced("noop")
+    def traced_call():
+        return 1
+
+    def plain_call():
+        return 1
+
+    n = 100000
+    start = time.perf_counter()
+    for _ in range(n):
+        plain_call()
+    plain = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(n):
+        traced_call()
+        with telemetry.span("noop"):
+            pass
+    traced = time.perf_counter() - start
+    print(f"[测试] 每次调用额外开销约 {(traced - plain) / n * 1e9:.0f}ns")
+    assert (traced - plain) / n < 5e-6
+    assert telemetry.metrics_snapshot()["counters"] == {}
+
+def main():
+    """运行所有测试"""
+    print("开始追踪与指标测试...")
+
+    test_spans_and_token_usage()
+    test_prometheus_export()
+    test_disabled_overhead()
+
+    print("\n追踪与指标测试完成！")
+
+if __name__ == "__main__":
+    main()
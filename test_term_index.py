@@ -0,0 +1,87 @@
+import random
+import time
+from utils.term_index import TermIndex, edit_distance
+
+KNOWN_TERMS = ["土壤湿度", "RSHub", "微波遥感", "地表粗糙度", "植被指数", "后向散射系数"]
+
+def test_exact_and_typo_matching():
+    """测试场景1：精确匹配与错别字纠正"""
+    print("\n" + "="*50)
+    print("测试场景1：精确匹配与错别字")
+    print("="*50)
+
+    index = TermIndex(KNOWN_TERMS)
+
+    result = index.clarify("RSHub是什么？")
+    print(f"[测试] RSHub是什么？ -> {result}")
+    assert result["is_ambiguous"] is False
+    assert result["corrected_term"] == "RSHub"
+
+    result = index.clarify("土地湿度是什么？")
+    print(f"[测试] 土地湿度是什么？ -> {result}")
+    assert result["is_ambiguous"] is True
+    assert result["original_term"] == "土地湿度"
+    assert result["suggestions"][0] == "土壤湿度"
+    assert 1 <= len(result["suggestions"]) <= 3
+
+    matches = index.suggest("微波传感器", k=3)
+    print(f"[测试] 微波传感器 -> {matches}")
+    assert matches[0].term == "微波遥感"
+
+def test_fallback_to_llm():
+    """测试场景2：本地无法判断时返回 None"""
+    print("\n" + "="*50)
+    print("测试场景2：回退到LLM")
+    print("="*50)
+
+    index = TermIndex(KNOWN_TERMS)
+    result = index.clarify("雷达回波是怎么形成的")
+    print(f"[测试] 雷达回波是怎么形成的 -> {result}")
+    assert result is None
+    assert TermIndex([]).clarify("土壤湿度") is None
+
+def test_edit_distance():
+    """测试场景3：编辑距离"""
+    assert edit_distance("土地湿度", "土壤湿度") == 1
+    assert edit_distance("abc", "abc") == 0
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("abcdef", "a", max_distance=2) == 3
+
+def test_large_index_performance():
+    """测试场景4：数万术语规模下的构建与查询（输出耗时）"""
+    print("\n" + "="*50)
+    print("测试场景4：大规模术语索引")
+    print("="*50)
+
+    rng = random.Random(0)
+    alphabet = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+    terms = KNOWN_TERMS + ["".join(rng.choices(alphabet, k=rng.randint(3, 6))) for _ in range(30000)]
+
+    start = time.perf_counter()
+    index = TermIndex(terms)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    queries = ["土地湿度是什么？", "后向散射系是什么", "植被指标怎么算"] * 50
+    start = time.perf_counter()
+    for query in queries:
+        index.suggest(query)
+    per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"[测试] {len(index)} 个术语，构建 {build_ms:.1f} ms，单次查询 {per_query_ms:.3f} ms")
+
+    # 耗时只输出不断言；延迟回退由 benchmarks（python -m benchmarks.run --section knowledge_base）跟踪
+    assert len(index) == len(set(terms))
+    assert index.suggest("土地湿度是什么？")[0].term == "土壤湿度"
+
+def main():
+    """运行所有测试"""
+    print("开始术语索引测试...")
+
+    test_exact_and_typo_matching()
+    test_fallback_to_llm()
+    test_edit_distance()
+    test_large_index_performance()
+
+    print("\n术语索引测试完成！")
+
+if __name__ == "__main__":
+    main()
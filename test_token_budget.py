@@ -0,0 +1,93 @@
+from core import telemetry
+from core.config import set_llm_provider
+from core.token_budget import get_budget, get_budget_stats, reset_budget_stats, set_budget
+from benchmarks.fake_llm import default_responder, fake_llm_provider
+from handlers.combined import handle_combined_analysis
+from handlers.instruction_0 import handle_instruction_0
+from utils.file_handler import estimate_tokens
+
+def test_output_budget():
+    """测试场景1：各阶段以 max_tokens 限制输出，并记录实际用量与预算"""
+    print("\n" + "="*50)
+    print("测试场景1：输出预算")
+    print("="*50)
+
+    verbose = lambda system, user: "让我逐步分析用户的请求。" * 40 + "\n" + default_responder(system, user)
+    classify_budget = get_budget("classify")
+    telemetry.reset_metrics()
+    telemetry.configure(enabled=True)
+    reset_budget_stats()
+    try:
+        # 紧凑输出：只有一个编号，远低于预算
+        set_llm_provider(fake_llm_provider(latency=0.0))
+        assert handle_instruction_0("说说土壤含水那些事", "") == -2
+        analysis = handle_combined_analysis("说说土壤含水那些事", "")
+        assert analysis["is_ambiguous"] and "土壤湿度" in analysis["suggestions"]
+        stats = get_budget_stats()
+        print(f"[测试] 预算统计: {stats}")
+        assert stats["classify"]["calls"] == 1 and stats["classify"]["at_limit"] == 0
+        assert 0 < stats["classify"]["completion_tokens"] <= classify_budget.max_output_tokens
+        assert stats["classify"]["budget_tokens"] == classify_budget.max_output_tokens
+        assert 0 < stats["combined"]["budget_used"] < 1
+
+        # 不遵守紧凑格式的输出在上限处被截断并记录
+        set_llm_provider(fake_llm_provider(latency=0.0, responder=verbose))
+        assert handle_instruction_0("说说土壤含水那些事", "") == -1
+        stats = get_budget_stats()["classify"]
+        assert stats["calls"] == 2 and stats["at_limit"] == 1
+        assert stats["completion_tokens"] <= 2 * classify_budget.max_output_tokens
+
+        # 不限制时得到完整输出
+        set_budget("classify", max_output_tokens=0)
+        assert handle_instruction_0("说说土壤含水那些事", "") == -2
+        counters = telemetry.metrics_snapshot()["counters"]
+        assert counters["llm_output_at_limit_total"][0]["value"] == 1
+    finally:
+        set_budget("classify", max_output_tokens=classify_budget.max_output_tokens)
+        telemetry.configure(enabled=False)
+        set_llm_provider(None)
+
+def test_input_budget():
+    """测试场景2：上传文件内容超过输入预算时截取相关片段，用户请求保持完整"""
+    print("\n" + "="*50)
+    print("测试场景2：输入预算")
+    print("="*50)
+
+    messages = []
+
+    def capture(system: str, user: str) -> str:
+        messages.append(user)
+        return default_responder(system, user)
+
+    filler = "".join(f"第{i}行：与查询无关的观测记录，数值为{i * 7 % 100}。\n" for i in range(3000))
+    file_content = filler[:len(filler) // 2] + "关键：土壤湿度参数为0.35。\n" + filler[len(filler) // 2:]
+    budget = get_budget("combined")
+    set_budget("combined", max_input_tokens=500)
+    reset_budget_stats()
+    set_llm_provider(fake_llm_provider(latency=0.0, responder=capture))
+    try:
+        analysis = handle_combined_analysis("看看这个数据对应的土壤湿度参数是什么", file_content)
+        message = messages[-1]
+        print(f"[测试] 用户消息 {estimate_tokens(message)} tokens（原文件内容 {estimate_tokens(file_content)} tokens）")
+        assert analysis["task_id"] == 1
+        assert message.startswith("用户请求：\n看看这个数据对应的土壤湿度参数是什么\n\n")
+        assert estimate_tokens(message) <= 550 and "土壤湿度参数为0.35" in message
+        assert get_budget_stats()["combined"]["truncated_inputs"] == 1
+
+        handle_combined_analysis("看看这个数据对应的土壤湿度参数是什么", "第1行：短文件")
+        assert messages[-1].endswith("第1行：短文件") and get_budget_stats()["combined"]["truncated_inputs"] == 1
+    finally:
+        set_budget("combined", max_input_tokens=budget.max_input_tokens)
+        set_llm_provider(None)
+
+def main():
+    """运行所有测试"""
+    print("开始 token 预算测试...")
+
+    test_output_budget()
+    test_input_budget()
+
+    print("\ntoken 预算测试完成！")
+
+if __name__ == "__main__":
+    main()
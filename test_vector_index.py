@@ -0,0 +1,117 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是向量知识库的可选依赖
+    np = None
+
+from utils.knowledge_base import MockKnowledgeBase, set_knowledge_base, query_knowledge_base, NOT_FOUND_MESSAGE
+
+QUERY = "雷达回波强度影响因素"
+
+def _search_in_worker(index_path: str) -> str:
+    """子进程：以内存映射方式加载同一份索引并检索"""
+    from utils.knowledge_base import VectorKnowledgeBase
+    kb = VectorKnowledgeBase(index_path)
+    assert isinstance(kb._index.embeddings, np.memmap)
+    return kb.search([(QUERY, 1.0)])[0].key
+
+def test_semantic_lookup():
+    """测试场景1：精确匹配失败的语义查询"""
+    print("\n" + "="*50)
+    print("测试场景1：语义检索")
+    print("="*50)
+    if np is None:
+        print("[跳过] 未安装 numpy")
+        return
+
+    mock = MockKnowledgeBase()
+    print(f"[测试] 倒排索引: {mock.query([(QUERY, 1.0)])}")
+    assert mock.query([(QUERY, 1.0)]) == NOT_FOUND_MESSAGE
+
+    with tempfile.TemporaryDirectory() as tmp:
+        set_knowledge_base('vector', index_path=os.path.join(tmp, "index"), knowledge_data=mock.knowledge_data)
+        result = query_knowledge_base([(QUERY, 1.0)])
+        print(f"[测试] 向量索引: {result}")
+        assert "雷达" in result
+
+        # 条目名称精确匹配仍然只返回该条目
+        result = query_knowledge_base([("土壤湿度", 1.0)])
+        assert result == mock.knowledge_data["土壤湿度"]
+        assert query_knowledge_base([("今天星期几", 1.0)]) == NOT_FOUND_MESSAGE
+        set_knowledge_base('mock')
+
+def test_persisted_mmap_index():
+    """测试场景2：索引持久化与多进程共享"""
+    print("\n" + "="*50)
+    print("测试场景2：内存映射索引")
+    print("="*50)
+    if np is None:
+        print("[跳过] 未安装 numpy")
+        return
+
+    from utils.knowledge_base import VectorKnowledgeBase
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "index")
+        VectorKnowledgeBase(index_path, knowledge_data=MockKnowledgeBase().knowledge_data)
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            keys = list(pool.map(_search_in_worker, [index_path] * 2))
+        print(f"[测试] 子进程检索结果: {keys}")
+        assert len(set(keys)) == 1
+
+        # 条目未变时再次构造直接加载已保存的索引，不重新向量化
+        from utils.vector_index import VectorIndex
+        data = MockKnowledgeBase().knowledge_data
+        embeddings_mtime = os.stat(os.path.join(index_path, "embeddings.npy")).st_mtime_ns
+        with mock.patch.object(VectorIndex, "build", wraps=VectorIndex.build) as build:
+            kb = VectorKnowledgeBase(index_path, knowledge_data=data)
+            assert build.call_count == 0 and isinstance(kb._index.embeddings, np.memmap)
+            assert os.stat(os.path.join(index_path, "embeddings.npy")).st_mtime_ns == embeddings_mtime
+
+            # 条目变化或 rebuild=True 时重新构建
+            changed = dict(data, 新条目="新增的知识条目")
+            assert VectorKnowledgeBase(index_path, knowledge_data=changed).search([("新条目", 1.0)])[0].key == "新条目"
+            VectorKnowledgeBase(index_path, knowledge_data=changed)
+            VectorKnowledgeBase(index_path, knowledge_data=changed, rebuild=True)
+            assert build.call_count == 2
+
+def test_batched_top_k():
+    """测试场景3：分块批量 top-k 与全量排序一致"""
+    print("\n" + "="*50)
+    print("测试场景3：批量 top-k")
+    print("="*50)
+    if np is None:
+        print("[跳过] 未安装 numpy")
+        return
+
+    from utils.vector_index import HashingEmbedder, VectorIndex
+    embedder = HashingEmbedder(dim=256)
+    entries = {f"条目{i}": f"第{i}号条目：微波遥感参数{i % 97}与地表类型{i % 13}" for i in range(5000)}
+    start = time.perf_counter()
+    index = VectorIndex.build(entries, embedder)
+    print(f"[测试] 构建 {len(index)} 条向量耗时 {time.perf_counter() - start:.2f}s")
+
+    queries = embedder.embed(["微波遥感参数42", "地表类型7", "条目123"])
+    start = time.perf_counter()
+    results = index.search_vectors(queries, top_k=5, block_rows=1000)
+    print(f"[测试] 批量检索 {len(queries)} 个查询耗时 {(time.perf_counter() - start) * 1000:.2f}ms")
+    expected = np.sort(queries @ index.embeddings.T, axis=1)[:, ::-1][:, :5]
+    for row, exp in zip(results, expected):
+        assert np.allclose([score for _, score in row], exp, atol=1e-5)
+
+def main():
+    """运行所有测试"""
+    print("开始向量知识库测试...")
+
+    test_semantic_lookup()
+    test_persisted_mmap_index()
+    test_batched_top_k()
+
+    print("\n向量知识库测试完成！")
+
+if __name__ == "__main__":
+    main()
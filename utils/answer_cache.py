@@ -0,0 +1,243 @@
+"""
+查询级答案缓存：同一问题的不同问法（"土壤湿度是什么？"、"什么是土壤湿度"、"土壤湿度的定义"）
+直接返回已保存的最终答案与标准术语，跳过意图识别、术语澄清与知识库查询。
+
+查询先去掉提问成分并归一化，归一化结果相同即命中；否则用字符二元组的 MinHash 签名做 LSH 分桶，
+只对同桶的候选计算 Jaccard 相似度。条目保存在 SQLite 中（重启后仍然有效），
+缓存键包含知识库内容指纹，知识库变化后旧答案不再命中，并在下次建立索引时删除。
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+    VOLCANO_MODEL_NAME,
+    get_llm_provider,
+)
+from core import telemetry
+from utils.disk_cache import SQLiteCache
+from utils.term_index import char_bigrams, normalize_text, strip_question_fillers
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_query(query: str) -> str:
+    """去掉大小写、空白、标点与"是什么"等提问成分后的查询"""
+    return strip_question_fillers(normalize_text(query))
+
+
+def _shingles(text: str) -> Set[str]:
+    return char_bigrams(text)
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """固定种子的 MinHash：num_perm 个哈希函数，分为 bands 个 LSH 桶"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm 必须是 bands 的整数倍")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shingles: Set[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+        if not hashes:
+            return [_MAX_HASH] * self.num_perm
+        return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in self._perms]
+
+    def band_keys(self, signature: List[int]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(i, tuple(signature[i * self.rows:(i + 1) * self.rows])) for i in range(self.bands)]
+
+
+class AnswerCache:
+    """
+    持久化的查询级答案缓存。
+
+    lookup(query, fingerprint) 返回 {"query", "answer", "term", "task_id", "similarity"} 或 None；
+    fingerprint 为知识库内容指纹（见 get_knowledge_base_fingerprint），namespace 区分不同的模型。
+    相似度匹配只在本进程建立的索引中进行（启动后首次查找时从 SQLite 载入），
+    归一化查询完全相同的条目即使由其他进程写入也能直接命中。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        ttl_seconds: Optional[float] = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: Optional[int] = ANSWER_CACHE_MAX_ENTRIES,
+        namespace: str = "",
+        num_perm: int = 64,
+        bands: int = 16,
+    ):
+        self.store = SQLiteCache(path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self.threshold = threshold
+        self.namespace = namespace
+        self._hasher = MinHasher(num_perm, bands)
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._shingles: Dict[str, Set[str]] = {}
+        self._stats = {"hits": 0, "similar_hits": 0, "misses": 0}
+
+    def _key(self, normalized: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\x00{fingerprint}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def lookup(self, query: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        entry = self._lookup(query, fingerprint)
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["hits"] += 1
+                if entry["similarity"] < 1.0:
+                    self._stats["similar_hits"] += 1
+        return entry
+
+    def _lookup(self, query: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        entry = self._load(self._key(normalized, fingerprint))
+        if entry is not None:
+            return dict(entry, similarity=1.0)
+
+        shingles = _shingles(normalized)
+        best: Optional[Tuple[float, str]] = None
+        with self._lock:
+            self._ensure_index(fingerprint)
+            candidates: Set[str] = set()
+            for band in self._hasher.band_keys(self._hasher.signature(shingles)):
+                candidates |= self._buckets.get(band, set())
+            for candidate in candidates:
+                score = jaccard(shingles, self._shingles[candidate])
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, candidate)
+        if best is None:
+            return None
+        entry = self._load(self._key(best[1], fingerprint))
+        return dict(entry, similarity=round(best[0], 4)) if entry is not None else None
+
+    def put(self, query: str, fingerprint: str, answer: str, term: Optional[str] = None, task_id: int = 1) -> None:
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        entry = {
+            "namespace": self.namespace, "fingerprint": fingerprint, "normalized": normalized,
+            "query": query, "answer": answer, "term": term, "task_id": task_id, "created_at": time.time(),
+        }
+        self.store.set(self._key(normalized, fingerprint), json.dumps(entry, ensure_ascii=False))
+        with self._lock:
+            if self._fingerprint == fingerprint:
+                self._index(normalized)
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.store.get(key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return {field: entry[field] for field in ("query", "answer", "term", "task_id")}
+
+    def _ensure_index(self, fingerprint: str) -> None:
+        """知识库指纹变化（或首次查找）时重建相似度索引，并删除属于旧知识库的条目"""
+        if self._fingerprint == fingerprint:
+            return
+        self._buckets.clear()
+        self._shingles.clear()
+        stale = []
+        for key, value in self.store.items():
+            entry = json.loads(value)
+            if entry.get("namespace") != self.namespace:
+                continue
+            if entry.get("fingerprint") != fingerprint:
+                stale.append(key)
+            else:
+                self._index(entry["normalized"])
+        for key in stale:
+            self.store.delete(key)
+        if stale:
+            print(f"[Agent] 知识库已变化，删除了 {len(stale)} 条过期的缓存答案")
+        self._fingerprint = fingerprint
+
+    def _index(self, normalized: str) -> None:
+        if normalized in self._shingles:
+            return
+        shingles = _shingles(normalized)
+        self._shingles[normalized] = shingles
+        for band in self._hasher.band_keys(self._hasher.signature(shingles)):
+            self._buckets.setdefault(band, set()).add(normalized)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.store.clear()
+            self._fingerprint = None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = len(self.store)
+        return stats
+
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_override = False
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    返回全局答案缓存；未启用（ANSWER_CACHE_ENABLED=0）或通过 set_llm_provider 替换了LLM时返回 None，
+    避免测试与基准中假模型的答案被保存，除非已用 set_answer_cache 明确指定。
+    """
+    global _answer_cache
+    if _answer_cache_override:
+        return _answer_cache
+    if not ANSWER_CACHE_ENABLED or get_llm_provider() is not None:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache(ANSWER_CACHE_PATH, namespace=VOLCANO_MODEL_NAME)
+        return _answer_cache
+
+
+def set_answer_cache(cache: Optional[AnswerCache]) -> None:
+    """指定全局答案缓存（None 表示关闭）"""
+    global _answer_cache, _answer_cache_override
+    with _answer_cache_lock:
+        _answer_cache = cache
+        _answer_cache_override = True
+
+
+def reset_answer_cache() -> None:
+    """恢复默认行为（按配置创建）"""
+    global _answer_cache, _answer_cache_override
+    with _answer_cache_lock:
+        _answer_cache = None
+        _answer_cache_override = False
+
+
+def _answer_cache_stats() -> Dict[str, float]:
+    return _answer_cache.stats() if _answer_cache is not None else {}
+
+
+telemetry.register_cache("answer", _answer_cache_stats)
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class SQLiteCache:
+    """
+    基于 SQLite 的持久化键值缓存，支持 TTL 过期与按条目数/字节数的 LRU 淘汰。
+
+    使用 WAL 模式与 busy_timeout，多个线程和进程可以同时读写同一个缓存文件；
+    每个线程持有独立的连接。命中/未命中等计数只统计当前进程。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        timeout: float = 30.0,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expired": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存值；不存在或已过期时返回 None"""
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        value, created_at = row
+        if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+            conn.execute("DELETE FROM entries WHERE key = ? AND created_at = ?", (key, created_at))
+            self._count("expired")
+            self._count("misses")
+            return None
+
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return value
+
+    def contains(self, key: str) -> bool:
+        """是否有未过期的缓存值；不更新访问时间、不计入命中统计"""
+        row = self._connection().execute("SELECT created_at FROM entries WHERE key = ?", (key,)).fetchone()
+        return row is not None and (self.ttl_seconds is None or time.time() - row[0] <= self.ttl_seconds)
+
+    def set(self, key: str, value: str) -> None:
+        """写入缓存值，并在超出容量时淘汰最久未访问的条目"""
+        conn = self._connection()
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("writes")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        if self.max_entries is None and self.max_bytes is None:
+            return 0
+        count, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        evicted = 0
+        if self.max_entries is not None and count > self.max_entries:
+            excess = count - self.max_entries
+            conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            evicted += excess
+            # 按条目数淘汰后重新统计大小，避免按字节淘汰时多删除条目
+            total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if self.max_bytes is not None and total_bytes > self.max_bytes:
+            freed = 0
+            victims = []
+            for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                if total_bytes - freed <= self.max_bytes:
+                    break
+                victims.append((key,))
+                freed += size
+            conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+            evicted += len(victims)
+        return evicted
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """遍历未过期的 (键, 值)，不更新访问时间、不计入命中统计"""
+        conn = self._connection()
+        if self.ttl_seconds is None:
+            rows = conn.execute("SELECT key, value FROM entries").fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT key, value FROM entries WHERE created_at >= ?", (time.time() - self.ttl_seconds,)
+            ).fetchall()
+        return iter(rows)
+
+    def clear(self) -> None:
+        """清空缓存（计数器保留）"""
+        self._connection().execute("DELETE FROM entries")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """返回当前进程的命中/未命中/写入/淘汰计数以及命中率"""
+        with self._stats_lock:
+            snapshot: Dict[str, float] = dict(self._stats)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+    def close(self) -> None:
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -1,16 +1,246 @@
+import mmap
 import os
-from typing import List
+import re
+from typing import List, NamedTuple, Optional, Tuple
 
-def read_files_to_string(file_paths: List[str] = None) -> str:
-    """Reads user-uploaded files and concatenates them into a single string."""
-    if not file_paths:
-        return ""
-    
-    content = []
-    for path in file_paths:
+from core.config import FILE_CONTEXT_MAX_TOKENS, FILE_READ_MAX_BYTES
+from core.telemetry import register_cache, traced
+from utils.memory_cache import LRUCache
+
+# 明显不是文本的扩展名直接跳过，不打开文件
+BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".ico", ".webp",
+    ".zip", ".gz", ".bz2", ".xz", ".7z", ".rar", ".tar",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
+    ".exe", ".dll", ".so", ".bin", ".pyc", ".npy", ".npz", ".h5", ".hdf", ".nc", ".mat", ".sqlite3", ".db",
+}
+SNIFF_BYTES = 8192
+MMAP_THRESHOLD = 1 << 20
+CHUNK_CHARS = 800
+OMITTED_MARK = "\n...[省略 {} 字符]...\n"
+
+_CJK_RE = re.compile(r"[　-鿿가-힯豈-﫿]")
+_digests = LRUCache(max_entries=128)
+register_cache("file_read", _digests.stats)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数：中日韩字符约 1 个 token，其余字符约 4 个字符 1 个 token"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class FileDigest(NamedTuple):
+    """单个文件的读取结果：kind 为 text / binary / error；excerpt 为放入提示词的文本"""
+    name: str
+    kind: str
+    size: int
+    excerpt: str
+    truncated: bool
+
+
+def _looks_binary(sample: bytes) -> bool:
+    if b"\x00" in sample:
+        return True
+    if not sample:
+        return False
+    # 控制字符（除换行、制表等）占比过高时视为二进制
+    control = sum(1 for byte in sample if byte < 32 and byte not in (9, 10, 12, 13, 27))
+    return control / len(sample) > 0.1
+
+
+def _decode(data: bytes) -> str:
+    for encoding in ("utf-8", "gb18030"):
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                content.append(f"--- 文件: {os.path.basename(path)} ---\n{f.read()}")
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+def _read_sample(path: str, size: int, max_bytes: int) -> Tuple[str, bool]:
+    """
+    读取文件内容；超过 max_bytes 时只取开头与结尾各一半（大文件用 mmap，只有被访问的页才会读入内存）。
+    返回 (文本, 是否截断)。
+    """
+    with open(path, 'rb') as f:
+        if size <= max_bytes:
+            return _decode(f.read()), False
+        half = max_bytes // 2
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                head, tail = mapped[:half], mapped[size - half:]
+        else:
+            head = f.read(half)
+            f.seek(size - half)
+            tail = f.read(half)
+    return _decode_slice(head) + OMITTED_MARK.format(f"约 {size - 2 * half} 字节") + _decode_slice(tail), True
+
+
+def _decode_slice(data: bytes) -> str:
+    """解码从文件中间截取的字节：去掉首尾被切断的 UTF-8 多字节字符，非 UTF-8 时按 GB18030 宽松解码"""
+    start = 0
+    while start < min(3, len(data)) and 0x80 <= data[start] < 0xC0:
+        start += 1
+    end = len(data)
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            break
+        if byte >= 0xC0:
+            width = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            if width > back:
+                end = len(data) - back
+            break
+    try:
+        return data[start:end].decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("gb18030", errors="ignore")
+
+
+def _chunks(text: str, chunk_chars: int = CHUNK_CHARS) -> List[str]:
+    """按行切分为不超过 chunk_chars 的片段（过长的行再按长度切分）"""
+    chunks: List[str] = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > chunk_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:chunk_chars])
+            line = line[chunk_chars:]
+        if len(current) + len(line) > chunk_chars and current:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _select_chunks(text: str, token_budget: int, query: Optional[str]) -> Tuple[str, bool]:
+    """
+    在 token 预算内选取片段：总是保留开头；有查询时按与查询的二元组重合度选取最相关的片段，
+    否则取开头与结尾。选中的片段按原文顺序拼接，省略处加标记。
+    """
+    if estimate_tokens(text) <= token_budget:
+        return text, False
+
+    from utils.retrieval import tokenize
+
+    # 片段不超过预算的四分之一，保证首尾或多个相关片段都能放入
+    chunks = _chunks(text, min(CHUNK_CHARS, max(100, token_budget // 4)))
+    costs = [estimate_tokens(chunk) for chunk in chunks]
+    if query:
+        query_tokens = set(tokenize(query))
+        scores = [len(query_tokens.intersection(tokenize(chunk))) for chunk in chunks]
+        order = [0] + sorted(range(1, len(chunks)), key=lambda i: (-scores[i], i))
+    else:
+        # 开头与结尾交替选取
+        order = []
+        head, tail = 0, len(chunks) - 1
+        while head <= tail:
+            order.append(head)
+            if tail != head:
+                order.append(tail)
+            head, tail = head + 1, tail - 1
+
+    selected, used = set(), 0
+    for i in order:
+        if used + costs[i] > token_budget:
+            if not selected:
+                # 单个片段超出预算时截取其开头
+                chars = max(1, len(chunks[i]) * token_budget // max(costs[i], 1))
+                return chunks[i][:chars] + OMITTED_MARK.format(len(text) - chars), True
+            continue
+        selected.add(i)
+        used += costs[i]
+
+    parts, omitted = [], 0
+    for i, chunk in enumerate(chunks):
+        if i in selected:
+            if omitted:
+                parts.append(OMITTED_MARK.format(omitted))
+                omitted = 0
+            parts.append(chunk)
+        else:
+            omitted += len(chunk)
+    if omitted:
+        parts.append(OMITTED_MARK.format(omitted))
+    return "".join(parts), True
+
+
+def fit_text(text: str, token_budget: int, query: Optional[str] = None) -> Tuple[str, bool]:
+    """把文本截取到 token 预算内（保留开头，以及与查询最相关或首尾的片段），返回 (文本, 是否截取)"""
+    if token_budget <= 0:
+        return "", bool(text)
+    return _select_chunks(text, token_budget, query)
+
+
+def digest_file(path: str, token_budget: int, query: Optional[str] = None, max_bytes: int = FILE_READ_MAX_BYTES) -> FileDigest:
+    """读取单个文件并生成预算内的摘录；结果按 (路径, 修改时间, 大小, 预算, 查询) 缓存"""
+    name = os.path.basename(path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        return FileDigest(name, "error", 0, f"--- 无法读取文件: {name}, 错误: {e} ---", False)
+
+    cache_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, token_budget, query, max_bytes)
+    cached = _digests.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if os.path.splitext(name)[1].lower() in BINARY_EXTENSIONS:
+        digest = FileDigest(name, "binary", stat.st_size, f"--- 已跳过非文本文件: {name}（{stat.st_size} 字节） ---", False)
+    else:
+        try:
+            with open(path, 'rb') as f:
+                sample = f.read(SNIFF_BYTES)
+            if _looks_binary(sample):
+                digest = FileDigest(name, "binary", stat.st_size, f"--- 已跳过非文本文件: {name}（{stat.st_size} 字节） ---", False)
+            else:
+                text, truncated = _read_sample(path, stat.st_size, max_bytes)
+                excerpt, selected = _select_chunks(text, token_budget, query)
+                digest = FileDigest(name, "text", stat.st_size, f"--- 文件: {name} ---\n{excerpt}", truncated or selected)
         except Exception as e:
-            content.append(f"--- 无法读取文件: {os.path.basename(path)}, 错误: {e} ---")
-    return "\n\n".join(content) 
\ No newline at end of file
+            digest = FileDigest(name, "error", stat.st_size, f"--- 无法读取文件: {name}, 错误: {e} ---", False)
+    _digests.set(cache_key, digest)
+    return digest
+
+
+def clear_file_cache() -> None:
+    """清空文件读取结果缓存（例如基准测试中测量冷读取）"""
+    _digests.clear()
+
+
+def read_file_digests(
+    file_paths: Optional[List[str]],
+    max_tokens: int = FILE_CONTEXT_MAX_TOKENS,
+    query: Optional[str] = None,
+    max_bytes: int = FILE_READ_MAX_BYTES,
+) -> List[FileDigest]:
+    """并行读取多个文件；max_tokens 为所有文件摘录的总 token 预算，平均分配给各文件"""
+    if not file_paths:
+        return []
+    budget = max(1, max_tokens // len(file_paths))
+    if len(file_paths) == 1:
+        return [digest_file(file_paths[0], budget, query, max_bytes)]
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(8, len(file_paths))) as pool:
+        return list(pool.map(lambda path: digest_file(path, budget, query, max_bytes), file_paths))
+
+
+@traced("file.read")
+def read_files_to_string(
+    file_paths: List[str] = None,
+    max_tokens: int = FILE_CONTEXT_MAX_TOKENS,
+    query: Optional[str] = None,
+) -> str:
+    """
+    Reads user-uploaded files and concatenates bounded excerpts into a single string.
+
+    Binary and unsupported files are skipped, large files are sampled (head/tail, or the chunks
+    most relevant to query) so the result stays within roughly max_tokens tokens.
+    """
+    return "\n\n".join(digest.excerpt for digest in read_file_digests(file_paths, max_tokens, query))
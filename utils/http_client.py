@@ -0,0 +1,190 @@
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# 这些状态码表示服务端暂时不可用，可以重试
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class HTTPError(Exception):
+    """请求失败：status 为 HTTP 状态码（连接错误时为 None）"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in RETRYABLE_STATUS
+
+
+class ConnectionPool:
+    """
+    同一主机的 HTTP/1.1 长连接池（基于 http.client）。
+
+    空闲连接放回池中复用（keep-alive），最多保留 max_size 个；
+    出错的连接直接关闭，不会放回。每个连接同一时间只被一个线程使用。
+    """
+
+    def __init__(self, base_url: str, max_size: int = 8, timeout: float = 10.0):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"不支持的协议: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._stats = {"connections_opened": 0, "connections_reused": 0}
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        with self._lock:
+            self._stats["connections_opened"] += 1
+        return cls(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """取出一个连接，返回 (连接, 是否为复用的空闲连接)"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection(timeout), False
+        with self._lock:
+            self._stats["connections_reused"] += 1
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        conn.timeout = timeout
+        return conn, True
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        if self._idle.qsize() < self.max_size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> bytes:
+        """发送一次请求并返回响应体；非 2xx 响应或连接错误抛出 HTTPError"""
+        conn, reused = self._acquire(timeout or self.timeout)
+        while True:
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                # 空闲连接可能已被服务端关闭（keep-alive 超时），换一个新连接立即重发一次
+                if reused and isinstance(e, (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine)):
+                    conn, reused = self._new_connection(timeout or self.timeout), False
+                    continue
+                raise HTTPError(f"{type(e).__name__}: {e}") from e
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        if not 200 <= response.status < 300:
+            retry_after = response.getheader("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                retry_after = None
+            raise HTTPError(f"HTTP {response.status}: {data[:200]!r}", response.status, retry_after)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, idle=self._idle.qsize())
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def call_with_retries(
+    func: Callable[[], Any],
+    max_attempts: int = 3,
+    base_delay: float = 0.2,
+    max_delay: float = 5.0,
+    on_retry: Optional[Callable[[int, HTTPError], None]] = None,
+) -> Any:
+    """
+    调用 func，遇到可重试的 HTTPError 时按指数退避重试，等待时间加入完全随机抖动（full jitter），
+    避免大量客户端在同一时刻重试；服务端返回 Retry-After 时以其为下限。
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func()
+        except HTTPError as e:
+            if not e.retryable or attempt == max_attempts:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            if e.retry_after is not None:
+                delay = max(delay, min(e.retry_after, max_delay))
+            if on_retry is not None:
+                on_retry(attempt, e)
+            time.sleep(delay)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class Singleflight:
+    """合并并发的相同请求：同一个 key 同一时间只执行一次，其余调用者等待并共享结果（或异常）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, _Call] = {}
+        self.shared = 0
+
+    def do(self, key: Any, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+def json_body(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
@@ -0,0 +1,140 @@
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from utils.term_index import TermIndex, normalize_text
+
+# 出现这些词时用户更可能是在描述任务2/3（环境模拟/参数反演），交给LLM判断
+TASK_CUE_WORDS = ["模拟", "仿真", "构建", "正向", "推断", "反演", "估算", "参数", "数据"]
+
+# 遥感领域常见词汇，用于判断查询是否"明显与领域无关"
+DOMAIN_HINT_WORDS = [
+    "遥感", "雷达", "卫星", "传感器", "散射", "反射", "辐射", "介电", "极化", "波段",
+    "光谱", "影像", "图像", "微波", "植被", "土壤", "地表", "湿度", "粗糙", "后向",
+    "回波", "SAR", "NDVI", "GIS", "RSHub",
+]
+
+# 明显与遥感领域无关的请求（日期、写作、娱乐等）；只有出现这些词且没有任何领域线索时才在本地拒绝，
+# 没有命中任何词的查询（例如"什么是亮温"）一律交给LLM，避免把领域问题误判为无关
+OFF_DOMAIN_CUE_WORDS = [
+    "星期", "几号", "几点", "日期", "天气预报", "作文", "写诗", "写首诗", "诗歌", "笑话",
+    "菜谱", "做菜", "股票", "彩票", "电影", "歌词", "星座",
+]
+
+_ASCII_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# 近似命中（错别字等）的置信度略低于精确命中：accept_threshold 高于该值时只接受精确命中
+NEAR_HIT_CONFIDENCE = 0.9
+
+
+class FastPathResult(NamedTuple):
+    """本地预分类结果，task_id 为 0 表示本地无法给出判断"""
+    task_id: int
+    confidence: float
+    reason: str
+
+
+class LocalIntentClassifier:
+    """
+    位于 handle_instruction_0 之前的本地意图预分类器。
+
+    只处理明显的情况：查询中（归一化后）直接包含已知术语，或与某个术语的编辑相似度
+    不低于 similarity_threshold（例如"土地湿度"）-> 任务1；查询包含明显无关的请求词
+    （例如"星期"、"作文"）且没有任何领域线索 -> -1。没有正向命中的查询一律返回 None，交由LLM判断。
+    """
+
+    def __init__(
+        self,
+        known_terms: List[str],
+        accept_threshold: float = 0.9,
+        reject_threshold: float = 0.95,
+        similarity_threshold: float = 0.75,
+        domain_hints: Optional[List[str]] = None,
+        task_cues: Optional[List[str]] = None,
+        off_domain_cues: Optional[List[str]] = None,
+    ):
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._stats = {"total": 0, "accepted": 0, "rejected": 0, "deferred": 0}
+        self.set_terms(known_terms, domain_hints)
+        self.task_cues = [normalize_text(w) for w in (task_cues or TASK_CUE_WORDS)]
+        self.off_domain_cues = [normalize_text(w) for w in (off_domain_cues or OFF_DOMAIN_CUE_WORDS)]
+
+    def set_terms(self, known_terms: List[str], domain_hints: Optional[List[str]] = None) -> None:
+        """重建术语表与领域词汇表"""
+        hints = domain_hints if domain_hints is not None else DOMAIN_HINT_WORDS
+        self.known_terms = {normalize_text(t): t for t in known_terms if normalize_text(t)}
+        self._term_index = TermIndex(self.known_terms.values())
+        vocabulary = set(self.known_terms) | {normalize_text(w) for w in hints}
+        vocabulary.discard("")
+        self._vocabulary = vocabulary
+        self._ascii_vocabulary = {w for w in vocabulary if _ASCII_WORD_RE.fullmatch(w)}
+
+    def predict(self, user_prompt: str, file_content: str = "") -> FastPathResult:
+        """计算本地分类结果与置信度，不更新统计计数"""
+        query = normalize_text(user_prompt)
+        if not query:
+            return FastPathResult(0, 0.0, "empty")
+
+        has_task_cue = any(cue and cue in query for cue in self.task_cues)
+        hits = [term for norm, term in self.known_terms.items() if norm in query]
+        if hits:
+            if has_task_cue:
+                return FastPathResult(1, 0.5, "term_hit_with_task_cue")
+            if file_content:
+                return FastPathResult(1, 0.6, "term_hit_with_file")
+            return FastPathResult(1, 1.0, f"term_hit:{hits[0]}")
+
+        near = self._term_index.suggest(user_prompt, k=1, min_score=self.similarity_threshold)
+        if near:
+            if has_task_cue:
+                return FastPathResult(1, 0.5, "term_near_with_task_cue")
+            if file_content:
+                return FastPathResult(1, 0.6, "term_near_with_file")
+            return FastPathResult(1, NEAR_HIT_CONFIDENCE, f"term_near:{near[0].term}")
+
+        # 上传了文件或出现任务线索时，不在本地拒绝
+        if file_content or has_task_cue:
+            return FastPathResult(0, 0.0, "needs_llm")
+        if any(word in query for word in self._vocabulary):
+            return FastPathResult(0, 0.0, "domain_hint")
+        if set(_ASCII_WORD_RE.findall(query)) & self._ascii_vocabulary:
+            return FastPathResult(0, 0.0, "domain_hint")
+
+        cues = [cue for cue in self.off_domain_cues if cue and cue in query]
+        if cues:
+            return FastPathResult(-1, 1.0, f"off_domain:{cues[0]}")
+        return FastPathResult(0, 0.0, "no_match")
+
+    def classify(self, user_prompt: str, file_content: str = "") -> Optional[int]:
+        """
+        返回本地可确定的任务ID；置信度不足时返回 None，表示需要调用LLM。
+        """
+        result = self.predict(user_prompt, file_content)
+        if result.task_id > 0 and result.confidence >= self.accept_threshold:
+            outcome = "accepted"
+        elif result.task_id < 0 and result.confidence >= self.reject_threshold:
+            outcome = "rejected"
+        else:
+            outcome = "deferred"
+
+        with self._lock:
+            self._stats["total"] += 1
+            self._stats[outcome] += 1
+        return None if outcome == "deferred" else result.task_id
+
+    def stats(self) -> Dict[str, float]:
+        """返回计数器快照，包括跳过LLM的比例"""
+        with self._lock:
+            snapshot: Dict[str, float] = dict(self._stats)
+        bypassed = snapshot["accepted"] + snapshot["rejected"]
+        snapshot["bypassed"] = bypassed
+        snapshot["bypass_rate"] = bypassed / snapshot["total"] if snapshot["total"] else 0.0
+        return snapshot
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for key in self._stats:
+                self._stats[key] = 0
@@ -0,0 +1,315 @@
+"""
+离线增量构建知识库索引：遍历源文档目录（.txt / .md / .json / .jsonl），切分、规范化后向量化，
+写入向量知识库（set_knowledge_base('vector')）读取的索引目录。
+
+每个源文件的处理结果（片段与向量）按 内容哈希 + 切分参数 + 向量化方式 缓存在 cache_dir 中，
+索引的 meta.json 记录各文件的 (大小, 修改时间, 内容哈希)：重新构建时修改时间与大小未变的文件不再读取，
+内容哈希未变的文件直接复用缓存，只有内容变化的文件交给进程池重新切分与向量化。
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import KB_BUILD_CACHE_DIR, KB_BUILD_WORKERS, KB_CHUNK_MAX_CHARS
+from utils.knowledge_store import iter_source_entries
+from utils.vector_index import Embedder, HashingEmbedder, VectorIndex
+
+SOURCE_EXTENSIONS = {".txt", ".md", ".markdown", ".json", ".jsonl"}
+# 切分规则变化时递增，旧的缓存结果自动失效
+CHUNKER_VERSION = 1
+
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n")
+_SPACES_RE = re.compile(r"[ \t\f\v]+")
+_SENTENCE_RE = re.compile(r"(?<=[。！？；!?;])|(?<=\.)\s+")
+
+
+def normalize_passage(text: str) -> str:
+    """NFKC 规范化（全角字母数字转半角），合并行内空白，去掉行首尾空白与多余空行"""
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+def chunk_text(text: str, max_chars: int = KB_CHUNK_MAX_CHARS) -> List[str]:
+    """
+    按段落把正文合并为不超过 max_chars 的片段；单个段落过长时按句子切分，句子仍过长时按字符数切分
+    """
+    text = normalize_passage(text)
+    if not text:
+        return []
+    if max_chars <= 0 or len(text) <= max_chars:
+        return [text]
+    pieces: List[str] = []
+    for paragraph in text.split("\n\n"):
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            sentence = sentence.strip()
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        candidate = f"{current}\n\n{piece}" if current else piece
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _markdown_sections(text: str, default_key: str) -> Iterator[Tuple[str, str]]:
+    """按标题切分 Markdown，条目名称为最近的标题（标题之前的内容使用文件名）"""
+    key, lines = default_key, []
+    for line in text.splitlines():
+        match = _HEADING_RE.match(line)
+        if match:
+            yield key, "\n".join(lines)
+            key, lines = match.group(2), []
+        else:
+            lines.append(line)
+    yield key, "\n".join(lines)
+
+
+def _json_entries(path: str) -> Iterator[Tuple[str, str]]:
+    """JSON 对象 {名称: 正文}，或 [{"key"/"term"/"title": ..., "text"/"content": ...}, ...]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        for key, text in data.items():
+            yield str(key), text if isinstance(text, str) else json.dumps(text, ensure_ascii=False)
+        return
+    for item in data:
+        key = next((item[name] for name in ("key", "term", "title", "name") if name in item), None)
+        text = next((item[name] for name in ("text", "content", "description") if name in item), None)
+        if key is not None and text is not None:
+            yield str(key), str(text)
+
+
+def parse_source(path: str) -> Iterator[Tuple[str, str]]:
+    """按扩展名读取源文件，返回 (条目名称, 正文)；纯文本文件以文件名作为条目名称"""
+    ext = os.path.splitext(path)[1].lower()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if ext == ".jsonl":
+        yield from iter_source_entries(path)
+    elif ext == ".json":
+        yield from _json_entries(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        if ext in (".md", ".markdown"):
+            yield from _markdown_sections(text, stem)
+        else:
+            yield stem, text
+
+
+def chunk_entries(entries: Iterable[Tuple[str, str]], max_chars: int = KB_CHUNK_MAX_CHARS) -> List[Tuple[str, str]]:
+    """切分各条目的正文；同一条目的多个片段使用相同的名称"""
+    chunks = []
+    for key, text in entries:
+        key = normalize_passage(key)
+        if key:
+            chunks.extend((key, chunk) for chunk in chunk_text(text, max_chars))
+    return chunks
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _artifact_id(content_hash: str, embedder_name: str, max_chars: int) -> str:
+    """缓存结果的名称：内容哈希 + 切分规则 + 向量化方式，任一变化都需要重新处理"""
+    return hashlib.sha256(f"{content_hash}\x00{CHUNKER_VERSION}\x00{max_chars}\x00{embedder_name}".encode()).hexdigest()[:32]
+
+
+def _artifact_paths(cache_dir: str, artifact: str) -> Tuple[str, str]:
+    return os.path.join(cache_dir, artifact + ".npy"), os.path.join(cache_dir, artifact + ".json")
+
+
+def _artifact_exists(cache_dir: str, artifact: str) -> bool:
+    # 片段文件最后写入，存在即表示缓存完整
+    return os.path.exists(_artifact_paths(cache_dir, artifact)[1])
+
+
+def _process_file(
+    path: str, cache_dir: str, embedder: Embedder, max_chars: int, use_cache: bool = True
+) -> Tuple[str, str, int, bool]:
+    """
+    进程池任务：计算内容哈希，缓存中没有（或 use_cache=False）时切分、向量化并写入缓存。
+    返回 (内容哈希, 缓存名称, 片段数, 是否复用了缓存)
+    """
+    content_hash = file_digest(path)
+    artifact = _artifact_id(content_hash, embedder.name, max_chars)
+    vectors_path, chunks_path = _artifact_paths(cache_dir, artifact)
+    if use_cache and _artifact_exists(cache_dir, artifact):
+        with open(chunks_path, 'r', encoding='utf-8') as f:
+            return content_hash, artifact, len(json.load(f)["keys"]), True
+    chunks = chunk_entries(parse_source(path), max_chars)
+    keys = [key for key, _ in chunks]
+    texts = [text for _, text in chunks]
+    embeddings = VectorIndex.build(chunks, embedder).embeddings
+    pid = os.getpid()
+    with open(f"{vectors_path}.{pid}.tmp", 'wb') as f:
+        np.save(f, embeddings)
+    os.replace(f"{vectors_path}.{pid}.tmp", vectors_path)
+    with open(f"{chunks_path}.{pid}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({"keys": keys, "texts": texts}, f, ensure_ascii=False)
+    os.replace(f"{chunks_path}.{pid}.tmp", chunks_path)
+    return content_hash, artifact, len(chunks), False
+
+
+def discover_sources(source_dir: str, exclude: Iterable[str] = ()) -> List[str]:
+    """源目录下的文档（相对路径，排序后返回）；跳过隐藏文件与目录，以及 exclude 中的目录（索引与缓存目录）"""
+    excluded = {os.path.abspath(path) for path in exclude}
+    found = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(
+            name for name in dirs
+            if not name.startswith(".") and os.path.abspath(os.path.join(root, name)) not in excluded
+        )
+        for name in files:
+            if not name.startswith(".") and os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS:
+                found.append(os.path.relpath(os.path.join(root, name), source_dir))
+    return sorted(found)
+
+
+def build_knowledge_base(
+    source_dir: str,
+    index_path: str,
+    cache_dir: str = KB_BUILD_CACHE_DIR,
+    workers: int = KB_BUILD_WORKERS,
+    embedder: Optional[Embedder] = None,
+    max_chars: int = KB_CHUNK_MAX_CHARS,
+    rebuild: bool = False,
+    prune: bool = True,
+) -> Dict[str, float]:
+    """
+    由 source_dir 中的文档构建（或增量更新）index_path 处的向量索引。
+
+    workers: 处理变化文件的进程数（0 表示 CPU 核数，1 表示在当前进程中处理）
+    rebuild: 忽略已有的文件清单与缓存，全部重新处理；也允许用空索引替换已有的非空索引
+    prune: 删除缓存中不再被任何源文件使用的结果（多个索引共用一个 cache_dir 时应关闭）
+
+    返回统计：源文件数、重新处理数、复用数、删除数、失败数、片段数、耗时，以及索引是否被重写（updated）。
+    source_dir 不是目录时抛出 FileNotFoundError；没有得到任何片段而已有索引非空时抛出 ValueError
+    （通常是源目录写错或被清空），此时不修改索引与缓存。
+    """
+    if not os.path.isdir(source_dir):
+        raise FileNotFoundError(f"源文档目录不存在: {source_dir}")
+    start = time.perf_counter()
+    embedder = embedder or HashingEmbedder()
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    previous = None if rebuild else VectorIndex.read_meta(index_path)
+    previous_files: Dict[str, Dict] = (previous or {}).get("build", {}).get("files", {})
+    sources = discover_sources(source_dir, exclude=(index_path, cache_dir))
+
+    files: Dict[str, Dict] = {}
+    pending: List[Tuple[str, os.stat_result]] = []
+    stats = {"files": len(sources), "processed": 0, "reused": 0, "removed": 0, "failed": 0}
+    for rel in sources:
+        stat = os.stat(os.path.join(source_dir, rel))
+        known = previous_files.get(rel)
+        # 大小与修改时间都未变时沿用记录的内容哈希，不读取文件
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            artifact = _artifact_id(known["sha256"], embedder.name, max_chars)
+            if _artifact_exists(cache_dir, artifact):
+                files[rel] = dict(known, artifact=artifact)
+                stats["reused"] += 1
+                continue
+        pending.append((rel, stat))
+    stats["removed"] = len(set(previous_files) - set(sources))
+
+    def record(rel: str, stat: os.stat_result, result: Tuple[str, str, int, bool]) -> None:
+        content_hash, artifact, chunks, reused = result
+        files[rel] = {"sha256": content_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                      "artifact": artifact, "chunks": chunks}
+        stats["reused" if reused else "processed"] += 1
+
+    def failed(rel: str, error: BaseException) -> None:
+        print(f"[警告] 无法处理源文件 {rel}，已跳过: {error}")
+        stats["failed"] += 1
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {
+                pool.submit(_process_file, os.path.join(source_dir, rel), cache_dir, embedder, max_chars, not rebuild):
+                    (rel, stat)
+                for rel, stat in pending
+            }
+            for future in as_completed(futures):
+                rel, stat = futures[future]
+                try:
+                    record(rel, stat, future.result())
+                except (OSError, ValueError, TypeError) as e:
+                    failed(rel, e)
+    else:
+        for rel, stat in pending:
+            try:
+                record(rel, stat, _process_file(os.path.join(source_dir, rel), cache_dir, embedder, max_chars, not rebuild))
+            except (OSError, ValueError, TypeError) as e:
+                failed(rel, e)
+
+    ordered = [files[rel] for rel in sources if rel in files]
+    build_meta = {"files": {rel: files[rel] for rel in sources if rel in files}, "max_chars": max_chars,
+                  "chunker_version": CHUNKER_VERSION}
+    unchanged = (
+        previous is not None
+        and VectorIndex.exists(index_path)
+        and previous.get("embedder") == embedder.name
+        and {rel: info["artifact"] for rel, info in files.items()}
+        == {rel: info.get("artifact") for rel, info in previous_files.items()}
+    )
+    if unchanged:
+        # 内容未变：只在文件的修改时间等记录变化时更新清单，不重写向量与条目
+        if build_meta["files"] != previous_files:
+            VectorIndex.write_meta(index_path, dict(previous, build=build_meta))
+        stats["chunks"] = previous.get("count", 0)
+    else:
+        keys: List[str] = []
+        texts: List[str] = []
+        matrices = []
+        if not rebuild and not any(info["chunks"] for info in ordered) and (previous or {}).get("count"):
+            raise ValueError(
+                f"{source_dir} 中没有可用的源文档，拒绝用空索引替换已有的 {previous['count']} 个片段（确需清空请使用 rebuild）"
+            )
+        for info in ordered:
+            vectors_path, chunks_path = _artifact_paths(cache_dir, info["artifact"])
+            with open(chunks_path, 'r', encoding='utf-8') as f:
+                chunks = json.load(f)
+            keys.extend(chunks["keys"])
+            texts.extend(chunks["texts"])
+            matrices.append(np.load(vectors_path))
+        embeddings = np.concatenate(matrices) if matrices else np.zeros((0, embedder.dim), dtype=np.float32)
+        VectorIndex(keys, texts, embeddings, embedder.name).save(index_path, extra_meta={"build": build_meta})
+        stats["chunks"] = len(keys)
+
+    if prune:
+        used = {info["artifact"] for info in ordered}
+        for name in os.listdir(cache_dir):
+            artifact, ext = os.path.splitext(name)
+            if ext in (".npy", ".json") and artifact not in used:
+                os.remove(os.path.join(cache_dir, name))
+
+    stats["updated"] = not unchanged
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
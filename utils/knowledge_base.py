@@ -1,7 +1,23 @@
-from typing import List, Tuple, Dict, Any, Optional
+from typing import Callable, List, NamedTuple, Tuple, Dict, Any, Optional
 from abc import ABC, abstractmethod
+import hashlib
 import json
 import os
+import threading
+import time
+
+from core.telemetry import register_cache, traced
+from utils.retrieval import InvertedIndex, KnowledgeHit
+
+NOT_FOUND_MESSAGE = "抱歉，关于您提到的知识，我的知识库中暂无相关信息。"
+NO_KEYWORD_MESSAGE = "抱歉，未能识别出有效查询关键词。"
+API_UNAVAILABLE_MESSAGE = "抱歉，知识库服务暂时不可用，请稍后再试。"
+
+def _digest(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8") + b"\x00")
+    return digest.hexdigest()[:16]
 
 class KnowledgeBase(ABC):
     """知识库基类，定义知识库接口"""
@@ -11,64 +27,698 @@ class KnowledgeBase(ABC):
         """查询知识库的抽象方法"""
         pass
 
-class MockKnowledgeBase(KnowledgeBase):
+    async def aquery(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        """异步查询；默认在线程池中执行 query，子类可提供原生异步实现"""
+        import asyncio  # 仅在异步路径中需要，避免同步使用者承担导入开销
+        return await asyncio.to_thread(self.query, keywords_with_weights)
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: int = 3) -> List[KnowledgeHit]:
+        """返回带得分的命中条目；默认把 query 的结果视为一条得分为1的命中"""
+        text = self.query(keywords_with_weights)
+        if not keywords_with_weights or text.startswith("抱歉"):
+            return []
+        return [KnowledgeHit(keywords_with_weights[0][0], text, 1.0)]
+
+    def keys(self) -> List[str]:
+        """返回知识库中的条目名称（用于术语索引），默认不提供"""
+        return []
+
+    def fingerprint(self) -> str:
+        """
+        知识库内容的指纹（跨进程、跨重启稳定），用于判断持久化的派生结果（如答案缓存）是否仍然有效。
+        默认由类型与条目名称计算，能取得条目内容的实现应把内容也计算在内。
+        """
+        return _digest(type(self).__name__, *sorted(self.keys()))
+
+    def check_for_updates(self) -> None:
+        """检查知识源是否变化并同步（会热加载的实现覆盖此方法）；在读取指纹之前调用"""
+
+    def add_reload_listener(self, listener: Callable[[], None]) -> None:
+        """注册回调：知识库内容重新加载或增量同步后调用（用于使缓存失效）"""
+        self.__dict__.setdefault("_reload_listeners", []).append(listener)
+
+    def _notify_reload(self) -> None:
+        for listener in self.__dict__.get("_reload_listeners", ()):
+            listener()
+
+class IndexedKnowledgeBase(KnowledgeBase):
+    """
+    基于内存倒排索引（BM25）的知识库，综合所有关键词及其权重检索条目，返回得分最高的若干段落。
+
+    top_k: 最多返回的段落数
+    min_score: 最高得分低于此值时视为未命中
+    relative_cutoff: 只返回得分不低于最高得分该比例的段落
+    """
+
+    def __init__(self, top_k: int = 3, min_score: float = 0.3, relative_cutoff: float = 0.6):
+        self.top_k = top_k
+        self.min_score = min_score
+        self.relative_cutoff = relative_cutoff
+        self.knowledge_data: Dict[str, str] = {}
+        self._index = InvertedIndex()
+
+    def _set_entries(self, knowledge_data: Dict[str, str]) -> None:
+        """替换知识条目并重建索引（新索引构建完成后一次性替换）"""
+        index = InvertedIndex(knowledge_data)
+        self.knowledge_data, self._index = knowledge_data, index
+        self._notify_reload()
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: Optional[int] = None) -> List[KnowledgeHit]:
+        hits = self._index.search(keywords_with_weights, top_k or self.top_k)
+        if not hits or hits[0].score < self.min_score:
+            return []
+        floor = hits[0].score * self.relative_cutoff
+        return [hit for hit in hits if hit.score >= floor]
+
+    def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        print(f"[知识库] 正在查询关键词: {keywords_with_weights}")
+        if not keywords_with_weights:
+            return NO_KEYWORD_MESSAGE
+        hits = self.search(keywords_with_weights)
+        if not hits:
+            return NOT_FOUND_MESSAGE
+        return "\n\n".join(hit.text for hit in hits)
+
+    async def aquery(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        # 内存索引查询不会阻塞事件循环，无需切换线程
+        return self.query(keywords_with_weights)
+
+    def keys(self) -> List[str]:
+        return list(self.knowledge_data.keys())
+
+    def fingerprint(self) -> str:
+        return _digest("indexed", *(f"{key}\x00{text}" for key, text in sorted(self.knowledge_data.items())))
+
+class MockKnowledgeBase(IndexedKnowledgeBase):
     """模拟知识库实现，用于测试和开发"""
     
-    def __init__(self, knowledge_data: Optional[Dict[str, str]] = None):
-        self.knowledge_data = knowledge_data or {
+    def __init__(self, knowledge_data: Optional[Dict[str, str]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._set_entries(knowledge_data or {
             "土壤湿度": "土壤湿度是影响微波后向散射系数的关键地表参数之一。通常，湿度越高，介电常数越大，导致更强的雷达回波信号。",
             "RSHub": "RSHub是一个集成了多种微波遥感模型的平台，用户可以通过Python脚本调用其工具链，进行正向模拟和数据分析。",
             "微波遥感": "微波遥感利用微波波段的电磁波来探测地表信息，其优势在于能够穿透云雾，实现全天时全天候观测。",
             "地表粗糙度": "地表粗糙度描述了地表面的起伏状况，是影响雷达信号散射方向和强度的另一个重要因素。",
-        }
-    
-    def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
-        """查询模拟知识库"""
-        print(f"[知识库] 正在查询关键词: {keywords_with_weights}")
-        if keywords_with_weights:
-            first_keyword = keywords_with_weights[0][0]
-            return self.knowledge_data.get(first_keyword, "抱歉，关于您提到的知识，我的知识库中暂无相关信息。")
-        return "抱歉，未能识别出有效查询关键词。"
+        })
 
-class FileKnowledgeBase(KnowledgeBase):
+class FileKnowledgeBase(IndexedKnowledgeBase):
     """基于文件的知识库实现"""
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, **kwargs):
+        super().__init__(**kwargs)
         self.file_path = file_path
         self._load_knowledge()
     
+    def reload(self) -> None:
+        """重新读取知识库文件（注册的重新加载回调会被调用）"""
+        self._load_knowledge()
+
     def _load_knowledge(self):
         """从文件加载知识库数据"""
         try:
             with open(self.file_path, 'r', encoding='utf-8') as f:
-                self.knowledge_data = json.load(f)
+                self._set_entries(json.load(f))
         except FileNotFoundError:
             print(f"[警告] 知识库文件 {self.file_path} 不存在，使用空知识库")
-            self.knowledge_data = {}
+            self._set_entries({})
         except json.JSONDecodeError:
             print(f"[警告] 知识库文件 {self.file_path} 格式错误，使用空知识库")
-            self.knowledge_data = {}
-    
+            self._set_entries({})
+
+class StoreKnowledgeBase(KnowledgeBase):
+    """
+    基于 SQLite 磁盘存储的知识库，适用于无法整体载入内存的大型知识库。
+
+    source_path 为知识源文件（.jsonl 逐行流式读取，或 JSON 对象）；db_path 默认为 source_path + ".sqlite3"。
+    查询时每隔 check_interval 秒检查一次知识源的修改时间与大小，变化时只同步内容发生变化的条目，
+    同步在单个事务中提交，并发查询不会看到加载到一半的状态。
+    hot_entries: 常驻内存的最近访问条目数
+    """
+
+    def __init__(
+        self,
+        source_path: str,
+        db_path: Optional[str] = None,
+        hot_entries: int = 1024,
+        check_interval: float = 2.0,
+        top_k: int = 3,
+        min_score: float = 0.3,
+        relative_cutoff: float = 0.6,
+    ):
+        from utils.knowledge_store import SQLiteKnowledgeStore
+
+        self.source_path = source_path
+        self.check_interval = check_interval
+        self.top_k = top_k
+        self.min_score = min_score
+        self.relative_cutoff = relative_cutoff
+        self.store = SQLiteKnowledgeStore(db_path or f"{source_path}.sqlite3", hot_entries=hot_entries)
+        self._refresh_lock = threading.Lock()
+        self._last_check = 0.0
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """知识源发生变化时增量同步，返回是否进行了同步"""
+        from utils.knowledge_store import iter_source_entries, source_signature
+
+        self._last_check = time.monotonic()
+        try:
+            signature = source_signature(self.source_path)
+        except FileNotFoundError:
+            if self.store.get_meta("source_signature") is None:
+                print(f"[警告] 知识库文件 {self.source_path} 不存在，使用空知识库")
+            return False
+        if self.store.get_meta("source_signature") == json.dumps(signature):
+            return False
+        try:
+            counts = self.store.sync(
+                iter_source_entries(self.source_path),
+                meta={"source_signature": json.dumps(signature)},
+            )
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            # 文件可能正在被写入，保留现有数据，下次检查时重试
+            print(f"[警告] 知识库文件 {self.source_path} 格式错误，继续使用已加载的数据: {e}")
+            return False
+        print(f"[知识库] 已同步 {self.source_path}: {counts}")
+        if counts["added"] or counts["updated"] or counts["removed"]:
+            self._notify_reload()
+        return True
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        # 同一时间只有一个线程检查与同步，其余查询继续使用当前快照
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            finally:
+                self._refresh_lock.release()
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: Optional[int] = None) -> List[KnowledgeHit]:
+        self._maybe_refresh()
+        hits = self.store.search(keywords_with_weights, top_k or self.top_k)
+        if not hits or hits[0].score < self.min_score:
+            return []
+        floor = hits[0].score * self.relative_cutoff
+        return [hit for hit in hits if hit.score >= floor]
+
     def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
-        """查询文件知识库"""
         print(f"[知识库] 正在查询关键词: {keywords_with_weights}")
-        if keywords_with_weights:
-            first_keyword = keywords_with_weights[0][0]
-            return self.knowledge_data.get(first_keyword, "抱歉，关于您提到的知识，我的知识库中暂无相关信息。")
-        return "抱歉，未能识别出有效查询关键词。"
+        if not keywords_with_weights:
+            return NO_KEYWORD_MESSAGE
+        hits = self.search(keywords_with_weights)
+        if not hits:
+            return NOT_FOUND_MESSAGE
+        return "\n\n".join(hit.text for hit in hits)
+
+    def keys(self) -> List[str]:
+        return self.store.keys()
+
+    def check_for_updates(self) -> None:
+        self._maybe_refresh()
+
+    def fingerprint(self) -> str:
+        # 知识源的修改时间与大小在同步时写入存储；先同步，避免知识源修改后仍返回旧指纹
+        self._maybe_refresh()
+        return _digest("store", self.source_path, self.store.get_meta("source_signature") or "")
+
+class VectorKnowledgeBase(KnowledgeBase):
+    """
+    基于稠密向量索引的知识库：按语义相似度检索，关键词与条目名称不完全一致时也能命中。
+
+    index_path 处已有索引时直接以内存映射方式加载（多个进程共享同一份数据）；
+    否则用 knowledge_data 或 file_path（JSON）中的条目构建索引并保存到 index_path。
+    给出条目时，索引的 meta.json 记录条目与向量化方式的指纹：指纹一致时直接加载，
+    只有 rebuild=True 或条目变化时才重新向量化并覆盖索引。
+    embedder 默认为本地字符 n-gram 哈希向量化，需与构建索引时使用的一致。
+    """
+
+    def __init__(
+        self,
+        index_path: str,
+        knowledge_data: Optional[Dict[str, str]] = None,
+        file_path: Optional[str] = None,
+        embedder=None,
+        top_k: int = 3,
+        min_score: float = 0.2,
+        relative_cutoff: float = 0.8,
+        rebuild: bool = False,
+    ):
+        # numpy 是可选依赖，只有使用向量知识库时才需要
+        from utils.vector_index import HashingEmbedder, VectorIndex
+
+        self.index_path = index_path
+        self.embedder = embedder or HashingEmbedder()
+        self.top_k = top_k
+        self.min_score = min_score
+        self.relative_cutoff = relative_cutoff
+
+        source = knowledge_data
+        if source is None and file_path is not None:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    source = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                print(f"[警告] 无法读取知识库文件 {file_path}: {e}")
+
+        source_fingerprint = None
+        if source is not None:
+            source_fingerprint = _digest(
+                "vector-source", self.embedder.name, *(f"{key}\x00{text}" for key, text in sorted(source.items()))
+            )
+
+        index = None
+        meta = None if rebuild else VectorIndex.read_meta(index_path)
+        if meta is not None and source is not None and meta.get("source") != source_fingerprint:
+            meta = None
+        if meta is not None and VectorIndex.exists(index_path):
+            index = VectorIndex.load(index_path)
+            if index.embedder_name != self.embedder.name:
+                raise ValueError(
+                    f"索引 {index_path} 使用 {index.embedder_name} 构建，与当前向量化方式 {self.embedder.name} 不一致"
+                )
+            print(f"[知识库] 已加载向量索引 {index_path}（{len(index)} 条）")
+        if index is None:
+            index = VectorIndex.build(source or {}, self.embedder)
+            index.save(index_path, extra_meta={"source": source_fingerprint} if source_fingerprint else None)
+            print(f"[知识库] 已构建向量索引 {index_path}（{len(index)} 条）")
+        self._index = index
+        self._fingerprint: Optional[str] = None
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: Optional[int] = None) -> List[KnowledgeHit]:
+        from utils.vector_index import weighted_query
+
+        keywords = [(keyword, weight) for keyword, weight in keywords_with_weights if weight > 0]
+        if not keywords:
+            return []
+        # 各关键词向量按权重加权合成一个查询向量，一次矩阵运算完成检索
+        hits = self._index.search_vectors(weighted_query(self.embedder, keywords), top_k or self.top_k)[0]
+        scores = {doc_id: max(0.0, score) for doc_id, score in hits}
+
+        # 条目名称与关键词完全一致时，该关键词的权重份额直接计满
+        total_weight = sum(weight for _, weight in keywords)
+        for keyword, weight in keywords:
+            doc_id = self._index.lookup_key(keyword)
+            if doc_id is not None:
+                scores[doc_id] = max(scores.get(doc_id, 0.0), weight / total_weight)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k or self.top_k]
+        if not ranked or ranked[0][1] < self.min_score:
+            return []
+        floor = ranked[0][1] * self.relative_cutoff
+        return [
+            KnowledgeHit(self._index.keys[doc_id], self._index.texts[doc_id], score)
+            for doc_id, score in ranked if score >= floor
+        ]
+
+    def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        print(f"[知识库] 正在进行语义检索: {keywords_with_weights}")
+        if not keywords_with_weights:
+            return NO_KEYWORD_MESSAGE
+        hits = self.search(keywords_with_weights)
+        if not hits:
+            return NOT_FOUND_MESSAGE
+        return "\n\n".join(hit.text for hit in hits)
+
+    def keys(self) -> List[str]:
+        # 离线构建的索引中同一条目可能切分为多个片段
+        return list(dict.fromkeys(self._index.keys))
+
+    def fingerprint(self) -> str:
+        # 索引加载后不再变化，条目名称与正文只需计算一次
+        if self._fingerprint is None:
+            self._fingerprint = _digest(
+                "vector", self._index.embedder_name,
+                *(f"{key}\x00{text}" for key, text in zip(self._index.keys, self._index.texts)),
+            )
+        return self._fingerprint
 
 class APIKnowledgeBase(KnowledgeBase):
-    """基于API的知识库实现"""
-    
-    def __init__(self, api_url: str, api_key: Optional[str] = None):
+    """
+    基于API的知识库实现。
+
+    请求格式：POST api_url，请求体为
+        {"queries": [{"keywords": [{"keyword": ..., "weight": ...}, ...], "top_k": 3}, ...]}
+    响应为 {"results": [[{"key": ..., "text": ..., "score": ...}, ...], ...]}，与 queries 一一对应。
+    一次查询的所有关键词在同一个请求中发送，search_many 把多次查询合并为批量请求（每批最多 max_batch_size 个）。
+
+    使用长连接池复用 TCP 连接；连接错误、超时与 429/5xx 响应按带随机抖动的指数退避重试；
+    并发的相同查询只发出一个请求，结果共享给所有调用者。
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: Optional[str] = None,
+        timeout: float = 10.0,
+        max_connections: int = 8,
+        max_attempts: int = 3,
+        retry_base_delay: float = 0.2,
+        max_batch_size: int = 32,
+        top_k: int = 3,
+    ):
+        from utils.http_client import ConnectionPool, Singleflight
+
         self.api_url = api_url
         self.api_key = api_key
-    
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.max_batch_size = max_batch_size
+        self.top_k = top_k
+        self._pool = ConnectionPool(api_url, max_size=max_connections, timeout=timeout)
+        self._singleflight = Singleflight()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "errors": 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _post(self, queries: List[Tuple[Tuple[Tuple[str, float], ...], int]]) -> List[List[KnowledgeHit]]:
+        from utils.http_client import call_with_retries, json_body
+
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        body = json_body({"queries": [
+            {"keywords": [{"keyword": keyword, "weight": weight} for keyword, weight in keywords], "top_k": top_k}
+            for keywords, top_k in queries
+        ]})
+
+        def send() -> bytes:
+            self._count("requests")
+            return self._pool.request("POST", "", body=body, headers=headers, timeout=self.timeout)
+
+        data = call_with_retries(
+            send,
+            max_attempts=self.max_attempts,
+            base_delay=self.retry_base_delay,
+            on_retry=lambda attempt, error: self._count("retries"),
+        )
+        results = json.loads(data)["results"]
+        if len(results) != len(queries):
+            raise ValueError(f"API返回了 {len(results)} 组结果，请求了 {len(queries)} 组")
+        return [
+            [KnowledgeHit(str(hit["key"]), str(hit["text"]), float(hit.get("score", 1.0))) for hit in hits]
+            for hits in results
+        ]
+
+    @staticmethod
+    def _query_key(keywords_with_weights: List[Tuple[str, float]], top_k: int) -> Tuple[Tuple[Tuple[str, float], ...], int]:
+        return tuple((str(keyword), float(weight)) for keyword, weight in keywords_with_weights), top_k
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: Optional[int] = None) -> List[KnowledgeHit]:
+        """查询一次；并发的相同查询合并为一个请求。请求最终失败时抛出 HTTPError"""
+        key = self._query_key(keywords_with_weights, top_k or self.top_k)
+        return self._singleflight.do(key, lambda: self._post([key])[0])
+
+    def search_many(self, queries: List[List[Tuple[str, float]]], top_k: Optional[int] = None) -> List[List[KnowledgeHit]]:
+        """批量查询：重复的查询只发送一次，每个请求最多包含 max_batch_size 个查询"""
+        keys = [self._query_key(keywords, top_k or self.top_k) for keywords in queries]
+        unique = list(dict.fromkeys(keys))
+        results: Dict[Any, List[KnowledgeHit]] = {}
+        for start in range(0, len(unique), self.max_batch_size):
+            chunk = unique[start:start + self.max_batch_size]
+            results.update(zip(chunk, self._post(chunk)))
+        return [results[key] for key in keys]
+
     def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
         """查询API知识库"""
-        # TODO: 实现API调用逻辑
         print(f"[知识库] 正在通过API查询关键词: {keywords_with_weights}")
-        return "API知识库功能尚未实现"
+        if not keywords_with_weights:
+            return NO_KEYWORD_MESSAGE
+        try:
+            hits = self.search(keywords_with_weights)
+        except Exception as e:
+            self._count("errors")
+            print(f"[错误] 知识库API请求失败: {e}")
+            return API_UNAVAILABLE_MESSAGE
+        if not hits:
+            return NOT_FOUND_MESSAGE
+        return "\n\n".join(hit.text for hit in hits)
+
+    def fingerprint(self) -> str:
+        # 远程内容的变化无法在本地察觉，依赖方需要另外设置过期时间
+        return _digest("api", self.api_url or "")
+
+    def stats(self) -> Dict[str, int]:
+        """请求数、重试数、失败数、合并的并发请求数与连接池状态"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["coalesced"] = self._singleflight.shared
+        stats.update(self._pool.stats())
+        return stats
+
+    def close(self) -> None:
+        self._pool.close()
+
+class FederatedBackend(NamedTuple):
+    """联合知识库中的一个后端：weight 为其得分权重，hedge 表示响应慢时是否发送对冲请求"""
+    knowledge_base: KnowledgeBase
+    weight: float = 1.0
+    hedge: bool = True
+    name: str = ""
+
+class FederatedKnowledgeBase(KnowledgeBase):
+    """
+    联合知识库：一次查询并行发往多个后端，按加权得分合并结果。
+
+    deadline: 整次查询的最长等待时间（秒），超时未返回的后端被忽略
+    hedge_after: 后端超过该时间仍未返回时，再向它发送一个相同的请求，取先返回的结果（None 表示不对冲）
+    confident_score: 出现加权得分不低于此值的命中时立即返回，不再等待其余后端
+    未完成的请求继续在后台线程中执行，结果被丢弃。
+    """
+
+    def __init__(
+        self,
+        backends: List[Any],
+        deadline: float = 2.0,
+        hedge_after: Optional[float] = 0.3,
+        confident_score: float = 0.95,
+        top_k: int = 3,
+        relative_cutoff: float = 0.6,
+        max_workers: Optional[int] = None,
+    ):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.backends = [
+            backend if isinstance(backend, FederatedBackend) else FederatedBackend(backend, name=type(backend).__name__)
+            for backend in backends
+        ]
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.confident_score = confident_score
+        self.top_k = top_k
+        self.relative_cutoff = relative_cutoff
+        # 每个后端最多同时有原始请求与对冲请求两个在途
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(4, len(self.backends) * 4),
+            thread_name_prefix="federated-kb",
+        )
+        self._stats_lock = threading.Lock()
+        self._stats = {"queries": 0, "early_returns": 0, "deadline_exceeded": 0, "hedges": 0, "hedge_wins": 0, "errors": 0}
+        for backend in self.backends:
+            backend.knowledge_base.add_reload_listener(self._notify_reload)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: Optional[int] = None) -> List[KnowledgeHit]:
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        top_k = top_k or self.top_k
+        self._count("queries")
+        start = time.monotonic()
+        deadline = start + self.deadline
+        # future -> (后端编号, 是否为对冲请求)
+        pending: Dict[Any, Tuple[int, bool]] = {}
+        for i, backend in enumerate(self.backends):
+            pending[self._executor.submit(backend.knowledge_base.search, keywords_with_weights, top_k)] = (i, False)
+        answered: set = set()
+        hedge_at = start + self.hedge_after if self.hedge_after is not None else None
+        merged: Dict[str, KnowledgeHit] = {}
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                self._count("deadline_exceeded")
+                slow = sorted({self.backends[i].name for i, _ in pending.values()})
+                print(f"[警告] 联合知识库查询超时，未返回的后端: {slow}")
+                break
+            if hedge_at is not None and now >= hedge_at:
+                # 只对冲一次：仍未返回的后端各再发送一个相同的请求
+                hedge_at = None
+                for i in sorted({i for i, _ in pending.values()}):
+                    if self.backends[i].hedge:
+                        self._count("hedges")
+                        pending[self._executor.submit(self.backends[i].knowledge_base.search, keywords_with_weights, top_k)] = (i, True)
+            timeout = deadline - now if hedge_at is None else min(deadline, hedge_at) - now
+
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            confident = False
+            for future in done:
+                i, is_hedge = pending.pop(future)
+                if i in answered:
+                    continue
+                try:
+                    hits = future.result()
+                except Exception as e:
+                    self._count("errors")
+                    print(f"[警告] 知识库后端 {self.backends[i].name} 查询失败: {e}")
+                    # 另一个请求（原始或对冲）仍在途时等待它的结果
+                    if any(j == i for j, _ in pending.values()):
+                        continue
+                    hits = []
+                answered.add(i)
+                if is_hedge:
+                    self._count("hedge_wins")
+                weight = self.backends[i].weight
+                for hit in hits:
+                    scored = hit._replace(score=hit.score * weight)
+                    current = merged.get(hit.key)
+                    if current is None or scored.score > current.score:
+                        merged[hit.key] = scored
+                    if scored.score >= self.confident_score:
+                        confident = True
+                # 同一后端的另一个请求已无需等待
+                for future_, (j, _) in list(pending.items()):
+                    if j == i:
+                        del pending[future_]
+            if confident:
+                self._count("early_returns")
+                break
+
+        hits = sorted(merged.values(), key=lambda hit: hit.score, reverse=True)[:top_k]
+        if not hits:
+            return []
+        floor = hits[0].score * self.relative_cutoff
+        return [hit for hit in hits if hit.score >= floor]
+
+    def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        print(f"[知识库] 正在联合查询 {len(self.backends)} 个知识库: {keywords_with_weights}")
+        if not keywords_with_weights:
+            return NO_KEYWORD_MESSAGE
+        hits = self.search(keywords_with_weights)
+        if not hits:
+            return NOT_FOUND_MESSAGE
+        return "\n\n".join(hit.text for hit in hits)
+
+    def keys(self) -> List[str]:
+        keys: Dict[str, None] = {}
+        for backend in self.backends:
+            keys.update(dict.fromkeys(backend.knowledge_base.keys()))
+        return list(keys)
+
+    def check_for_updates(self) -> None:
+        for backend in self.backends:
+            backend.knowledge_base.check_for_updates()
+
+    def fingerprint(self) -> str:
+        return _digest("federated", *(f"{b.name}:{b.weight}:{b.knowledge_base.fingerprint()}" for b in self.backends))
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+class CachingKnowledgeBase(KnowledgeBase):
+    """
+    为任意知识库加一层进程内缓存。
+
+    命中结果保存在按条目数淘汰的 LRU 中（可选 TTL）；未命中（NOT_FOUND_MESSAGE / 空结果）保存在单独的、
+    过期时间更短的负缓存中，避免热门的未收录术语反复访问后端，同时让新收录的条目较快可见。
+    服务暂时不可用等错误结果不缓存。底层知识库重新加载时两级缓存都会清空。
+    """
+
+    def __init__(
+        self,
+        inner: KnowledgeBase,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = None,
+        negative_max_entries: int = 1024,
+        negative_ttl_seconds: float = 30.0,
+    ):
+        from utils.memory_cache import LRUCache
+
+        self.inner = inner
+        self._positive = LRUCache(max_entries, ttl_seconds)
+        self._negative = LRUCache(negative_max_entries, negative_ttl_seconds)
+        self._invalidations = 0
+        inner.add_reload_listener(self.invalidate)
+
+    @staticmethod
+    def _key(kind: str, keywords_with_weights: List[Tuple[str, float]], top_k: Optional[int] = None) -> Tuple:
+        return kind, tuple((str(keyword), float(weight)) for keyword, weight in keywords_with_weights), top_k
+
+    def _lookup(self, key: Tuple) -> Any:
+        value = self._positive.get(key)
+        if value is None:
+            value = self._negative.get(key)
+        return value
+
+    def _store(self, key: Tuple, value: Any, negative: bool) -> None:
+        (self._negative if negative else self._positive).set(key, value)
+
+    def invalidate(self) -> None:
+        """清空两级缓存，并通知本缓存的监听者"""
+        self._positive.clear()
+        self._negative.clear()
+        self._invalidations += 1
+        self._notify_reload()
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: Optional[int] = None) -> List[KnowledgeHit]:
+        key = self._key("search", keywords_with_weights, top_k)
+        hits = self._lookup(key)
+        if hits is None:
+            hits = self.inner.search(keywords_with_weights, top_k) if top_k else self.inner.search(keywords_with_weights)
+            self._store(key, hits, negative=not hits)
+        return hits
+
+    def query(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        key = self._key("query", keywords_with_weights)
+        text = self._lookup(key)
+        if text is None:
+            text = self.inner.query(keywords_with_weights)
+            self._remember(key, text)
+        return text
+
+    async def aquery(self, keywords_with_weights: List[Tuple[str, float]]) -> str:
+        key = self._key("query", keywords_with_weights)
+        text = self._lookup(key)
+        if text is None:
+            text = await self.inner.aquery(keywords_with_weights)
+            self._remember(key, text)
+        return text
+
+    def _remember(self, key: Tuple, text: str) -> None:
+        if text == NOT_FOUND_MESSAGE:
+            self._store(key, text, negative=True)
+        elif not text.startswith("抱歉"):
+            self._store(key, text, negative=False)
+
+    def keys(self) -> List[str]:
+        return self.inner.keys()
+
+    def check_for_updates(self) -> None:
+        self.inner.check_for_updates()
+
+    def fingerprint(self) -> str:
+        return self.inner.fingerprint()
+
+    def stats(self) -> Dict[str, int]:
+        """命中、未命中（访问后端）、负缓存命中、淘汰与失效次数"""
+        positive, negative = self._positive.stats(), self._negative.stats()
+        return {
+            "hits": positive["hits"],
+            "negative_hits": negative["hits"],
+            "misses": negative["misses"],
+            "evictions": positive["evictions"] + negative["evictions"],
+            "expired": positive["expired"] + negative["expired"],
+            "invalidations": self._invalidations,
+            "size": positive["size"],
+            "negative_size": negative["size"],
+        }
 
 class KnowledgeBaseFactory:
     """知识库工厂类，用于创建不同类型的知识库实例"""
@@ -79,46 +729,171 @@ class KnowledgeBaseFactory:
         创建知识库实例
         
         Args:
-            kb_type: 知识库类型，可选值：'mock', 'file', 'api'
-            **kwargs: 创建知识库所需的参数
+            kb_type: 知识库类型，可选值：'mock', 'file', 'store', 'vector', 'api', 'federated'
+            **kwargs: 创建知识库所需的参数；cache=True（或 CachingKnowledgeBase 的参数字典）时外加一层进程内缓存
         
         Returns:
             KnowledgeBase: 知识库实例
         """
+        cache = kwargs.pop('cache', None)
+        knowledge_base = KnowledgeBaseFactory._create(kb_type, **kwargs)
+        if cache:
+            # cache=True 使用默认参数，也可以传入 CachingKnowledgeBase 的参数字典
+            knowledge_base = CachingKnowledgeBase(knowledge_base, **(cache if isinstance(cache, dict) else {}))
+        return knowledge_base
+
+    @staticmethod
+    def _create(kb_type: str, **kwargs) -> KnowledgeBase:
+        # 检索参数（top_k / min_score / relative_cutoff）对基于索引的知识库（mock / file / store / vector）生效
+        search_options = {k: kwargs[k] for k in ('top_k', 'min_score', 'relative_cutoff') if k in kwargs}
         if kb_type == 'mock':
-            return MockKnowledgeBase(kwargs.get('knowledge_data'))
+            return MockKnowledgeBase(kwargs.get('knowledge_data'), **search_options)
         elif kb_type == 'file':
-            return FileKnowledgeBase(kwargs.get('file_path', 'knowledge_base.json'))
+            return FileKnowledgeBase(kwargs.get('file_path', 'knowledge_base.json'), **search_options)
+        elif kb_type == 'store':
+            return StoreKnowledgeBase(
+                kwargs.get('file_path', 'knowledge_base.jsonl'),
+                db_path=kwargs.get('db_path'),
+                hot_entries=kwargs.get('hot_entries', 1024),
+                check_interval=kwargs.get('check_interval', 2.0),
+                **search_options
+            )
+        elif kb_type == 'vector':
+            from core.config import KNOWLEDGE_BASE_INDEX_PATH
+            return VectorKnowledgeBase(
+                kwargs.get('index_path', KNOWLEDGE_BASE_INDEX_PATH),
+                knowledge_data=kwargs.get('knowledge_data'),
+                file_path=kwargs.get('file_path'),
+                embedder=kwargs.get('embedder'),
+                rebuild=kwargs.get('rebuild', False),
+                **search_options
+            )
+        elif kb_type == 'federated':
+            # backends: 知识库实例、FederatedBackend，或 {"type": ..., "weight": ..., "hedge": ..., 其余为创建参数} 形式的配置
+            backends = []
+            for spec in kwargs.get('backends', []):
+                if isinstance(spec, (KnowledgeBase, FederatedBackend)):
+                    backends.append(spec)
+                    continue
+                spec = dict(spec)
+                backend_type = spec.pop('type')
+                weight = spec.pop('weight', 1.0)
+                hedge = spec.pop('hedge', True)
+                backends.append(FederatedBackend(
+                    KnowledgeBaseFactory.create_knowledge_base(backend_type, **spec), weight, hedge, backend_type
+                ))
+            federated_options = {
+                k: kwargs[k] for k in ('deadline', 'hedge_after', 'confident_score', 'top_k', 'relative_cutoff', 'max_workers')
+                if k in kwargs
+            }
+            return FederatedKnowledgeBase(backends, **federated_options)
         elif kb_type == 'api':
+            api_options = {
+                k: kwargs[k] for k in ('timeout', 'max_connections', 'max_attempts', 'retry_base_delay', 'max_batch_size', 'top_k')
+                if k in kwargs
+            }
             return APIKnowledgeBase(
                 kwargs.get('api_url'),
-                kwargs.get('api_key')
+                kwargs.get('api_key'),
+                **api_options
             )
         else:
             raise ValueError(f"未知的知识库类型: {kb_type}")
 
 # 默认使用模拟知识库
 _knowledge_base = MockKnowledgeBase()
+# 每次切换知识库时递增，依赖知识库内容的缓存（如术语索引）据此判断是否需要重建
+_knowledge_base_generation = 0
+_fingerprint: Optional[Tuple[int, str]] = None
 
 def set_knowledge_base(kb_type: str, **kwargs):
     """设置全局知识库实例"""
-    global _knowledge_base
+    global _knowledge_base, _knowledge_base_generation
     _knowledge_base = KnowledgeBaseFactory.create_knowledge_base(kb_type, **kwargs)
+    # 知识库内容热加载后同样递增版本号，使依赖其内容的缓存重建
+    _knowledge_base.add_reload_listener(_bump_knowledge_base_generation)
+    _knowledge_base_generation += 1
+
+def _bump_knowledge_base_generation() -> None:
+    global _knowledge_base_generation
+    _knowledge_base_generation += 1
+
+@traced("knowledge_base.query")
+def query_knowledge_base(
+    keywords_with_weights: List[Tuple[str, float]], knowledge_base: Optional[KnowledgeBase] = None
+) -> str:
+    """查询知识库的全局函数；knowledge_base 指定时查询该实例（后台任务在提交时取得实例，不受之后的切换影响）"""
+    return (knowledge_base or _knowledge_base).query(keywords_with_weights)
+
+@traced("knowledge_base.search")
+def search_knowledge_base(keywords_with_weights: List[Tuple[str, float]]) -> List[KnowledgeHit]:
+    """检索全局知识库，返回带得分的命中条目（用于逐段输出）"""
+    return _knowledge_base.search(keywords_with_weights)
+
+@traced("knowledge_base.query")
+async def query_knowledge_base_async(
+    keywords_with_weights: List[Tuple[str, float]], knowledge_base: Optional[KnowledgeBase] = None
+) -> str:
+    """异步查询知识库的全局函数"""
+    return await (knowledge_base or _knowledge_base).aquery(keywords_with_weights)
+
+def get_knowledge_base() -> KnowledgeBase:
+    """返回当前的全局知识库实例"""
+    return _knowledge_base
+
+def get_knowledge_base_terms() -> List[str]:
+    """返回当前全局知识库中的条目名称"""
+    return _knowledge_base.keys()
 
-def query_knowledge_base(keywords_with_weights: List[Tuple[str, float]]) -> str:
-    """查询知识库的全局函数"""
-    return _knowledge_base.query(keywords_with_weights)
+def get_knowledge_base_generation() -> int:
+    """返回当前全局知识库的版本号"""
+    return _knowledge_base_generation
+
+def get_knowledge_base_fingerprint() -> str:
+    """返回当前全局知识库的内容指纹（每个版本只计算一次）"""
+    global _fingerprint
+    # 会热加载的知识库先检查知识源，变化时版本号递增，指纹随之重新计算
+    _knowledge_base.check_for_updates()
+    generation = _knowledge_base_generation
+    if _fingerprint is None or _fingerprint[0] != generation:
+        _fingerprint = (generation, _knowledge_base.fingerprint())
+    return _fingerprint[1]
+
+def get_knowledge_base_stats() -> Dict[str, Any]:
+    """返回当前全局知识库的统计信息（没有统计的实现返回空字典）"""
+    stats = getattr(_knowledge_base, "stats", None)
+    return stats() if callable(stats) else {}
+
+register_cache("knowledge_base", get_knowledge_base_stats)
 
 """
 #文件知识库
 set_knowledge_base('file', file_path='my_knowledge.json')
 
+#磁盘知识库（大型 JSONL 知识源，修改后自动增量同步）
+set_knowledge_base('store', file_path='my_knowledge.jsonl')
+
+#向量知识库（索引保存在 KNOWLEDGE_BASE_INDEX_PATH，已存在时直接加载）
+set_knowledge_base('vector', file_path='my_knowledge.json')
+
+#由 KNOWLEDGE_BASE_PATH 下的源文档离线构建的向量知识库（先运行 python build_kb.py）
+set_knowledge_base('vector')
+
 #API知识库
 set_knowledge_base('api', 
     api_url='https://api.example.com/knowledge',
     api_key='your_api_key'
 )
 
+#联合知识库（并行查询多个后端，按加权得分合并）
+set_knowledge_base('federated', deadline=1.5, backends=[
+    {'type': 'file', 'file_path': 'my_knowledge.json'},
+    {'type': 'api', 'api_url': 'https://api.example.com/knowledge', 'weight': 0.8},
+])
+
+#带进程内缓存的API知识库（命中结果LRU缓存，未命中结果短期缓存）
+set_knowledge_base('api', api_url='https://api.example.com/knowledge', cache={'max_entries': 4096, 'negative_ttl_seconds': 60})
+
 #自定义的模拟数据
 custom_data = {
     "新术语1": "新知识1",
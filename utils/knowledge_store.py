@@ -0,0 +1,326 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.retrieval import KnowledgeHit, tokenize
+from utils.term_index import normalize_text
+
+
+def iter_source_entries(source_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    逐条读取知识源文件，返回 (条目名称, 正文)。
+
+    .jsonl 文件每行一个 {"key": ..., "text": ...}（或单个 {名称: 正文}），流式读取，内存占用与文件大小无关；
+    其他文件按 JSON 对象 {名称: 正文} 整体解析，适用于较小的知识库。
+    """
+    if source_path.endswith(".jsonl"):
+        with open(source_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                if "key" in item and "text" in item:
+                    yield str(item["key"]), str(item["text"])
+                else:
+                    for key, text in item.items():
+                        yield str(key), str(text)
+    else:
+        with open(source_path, 'r', encoding='utf-8') as f:
+            for key, text in json.load(f).items():
+                yield str(key), str(text)
+
+
+def source_signature(source_path: str) -> Tuple[int, int]:
+    """知识源文件的 (mtime_ns, size)，用于低成本地判断文件是否变化"""
+    stat = os.stat(source_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SQLiteKnowledgeStore:
+    """
+    基于 SQLite 的磁盘知识库：条目与全文索引（FTS5）都保存在数据库文件中，
+    查询时按需读取，只有最近访问的 hot_entries 条正文常驻内存。
+
+    正文按 utils.retrieval.tokenize 切分为二元组后写入 FTS5，条目名称的词项重复 key_boost 次以提高权重。
+    sync 在一个事务内增量应用知识源的变化（只写入内容哈希变化的条目）；
+    WAL 模式下并发查询始终看到同步前或同步后的完整快照，不会读到一半的状态。
+    """
+
+    def __init__(self, path: str, hot_entries: int = 1024, key_boost: int = 3, timeout: float = 30.0):
+        self.path = path
+        self.hot_entries = hot_entries
+        self.key_boost = key_boost
+        self.timeout = timeout
+        self._local = threading.local()
+        self._hot: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
+        self._hot_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # 每次同步提交后递增；读取开始后版本发生变化的结果不写入常驻集合，避免缓存旧内容
+        self._version = 0
+        # 本地常驻集合对应的数据库同步版本（meta 表中的 sync_version）
+        self._synced_db_version: Optional[int] = None
+        self._stats = {"hot_hits": 0, "hot_misses": 0, "syncs": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " id INTEGER PRIMARY KEY,"
+                " key TEXT NOT NULL UNIQUE,"
+                " norm_key TEXT NOT NULL,"
+                " text TEXT NOT NULL,"
+                " hash TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_norm_key ON entries(norm_key)")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(tokens, tokenize='unicode61')")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_vocab USING fts5vocab(entries_fts, row)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    # --- 同步 ---
+
+    def get_meta(self, name: str) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _index_tokens(self, key: str, text: str) -> str:
+        return " ".join(tokenize(key) * self.key_boost + tokenize(text))
+
+    def sync(self, entries: Iterable[Tuple[str, str]], meta: Optional[Dict[str, str]] = None, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        把数据库内容同步为 entries：新增/修改的条目写入，消失的条目删除，未变化的条目不做改动。
+
+        整个同步在一个写事务中完成，提交前查询看到的仍是旧快照。返回各类变化的条目数。
+        """
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        changed_ids: List[int] = []
+        with self._sync_lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)")
+                conn.execute("DELETE FROM seen")
+                batch: List[Tuple[str, str]] = []
+                for entry in entries:
+                    batch.append(entry)
+                    if len(batch) >= batch_size:
+                        self._apply_batch(conn, batch, counts, changed_ids)
+                        batch = []
+                if batch:
+                    self._apply_batch(conn, batch, counts, changed_ids)
+
+                removed = [row[0] for row in conn.execute("SELECT id FROM entries WHERE id NOT IN (SELECT id FROM seen)")]
+                for start in range(0, len(removed), 500):
+                    chunk = removed[start:start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    conn.execute(f"DELETE FROM entries WHERE id IN ({marks})", chunk)
+                    conn.execute(f"DELETE FROM entries_fts WHERE rowid IN ({marks})", chunk)
+                counts["removed"] = len(removed)
+                changed_ids.extend(removed)
+                for name, value in (meta or {}).items():
+                    conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+                db_version = self._db_version(conn) + 1
+                conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('sync_version', ?)", (str(db_version),))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            with self._hot_lock:
+                self._version += 1
+                if self._synced_db_version == db_version - 1:
+                    for doc_id in changed_ids:
+                        self._hot.pop(doc_id, None)
+                else:
+                    self._hot.clear()
+                self._synced_db_version = db_version
+                self._stats["syncs"] += 1
+        return counts
+
+    def _apply_batch(self, conn: sqlite3.Connection, batch: List[Tuple[str, str]], counts: Dict[str, int], changed_ids: List[int]) -> None:
+        keys = [key for key, _ in batch]
+        marks = ",".join("?" * len(keys))
+        existing = {
+            key: (doc_id, digest)
+            for doc_id, key, digest in conn.execute(f"SELECT id, key, hash FROM entries WHERE key IN ({marks})", keys)
+        }
+        for key, text in batch:
+            digest = hashlib.sha1(f"{key}\x00{text}".encode("utf-8")).hexdigest()
+            current = existing.get(key)
+            if current is None:
+                cursor = conn.execute(
+                    "INSERT INTO entries (key, norm_key, text, hash) VALUES (?, ?, ?, ?)",
+                    (key, normalize_text(key), text, digest),
+                )
+                doc_id = cursor.lastrowid
+                conn.execute("INSERT INTO entries_fts (rowid, tokens) VALUES (?, ?)", (doc_id, self._index_tokens(key, text)))
+                existing[key] = (doc_id, digest)
+                counts["added"] += 1
+            elif current[1] != digest:
+                doc_id = current[0]
+                conn.execute("UPDATE entries SET text = ?, hash = ? WHERE id = ?", (text, digest, doc_id))
+                conn.execute("DELETE FROM entries_fts WHERE rowid = ?", (doc_id,))
+                conn.execute("INSERT INTO entries_fts (rowid, tokens) VALUES (?, ?)", (doc_id, self._index_tokens(key, text)))
+                existing[key] = (doc_id, digest)
+                changed_ids.append(doc_id)
+                counts["updated"] += 1
+            else:
+                doc_id = current[0]
+                counts["unchanged"] += 1
+            conn.execute("INSERT OR IGNORE INTO seen (id) VALUES (?)", (doc_id,))
+
+    # --- 读取 ---
+
+    @staticmethod
+    def _db_version(conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE name = 'sync_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _check_db_version(self, conn: sqlite3.Connection) -> None:
+        """其他进程或实例同步过同一数据库时，清空本地常驻集合"""
+        db_version = self._db_version(conn)
+        if db_version != self._synced_db_version:
+            with self._hot_lock:
+                if db_version != self._synced_db_version:
+                    self._version += 1
+                    self._hot.clear()
+                    self._synced_db_version = db_version
+
+    def _fetch(self, doc_ids: List[int]) -> Dict[int, Tuple[str, str]]:
+        """按编号读取 (名称, 正文)，优先使用常驻集合"""
+        found: Dict[int, Tuple[str, str]] = {}
+        missing: List[int] = []
+        with self._hot_lock:
+            version = self._version
+            for doc_id in doc_ids:
+                entry = self._hot.get(doc_id)
+                if entry is None:
+                    missing.append(doc_id)
+                else:
+                    self._hot.move_to_end(doc_id)
+                    found[doc_id] = entry
+            self._stats["hot_hits"] += len(found)
+            self._stats["hot_misses"] += len(missing)
+        if not missing:
+            return found
+
+        marks = ",".join("?" * len(missing))
+        rows = self._connection().execute(f"SELECT id, key, text FROM entries WHERE id IN ({marks})", missing).fetchall()
+        with self._hot_lock:
+            for doc_id, key, text in rows:
+                found[doc_id] = (key, text)
+                if version == self._version and self.hot_entries > 0:
+                    self._hot[doc_id] = (key, text)
+            while len(self._hot) > self.hot_entries:
+                self._hot.popitem(last=False)
+        return found
+
+    def get(self, key: str) -> Optional[str]:
+        """按条目名称精确查找（忽略大小写与标点）"""
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            self._check_db_version(conn)
+            row = conn.execute("SELECT id FROM entries WHERE norm_key = ? ORDER BY id LIMIT 1", (normalize_text(key),)).fetchone()
+            entry = self._fetch([row[0]]).get(row[0]) if row is not None else None
+        finally:
+            conn.execute("COMMIT")
+        return entry[1] if entry else None
+
+    def keys(self) -> List[str]:
+        return [row[0] for row in self._connection().execute("SELECT key FROM entries ORDER BY id")]
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: int = 3, candidate_limit: int = 100) -> List[KnowledgeHit]:
+        """
+        按关键词及其权重检索：先用 FTS5 的 BM25 排序取出候选，再按各关键词的词项覆盖率（以 IDF 加权）打分，
+        得分归一化到 0~1；条目名称与关键词完全一致时，该关键词的权重份额直接计满。
+        """
+        conn = self._connection()
+        keywords = [(keyword, weight, set(tokenize(keyword))) for keyword, weight in keywords_with_weights if weight > 0]
+        total_weight = sum(weight for _, weight, _ in keywords)
+        all_tokens = sorted(set().union(*(tokens for _, _, tokens in keywords))) if keywords else []
+        if not total_weight:
+            return []
+
+        # 读取快照内的全部数据，保证候选、词频与正文来自同一版本
+        conn.execute("BEGIN")
+        try:
+            self._check_db_version(conn)
+            exact: Dict[int, float] = {}
+            for keyword, weight, _ in keywords:
+                row = conn.execute("SELECT id FROM entries WHERE norm_key = ? ORDER BY id LIMIT 1", (normalize_text(keyword),)).fetchone()
+                if row is not None:
+                    exact[row[0]] = exact.get(row[0], 0.0) + weight
+
+            candidates: List[int] = []
+            contains: Dict[str, set] = {}
+            idf: Dict[str, float] = {}
+            if all_tokens:
+                match = " OR ".join(f'"{token}"' for token in all_tokens)
+                candidates = [row[0] for row in conn.execute(
+                    "SELECT rowid FROM entries_fts WHERE entries_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (match, candidate_limit),
+                )]
+                n_docs = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                marks = ",".join("?" * len(all_tokens))
+                doc_freq = dict(conn.execute(f"SELECT term, doc FROM entries_vocab WHERE term IN ({marks})", all_tokens))
+                idf = {
+                    token: math.log(1.0 + (n_docs - doc_freq.get(token, 0) + 0.5) / (doc_freq.get(token, 0) + 0.5))
+                    for token in all_tokens
+                }
+                if candidates:
+                    id_marks = ",".join("?" * len(candidates))
+                    for token in all_tokens:
+                        if token in doc_freq:
+                            contains[token] = {row[0] for row in conn.execute(
+                                f"SELECT rowid FROM entries_fts WHERE entries_fts MATCH ? AND rowid IN ({id_marks})",
+                                [f'"{token}"'] + candidates,
+                            )}
+
+            scores: Dict[int, float] = {}
+            for rank, doc_id in enumerate(candidates):
+                score = 0.0
+                for _, weight, tokens in keywords:
+                    upper = sum(idf[token] for token in tokens)
+                    if upper:
+                        score += weight * sum(idf[token] for token in tokens if doc_id in contains.get(token, ())) / upper
+                scores[doc_id] = score / total_weight
+            for doc_id, weight in exact.items():
+                scores[doc_id] = max(scores.get(doc_id, 0.0), weight / total_weight)
+
+            order = {doc_id: rank for rank, doc_id in enumerate(candidates)}
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], order.get(item[0], len(order))))[:top_k]
+            entries = self._fetch([doc_id for doc_id, _ in ranked])
+        finally:
+            conn.execute("COMMIT")
+        return [KnowledgeHit(entries[doc_id][0], entries[doc_id][1], score) for doc_id, score in ranked if doc_id in entries]
+
+    def stats(self) -> Dict[str, int]:
+        with self._hot_lock:
+            return dict(self._stats, hot_size=len(self._hot), version=self._version)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,129 @@
+"""
+推测式知识库预取：给出澄清建议后立即在后台并发查询各候选术语，
+用户选择后直接使用已取回（或正在取回）的结果，省去一次知识库往返。
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from core.config import PREFETCH_MAX_INFLIGHT, PREFETCH_WIDTH
+from core import telemetry
+from utils.knowledge_base import (
+    get_knowledge_base,
+    get_knowledge_base_generation,
+    query_knowledge_base,
+    query_knowledge_base_async,
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# 全进程同时进行的预取查询数上限；预算用完时不再预取，避免推测性请求挤占真实请求
+_inflight = threading.BoundedSemaphore(max(1, PREFETCH_MAX_INFLIGHT))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, PREFETCH_MAX_INFLIGHT), thread_name_prefix="kb-prefetch")
+        return _executor
+
+
+class KnowledgePrefetcher:
+    """
+    一次澄清过程的预取器：prefetch / aprefetch 在后台查询前 width 个建议术语，
+    take / atake 取出所选术语的结果（未预取、查询失败或知识库已切换时返回 None，由调用方正常查询），
+    cancel 取消其余尚未开始的查询。已完成的多余结果不会丢弃到别处，若知识库启用了缓存则已写入缓存。
+    查询使用发起预取时的知识库实例，之后切换全局知识库不会影响已提交的查询。
+    """
+
+    def __init__(self, width: int = PREFETCH_WIDTH):
+        self.width = width
+        self._pending: Dict[str, Any] = {}
+        self._generation = get_knowledge_base_generation()
+
+    def _candidates(self, terms: Optional[List[str]]) -> List[str]:
+        candidates = []
+        for term in (terms or [])[:max(0, self.width)]:
+            if term and term not in self._pending and term not in candidates:
+                candidates.append(term)
+        return candidates
+
+    def _track(self, term: str, future: Any) -> None:
+        self._pending[term] = future
+        future.add_done_callback(lambda _: _inflight.release())
+        telemetry.increment("prefetch_total", outcome="started")
+
+    def prefetch(self, terms: Optional[List[str]]) -> int:
+        """在线程池中预取，返回发起的查询数"""
+        started = 0
+        knowledge_base = get_knowledge_base()
+        for term in self._candidates(terms):
+            if not _inflight.acquire(blocking=False):
+                telemetry.increment("prefetch_total", outcome="skipped")
+                break
+            self._track(term, _get_executor().submit(query_knowledge_base, [(term, 1.0)], knowledge_base))
+            started += 1
+        return started
+
+    def aprefetch(self, terms: Optional[List[str]]) -> int:
+        """在当前事件循环中预取（使用知识库的异步查询），返回发起的查询数"""
+        started = 0
+        knowledge_base = get_knowledge_base()
+        for term in self._candidates(terms):
+            if not _inflight.acquire(blocking=False):
+                telemetry.increment("prefetch_total", outcome="skipped")
+                break
+            self._track(term, asyncio.ensure_future(query_knowledge_base_async([(term, 1.0)], knowledge_base)))
+            started += 1
+        return started
+
+    def _pop(self, term: Optional[str]) -> Optional[Any]:
+        future = self._pending.pop(term, None) if term else None
+        if future is None or future.cancelled() or get_knowledge_base_generation() != self._generation:
+            telemetry.increment("prefetch_total", outcome="miss")
+            return None
+        return future
+
+    def _hit(self, term: str, text: str) -> str:
+        print(f"[Agent] 使用预取的知识库结果: '{term}'")
+        telemetry.increment("prefetch_total", outcome="hit")
+        telemetry.annotate(prefetch="hit")
+        return text
+
+    def take(self, term: Optional[str]) -> Optional[str]:
+        """取出术语的预取结果（查询尚未完成时等待它完成）"""
+        future = self._pop(term)
+        if future is None:
+            return None
+        try:
+            return self._hit(term, future.result())
+        except Exception as e:
+            print(f"[警告] 预取知识库结果失败，改为直接查询: {e}")
+            return None
+
+    async def atake(self, term: Optional[str]) -> Optional[str]:
+        """Async variant of take."""
+        future = self._pop(term)
+        if future is None:
+            return None
+        try:
+            text = await (future if asyncio.isfuture(future) else asyncio.wrap_future(future))
+            return self._hit(term, text)
+        except Exception as e:
+            print(f"[警告] 预取知识库结果失败，改为直接查询: {e}")
+            return None
+
+    def cancel(self, wait: bool = False) -> None:
+        """取消其余未使用的预取（已在执行的查询会完成，结果不再使用）；wait=True 时等待线程池中已在执行的查询结束"""
+        running = []
+        for future in self._pending.values():
+            if not future.cancel() and isinstance(future, concurrent.futures.Future):
+                running.append(future)
+            telemetry.increment("prefetch_total", outcome="unused")
+        self._pending.clear()
+        if wait and running:
+            concurrent.futures.wait(running)
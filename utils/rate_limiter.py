@@ -0,0 +1,406 @@
+"""
+LLM 客户端限流：令牌桶（每分钟请求数 / token 数）与 AIMD 自适应并发。
+
+令牌桶采用预约方式：取令牌时先扣除（允许暂时为负），返回需要等待的时间，
+同步调用用 time.sleep、异步调用用 asyncio.sleep 等待，线程与协程共用同一个桶。
+提供 state_path 时桶的状态保存在文件中并用 flock 加锁，同一台机器上的多个进程共享配额。
+并发上限按 AIMD 调整：请求成功时加性增加（约每轮增加 1），遇到 429 或超时时乘性减少，
+同一冷却时间内的多次过载只减少一次，避免同一批请求的 429 把并发压到最低。
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from core.config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_MIN_CONCURRENCY,
+    LLM_RATE_LIMIT_ENABLED,
+    LLM_RATE_LIMIT_STATE_PATH,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    get_llm_provider,
+)
+from core import telemetry
+
+try:
+    import fcntl
+except ImportError:  # Windows：只在进程内共享
+    fcntl = None
+
+# 表示服务端过载的状态码
+OVERLOAD_STATUS = {429, 503}
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """取出异常中的 HTTP 状态码（openai 的 status_code 或 http_client 的 status）"""
+    for attr in ("status_code", "status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """429 / 503 或超时：说明请求过多，需要降低并发并稍后重试"""
+    if status_code(error) in OVERLOAD_STATUS:
+        return True
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """服务端在 Retry-After 响应头中给出的等待秒数"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """进程内令牌桶：rate_per_minute 为每分钟补充的令牌数，capacity 为允许的突发量（默认 1 秒的量）"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute 必须大于 0")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(self.rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """预约 amount 个令牌，返回需要等待的秒数（0 表示可以立即发送）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+
+class FileTokenBucket(TokenBucket):
+    """状态保存在文件中的令牌桶，多个进程通过 flock 共享同一份配额（没有 fcntl 的平台只在进程内共享）"""
+
+    def __init__(self, path: str, rate_per_minute: float, capacity: Optional[float] = None):
+        super().__init__(rate_per_minute, capacity)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @contextmanager
+    def _state(self):
+        """加锁读取 (令牌数, 更新时间)，退出时写回；时间使用 time.time()，各进程一致"""
+        with self._lock, open(self.path, "a+", encoding="utf-8") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    data = json.loads(f.read() or "{}")
+                except ValueError:
+                    data = {}
+                state = {"tokens": data.get("tokens", self.capacity), "updated": data.get("updated", time.time())}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._state() as state:
+            now = time.time()
+            tokens = min(self.capacity, state["tokens"] + max(0.0, now - state["updated"]) * self.rate) - amount
+            state.update(tokens=tokens, updated=now)
+            return max(0.0, -tokens / self.rate)
+
+
+class _AsyncWaiter:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+
+    def wake(self) -> None:
+        def _set() -> None:
+            if not self.future.done():
+                self.future.set_result(None)
+        self.loop.call_soon_threadsafe(_set)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 并发上限：成功时上限增加 increase / 上限（每轮约增加 increase），
+    过载时上限乘以 decrease（cooldown 秒内只减少一次），上限在 [minimum, maximum] 之间。
+    线程用 acquire()、协程用 aacquire() 取得名额，完成后都调用 release()。
+    """
+
+    def __init__(
+        self,
+        maximum: int = LLM_MAX_CONCURRENCY,
+        minimum: int = LLM_MIN_CONCURRENCY,
+        initial: Optional[int] = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._limit = float(min(self.maximum, initial or self.maximum))
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+        self._async_waiters: Deque[_AsyncWaiter] = deque()
+
+    @property
+    def limit(self) -> int:
+        return max(self.minimum, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    async def aacquire(self) -> None:
+        while True:
+            with self._condition:
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                waiter = _AsyncWaiter()
+                self._async_waiters.append(waiter)
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self._condition:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+                    else:
+                        self._wake_locked(1)  # 已被唤醒但放弃等待，名额交给下一个
+                raise
+
+    def release(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._wake_locked(1)
+
+    def _wake_locked(self, count: int) -> None:
+        self._condition.notify(count)
+        for _ in range(min(count, len(self._async_waiters))):
+            self._async_waiters.popleft().wake()
+
+    def on_success(self) -> None:
+        with self._condition:
+            before = self.limit
+            self._limit = min(float(self.maximum), self._limit + self.increase / max(self._limit, 1.0))
+            if self.limit > before:
+                self._wake_locked(self.limit - before)
+
+    def on_overload(self) -> bool:
+        """过载时降低上限；返回 False 表示仍在冷却时间内，本次未调整"""
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return False
+            self._last_decrease = now
+            self._limit = max(float(self.minimum), self._limit * self.decrease)
+            return True
+
+
+class RateLimiter:
+    """
+    LLM 调用的共享限流器：先取得并发名额，再从请求桶与 token 桶预约（需要时等待），然后发送请求。
+    call() / acall() 在遇到 429 或超时时降低并发上限，并按 Retry-After 或带抖动的指数退避重试。
+
+    tokens_per_minute 按调用前估计的 token 数（提示词 + 输出预算）预约。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        min_concurrency: int = LLM_MIN_CONCURRENCY,
+        initial_concurrency: Optional[int] = None,
+        state_path: Optional[str] = None,
+        max_retries: int = LLM_MAX_RETRIES,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        burst_seconds: float = 1.0,
+    ):
+        self.requests = self._bucket(requests_per_minute, burst_seconds, state_path, "requests")
+        self.tokens = self._bucket(tokens_per_minute, burst_seconds, state_path, "tokens")
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency, initial_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "overloads": 0, "retries": 0, "errors": 0, "waited_seconds": 0.0}
+
+    @staticmethod
+    def _bucket(rate: float, burst_seconds: float, state_path: Optional[str], name: str) -> Optional[TokenBucket]:
+        if not rate or rate <= 0:
+            return None
+        capacity = max(rate / 60.0 * burst_seconds, 1.0)
+        if state_path:
+            return FileTokenBucket(f"{state_path}.{name}", rate, capacity)
+        return TokenBucket(rate, capacity)
+
+    def _reserve(self, tokens: float) -> float:
+        wait = self.requests.reserve(1) if self.requests else 0.0
+        if self.tokens and tokens > 0:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait > 0:
+            self._count(waited_seconds=wait)
+            telemetry.observe("llm_rate_limit_wait_seconds", wait)
+        return wait
+
+    def _finish(self, error: Optional[BaseException]) -> bool:
+        """释放名额并反馈结果；返回 True 表示过载，可以重试"""
+        self.concurrency.release()
+        if error is None:
+            self.concurrency.on_success()
+            self._count(requests=1)
+            return False
+        if is_overload_error(error):
+            if self.concurrency.on_overload():
+                print(f"[警告] LLM 服务过载（{type(error).__name__}），并发上限降为 {self.concurrency.limit}")
+            self._count(requests=1, overloads=1)
+            telemetry.increment("llm_overloads_total")
+            return True
+        self._count(requests=1, errors=1)
+        return False
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.max_delay))
+        self._count(retries=1)
+        telemetry.increment("llm_retries_total")
+        return delay
+
+    def call(self, func: Callable[[], Any], tokens: float = 0) -> Any:
+        """在限流下调用 func()，过载时重试"""
+        for attempt in range(self.max_retries + 1):
+            self.concurrency.acquire()
+            try:
+                time.sleep(self._reserve(tokens))
+                result = func()
+            except BaseException as e:
+                if not self._finish(e) or attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                continue
+            self._finish(None)
+            return result
+
+    async def acall(self, func: Callable[[], Awaitable[Any]], tokens: float = 0) -> Any:
+        """Async variant of call：等待名额与令牌时不阻塞事件循环。"""
+        for attempt in range(self.max_retries + 1):
+            await self.concurrency.aacquire()
+            try:
+                await asyncio.sleep(self._reserve(tokens))
+                result = await func()
+            except BaseException as e:
+                overloaded = self._finish(e)
+                if not overloaded or attempt == self.max_retries or isinstance(e, asyncio.CancelledError):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            self._finish(None)
+            return result
+
+    @contextmanager
+    def limit(self, tokens: float = 0):
+        """不重试的限流区间（流式调用使用）：进入时等待名额与令牌，退出时反馈结果"""
+        self.concurrency.acquire()
+        error: Optional[BaseException] = None
+        try:
+            time.sleep(self._reserve(tokens))
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._finish(error)
+
+    def _count(self, **values: float) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+    def stats(self) -> Dict[str, float]:
+        """请求数、过载次数、重试次数、其他错误数、累计等待秒数，以及当前的并发上限与进行中的请求数"""
+        with self._lock:
+            stats: Dict[str, float] = dict(self._stats)
+        stats["concurrency_limit"] = self.concurrency.limit
+        stats["in_flight"] = self.concurrency.in_flight
+        return stats
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_override = False
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    返回全局限流器；未启用（LLM_RATE_LIMIT_ENABLED=0）或通过 set_llm_provider 替换了LLM时返回 None，
+    除非已用 set_rate_limiter 明确指定。
+    """
+    global _rate_limiter
+    if _rate_limiter_override:
+        return _rate_limiter
+    if not LLM_RATE_LIMIT_ENABLED or get_llm_provider() is not None:
+        return None
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                LLM_REQUESTS_PER_MINUTE,
+                LLM_TOKENS_PER_MINUTE,
+                state_path=LLM_RATE_LIMIT_STATE_PATH or None,
+            )
+        return _rate_limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """指定全局限流器（None 表示不限流）"""
+    global _rate_limiter, _rate_limiter_override
+    with _rate_limiter_lock:
+        _rate_limiter = limiter
+        _rate_limiter_override = True
+
+
+def reset_rate_limiter() -> None:
+    """恢复默认行为（按配置创建）"""
+    global _rate_limiter, _rate_limiter_override
+    with _rate_limiter_lock:
+        _rate_limiter = None
+        _rate_limiter_override = False
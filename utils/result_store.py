@@ -0,0 +1,261 @@
+import gzip
+import json
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from core.config import RESULT_STORE_COMPRESSION, RESULT_STORE_SEGMENT_MAX_BYTES
+from utils.term_index import normalize_text
+
+try:
+    import fcntl
+except ImportError:  # Windows：只在进程内加锁
+    fcntl = None
+
+# 每条记录：4 字节长度 + 1 字节压缩方式 + 负载（JSON，按压缩方式压缩）
+_HEADER = struct.Struct(">IB")
+_CODECS = {"": 0, "none": 0, "gzip": 1, "zstd": 2}
+_SEGMENT_RE = re.compile(r"^segment-(\d{6})\.log$")
+INDEX_FILE = "index.jsonl"
+LOCK_FILE = ".lock"
+
+
+class IndexEntry(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("使用 zstd 压缩需要安装 zstandard: pip install zstandard")
+    return zstandard
+
+
+def _encode(payload: bytes, codec: int) -> bytes:
+    if codec == 1:
+        return gzip.compress(payload, compresslevel=6, mtime=0)
+    if codec == 2:
+        return _zstd().ZstdCompressor(level=3).compress(payload)
+    return payload
+
+
+def _decode(data: bytes, codec: int) -> bytes:
+    if codec == 1:
+        return gzip.decompress(data)
+    if codec == 2:
+        return _zstd().ZstdDecompressor().decompress(data)
+    return data
+
+
+def query_key(query: str) -> str:
+    """按查询查找结果时使用的归一化查询（忽略大小写、空白与标点）"""
+    return normalize_text(query)
+
+
+class ResultStore:
+    """
+    查询结果存储：每个结果有独立的编号，写入只追加的分段日志（segment-000001.log ...），
+    另有一个 JSONL 偏移索引（编号 -> 分段、偏移、长度），可以按编号或归一化查询找回结果。
+
+    单条记录可选 gzip / zstd 压缩（zstd 需要安装 zstandard）。写入时持有进程内锁与文件锁（POSIX），
+    多个线程和进程可以同时写入同一目录；其他进程写入的结果在查找未命中时从索引文件增量读入。
+    索引损坏或丢失时可以用 rebuild_index() 从分段日志重建。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        compression: Optional[str] = RESULT_STORE_COMPRESSION,
+        segment_max_bytes: int = RESULT_STORE_SEGMENT_MAX_BYTES,
+    ):
+        compression = (compression or "").lower()
+        if compression not in _CODECS:
+            raise ValueError(f"未知的压缩方式: {compression}")
+        if compression == "zstd":
+            _zstd()
+        self.directory = directory
+        self.codec = _CODECS[compression]
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, IndexEntry] = {}
+        self._by_query: Dict[str, str] = {}
+        self._index_pos = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        if not os.path.exists(self._index_path) and self._segments():
+            self.rebuild_index()
+        with self._lock:
+            self._refresh_locked()
+
+    # --- 写入 ---
+
+    def put(self, query: str, answer: Optional[str], **fields: Any) -> str:
+        """保存一个查询结果，返回结果编号；fields 为其他需要一起保存的字段（如 status、term）"""
+        result_id = uuid.uuid4().hex
+        record = dict(fields, id=result_id, query=query, answer=answer, created_at=time.time())
+        data = _encode(json.dumps(record, ensure_ascii=False).encode("utf-8"), self.codec)
+        key = query_key(query)
+
+        with self._lock, self._file_lock():
+            # 先读入其他进程写入的索引，保证本进程的索引位置始终在文件末尾
+            self._refresh_locked()
+            segment = self._writable_segment(len(data))
+            with open(self._segment_path(segment), "ab") as f:
+                offset = f.tell()
+                f.write(_HEADER.pack(len(data), self.codec) + data)
+            line = json.dumps({"id": result_id, "key": key, "segment": segment, "offset": offset,
+                               "length": len(data)}, ensure_ascii=False) + "\n"
+            with open(self._index_path, "ab") as f:
+                f.write(line.encode("utf-8"))
+            self._refresh_locked()
+        return result_id
+
+    def _writable_segment(self, size: int) -> int:
+        segments = self._segments()
+        if not segments:
+            return 1
+        last = segments[-1]
+        if os.path.getsize(self._segment_path(last)) + _HEADER.size + size > self.segment_max_bytes:
+            return last + 1
+        return last
+
+    # --- 读取 ---
+
+    def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """按编号读取结果，不存在时返回 None"""
+        entry = self._entry(result_id)
+        return self._read(entry) if entry else None
+
+    def find(self, query: str) -> Optional[Dict[str, Any]]:
+        """按归一化查询读取最近一次保存的结果，不存在时返回 None"""
+        key = query_key(query)
+        with self._lock:
+            result_id = self._by_query.get(key)
+            if result_id is None:
+                self._refresh_locked()
+                result_id = self._by_query.get(key)
+        return self.get(result_id) if result_id else None
+
+    def lookup(self, id_or_query: str) -> Optional[Dict[str, Any]]:
+        """先按编号查找，找不到时按查询查找"""
+        return self.get(id_or_query) or self.find(id_or_query)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            self._refresh_locked()
+            return list(self._by_id)
+
+    def __len__(self) -> int:
+        return len(self.ids())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """按写入顺序遍历全部结果"""
+        for result_id in self.ids():
+            record = self.get(result_id)
+            if record is not None:
+                yield record
+
+    def _entry(self, result_id: str) -> Optional[IndexEntry]:
+        with self._lock:
+            entry = self._by_id.get(result_id)
+            if entry is None:
+                self._refresh_locked()
+                entry = self._by_id.get(result_id)
+            return entry
+
+    def _read(self, entry: IndexEntry) -> Optional[Dict[str, Any]]:
+        with open(self._segment_path(entry.segment), "rb") as f:
+            f.seek(entry.offset)
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            length, codec = _HEADER.unpack(header)
+            data = f.read(length)
+        if len(data) < length:
+            return None
+        return json.loads(_decode(data, codec))
+
+    # --- 索引 ---
+
+    def _refresh_locked(self) -> None:
+        """从上次读到的位置继续读取索引文件（只处理完整的行）"""
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_pos)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                item = json.loads(line)
+                self._add_entry(item["id"], item["key"], IndexEntry(item["segment"], item["offset"], item["length"]))
+            except (ValueError, KeyError):
+                print(f"[警告] 跳过损坏的结果索引行: {line[:80]!r}")
+        self._index_pos += end
+
+    def _add_entry(self, result_id: str, key: str, entry: IndexEntry) -> None:
+        self._by_id[result_id] = entry
+        self._by_query[key] = result_id
+
+    def rebuild_index(self) -> int:
+        """扫描全部分段日志重建索引文件，返回索引的结果数"""
+        with self._lock, self._file_lock():
+            return self._rebuild_index_locked()
+
+    def _rebuild_index_locked(self) -> int:
+        self._by_id.clear()
+        self._by_query.clear()
+        lines = []
+        for segment in self._segments():
+            with open(self._segment_path(segment), "rb") as f:
+                while True:
+                    offset = f.tell()
+                    header = f.read(_HEADER.size)
+                    if len(header) < _HEADER.size:
+                        break
+                    length, codec = _HEADER.unpack(header)
+                    data = f.read(length)
+                    if len(data) < length:
+                        print(f"[警告] 分段 {segment} 末尾的记录不完整，已忽略")
+                        break
+                    record = json.loads(_decode(data, codec))
+                    key = query_key(record.get("query", ""))
+                    lines.append(json.dumps({"id": record["id"], "key": key, "segment": segment,
+                                             "offset": offset, "length": length}, ensure_ascii=False) + "\n")
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self._index_path)
+        self._index_pos = 0
+        self._refresh_locked()
+        return len(self._by_id)
+
+    # --- 文件 ---
+
+    def _segments(self) -> List[int]:
+        return sorted(int(m.group(1)) for m in map(_SEGMENT_RE.match, os.listdir(self.directory)) if m)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.log")
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的写锁（POSIX flock）；没有 fcntl 的平台只依赖进程内锁"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,150 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from utils.term_index import normalize_text
+
+_ASCII_RUN_RE = re.compile(r"[a-z0-9]+")
+_NON_ASCII_RUN_RE = re.compile(r"[^a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中文友好的分词：英文/数字按整词切分，其余文字按字符二元组切分
+    （长度为1的片段保留单字）。
+    """
+    normalized = normalize_text(text)
+    tokens = _ASCII_RUN_RE.findall(normalized)
+    for run in _NON_ASCII_RUN_RE.findall(normalized):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class KnowledgeHit(NamedTuple):
+    """检索命中的条目：条目名称、正文与归一化到 0~1 的得分"""
+    key: str
+    text: str
+    score: float
+
+
+class InvertedIndex:
+    """
+    基于倒排表的 BM25 检索引擎，对条目名称和正文同时建索引。
+
+    每个词项的 BM25 贡献（impact）在建索引时预先计算并按从高到低排序，
+    查询时每个词项最多只读取前 max_postings 条记录，因此查询耗时与知识库规模基本无关。
+    """
+
+    def __init__(
+        self,
+        entries: Union[Dict[str, str], Iterable[Tuple[str, str]]] = (),
+        k1: float = 1.2,
+        b: float = 0.75,
+        key_boost: float = 3.0,
+        max_postings: int = 200,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.key_boost = key_boost
+        self.max_postings = max_postings
+        items = entries.items() if isinstance(entries, dict) else entries
+        self._keys: List[str] = []
+        self._texts: List[str] = []
+        self._by_key: Dict[str, int] = {}
+        self._postings: Dict[str, List[Tuple[float, int]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._build(items)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _build(self, items: Iterable[Tuple[str, str]]) -> None:
+        term_freqs: List[Counter] = []
+        for key, text in items:
+            text = text if isinstance(text, str) else str(text)
+            doc_id = len(self._keys)
+            self._keys.append(key)
+            self._texts.append(text)
+            self._by_key.setdefault(normalize_text(key), doc_id)
+            freqs = Counter(tokenize(text))
+            for token in tokenize(key):
+                freqs[token] += self.key_boost
+            term_freqs.append(freqs)
+
+        n_docs = len(term_freqs)
+        if not n_docs:
+            return
+        lengths = [sum(freqs.values()) for freqs in term_freqs]
+        avg_length = sum(lengths) / n_docs or 1.0
+
+        doc_freq: Counter = Counter()
+        for freqs in term_freqs:
+            doc_freq.update(freqs.keys())
+        idf = {
+            token: math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for token, df in doc_freq.items()
+        }
+
+        postings: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        k1_plus_1 = self.k1 + 1.0
+        for doc_id, freqs in enumerate(term_freqs):
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[doc_id] / avg_length)
+            for token, tf in freqs.items():
+                postings[token].append((idf[token] * tf * k1_plus_1 / (tf + norm), doc_id))
+        for plist in postings.values():
+            plist.sort(reverse=True)
+        self._idf = idf
+        self._postings = dict(postings)
+
+    def get(self, key: str) -> Union[str, None]:
+        """按条目名称精确查找（忽略大小写与标点）"""
+        doc_id = self._by_key.get(normalize_text(key))
+        return self._texts[doc_id] if doc_id is not None else None
+
+    def search(self, keywords_with_weights: List[Tuple[str, float]], top_k: int = 3) -> List[KnowledgeHit]:
+        """
+        按关键词及其权重检索，返回得分最高的 top_k 个条目。
+
+        得分为加权 BM25 除以其理论上限，归一化到 0~1；
+        条目名称与某个关键词完全一致时，该关键词的权重份额直接计满。
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        exact: Dict[int, float] = defaultdict(float)
+        upper_bound = 0.0
+        total_weight = 0.0
+        for keyword, weight in keywords_with_weights:
+            if weight <= 0:
+                continue
+            total_weight += weight
+            doc_id = self._by_key.get(normalize_text(keyword))
+            if doc_id is not None:
+                exact[doc_id] += weight
+            for token in set(tokenize(keyword)):
+                idf = self._idf.get(token)
+                if idf is None:
+                    # 未出现的词项也计入上限，缺失的词会降低得分
+                    upper_bound += weight * math.log(1.0 + len(self._keys) + 0.5) * (self.k1 + 1.0)
+                    continue
+                upper_bound += weight * idf * (self.k1 + 1.0)
+                for impact, doc_id in islice(self._postings[token], self.max_postings):
+                    scores[doc_id] += weight * impact
+
+        if not scores and not exact:
+            return []
+        # 非精确命中的条目按原始得分单调排序，只需对候选前 top_k 个与精确命中的条目做归一化
+        candidates = {doc_id for doc_id, _ in heapq.nlargest(top_k, scores.items(), key=itemgetter(1))}
+        candidates.update(exact)
+        normalized = []
+        for doc_id in candidates:
+            bm25 = min(1.0, scores.get(doc_id, 0.0) / upper_bound) if upper_bound else 0.0
+            key_share = exact.get(doc_id, 0.0) / total_weight if total_weight else 0.0
+            normalized.append((max(bm25, key_share), doc_id))
+        normalized.sort(reverse=True)
+        return [KnowledgeHit(self._keys[doc_id], self._texts[doc_id], score) for score, doc_id in normalized[:top_k]]
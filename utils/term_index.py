@@ -0,0 +1,201 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+# 提问中常见的非术语成分，匹配前先去除
+QUESTION_FILLERS = [
+    "请问", "请介绍一下", "介绍一下", "什么是", "是什么意思", "是什么", "是啥", "什么叫",
+    "怎么用", "如何使用", "怎么使用", "的定义", "的含义", "有哪些", "有什么", "一下",
+    "怎么", "如何", "吗", "呢", "啊",
+]
+
+
+def normalize_text(text: str) -> str:
+    """统一大小写并去除空白与标点，用于术语匹配"""
+    return _NON_WORD_RE.sub("", text or "").casefold()
+
+
+def char_bigrams(text: str) -> Set[str]:
+    """返回文本的字符二元组集合（文本长度为1时返回该字符本身）"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def strip_question_fillers(text: str) -> str:
+    """去除"是什么"、"怎么用"等提问成分，保留核心术语部分（输入需已归一化）"""
+    core = text
+    for filler in QUESTION_FILLERS:
+        core = core.replace(filler, "")
+    return core or text
+
+
+def edit_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Levenshtein 编辑距离；超过 max_distance 时提前返回 max_distance + 1"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class TermMatch(NamedTuple):
+    """术语匹配结果：标准术语、相似度（0~1）以及查询中与之对应的片段"""
+    term: str
+    score: float
+    matched_text: str
+
+
+class TermIndex:
+    """
+    基于字符 n-gram 倒排与编辑距离的术语索引。
+
+    先用一元/二元字符组的倒排表召回候选术语（过于常见的一元组会被跳过），
+    再对候选计算查询中最佳窗口的编辑相似度进行排序，适合中文短术语的纠错与推荐。
+    """
+
+    def __init__(
+        self,
+        terms: Iterable[str] = (),
+        max_candidates: int = 64,
+        max_unigram_postings: int = 2000,
+    ):
+        self.max_candidates = max_candidates
+        self.max_unigram_postings = max_unigram_postings
+        self._terms: List[str] = []
+        self._normalized: List[str] = []
+        self._by_normalized: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for term in terms:
+            self.add(term)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    @property
+    def terms(self) -> List[str]:
+        """全部术语（按加入顺序）"""
+        return list(self._terms)
+
+    def __contains__(self, term: str) -> bool:
+        return normalize_text(term) in self._by_normalized
+
+    def add(self, term: str) -> None:
+        """加入一个术语，重复术语（归一化后相同）会被忽略"""
+        normalized = normalize_text(term)
+        if not normalized or normalized in self._by_normalized:
+            return
+        term_id = len(self._terms)
+        self._terms.append(term)
+        self._normalized.append(normalized)
+        self._by_normalized[normalized] = term_id
+        for gram in set(normalized) | char_bigrams(normalized):
+            self._postings[gram].append(term_id)
+
+    def _candidates(self, text: str) -> List[int]:
+        """按共享 n-gram 数量（二元组加权）召回候选术语"""
+        counts: Dict[int, float] = defaultdict(float)
+        for gram in char_bigrams(text):
+            if len(gram) == 2:
+                for term_id in self._postings.get(gram, ()):
+                    counts[term_id] += 2.0
+        for char in set(text):
+            postings = self._postings.get(char, ())
+            if len(postings) > self.max_unigram_postings:
+                continue
+            for term_id in postings:
+                counts[term_id] += 1.0
+        ranked = sorted(counts, key=counts.__getitem__, reverse=True)
+        return ranked[:self.max_candidates]
+
+    def _best_window(self, text: str, normalized_term: str) -> TermMatch:
+        """在查询中寻找与术语编辑相似度最高的片段"""
+        term_len = len(normalized_term)
+        best_score, best_window = 0.0, text
+        for length in range(max(1, term_len - 1), term_len + 2):
+            if length > len(text):
+                windows = [text]
+            else:
+                windows = [text[i:i + length] for i in range(len(text) - length + 1)]
+            for window in windows:
+                longest = max(len(window), term_len)
+                max_distance = int(longest * (1.0 - best_score))
+                distance = edit_distance(window, normalized_term, max_distance)
+                score = 1.0 - distance / longest
+                if score > best_score:
+                    best_score, best_window = score, window
+        return TermMatch("", best_score, best_window)
+
+    def suggest(self, text: str, k: int = 3, min_score: float = 0.0) -> List[TermMatch]:
+        """返回与文本最相近的 k 个术语，按相似度从高到低排序"""
+        normalized = normalize_text(text)
+        if not normalized or not self._terms:
+            return []
+        core = strip_question_fillers(normalized)
+
+        matches = []
+        for term_id in self._candidates(core):
+            normalized_term = self._normalized[term_id]
+            if normalized_term in normalized:
+                match = TermMatch(self._terms[term_id], 1.0, normalized_term)
+            else:
+                window = self._best_window(core, normalized_term)
+                match = TermMatch(self._terms[term_id], window.score, window.matched_text)
+            if match.score >= min_score:
+                matches.append(match)
+        # 相似度相同时优先更长的术语（例如同时命中"遥感"和"微波遥感"）
+        matches.sort(key=lambda m: (m.score, len(m.term)), reverse=True)
+        return matches[:k]
+
+    def clarify(
+        self,
+        text: str,
+        auto_correct_threshold: float = 0.85,
+        suggest_threshold: float = 0.5,
+        max_suggestions: int = 3,
+        min_margin: float = 0.15,
+    ) -> Optional[Dict]:
+        """
+        返回与 TermClarification 字段一致的字典；本地无法给出可靠结果时返回 None。
+
+        - 查询中直接包含某个术语，或最佳候选相似度超过 auto_correct_threshold
+          且明显领先第二名时，判定为不模糊；
+        - 最佳候选相似度不低于 suggest_threshold 时，判定为模糊并给出建议列表。
+        """
+        matches = self.suggest(text, k=max(max_suggestions, 2))
+        if not matches or matches[0].score < suggest_threshold:
+            return None
+
+        best = matches[0]
+        runner_up = matches[1].score if len(matches) > 1 else 0.0
+        if best.score >= 1.0 or (best.score >= auto_correct_threshold and best.score - runner_up >= min_margin):
+            return {
+                "is_ambiguous": False,
+                "original_term": best.matched_text,
+                "corrected_term": best.term,
+                "suggestions": None,
+            }
+
+        floor = suggest_threshold * 0.6
+        return {
+            "is_ambiguous": True,
+            "original_term": best.matched_text,
+            "corrected_term": None,
+            "suggestions": [m.term for m in matches[:max_suggestions] if m.score >= floor],
+        }
@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from typing import Dict, Iterable, List, Optional, Protocol, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.retrieval import KnowledgeHit
+from utils.term_index import normalize_text
+
+EMBEDDINGS_FILE = "embeddings.npy"
+ENTRIES_FILE = "entries.json"
+META_FILE = "meta.json"
+
+
+class Embedder(Protocol):
+    """本地向量化接口：name 标识模型与参数（写入索引元数据，用于检查索引是否兼容）"""
+    name: str
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """返回形状为 (len(texts), dim) 的 float32 矩阵，每行已做 L2 归一化"""
+        ...
+
+
+class HashingEmbedder:
+    """
+    字符 n-gram 哈希向量化，无需模型文件、可离线使用。
+    中文没有空格分词，单字与二元组的重合即可反映"回波强度"与"雷达回波信号"这类表述之间的相近程度。
+
+    每个 n-gram 经 crc32 哈希到 dim 维中的一维并带正负号（减少碰撞带来的偏差），
+    结果在不同进程与机器之间保持一致。
+    """
+
+    def __init__(self, dim: int = 1024, ngram_range: Tuple[int, int] = (1, 2)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.name = f"hashing-char-{ngram_range[0]}-{ngram_range[1]}-d{dim}"
+
+    def _ngrams(self, text: str) -> Iterable[str]:
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                yield text[i:i + n]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for gram in self._ngrams(normalize_text(text)):
+                h = zlib.crc32(gram.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def weighted_query(embedder: Embedder, keywords_with_weights: Sequence[Tuple[str, float]]) -> np.ndarray:
+    """把多个关键词的向量按权重相加并归一化，合成一个查询向量"""
+    vectors = embedder.embed([keyword for keyword, _ in keywords_with_weights])
+    weights = np.asarray([weight for _, weight in keywords_with_weights], dtype=np.float32)
+    query = weights @ vectors
+    norm = np.linalg.norm(query)
+    return query / norm if norm else query
+
+
+class VectorIndex:
+    """
+    稠密向量索引：条目向量按行存放在 float32 矩阵中，按余弦相似度检索 top-k。
+
+    通过 save / load 持久化为目录（embeddings.npy + entries.json + meta.json）；
+    load 默认以只读内存映射方式打开矩阵，多个进程共享操作系统页缓存中的同一份数据，启动时无需读入整个文件。
+    """
+
+    def __init__(self, keys: List[str], texts: List[str], embeddings: np.ndarray, embedder_name: str):
+        if len(keys) != len(texts) or len(keys) != embeddings.shape[0]:
+            raise ValueError("条目数与向量矩阵行数不一致")
+        self.keys = keys
+        self.texts = texts
+        self.embeddings = embeddings
+        self.embedder_name = embedder_name
+        self._by_key: Dict[str, int] = {}
+        for doc_id, key in enumerate(keys):
+            self._by_key.setdefault(normalize_text(key), doc_id)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def build(
+        cls,
+        entries: Union[Dict[str, str], Iterable[Tuple[str, str]]],
+        embedder: Embedder,
+        batch_size: int = 256,
+    ) -> "VectorIndex":
+        """对条目（名称 + 正文）分批向量化并构建索引"""
+        items = list(entries.items() if isinstance(entries, dict) else entries)
+        keys = [key for key, _ in items]
+        texts = [text if isinstance(text, str) else str(text) for _, text in items]
+        embeddings = np.zeros((len(items), embedder.dim), dtype=np.float32)
+        for start in range(0, len(items), batch_size):
+            batch = [f"{key}\n{text}" for key, text in zip(keys[start:start + batch_size], texts[start:start + batch_size])]
+            embeddings[start:start + len(batch)] = embedder.embed(batch)
+        return cls(keys, texts, embeddings, embedder.name)
+
+    def save(self, path: str, extra_meta: Optional[Dict] = None) -> None:
+        """
+        写入索引目录；先写临时目录再整体替换，读者不会看到写了一半的索引。
+        extra_meta 一并写入 meta.json（例如离线构建的文件清单），load 时忽略。
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".vector-index-", dir=parent)
+        try:
+            np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), np.ascontiguousarray(self.embeddings, dtype=np.float32))
+            with open(os.path.join(tmp_dir, ENTRIES_FILE), 'w', encoding='utf-8') as f:
+                json.dump({"keys": self.keys, "texts": self.texts}, f, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({
+                    **(extra_meta or {}),
+                    "embedder": self.embedder_name,
+                    "dim": int(self.embeddings.shape[1]),
+                    "count": len(self.keys),
+                }, f, ensure_ascii=False)
+            if os.path.isdir(path):
+                old_dir = tmp_dir + ".old"
+                os.replace(path, old_dir)
+                os.replace(tmp_dir, path)
+                shutil.rmtree(old_dir, ignore_errors=True)
+            else:
+                os.replace(tmp_dir, path)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorIndex":
+        """读取索引目录；mmap=True 时向量矩阵以只读内存映射方式打开"""
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(path, ENTRIES_FILE), 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode='r' if mmap else None)
+        return cls(entries["keys"], entries["texts"], embeddings, meta["embedder"])
+
+    @staticmethod
+    def read_meta(path: str) -> Optional[Dict]:
+        """读取索引目录的 meta.json，不存在或损坏时返回 None"""
+        try:
+            with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def write_meta(path: str, meta: Dict) -> None:
+        """只替换已有索引的 meta.json（向量与条目不变时使用）"""
+        tmp_path = os.path.join(path, META_FILE + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, META_FILE))
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return all(os.path.exists(os.path.join(path, name)) for name in (EMBEDDINGS_FILE, ENTRIES_FILE, META_FILE))
+
+    def lookup_key(self, key: str) -> Optional[int]:
+        """按条目名称精确查找（忽略大小写与标点），返回条目编号"""
+        return self._by_key.get(normalize_text(key))
+
+    def search_vectors(self, queries: np.ndarray, top_k: int = 3, block_rows: int = 65536) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索：queries 为 (q, dim) 的归一化查询向量，返回每个查询的 [(条目编号, 余弦相似度)]。
+
+        矩阵按 block_rows 行分块与全部查询相乘，每块只保留候选 top-k，
+        内存占用与知识库规模无关，内存映射的矩阵也只需顺序读取一遍。
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_docs = len(self.keys)
+        if n_docs == 0 or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        k = min(top_k, n_docs)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, n_docs, block_rows):
+            block = np.asarray(self.embeddings[start:start + block_rows])
+            scores = queries @ block.T
+            if scores.shape[1] > k:
+                part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, part, axis=1)
+                ids = part + start
+            else:
+                ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_ids = np.concatenate([best_ids, ids], axis=1)
+            if best_scores.shape[1] > k:
+                part = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, part, axis=1)
+                best_ids = np.take_along_axis(best_ids, part, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        return [
+            [(int(doc_id), float(score)) for doc_id, score in zip(ids_row, scores_row)]
+            for ids_row, scores_row in zip(best_ids, best_scores)
+        ]
+
+    def search(self, queries: Sequence[str], embedder: Embedder, top_k: int = 3) -> List[List[KnowledgeHit]]:
+        """批量检索文本查询"""
+        results = self.search_vectors(embedder.embed(list(queries)), top_k)
+        return [
+            [KnowledgeHit(self.keys[doc_id], self.texts[doc_id], max(0.0, score)) for doc_id, score in row]
+            for row in results
+        ]